@@ -22,6 +22,15 @@ class Settings(BaseSettings):
     APP_NAME: str = "Auth Service"
     DEBUG: bool = False
     
+    # Tiempo mínimo de plazo restante (segundos) para verificar una contraseña
+    # con bcrypt; con menos se responde 504 sin hacer el cálculo
+    DEADLINE_BCRYPT_BUDGET: float = 0.25
+    
+    # Logging (JSON desde un hilo aparte; fracción de solicitudes exitosas registradas)
+    LOG_LEVEL: str = "INFO"
+    LOG_JSON: bool = True
+    LOG_SAMPLE_RATE: float = 1.0
+    
     model_config = {
         "env_file": ".env"
     }
@@ -1,6 +1,7 @@
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import create_engine, event, MetaData
 from sqlalchemy.orm import sessionmaker, declarative_base
 from app.config import settings
+from app.utils.deadline import check_deadline, remaining
 
 # Configurar el esquema auth por defecto para todos los modelos
 metadata = MetaData(schema='auth')
@@ -12,6 +13,24 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+@event.listens_for(SessionLocal, "after_begin")
+def apply_statement_timeout(session, transaction, connection):
+    """
+    Limita las consultas de cada transacción al plazo restante de la
+    solicitud (X-Request-Deadline): Postgres cancela las consultas que lo
+    superan en lugar de seguir trabajando para un cliente que ya no espera.
+    SET LOCAL solo dura hasta el final de la transacción, de modo que no
+    afecta al siguiente uso de la conexión del pool.
+    """
+    budget = remaining()
+    if budget is None:
+        return
+    check_deadline()
+    if connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {max(1, int(budget * 1000))}")
+
+
 # Usar el metadata con el esquema auth configurado
 Base = declarative_base(metadata=metadata)
 
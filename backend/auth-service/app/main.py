@@ -1,20 +1,29 @@
 from contextlib import asynccontextmanager
+import logging
 from fastapi import FastAPI, Depends
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from sqlalchemy.orm import Session
 from app.config import settings
+from app.utils.deadline import DeadlineMiddleware
+from app.utils.logging_config import AccessLogMiddleware, setup_logging
+from app.utils.metrics import MetricsMiddleware, render_metrics
 from app.database import get_db, SessionLocal
 from app.api import auth, users, tenants
 
+# Configurar logging (JSON escrito desde un hilo aparte, fuera del event loop)
+setup_logging("auth-service", settings.LOG_LEVEL, settings.LOG_JSON)
+logger = logging.getLogger("auth-service")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan events for the application."""
     # Startup event
     db = SessionLocal()
     try:
-        print("Auth service started")
-    except Exception as e:
-        print(f"Error during startup: {e}")
+        logger.info("Auth service started")
+    except Exception:
+        logger.exception("Error during startup")
     finally:
         db.close()
     
@@ -33,14 +42,18 @@ app = FastAPI(
     debug=settings.DEBUG
 )
 
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Configure properly for production
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Sin CORSMiddleware: los navegadores acceden a través del gateway, que
+# responde los preflight y agrega los encabezados CORS
+
+# Plazo de la solicitud (X-Request-Deadline) propagado por el gateway: las
+# solicitudes vencidas se responden 504 sin ejecutarse
+app.add_middleware(DeadlineMiddleware)
+
+# Métricas por plantilla de ruta (latencia, solicitudes en curso y códigos de estado)
+app.add_middleware(MetricsMiddleware, namespace="auth")
+
+# Request ID (X-Request-ID) y una línea de log por solicitud
+app.add_middleware(AccessLogMiddleware, logger_name="auth-service", sample_rate=settings.LOG_SAMPLE_RATE)
 
 # Include routers
 app.include_router(auth.router)
@@ -64,6 +77,12 @@ def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Métricas del servicio en formato de texto de Prometheus."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 # El evento de inicio ahora se maneja en la función lifespan
 
 
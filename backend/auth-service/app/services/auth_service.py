@@ -7,6 +7,8 @@ from app.schemas.tenant import TenantCreate
 from app.services.user_service import UserService
 from app.services.tenant_service import TenantService
 from app.services.user_tenant_service import UserTenantService
+from app.config import settings
+from app.utils.deadline import check_deadline
 from app.utils.auth import verify_password, create_access_token, create_refresh_token, verify_token
 
 
@@ -68,7 +70,8 @@ class AuthService:
         if not user or not user.is_active:
             return None
         
-        # Verify password
+        # Verify password (bcrypt es costoso: solo si queda plazo para terminarlo)
+        check_deadline(settings.DEADLINE_BCRYPT_BUDGET)
         if not verify_password(login_data.password, user.hashed_password):
             return None
         
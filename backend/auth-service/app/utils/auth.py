@@ -1,21 +1,41 @@
 import secrets
+import time
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.config import settings
+from app.utils.metrics import Histogram
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Duración de bcrypt (por diseño es la operación más costosa del servicio)
+BCRYPT_SECONDS = Histogram(
+    "auth_bcrypt_duration_seconds",
+    "Duración de las operaciones de bcrypt en segundos",
+    ("operation",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0, 5.0),
+)
+_BCRYPT_VERIFY = BCRYPT_SECONDS.labels("verify")
+_BCRYPT_HASH = BCRYPT_SECONDS.labels("hash")
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    start = time.perf_counter()
+    try:
+        return pwd_context.verify(plain_password, hashed_password)
+    finally:
+        _BCRYPT_VERIFY.observe(time.perf_counter() - start)
 
 
 def get_password_hash(password: str) -> str:
     """Hash a password."""
-    return pwd_context.hash(password)
+    start = time.perf_counter()
+    try:
+        return pwd_context.hash(password)
+    finally:
+        _BCRYPT_HASH.observe(time.perf_counter() - start)
 
 
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
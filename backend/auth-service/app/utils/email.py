@@ -1,14 +1,17 @@
+import logging
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import Optional
 from app.config import settings
 
+logger = logging.getLogger("auth-service")
+
 
 async def send_email(to_email: str, subject: str, html_content: str) -> bool:
     """Send an email using SMTP."""
     if not all([settings.EMAIL_HOST, settings.EMAIL_USERNAME, settings.EMAIL_PASSWORD]):
-        print(f"Email configuration missing. Would send email to {to_email} with subject: {subject}")
+        logger.info("Email configuration missing. Would send email to %s with subject: %s", to_email, subject)
         return True  # Return True for development without email config
     
     try:
@@ -27,7 +30,7 @@ async def send_email(to_email: str, subject: str, html_content: str) -> bool:
         
         return True
     except Exception as e:
-        print(f"Failed to send email: {e}")
+        logger.error("Failed to send email: %s", e)
         return False
 
 
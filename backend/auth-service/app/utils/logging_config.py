@@ -0,0 +1,239 @@
+"""
+Configuración de logging compartida por los servicios.
+
+Los registros se encolan en el hilo que los genera (sin formatear ni escribir)
+y un QueueListener los formatea como JSON y los escribe desde otro hilo, fuera
+del event loop. Cada registro lleva el ID de la solicitud en curso.
+"""
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# ID de la solicitud en curso; se incluye en cada registro y se propaga a los servicios
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Encabezado con el que se recibe y se propaga el ID de la solicitud
+REQUEST_ID_HEADER = "x-request-id"
+
+# Atributos propios de LogRecord; el resto (pasados con `extra=`) se emiten como campos
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+# Pipeline activo (handler de la cola y listener)
+_handler: Optional[QueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Copia el ID de la solicitud en curso al registro (en el hilo que lo genera)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formatea cada registro como una línea JSON."""
+
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "service": self.service,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            data["request_id"] = record.request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler que encola el registro tal cual. El QueueHandler estándar
+    formatea el mensaje antes de encolarlo; aquí el formateo (incluidos los
+    argumentos de `logger.info("%s", valor)`) ocurre en el hilo del listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging(service: str, level: str = "INFO", json_format: bool = True) -> QueueListener:
+    """
+    Configura el logging del proceso con una cola y un hilo escritor.
+
+    Args:
+        service: El nombre del servicio (se incluye en cada registro)
+        level: El nivel mínimo de logging
+        json_format: True para JSON, False para texto legible
+
+    Returns:
+        El QueueListener iniciado
+    """
+    global _handler, _listener
+    shutdown_logging()
+
+    stream = logging.StreamHandler(sys.stderr)
+    if json_format:
+        stream.setFormatter(JsonFormatter(service))
+    else:
+        stream.setFormatter(
+            logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s")
+        )
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _handler = DeferredQueueHandler(log_queue)
+    _handler.addFilter(RequestIdFilter())
+    _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(level)
+    return _listener
+
+
+def shutdown_logging() -> None:
+    """Detiene el listener (escribiendo los registros pendientes) y quita el handler."""
+    global _handler, _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+
+
+atexit.register(shutdown_logging)
+
+
+def new_request_id(value: Optional[str] = None) -> str:
+    """
+    Devuelve el ID de la solicitud recibido si es válido o genera uno nuevo.
+
+    Args:
+        value: El valor del encabezado X-Request-ID, si se recibió
+
+    Returns:
+        El ID de la solicitud
+    """
+    if value and len(value) <= 128 and value.isprintable():
+        return value
+    return uuid.uuid4().hex
+
+
+def client_address(scope: Scope) -> str:
+    """
+    Obtiene la IP del cliente desde X-Forwarded-For o desde la conexión.
+
+    Args:
+        scope: El scope ASGI de la solicitud
+
+    Returns:
+        La IP del cliente, o "unknown" si no se conoce
+    """
+    for name, value in scope["headers"]:
+        if name == b"x-forwarded-for":
+            return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def should_log_success(sample_rate: float) -> bool:
+    """Indica si se registra una solicitud exitosa según la tasa de muestreo (0 a 1)."""
+    return sample_rate >= 1.0 or random.random() < sample_rate
+
+
+class AccessLogMiddleware:
+    """
+    Middleware ASGI que asigna el ID de la solicitud (X-Request-ID), lo
+    devuelve en la respuesta y registra una línea por solicitud. Las
+    solicitudes exitosas se muestrean con `sample_rate`; las respuestas 4xx y
+    5xx se registran siempre.
+    """
+
+    def __init__(self, app: ASGIApp, logger_name: str, sample_rate: float = 1.0):
+        self.app = app
+        self.logger = logging.getLogger(logger_name)
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        received = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER.encode():
+                received = value.decode("latin-1")
+                break
+        request_id = new_request_id(received)
+        token = request_id_var.set(request_id)
+        status_code: Optional[int] = None
+
+        async def send_with_request_id(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (REQUEST_ID_HEADER.encode(), request_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            try:
+                await self.app(scope, receive, send_with_request_id)
+            except Exception as e:
+                duration = (time.perf_counter() - start_time) * 1000
+                self.logger.error(
+                    "Error: %s %s - %s - %.1fms", scope["method"], scope["path"], e, duration,
+                    extra={
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "client": client_address(scope),
+                        "duration_ms": round(duration, 1),
+                    },
+                )
+                await self.handle_error(scope, send_with_request_id, e, status_code is not None)
+                return
+
+            if status_code is not None and status_code < 400 and not should_log_success(self.sample_rate):
+                return
+            duration = (time.perf_counter() - start_time) * 1000
+            self.logger.info(
+                "%s %s - Status: %s - Time: %.1fms", scope["method"], scope["path"], status_code, duration,
+                extra={
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status_code,
+                    "request_id": request_id,
+                    "client": client_address(scope),
+                    "duration_ms": round(duration, 1),
+                },
+            )
+        finally:
+            request_id_var.reset(token)
+
+    async def handle_error(self, scope: Scope, send: Send, error: Exception, response_started: bool) -> None:
+        """Maneja un error no controlado de la aplicación (por defecto lo propaga)."""
+        raise error
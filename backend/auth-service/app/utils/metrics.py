@@ -0,0 +1,309 @@
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Funciones que generan líneas de métricas en formato de texto de Prometheus
+# al momento de la consulta (ej: estado de las réplicas de cada servicio)
+_collectors: List[Callable[[], Iterable[str]]] = []
+
+# Buckets por defecto de los histogramas de latencia (en segundos)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Cantidad máxima de combinaciones de etiquetas por métrica; las demás se
+# acumulan en una serie con todas las etiquetas en "other"
+MAX_SERIES = 1000
+
+# Códigos de estado como texto, para no convertirlos en cada solicitud
+_STATUS_TEXT = {code: str(code) for code in range(100, 600)}
+
+
+def format_labels(**labels: object) -> str:
+    """
+    Formatea las etiquetas de una métrica (ej: {service="auth"}).
+
+    Args:
+        labels: Nombre y valor de cada etiqueta
+
+    Returns:
+        Las etiquetas entre llaves, o una cadena vacía si no hay etiquetas
+    """
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels.items():
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def register_collector(collector: Callable[[], Iterable[str]]) -> None:
+    """
+    Registra una función que genera líneas de métricas al consultar /metrics.
+
+    Args:
+        collector: Función sin argumentos que devuelve las líneas
+    """
+    if collector not in _collectors:
+        _collectors.append(collector)
+
+
+def render_metrics() -> str:
+    """
+    Genera el texto completo de las métricas para el endpoint /metrics.
+
+    Returns:
+        Las métricas en formato de texto de Prometheus
+    """
+    lines: List[str] = []
+    for collector in _collectors:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
+
+
+class _Metric:
+    """
+    Base de las métricas con etiquetas. Cada combinación de valores de
+    etiquetas (una tupla) tiene un hijo que se crea una sola vez; registrar un
+    valor no crea diccionarios ni cadenas.
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), register: bool = True):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if register:
+            register_collector(self.collect)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """
+        Devuelve el hijo de la métrica para los valores de etiquetas dados.
+        Conviene guardar el hijo cuando las etiquetas son fijas.
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} espera las etiquetas {self.labelnames}")
+            if len(self._children) >= MAX_SERIES:
+                values = ("other",) * len(self.labelnames)
+                child = self._children.get(values)
+            if child is None:
+                child = self._children[values] = self._new_child()
+        return child
+
+    def _label_text(self, values: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        labels = dict(zip(self.labelnames, values))
+        if extra is not None:
+            labels[extra[0]] = extra[1]
+        return format_labels(**labels)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def collect(self) -> List[str]:
+        """Genera las líneas de la métrica en formato de texto de Prometheus."""
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ] + self._samples()
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class Counter(_Metric):
+    """Contador que solo aumenta (ej: solicitudes por código de estado)."""
+
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{self._label_text(values)} {child.value:g}" for values, child in self._children.items()]
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Gauge(Counter):
+    """Valor que sube y baja (ej: solicitudes en curso)."""
+
+    kind = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # Un contador por bucket más el de +Inf (no acumulados)
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+
+class Histogram(_Metric):
+    """Histograma con buckets fijos (ej: latencia de las solicitudes en segundos)."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        register: bool = True,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, register)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{self._label_text(values, ('le', le))} {cumulative}")
+            labels = self._label_text(values)
+            lines.append(f"{self.name}_sum{labels} {child.sum:.6f}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def default_route_template(scope: Scope) -> str:
+    """
+    Devuelve la plantilla de la ruta que atendió la solicitud (ej:
+    "/{tenant_id}/patients/{patient_id}") para no crear una serie por URL.
+    """
+    route = scope.get("route")
+    if route is None:
+        # Versiones de Starlette que no guardan la ruta en el scope
+        from starlette.routing import Match
+
+        router = getattr(scope.get("app"), "router", None)
+        for candidate in getattr(router, "routes", ()):
+            if candidate.matches(scope)[0] == Match.FULL:
+                route = candidate
+                break
+    return getattr(route, "path", None) or "unmatched"
+
+
+# Métricas HTTP por namespace (se crean una sola vez aunque la aplicación se construya varias veces)
+_http_metrics: Dict[str, Tuple[Histogram, Counter, Gauge]] = {}
+
+
+def http_metrics(namespace: str) -> Tuple[Histogram, Counter, Gauge]:
+    """
+    Devuelve las métricas HTTP del namespace: latencia, respuestas por código
+    de estado y solicitudes en curso.
+    """
+    if namespace not in _http_metrics:
+        _http_metrics[namespace] = (
+            Histogram(
+                f"{namespace}_http_request_duration_seconds",
+                "Duración de las solicitudes HTTP en segundos",
+                ("method", "route"),
+            ),
+            Counter(
+                f"{namespace}_http_responses_total",
+                "Respuestas HTTP por código de estado",
+                ("method", "route", "status"),
+            ),
+            Gauge(f"{namespace}_http_requests_in_flight", "Solicitudes HTTP en curso"),
+        )
+    return _http_metrics[namespace]
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI que registra la latencia por método y plantilla de ruta,
+    las solicitudes en curso y las respuestas por código de estado.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        namespace: str,
+        route_template: Callable[[Scope], str] = default_route_template,
+    ):
+        self.app = app
+        self.route_template = route_template
+        self.duration, self.responses, in_flight = http_metrics(namespace)
+        self.in_flight = in_flight.labels()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        self.in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.in_flight.dec()
+            method, route = scope["method"], self.route_template(scope)
+            self.duration.labels(method, route).observe(time.perf_counter() - start)
+            self.responses.labels(method, route, _STATUS_TEXT.get(status_code) or str(status_code)).inc()
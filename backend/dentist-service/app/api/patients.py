@@ -8,6 +8,7 @@ from app.schemas.patient import Patient, PatientCreate, PatientUpdate, PatientGu
 from app.models.patient import Patient as PatientModel
 from app.services.patient_service import PatientService
 from app.utils.auth import validate_token, get_tenant_id_from_path
+from app.utils.deadline import check_deadline
 from app.filters.patient_filter import PatientFilter
 from fastapi_filter import FilterDepends
 
@@ -35,6 +36,7 @@ def get_patients(
     3. Con filtros específicos: Filtra por los campos definidos
     4. Con order_by: Ordena los resultados
     """
+    check_deadline()
     query = patient_filter.filter(db.query(PatientModel).filter(PatientModel.tenant_id == tenant_id))
     return query.offset(skip).limit(limit).all()
 
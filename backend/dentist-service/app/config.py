@@ -11,8 +11,19 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     AUTH_SERVICE_URL: Optional[str] = os.environ.get("AUTH_SERVICE_URL", "http://localhost:8000")
+    
+    # Identidad firmada por el gateway (X-Gateway-Identity): misma clave que
+    # IDENTITY_HEADER_SECRET del gateway. Sin el encabezado, el token se valida
+    # con el servicio de autenticación si AUTH_SERVICE_FALLBACK está activo
+    GATEWAY_IDENTITY_SECRET: str = "your-identity-secret"
+    AUTH_SERVICE_FALLBACK: bool = True
     DEBUG: bool = os.environ.get("DEBUG", "False").lower() in ("true", "1", "t")
     
+    # Logging (JSON desde un hilo aparte; fracción de solicitudes exitosas registradas)
+    LOG_LEVEL: str = "INFO"
+    LOG_JSON: bool = True
+    LOG_SAMPLE_RATE: float = 1.0
+    
     model_config = ConfigDict(env_file=".env")
 
 
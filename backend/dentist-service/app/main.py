@@ -1,19 +1,28 @@
 from contextlib import asynccontextmanager
+import logging
 from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.config import settings
+from app.utils.deadline import DeadlineMiddleware
+from app.utils.logging_config import AccessLogMiddleware, setup_logging
+from app.utils.metrics import MetricsMiddleware, render_metrics
 from app.database import SessionLocal
 from app.api import patients
 
+# Configurar logging (JSON escrito desde un hilo aparte, fuera del event loop)
+setup_logging("dentist-service", settings.LOG_LEVEL, settings.LOG_JSON)
+logger = logging.getLogger("dentist-service")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan events for the application."""
     # Startup event
     db = SessionLocal()
     try:
-        print("Dentist service started")
-    except Exception as e:
-        print(f"Error during startup: {e}")
+        logger.info("Dentist service started")
+    except Exception:
+        logger.exception("Error during startup")
     finally:
         db.close()
     
@@ -31,14 +40,18 @@ app = FastAPI(
     debug=settings.DEBUG
 )
 
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Configure properly for production
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Sin CORSMiddleware: los navegadores acceden a través del gateway, que
+# responde los preflight y agrega los encabezados CORS
+
+# Plazo de la solicitud (X-Request-Deadline) propagado por el gateway: las
+# solicitudes vencidas se responden 504 sin ejecutarse
+app.add_middleware(DeadlineMiddleware)
+
+# Métricas por plantilla de ruta (latencia, solicitudes en curso y códigos de estado)
+app.add_middleware(MetricsMiddleware, namespace="dentist")
+
+# Request ID (X-Request-ID) y una línea de log por solicitud
+app.add_middleware(AccessLogMiddleware, logger_name="dentist-service", sample_rate=settings.LOG_SAMPLE_RATE)
 
 # Include routers
 app.include_router(patients.router)
@@ -60,6 +73,12 @@ def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Métricas del servicio en formato de texto de Prometheus."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)  # Using port 8001 to avoid conflict with auth service
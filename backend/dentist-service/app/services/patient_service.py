@@ -6,6 +6,7 @@ from uuid import UUID
 from app.models.patient import Patient, PatientGuardian
 from app.schemas.patient import PatientCreate, PatientUpdate, PatientGuardianCreate, PatientGuardianUpdate
 from app.filters.patient_filter import PatientFilter
+from app.utils.deadline import check_deadline
 
 
 class PatientService:
@@ -14,6 +15,7 @@ class PatientService:
         """
         Get all patients for a specific tenant with pagination.
         """
+        check_deadline()
         return db.query(Patient).filter(Patient.tenant_id == tenant_id).offset(skip).limit(limit).all()
     
     @staticmethod
@@ -21,6 +23,7 @@ class PatientService:
         """
         Filter patients using fastapi-filter.
         """
+        check_deadline()
         query = db.query(Patient).filter(Patient.tenant_id == tenant_id)
         query = patient_filter.filter(query)
         return patient_filter.sort(query).all()
@@ -96,6 +99,7 @@ class PatientService:
         """
         Search for patients by name or email.
         """
+        check_deadline()
         search = f"%{query}%"
         return db.query(Patient).filter(
             Patient.tenant_id == tenant_id,
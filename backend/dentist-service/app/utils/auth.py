@@ -1,43 +1,82 @@
-from fastapi import Depends, HTTPException, status, Path
+from fastapi import Depends, HTTPException, Request, status, Path
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from pydantic import ValidationError
 from typing import Optional
 from uuid import UUID
 import httpx
+import logging
 
 from app.config import settings
+from app.utils.deadline import DEADLINE_HEADER, deadline_var, format_deadline, remaining
+from app.utils.logging_config import REQUEST_ID_HEADER, request_id_var
+from app.utils.signed_identity import IDENTITY_HEADER, InvalidIdentity, decode_identity
 
-# OAuth2 scheme for token authentication
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+logger = logging.getLogger("dentist-service")
 
+# OAuth2 scheme for token authentication (opcional: con la identidad firmada
+# por el gateway no hace falta el token)
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
-async def validate_token(token: str = Depends(oauth2_scheme)) -> dict:
-    """
-    Validate the access token and return the user data.
-    This function will call the auth service to validate the token.
-    """
-    credentials_exception = HTTPException(
+
+def credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+async def validate_token(request: Request, token: Optional[str] = Depends(oauth2_scheme)) -> dict:
+    """
+    Validate the request identity and return the user data.
     
+    Si el gateway envió el encabezado X-Gateway-Identity, basta con verificar
+    su firma (sin llamadas de red). Si no, el token se valida con el servicio
+    de autenticación (si AUTH_SERVICE_FALLBACK está activo).
+    """
+    identity = request.headers.get(IDENTITY_HEADER)
+    if identity is not None:
+        try:
+            return decode_identity(identity, settings.GATEWAY_IDENTITY_SECRET)
+        except InvalidIdentity as e:
+            logger.warning("Identidad del gateway rechazada: %s", e)
+            raise credentials_exception()
+    
+    if token is None or not settings.AUTH_SERVICE_FALLBACK:
+        raise credentials_exception()
+    return await validate_token_with_auth_service(token)
+
+
+async def validate_token_with_auth_service(token: str) -> dict:
+    """
+    Validate the access token by calling the auth service.
+    """
     try:
         # Call the auth service to validate the token
-        async with httpx.AsyncClient() as client:
+        headers = {"Authorization": f"Bearer {token}"}
+        request_id = request_id_var.get()
+        if request_id:
+            headers[REQUEST_ID_HEADER] = request_id
+        # Propagar el plazo de la solicitud y no esperar más allá de él
+        timeout = httpx.Timeout(5.0)
+        deadline = deadline_var.get()
+        if deadline is not None:
+            headers[DEADLINE_HEADER] = format_deadline(deadline)
+            timeout = httpx.Timeout(max(remaining(), 0.001))
+        async with httpx.AsyncClient(timeout=timeout) as client:
             response = await client.get(
                 f"{settings.AUTH_SERVICE_URL}/auth/validate-token",
-                headers={"Authorization": f"Bearer {token}"}
+                headers=headers
             )
             
             if response.status_code != 200:
-                raise credentials_exception
+                raise credentials_exception()
             
             return response.json()
             
     except (JWTError, ValidationError, httpx.RequestError):
-        raise credentials_exception
+        raise credentials_exception()
 
 
 def get_tenant_id_from_path(tenant_id: UUID = Path(..., description="ID del tenant")) -> UUID:
@@ -0,0 +1,91 @@
+"""
+Encabezado de identidad firmado por el gateway.
+
+El gateway verifica el JWT una sola vez y reenvía los claims a los servicios
+en el encabezado X-Gateway-Identity, firmado con HMAC-SHA256 y con una
+expiración corta. Los servicios verifican la firma (un HMAC, sin llamadas de
+red) en lugar de volver a validar el token.
+
+Formato: <claims en JSON, base64url>.<firma HMAC-SHA256, base64url>
+"""
+import base64
+import hashlib
+import hmac
+import json
+import time
+from typing import Any, Dict, Mapping, Optional
+
+# Encabezado con la identidad firmada
+IDENTITY_HEADER = "x-gateway-identity"
+
+# Claims de tiempo del JWT original; el encabezado lleva su propia expiración
+_TIME_CLAIMS = ("exp", "iat", "nbf")
+
+
+class InvalidIdentity(ValueError):
+    """El encabezado de identidad está mal formado, tiene una firma inválida o expiró."""
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(data: str, secret: str) -> str:
+    return _b64encode(hmac.new(secret.encode(), data.encode("ascii"), hashlib.sha256).digest())
+
+
+def encode_identity(claims: Mapping[str, Any], secret: str, ttl: float, now: Optional[float] = None) -> str:
+    """
+    Genera el encabezado de identidad firmado.
+
+    Args:
+        claims: Los claims verificados del token (sub, tenant_id, etc.)
+        secret: La clave compartida con los servicios
+        ttl: Segundos de validez del encabezado
+        now: Momento actual (para las pruebas)
+
+    Returns:
+        El valor del encabezado
+    """
+    issued = int(time.time() if now is None else now)
+    data = {key: value for key, value in claims.items() if key not in _TIME_CLAIMS}
+    data["iat"] = issued
+    data["exp"] = issued + int(ttl)
+    body = _b64encode(json.dumps(data, separators=(",", ":"), default=str).encode())
+    return f"{body}.{_sign(body, secret)}"
+
+
+def decode_identity(value: str, secret: str, leeway: float = 5.0, now: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Verifica el encabezado de identidad y devuelve sus claims.
+
+    Args:
+        value: El valor del encabezado
+        secret: La clave compartida con el gateway
+        leeway: Segundos de tolerancia por diferencias de reloj
+        now: Momento actual (para las pruebas)
+
+    Returns:
+        Los claims firmados por el gateway
+
+    Raises:
+        InvalidIdentity: Si el encabezado no es válido o expiró
+    """
+    body, _, signature = value.partition(".")
+    if not body or not signature or not value.isascii():
+        raise InvalidIdentity("Encabezado de identidad mal formado")
+    if not hmac.compare_digest(signature, _sign(body, secret)):
+        raise InvalidIdentity("Firma del encabezado de identidad inválida")
+    try:
+        claims = json.loads(_b64decode(body))
+    except ValueError:
+        raise InvalidIdentity("Encabezado de identidad mal formado")
+    if not isinstance(claims, dict) or not isinstance(claims.get("exp"), int):
+        raise InvalidIdentity("Encabezado de identidad mal formado")
+    if claims["exp"] + leeway < (time.time() if now is None else now):
+        raise InvalidIdentity("Encabezado de identidad expirado")
+    return claims
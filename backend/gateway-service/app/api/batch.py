@@ -0,0 +1,224 @@
+import asyncio
+import base64
+import json
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from pydantic import BaseModel, Field
+from app.api.router import PROXY_METHODS, proxy_verified
+from app.config.settings import settings
+from app.utils.auth import verify_token
+from app.utils.proxy import json_error
+from app.utils.routing import get_routing_table
+import logging
+
+# Configurar logging
+logger = logging.getLogger("gateway-service")
+
+router = APIRouter()
+
+# Encabezados de la solicitud del lote que no se copian a cada sub-solicitud:
+# describen el cuerpo del lote, y las respuestas se piden sin comprimir
+# porque se devuelven dentro del JSON del lote
+BATCH_ONLY_HEADERS = frozenset({b"content-length", b"content-type", b"accept-encoding", b"transfer-encoding"})
+
+# Encabezados que una sub-solicitud no puede reemplazar: el token se verifica
+# una sola vez para todo el lote
+PROTECTED_HEADERS = frozenset({"authorization", "host", "content-length"})
+
+
+class BatchItem(BaseModel):
+    """Una sub-solicitud del lote."""
+
+    id: Optional[str] = None
+    method: str = "GET"
+    # Ruta del gateway con query opcional (ej: "/auth/users/me")
+    path: str
+    headers: Dict[str, str] = Field(default_factory=dict)
+    # Cuerpo JSON de la sub-solicitud
+    body: Any = None
+
+
+class BatchRequest(BaseModel):
+    """Lote de sub-solicitudes."""
+
+    requests: List[BatchItem] = Field(..., min_length=1)
+
+
+def build_sub_request(parent: Request, item: BatchItem) -> Request:
+    """
+    Construye la solicitud de un elemento del lote a partir de la solicitud
+    del lote (conserva el cliente, el token y las cookies).
+
+    Args:
+        parent: La solicitud POST /batch
+        item: El elemento del lote
+
+    Returns:
+        La sub-solicitud
+    """
+    path, _, query = item.path.partition("?")
+    body = b"" if item.body is None else json.dumps(item.body).encode()
+
+    headers = [(name, value) for name, value in parent.scope["headers"] if name not in BATCH_ONLY_HEADERS]
+    overridden = {name.lower() for name in item.headers} - PROTECTED_HEADERS
+    headers = [(name, value) for name, value in headers if name.decode("latin-1") not in overridden]
+    headers.extend(
+        (name.lower().encode("latin-1"), value.encode("latin-1"))
+        for name, value in item.headers.items()
+        if name.lower() in overridden
+    )
+    if body:
+        if "content-type" not in overridden:
+            headers.append((b"content-type", b"application/json"))
+        headers.append((b"content-length", str(len(body)).encode()))
+
+    scope = {
+        key: value for key, value in parent.scope.items() if key not in ("route", "endpoint", "path_params")
+    }
+    scope.update(
+        method=item.method.upper(),
+        path=path,
+        raw_path=path.encode(),
+        query_string=query.encode(),
+        headers=headers,
+    )
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return Request(scope, receive)
+
+
+async def read_body(response: Response) -> bytes:
+    """Lee el cuerpo completo de una respuesta (incluidas las transmitidas en streaming)."""
+    if hasattr(response, "body_iterator"):
+        try:
+            chunks = [chunk async for chunk in response.body_iterator]
+        finally:
+            if response.background is not None:
+                await response.background()
+        return b"".join(chunk if isinstance(chunk, bytes) else chunk.encode() for chunk in chunks)
+    return response.body
+
+
+async def render_item(item: BatchItem, response: Response) -> Dict[str, Any]:
+    """
+    Convierte la respuesta de una sub-solicitud en un elemento de la
+    respuesta del lote. Los cuerpos JSON se incluyen como JSON, los de texto
+    como cadena y los binarios en base64.
+    """
+    content = await read_body(response)
+    headers = {
+        name: value for name, value in response.headers.items() if name not in ("content-length", "transfer-encoding")
+    }
+    result: Dict[str, Any] = {"id": item.id, "status": response.status_code, "headers": headers}
+    if not content:
+        result["body"] = None
+        return result
+
+    if "json" in response.headers.get("content-type", ""):
+        try:
+            result["body"] = json.loads(content)
+            return result
+        except ValueError:
+            pass
+    try:
+        result["body"] = content.decode("utf-8")
+    except UnicodeDecodeError:
+        result["body"] = base64.b64encode(content).decode()
+        result["encoding"] = "base64"
+    return result
+
+
+async def run_item(
+    parent: Request,
+    item: BatchItem,
+    payload: Optional[Dict[str, Any]],
+    auth_error: Optional[HTTPException],
+    semaphore: asyncio.Semaphore,
+) -> Dict[str, Any]:
+    """
+    Resuelve, autoriza y reenvía un elemento del lote con las mismas reglas
+    que una solicitud individual. Los errores de un elemento (ej: un
+    encabezado que no se puede codificar o un fallo inesperado al reenviarlo)
+    se responden en ese elemento sin afectar al resto del lote.
+    """
+    if item.method.upper() not in PROXY_METHODS:
+        return await render_item(item, json_error(status.HTTP_405_METHOD_NOT_ALLOWED, "Método no permitido"))
+
+    match = get_routing_table().resolve(item.path.partition("?")[0])
+    if match is None or not item.path.startswith(f"/{match.service.name}/"):
+        return await render_item(item, json_error(status.HTTP_404_NOT_FOUND, "Ruta no encontrada"))
+
+    is_public = match.is_public
+    if not is_public and auth_error is not None:
+        return await render_item(
+            item, json_error(auth_error.status_code, auth_error.detail, headers=auth_error.headers)
+        )
+
+    try:
+        request = build_sub_request(parent, item)
+    except (TypeError, ValueError) as e:
+        # UnicodeEncodeError (encabezados fuera de latin-1) es un ValueError
+        logger.debug("Sub-solicitud inválida en el lote: %s", e)
+        return await render_item(item, json_error(status.HTTP_400_BAD_REQUEST, "Sub-solicitud inválida"))
+
+    async with semaphore:
+        try:
+            response = await proxy_verified(request, match.service, match.path, None if is_public else payload, is_public)
+            return await render_item(item, response)
+        except HTTPException as e:
+            response = json_error(e.status_code, e.detail, headers=e.headers)
+        except Exception:
+            logger.exception("Error al reenviar una sub-solicitud del lote a %s", match.service.name)
+            response = json_error(
+                status.HTTP_502_BAD_GATEWAY, f"Error al reenviar la solicitud al servicio {match.service.name}"
+            )
+        return await render_item(item, response)
+
+
+@router.post("/batch")
+async def batch(batch_request: BatchRequest, request: Request):
+    """
+    Ejecuta varias solicitudes a los servicios en una sola ida y vuelta.
+
+    El token se verifica una sola vez para todo el lote; cada elemento pasa
+    por las reglas de rutas públicas, los límites de solicitudes y el
+    reenvío de una solicitud normal. Los elementos se envían en paralelo
+    (hasta BATCH_MAX_CONCURRENCY a la vez) y las respuestas se devuelven en
+    el mismo orden que las solicitudes.
+
+    Args:
+        batch_request: Las sub-solicitudes del lote
+        request: La solicitud entrante
+
+    Returns:
+        Las respuestas de cada sub-solicitud, en orden
+    """
+    items = batch_request.requests
+    if len(items) > settings.BATCH_MAX_REQUESTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"El lote admite como máximo {settings.BATCH_MAX_REQUESTS} solicitudes",
+        )
+
+    # Verificar el token una sola vez si algún elemento lo necesita
+    payload = None
+    auth_error = None
+    routing_table = get_routing_table()
+    needs_auth = False
+    for item in items:
+        match = routing_table.resolve(item.path.partition("?")[0])
+        if match is not None and not match.is_public:
+            needs_auth = True
+            break
+    if needs_auth:
+        try:
+            payload = await verify_token(request)
+        except HTTPException as e:
+            auth_error = e
+
+    semaphore = asyncio.Semaphore(settings.BATCH_MAX_CONCURRENCY)
+    responses = await asyncio.gather(*(run_item(request, item, payload, auth_error, semaphore) for item in items))
+    logger.debug("Lote de %d solicitudes atendido", len(items))
+    return {"responses": responses}
@@ -1,7 +1,15 @@
-from fastapi import APIRouter, Request, HTTPException, status
-from app.config.settings import settings
-from app.utils.proxy import forward_request_to_service
+from typing import Any, Dict, Optional
+from fastapi import APIRouter, Request, Response, HTTPException, status
+from app.utils.routing import ServiceRoute, get_routing_table
+from app.utils.proxy import json_error, proxy_to_upstream
 from app.utils.auth import verify_token
+from app.utils.capture import get_traffic_capture
+from app.utils.coalescing import get_single_flight
+from app.config.settings import settings
+from app.utils.identity import Identity, identity_header_var, resolve_identity, tenant_var
+from app.utils.rate_limit import get_rate_limiter
+from app.utils.response_cache import get_response_cache
+from app.utils.signed_identity import encode_identity
 import logging
 
 # Configurar logging
@@ -10,6 +18,9 @@ logger = logging.getLogger("gateway-service")
 # Crear un router para todos los servicios
 router = APIRouter()
 
+# Métodos HTTP que se reenvían a los servicios
+PROXY_METHODS = ("GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS")
+
 
 def is_public_path(path: str, public_paths: list) -> bool:
     """
@@ -34,7 +45,7 @@ def is_public_path(path: str, public_paths: list) -> bool:
     return False
 
 
-@router.api_route("/{service}/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
+@router.api_route("/{service}/{path:path}", methods=list(PROXY_METHODS))
 async def service_proxy(service: str, path: str, request: Request):
     """
     Proxy dinámico para todos los servicios configurados.
@@ -47,29 +58,148 @@ async def service_proxy(service: str, path: str, request: Request):
     Returns:
         La respuesta del servicio
     """
-    # Verificar si el servicio está configurado
-    if service not in settings.SERVICES:
+    # Obtener la configuración del servicio de la tabla de rutas precompilada
+    route = get_routing_table().get(service)
+    if route is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Servicio '{service}' no encontrado"
         )
     
-    # Obtener la configuración del servicio
-    service_config = settings.SERVICES[service]
-    service_url = service_config["url"]
-    public_paths = service_config["public_paths"]
-    
-    # Verificar si la ruta requiere autenticación usando la función mejorada
-    if not is_public_path(path, public_paths):
+    # Verificar si la ruta requiere autenticación
+    payload = None
+    is_public = route.is_public(path)
+    if not is_public:
         try:
             # Solo verificar el token para rutas protegidas
             # La autorización será responsabilidad de cada servicio
-            await verify_token(request)
-            logger.info(f"Token verificado para la ruta {path}")
+            payload = await verify_token(request)
+            logger.debug("Token verificado para la ruta %s", path)
         except HTTPException as e:
             raise e
     else:
-        logger.info(f"Ruta pública: {path}")
+        logger.debug("Ruta pública: %s", path)
+    
+    return await proxy_verified(request, route, path, payload, is_public)
+
+
+async def proxy_verified(
+    request: Request,
+    route: ServiceRoute,
+    path: str,
+    payload: Optional[Dict[str, Any]],
+    is_public: bool,
+) -> Response:
+    """
+    Reenvía una solicitud cuya autenticación ya se resolvió, aplicando los
+    límites de solicitudes y, si está activa, la captura de tráfico.
+    
+    Args:
+        request: La solicitud entrante
+        route: La ruta del servicio
+        path: La ruta relativa al servicio
+        payload: El payload del token verificado (None en rutas públicas)
+        is_public: Si la ruta es pública
+    
+    Returns:
+        La respuesta del servicio, o 429 si se excedió un límite
+    """
+    identity = resolve_identity(path, payload, route.tenant_paths)
+    forward = lambda: limit_and_dispatch(request, route, path, payload, is_public, identity)
+    
+    # Una muestra de las solicitudes se guarda para reproducirla en pruebas de carga
+    capture = get_traffic_capture()
+    if capture is not None and capture.sampled():
+        return await capture.record(request, route.name, path, identity, forward)
+    return await forward()
+
+
+async def limit_and_dispatch(
+    request: Request,
+    route: ServiceRoute,
+    path: str,
+    payload: Optional[Dict[str, Any]],
+    is_public: bool,
+    identity: Identity,
+) -> Response:
+    """
+    Aplica los límites de solicitudes y reenvía la solicitud al servicio.
+    
+    Args:
+        request: La solicitud entrante
+        route: La ruta del servicio
+        path: La ruta relativa al servicio
+        payload: El payload del token verificado (None en rutas públicas)
+        is_public: Si la ruta es pública
+        identity: La identidad verificada de la solicitud
+    
+    Returns:
+        La respuesta del servicio, o 429 si se excedió un límite
+    """
+    # Limitar por IP (rutas públicas), por usuario y por tenant
+    rate_limit = None
+    rate_limiter = get_rate_limiter()
+    if rate_limiter is not None:
+        rate_limit = await rate_limiter.check(request, route, path, identity, is_public)
+        if rate_limit is not None and not rate_limit.allowed:
+            logger.warning("Límite de solicitudes excedido en %s/%s", route.name, path)
+            return json_error(
+                status.HTTP_429_TOO_MANY_REQUESTS,
+                "Demasiadas solicitudes",
+                headers=rate_limit.headers(),
+            )
+    
+    # Reenviar la solicitud al servicio correspondiente, con los claims del
+    # token firmados para que el servicio no tenga que volver a validarlo
+    token = None
+    if payload is not None and settings.IDENTITY_HEADER_ENABLED:
+        token = identity_header_var.set(
+            encode_identity(payload, settings.IDENTITY_HEADER_SECRET, settings.IDENTITY_HEADER_TTL)
+        )
+    tenant_token = tenant_var.set(identity.tenant)
+    try:
+        response = await dispatch(request, route, path, identity)
+    finally:
+        tenant_var.reset(tenant_token)
+        if token is not None:
+            identity_header_var.reset(token)
+    if rate_limit is not None:
+        response.headers.update(rate_limit.headers())
+    return response
+
+
+async def dispatch(request: Request, route: ServiceRoute, path: str, identity: Identity) -> Response:
+    """
+    Reenvía la solicitud al servicio, pasando por la caché de respuestas si
+    está activada.
+    
+    Args:
+        request: La solicitud entrante
+        route: La ruta del servicio
+        path: La ruta relativa al servicio
+        identity: La identidad verificada de la solicitud
+    
+    Returns:
+        La respuesta del servicio o de la caché
+    """
+    fetch = lambda: proxy_to_upstream(request, route, path)
+    
+    # Los GET idénticos en curso comparten una sola solicitud al servicio
+    single_flight = get_single_flight()
+    if request.method == "GET" and single_flight is not None:
+        key = single_flight.build_key(request, route.name, path, identity)
+        fetch = lambda: single_flight.do(key, lambda: proxy_to_upstream(request, route, path))
+    
+    response_cache = get_response_cache()
+    if response_cache is None or request.method == "OPTIONS":
+        return await fetch()
+    
+    # Las respuestas GET se pueden servir desde la caché (por usuario y tenant)
+    if request.method == "GET":
+        return await response_cache.handle(request, route.name, path, identity, fetch)
     
-    # Reenviar la solicitud al servicio correspondiente
-    return await forward_request_to_service(request, service_url)
+    # Una escritura correcta invalida las respuestas guardadas de esa ruta
+    response = await proxy_to_upstream(request, route, path)
+    if response.status_code < 400:
+        await response_cache.invalidate(route.name, path)
+    return response
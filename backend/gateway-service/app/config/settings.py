@@ -1,4 +1,4 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import os
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -13,36 +13,281 @@ class Settings(BaseSettings):
     
     # Configuración general de la aplicación
     APP_NAME: str = "API Gateway Service"
+    DEBUG: bool = False
+    GATEWAY_HOST: str = "0.0.0.0"
+    GATEWAY_PORT: int = 8000
     
-    # Configuración de CORS
+    # Logging: JSON escrito desde un hilo aparte; LOG_SAMPLE_RATE es la
+    # fracción de solicitudes exitosas que se registran (los errores siempre)
+    LOG_LEVEL: str = "INFO"
+    LOG_JSON: bool = True
+    LOG_SAMPLE_RATE: float = 1.0
+    
+    # Configuración de CORS: el gateway responde los preflight sin reenviarlos
+    # a los servicios (que no procesan CORS); CORS_MAX_AGE es el tiempo que el
+    # navegador reutiliza la respuesta preflight (Chrome la limita a 2 horas)
     CORS_ORIGINS: List[str] = ["http://localhost:3000"]
+    CORS_ALLOW_METHODS: List[str] = ["*"]
+    CORS_ALLOW_HEADERS: List[str] = ["*"]
+    CORS_ALLOW_CREDENTIALS: bool = True
+    CORS_EXPOSE_HEADERS: List[str] = [
+        "X-Request-ID",
+        "Retry-After",
+        "RateLimit-Limit",
+        "RateLimit-Remaining",
+        "RateLimit-Reset",
+        "RateLimit-Policy",
+    ]
+    CORS_MAX_AGE: int = 86400
+    CORS_PREFLIGHT_CACHE_SIZE: int = 1024
     
     # Configuración de JWT
     JWT_SECRET_KEY: str = "your-secret-key"
     JWT_ALGORITHM: str = "HS256"
     
+    # Caché de tokens verificados (tamaño máximo y TTL máximo en segundos)
+    # Las entradas expiran en el `exp` del token o en el TTL, lo que ocurra primero
+    JWT_CACHE_ENABLED: bool = True
+    JWT_CACHE_MAX_SIZE: int = 10000
+    JWT_CACHE_MAX_TTL: float = 300.0
+    # Tamaño máximo (bytes) del payload de un token en la caché compartida
+    JWT_CACHE_SHARED_ENTRY_BYTES: int = 1024
+    
+    # Memoria compartida entre los workers de la máquina (ej: /dev/shm): la
+    # caché de tokens, los límites de solicitudes (sin RATE_LIMIT_REDIS_URL) y
+    # la apertura de los circuit breakers dejan de ser propios de cada worker
+    SHARED_MEMORY_DIR: Optional[str] = None
+    SHARED_MEMORY_STRIPES: int = 64
+    
+    # Encabezado X-Gateway-Identity: claims del token verificado firmados con
+    # HMAC-SHA256 (clave compartida con los servicios) y válidos por
+    # IDENTITY_HEADER_TTL segundos; los servicios no vuelven a validar el token
+    IDENTITY_HEADER_ENABLED: bool = True
+    IDENTITY_HEADER_SECRET: str = "your-identity-secret"
+    IDENTITY_HEADER_TTL: int = 30
+    
     # Configuración de servicios
     # Diccionario con la configuración de cada servicio
     AUTH_SERVICE_URL: str = "http://localhost:8001"
     DENTIST_SERVICE_URL: str = "http://localhost:8002"
+    # Réplicas de cada servicio (lista JSON); si está vacía se usa la URL única
+    AUTH_SERVICE_URLS: List[str] = []
+    DENTIST_SERVICE_URLS: List[str] = []
+    
+    # Registro de servicios en un archivo JSON o YAML (reemplaza a SERVICES) o
+    # en SERVICES_CONFIG (JSON); el archivo se revisa cada
+    # SERVICES_RELOAD_INTERVAL segundos (0 desactiva la recarga)
+    SERVICES_FILE: Optional[str] = None
+    SERVICES_CONFIG: Optional[str] = None
+    SERVICES_RELOAD_INTERVAL: float = 5.0
+    
+    # Balanceo entre réplicas: "least_outstanding" o "p2c" (power-of-two-choices)
+    UPSTREAM_LB_STRATEGY: str = "least_outstanding"
+    
+    # Health checks activos de las réplicas (intervalo y timeout en segundos)
+    HEALTH_CHECK_ENABLED: bool = True
+    HEALTH_CHECK_INTERVAL: float = 10.0
+    HEALTH_CHECK_TIMEOUT: float = 2.0
+    HEALTH_CHECK_UNHEALTHY_THRESHOLD: int = 2
+    HEALTH_CHECK_HEALTHY_THRESHOLD: int = 1
+    
+    # Circuit breaker por servicio: se abre si en la ventana de las últimas
+    # solicitudes la tasa de errores o el percentil de latencia (en segundos,
+    # 0 lo desactiva) superan el umbral; abierto, responde 503 de inmediato
+    BREAKER_ENABLED: bool = True
+    BREAKER_WINDOW_SIZE: int = 50
+    BREAKER_MIN_REQUESTS: int = 20
+    BREAKER_ERROR_RATE: float = 0.5
+    BREAKER_LATENCY_PERCENTILE: float = 0.95
+    BREAKER_LATENCY_THRESHOLD: float = 10.0
+    BREAKER_OPEN_SECONDS: float = 30.0
+    BREAKER_HALF_OPEN_MAX_CALLS: int = 3
+    
+    # Rate limiting (GCRA): las rutas públicas se limitan por IP y las
+    # protegidas por usuario y por tenant; cada servicio puede definir reglas
+    # por ruta en "rate_limits". RATE_LIMIT_REDIS_URL comparte el estado entre
+    # instancias y SHARED_MEMORY_DIR entre los workers de una misma máquina.
+    # X-Forwarded-For solo se usa detrás de un proxy de confianza
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_DEFAULT_IP: str = "300/minute"
+    RATE_LIMIT_DEFAULT_USER: str = "600/minute"
+    RATE_LIMIT_DEFAULT_TENANT: str = "3000/minute"
+    RATE_LIMIT_MAX_KEYS: int = 100000
+    RATE_LIMIT_REDIS_URL: Optional[str] = None
+    RATE_LIMIT_TRUST_FORWARDED: bool = False
+    
+    # Límite adaptativo (AIMD) de solicitudes en curso por servicio: crece
+    # mientras las respuestas llegan a tiempo y se reduce si la latencia supera
+    # CONCURRENCY_LATENCY_TOLERANCE veces la habitual; por encima del límite
+    # se espera en la cola de FAIR_QUEUE_* y, si no hay lugar, se responde 503
+    # con Retry-After (en segundos)
+    CONCURRENCY_LIMIT_ENABLED: bool = True
+    CONCURRENCY_INITIAL_LIMIT: int = 50
+    CONCURRENCY_MIN_LIMIT: int = 5
+    CONCURRENCY_MAX_LIMIT: int = 500
+    CONCURRENCY_BACKOFF_RATIO: float = 0.9
+    CONCURRENCY_LATENCY_TOLERANCE: float = 2.0
+    CONCURRENCY_RETRY_AFTER: int = 1
+    
+    # Clases de prioridad (nombre -> peso) y reparto justo entre tenants:
+    # con el límite de concurrencia lleno las solicitudes esperan hasta
+    # FAIR_QUEUE_MAX_WAIT segundos en una cola por clase y tenant, y ningún
+    # tenant tiene en curso más de FAIR_QUEUE_TENANT_SHARE del límite. La
+    # clase sale de las reglas "priorities" del servicio o del encabezado
+    # X-Request-Priority (por defecto PRIORITY_DEFAULT_CLASS)
+    FAIR_QUEUE_ENABLED: bool = True
+    PRIORITY_CLASSES: Dict[str, float] = {"interactive": 8.0, "bulk": 1.0}
+    PRIORITY_DEFAULT_CLASS: str = "interactive"
+    FAIR_QUEUE_TENANT_SHARE: float = 0.5
+    FAIR_QUEUE_MAX_PENDING: int = 100
+    FAIR_QUEUE_MAX_WAIT: float = 0.05
+    
+    # Expulsión temporal de réplicas con errores consecutivos
+    OUTLIER_CONSECUTIVE_ERRORS: int = 5
+    OUTLIER_EJECTION_SECONDS: float = 30.0
+    OUTLIER_MAX_EJECTION_PERCENT: int = 50
+    
+    # Reintentos de las solicitudes idempotentes (GET, HEAD, OPTIONS) ante
+    # errores de conexión, con backoff exponencial y jitter (en segundos)
+    RETRY_ENABLED: bool = True
+    RETRY_MAX_RETRIES: int = 2
+    RETRY_BACKOFF_BASE: float = 0.025
+    RETRY_BACKOFF_MAX: float = 0.25
+    
+    # Hedging: si la respuesta tarda más que el percentil HEDGE_PERCENTILE de
+    # las últimas respuestas, se envía un duplicado a otra réplica y se usa la
+    # primera respuesta que llegue
+    HEDGE_ENABLED: bool = False
+    HEDGE_PERCENTILE: float = 0.95
+    HEDGE_MIN_DELAY: float = 0.01
+    HEDGE_MIN_SAMPLES: int = 20
+    
+    # Presupuesto por servicio de reintentos y duplicados: como máximo
+    # RETRY_BUDGET_RATIO de las solicitudes originales, más
+    # RETRY_BUDGET_MIN_PER_SECOND por segundo para servicios con poco tráfico
+    RETRY_BUDGET_RATIO: float = 0.1
+    RETRY_BUDGET_MIN_PER_SECOND: float = 5.0
+    RETRY_BUDGET_MAX_BALANCE: float = 100.0
+    
+    # Configuración de los clientes HTTP hacia los servicios
+    # Se crea un cliente por servicio al iniciar el gateway y se reutiliza
+    # en todas las solicitudes (keep-alive y pool de conexiones).
+    # UPSTREAM_TIMEOUT es el plazo por defecto de cada solicitud; cada servicio
+    # puede definir el suyo en "timeout" y el de rutas específicas en "timeouts"
+    UPSTREAM_TIMEOUT: float = 30.0
+    UPSTREAM_CONNECT_TIMEOUT: float = 5.0
+    UPSTREAM_MAX_CONNECTIONS: int = 100
+    UPSTREAM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    UPSTREAM_KEEPALIVE_EXPIRY: float = 30.0
+    UPSTREAM_HTTP2: bool = False
+    
+    # Streaming de cuerpos: los cuerpos mayores que el umbral (en bytes) o de
+    # longitud desconocida se transmiten por partes en lugar de leerse en memoria
+    PROXY_STREAMING: bool = True
+    PROXY_STREAM_THRESHOLD: int = 64 * 1024
+    
+    # Compresión de las respuestas según el Accept-Encoding del cliente, en
+    # orden de preferencia ("br" requiere el paquete brotli y "zstd" el paquete
+    # zstandard); solo para los tipos de contenido permitidos y a partir de
+    # COMPRESSION_MIN_SIZE bytes. Las respuestas ya comprimidas no se tocan
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_ENCODINGS: List[str] = ["br", "zstd", "gzip"]
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_CONTENT_TYPES: List[str] = [
+        "text/*",
+        "application/json",
+        "application/*+json",
+        "application/javascript",
+        "application/xml",
+        "application/*+xml",
+        "image/svg+xml",
+    ]
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    COMPRESSION_ZSTD_LEVEL: int = 3
+    
+    # Caché de respuestas GET (por usuario y tenant) según el Cache-Control
+    # del servicio; RESPONSE_CACHE_REDIS_URL activa un almacén compartido
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    RESPONSE_CACHE_MAX_ENTRY_BYTES: int = 1024 * 1024
+    RESPONSE_CACHE_REDIS_URL: Optional[str] = None
+    
+    # Agrupación de solicitudes GET idénticas en curso (single-flight): solo
+    # se comparten respuestas en memoria de hasta COALESCING_MAX_BODY_BYTES
+    COALESCING_ENABLED: bool = True
+    COALESCING_MAX_BODY_BYTES: int = 1024 * 1024
+    
+    # POST /batch: cantidad máxima de sub-solicitudes por lote y cuántas se
+    # envían a los servicios al mismo tiempo
+    BATCH_MAX_REQUESTS: int = 20
+    BATCH_MAX_CONCURRENCY: int = 10
+    
+    # Tráfico en sombra: los servicios con "shadow" en el registro copian un
+    # porcentaje de las solicitudes a una versión candidata, sin esperar su
+    # respuesta; las copias usan un pool propio (SHADOW_MAX_CONNECTIONS por
+    # URL) y se descartan si hay SHADOW_MAX_IN_FLIGHT en curso
+    SHADOW_ENABLED: bool = True
+    SHADOW_MAX_IN_FLIGHT: int = 100
+    SHADOW_MAX_CONNECTIONS: int = 20
+    SHADOW_TIMEOUT: float = 10.0
+    
+    # Captura de tráfico para pruebas de carga (benchmarks/replay.py): con
+    # CAPTURE_FILE, una fracción CAPTURE_SAMPLE_RATE de las solicitudes a los
+    # servicios se agrega al archivo (JSON Lines, gzip si termina en ".gz"),
+    # sin los encabezados ni los campos secretos; CAPTURE_MAX_FILE_BYTES
+    # detiene la captura al alcanzar ese tamaño (0 = sin límite)
+    CAPTURE_FILE: Optional[str] = None
+    CAPTURE_SAMPLE_RATE: float = 0.1
+    CAPTURE_MAX_BODY_BYTES: int = 64 * 1024
+    CAPTURE_MAX_FILE_BYTES: int = 1024 * 1024 * 1024
+    CAPTURE_REDACT_HEADERS: List[str] = ["authorization", "cookie", "proxy-authorization", "x-api-key"]
+    CAPTURE_REDACT_FIELDS: List[str] = [
+        "password",
+        "current_password",
+        "new_password",
+        "token",
+        "access_token",
+        "refresh_token",
+        "secret",
+        "api_key",
+    ]
     
     @property
     def SERVICES(self) -> Dict[str, Dict[str, Any]]:
         return {
             "auth": {
                 "url": self.AUTH_SERVICE_URL,
+                "urls": self.AUTH_SERVICE_URLS,
+                "health_path": "/health",
+                "timeout": 10,
+                "tenant_paths": ["tenants/{tenant}"],
                 "public_paths": [
                     "login",
                     "register",
                     "reset-password",
                     "verify-email",
                     "health"
+                ],
+                "rate_limits": [
+                    {"path": "login", "methods": ["POST"], "limit": "10/minute", "key": "ip"},
+                    {"path": "register", "methods": ["POST"], "limit": "5/minute", "key": "ip"},
+                    {"path": "reset-password", "methods": ["POST"], "limit": "5/minute", "key": "ip"}
                 ]
             },
             "dentist": {
                 "url": self.DENTIST_SERVICE_URL,
+                "urls": self.DENTIST_SERVICE_URLS,
+                "health_path": "/health",
+                "tenant_paths": ["{tenant}/*"],
                 "public_paths": [
                     "health"
+                ],
+                "rate_limits": [
+                    {"path": "*/patients", "methods": ["GET"], "limit": "120/minute;burst=30", "key": "tenant"}
+                ],
+                "timeouts": [
+                    {"path": "*/patients", "methods": ["GET"], "timeout": 15}
                 ]
             }
         }
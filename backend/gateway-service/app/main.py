@@ -1,17 +1,27 @@
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Request, Response, HTTPException, status
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from app.config.settings import settings
+from app.api.batch import router as batch_router
 from app.api.router import router
+from app.middleware import ProxyMiddleware, RequestLoggingMiddleware, gateway_route_template
+from app.utils.capture import close_traffic_capture
+from app.utils.clients import init_clients, close_clients
+from app.utils.compression import CompressionMiddleware
+from app.utils.cors import GatewayCORSMiddleware
+from app.utils.registry import RegistryWatcher, load_service_definitions
+from app.utils.routing import build_routing_table, get_routing_table, set_routing_table
+from app.utils.balancer import health_check_loop
+from app.utils.logging_config import setup_logging
+from app.utils.metrics import MetricsMiddleware, render_metrics
+from app.utils.shadow import close_shadow_mirror
+from app.utils.shared_memory import close_shared_tables
+from contextlib import suppress
+import asyncio
 import logging
-import time
-import json
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
+# Configure logging (JSON escrito desde un hilo aparte, fuera del event loop)
+setup_logging("gateway-service", settings.LOG_LEVEL, settings.LOG_JSON)
 logger = logging.getLogger("gateway-service")
 
 @asynccontextmanager
@@ -19,11 +29,35 @@ async def lifespan(app: FastAPI):
     """Lifespan events for the application."""
     # Startup event
     logger.info("API Gateway starting up")
-    logger.info(f"Servicios configurados: {list(settings.SERVICES.keys())}")
+    # Construir la tabla de rutas (desde SERVICES_FILE, SERVICES_CONFIG o SERVICES)
+    routing_table = build_routing_table(load_service_definitions())
+    set_routing_table(routing_table)
+    logger.info("Servicios configurados: %s", list(routing_table.services.keys()))
+    await init_clients(routing_table.services.keys())
+    
+    # Recargar el archivo de servicios cuando cambie, sin reiniciar
+    watcher_task = None
+    if settings.SERVICES_FILE and settings.SERVICES_RELOAD_INTERVAL > 0:
+        watcher = RegistryWatcher(settings.SERVICES_FILE, settings.SERVICES_RELOAD_INTERVAL)
+        watcher_task = asyncio.create_task(watcher.run())
+    
+    # Health checks activos de las réplicas de cada servicio
+    health_task = None
+    if settings.HEALTH_CHECK_ENABLED:
+        health_task = asyncio.create_task(health_check_loop(lambda: get_routing_table().services.values()))
     
     yield  # This is where the application runs
     
     # Shutdown event
+    for task in (health_task, watcher_task):
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+    await close_clients()
+    await close_shadow_mirror()
+    close_shared_tables()
+    close_traffic_capture()
     logger.info("API Gateway shutting down")
 
 app = FastAPI(
@@ -36,57 +70,25 @@ app = FastAPI(
     debug=settings.DEBUG    
 )
 
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=settings.CORS_ORIGINS,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Las solicitudes a los servicios se atienden en un middleware ASGI, sin el
+# enrutamiento de FastAPI; FastAPI queda para /, /batch, /health, /metrics y la documentación
+app.add_middleware(ProxyMiddleware)
 
-# Request logging middleware
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    """Log all requests and their processing time."""
-    start_time = time.time()
-    
-    # Get client IP
-    forwarded_for = request.headers.get("X-Forwarded-For")
-    if forwarded_for:
-        client_ip = forwarded_for.split(",")[0].strip()
-    else:
-        client_ip = request.client.host if request.client else "unknown"
-    
-    # Log request details
-    logger.info(f"Request: {request.method} {request.url.path} from {client_ip}")
-    
-    try:
-        # Process the request
-        response = await call_next(request)
-        
-        # Log response details
-        process_time = time.time() - start_time
-        logger.info(
-            f"Response: {request.method} {request.url.path} - "
-            f"Status: {response.status_code} - Time: {process_time:.3f}s"
-        )
-        
-        return response
-    except Exception as e:
-        # Log any exceptions
-        process_time = time.time() - start_time
-        logger.error(
-            f"Error: {request.method} {request.url.path} - "
-            f"Error: {str(e)} - Time: {process_time:.3f}s"
-        )
-        
-        # Return a 500 error response
-        return Response(
-            content=json.dumps({"detail": "Internal server error"}).encode(),
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            media_type="application/json"
-        )
+# Compresión gzip/brotli/zstd de las respuestas, parte por parte
+app.add_middleware(CompressionMiddleware)
+
+# CORS: los preflight se responden aquí (desde una caché) y nunca llegan a los servicios
+app.add_middleware(GatewayCORSMiddleware)
+
+# Métricas por plantilla de ruta (latencia, solicitudes en curso y códigos de estado)
+app.add_middleware(MetricsMiddleware, namespace="gateway", route_template=gateway_route_template)
+
+# Request logging middleware (ASGI puro, sin BaseHTTPMiddleware): asigna el
+# X-Request-ID y registra una línea por solicitud, con muestreo de las exitosas
+app.add_middleware(RequestLoggingMiddleware)
+
+# POST /batch: varias solicitudes a los servicios en una sola ida y vuelta
+app.include_router(batch_router)
 
 # Include router dinámico para todos los servicios
 app.include_router(router)
@@ -98,7 +100,7 @@ def read_root():
         "message": "API Gateway Service",
         "version": "1.0.0",
         "docs": "/docs",
-        "services": list(settings.SERVICES.keys())
+        "services": list(get_routing_table().services.keys())
     }
 
 @app.get("/health")
@@ -106,6 +108,11 @@ def health_check():
     """Health check endpoint."""
     return {"status": "healthy"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Métricas del gateway en formato de texto de Prometheus."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -0,0 +1,94 @@
+import json
+import logging
+import re
+from functools import lru_cache
+from fastapi import HTTPException, Request, status
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.api.router import PROXY_METHODS, service_proxy
+from app.config.settings import settings
+from app.utils.logging_config import AccessLogMiddleware
+from app.utils.metrics import default_route_template
+from app.utils.proxy import json_error
+from app.utils.routing import get_routing_table, split_service_path
+
+# Configurar logging
+logger = logging.getLogger("gateway-service")
+
+# Segmentos de ruta que son identificadores (números, UUID o tokens largos)
+_ID_SEGMENT = re.compile(
+    r"\d+|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|(?=.*\d)[\w-]{16,}"
+)
+
+
+@lru_cache(maxsize=4096)
+def proxy_route_template(path: str) -> str:
+    """
+    Reemplaza los identificadores de una ruta por "{id}" (ej:
+    "/dentist/<uuid>/patients/42" -> "/dentist/{id}/patients/{id}").
+    """
+    return "/".join("{id}" if _ID_SEGMENT.fullmatch(segment) else segment for segment in path.split("/"))
+
+
+def gateway_route_template(scope: Scope) -> str:
+    """Plantilla de ruta para las métricas: la ruta normalizada si se reenvía a un servicio."""
+    service, _ = split_service_path(scope["path"])
+    if scope["path"].startswith(f"/{service}/") and get_routing_table().get(service) is not None:
+        return proxy_route_template(scope["path"])
+    return default_route_template(scope)
+
+
+class RequestLoggingMiddleware(AccessLogMiddleware):
+    """
+    Middleware ASGI que registra cada solicitud (con su ID y tiempo de
+    respuesta) y convierte los errores no controlados en un 500 JSON.
+
+    A diferencia de `@app.middleware("http")` (BaseHTTPMiddleware) no crea
+    tareas ni flujos intermedios por solicitud, y las respuestas transmitidas
+    por partes llegan al cliente sin pasar por una cola.
+    """
+
+    def __init__(self, app: ASGIApp):
+        super().__init__(app, "gateway-service", sample_rate=settings.LOG_SAMPLE_RATE)
+
+    async def handle_error(self, scope: Scope, send: Send, error: Exception, response_started: bool) -> None:
+        if response_started:
+            # La respuesta ya empezó: solo queda cortar la conexión
+            raise error
+        await send({
+            "type": "http.response.start",
+            "status": status.HTTP_500_INTERNAL_SERVER_ERROR,
+            "headers": [(b"content-type", b"application/json")],
+        })
+        await send({
+            "type": "http.response.body",
+            "body": json.dumps({"detail": "Internal server error"}).encode(),
+        })
+
+
+class ProxyMiddleware:
+    """
+    Middleware ASGI que atiende directamente las solicitudes a los servicios
+    configurados (/{service}/{path}), sin pasar por el enrutamiento ni las
+    dependencias de FastAPI. Las demás rutas (/, /health, /metrics, /docs y
+    servicios desconocidos) siguen a la aplicación FastAPI.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in PROXY_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        service, path = split_service_path(scope["path"])
+        if not scope["path"].startswith(f"/{service}/") or get_routing_table().get(service) is None:
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope, receive)
+        try:
+            response = await service_proxy(service, path, request)
+        except HTTPException as e:
+            response = json_error(e.status_code, e.detail, headers=e.headers)
+        await response(scope, receive, send)
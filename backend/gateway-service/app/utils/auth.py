@@ -1,6 +1,7 @@
 from fastapi import Request, HTTPException, status
 from jose import jwt, JWTError
 from app.config.settings import settings
+from app.utils.token_cache import token_cache
 from typing import Dict, Any
 import logging
 
@@ -23,7 +24,7 @@ async def verify_token(request: Request) -> Dict[str, Any]:
     """
     auth_header = request.headers.get("Authorization")
     if not auth_header:
-        logger.warning(f"Solicitud sin encabezado de autorización: {request.url.path}")
+        logger.warning("Solicitud sin encabezado de autorización: %s", request.url.path)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Encabezado de autorización faltante",
@@ -34,7 +35,7 @@ async def verify_token(request: Request) -> Dict[str, Any]:
         # Extraer token del encabezado (Bearer token)
         parts = auth_header.split()
         if len(parts) != 2 or parts[0].lower() != "bearer":
-            logger.warning(f"Esquema de autenticación inválido: {auth_header}")
+            logger.warning("Esquema de autenticación inválido: %s", auth_header)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Esquema de autenticación inválido",
@@ -43,6 +44,12 @@ async def verify_token(request: Request) -> Dict[str, Any]:
         
         token = parts[1]
         
+        # Reutilizar la verificación previa del mismo token si sigue vigente
+        if settings.JWT_CACHE_ENABLED:
+            payload = token_cache.get(token)
+            if payload is not None:
+                return payload
+        
         # Decodificar y verificar el token
         payload = jwt.decode(
             token,
@@ -50,19 +57,22 @@ async def verify_token(request: Request) -> Dict[str, Any]:
             algorithms=[settings.JWT_ALGORITHM]
         )
         
+        if settings.JWT_CACHE_ENABLED:
+            token_cache.set(token, payload)
+        
         # Registrar información útil para depuración
-        logger.debug(f"Token válido para usuario: {payload.get('sub', 'desconocido')}")
+        logger.debug("Token válido para usuario: %s", payload.get("sub", "desconocido"))
         
         return payload
     except JWTError as e:
-        logger.warning(f"Error de token JWT: {str(e)}")
+        logger.warning("Error de token JWT: %s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token inválido",
             headers={"WWW-Authenticate": "Bearer"},
         )
     except Exception as e:
-        logger.error(f"Error inesperado al verificar token: {str(e)}")
+        logger.error("Error inesperado al verificar token: %s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Error de autenticación",
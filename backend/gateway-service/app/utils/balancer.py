@@ -0,0 +1,244 @@
+import asyncio
+import random
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Collection, Iterable, Iterator, List, Optional, Sequence
+import httpx
+from app.config.settings import settings
+from app.utils.clients import get_client
+from app.utils.metrics import format_labels
+import logging
+
+# Configurar logging
+logger = logging.getLogger("gateway-service")
+
+# Estrategias de selección de réplica admitidas
+LEAST_OUTSTANDING = "least_outstanding"
+POWER_OF_TWO = "p2c"
+
+
+class Replica:
+    """Una réplica de un servicio con sus contadores de uso y salud."""
+
+    __slots__ = (
+        "url", "in_flight", "requests", "healthy", "consecutive_errors", "ejections", "ejected_until",
+        "_successes", "_failures",
+    )
+
+    def __init__(self, url: str):
+        self.url = url
+        self.in_flight = 0
+        self.requests = 0
+        self.healthy = True
+        # Expulsión por errores consecutivos (outlier ejection)
+        self.consecutive_errors = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self._successes = 0
+        self._failures = 0
+
+    def __repr__(self) -> str:
+        return f"Replica({self.url!r}, in_flight={self.in_flight}, healthy={self.healthy})"
+
+
+class LoadBalancer:
+    """
+    Balanceador de carga entre las réplicas de un servicio.
+
+    Elige la réplica con menos solicitudes en curso (least-outstanding-requests)
+    o la mejor de dos réplicas al azar (power-of-two-choices). Las réplicas
+    marcadas como no saludables por los health checks y las expulsadas por
+    errores consecutivos se excluyen; si no queda ninguna se usan todas, para
+    no rechazar tráfico por un falso negativo.
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        strategy: str = LEAST_OUTSTANDING,
+        rng: Optional[random.Random] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if not urls:
+            raise ValueError("El servicio debe tener al menos una réplica")
+        if strategy not in (LEAST_OUTSTANDING, POWER_OF_TWO):
+            raise ValueError(f"Estrategia de balanceo desconocida: {strategy}")
+        self.replicas: List[Replica] = [Replica(url.rstrip("/")) for url in urls]
+        self.strategy = strategy
+        self._rng = rng or random.Random()
+        self._clock = clock
+        self._offset = 0
+
+    @property
+    def urls(self) -> List[str]:
+        return [replica.url for replica in self.replicas]
+
+    def is_ejected(self, replica: Replica) -> bool:
+        return replica.ejected_until > self._clock()
+
+    def candidates(self) -> List[Replica]:
+        """Devuelve las réplicas saludables y no expulsadas (o todas si no queda ninguna)."""
+        now = self._clock()
+        available = [replica for replica in self.replicas if replica.healthy and replica.ejected_until <= now]
+        return available or self.replicas
+
+    def choose(self, exclude: Collection[Replica] = ()) -> Replica:
+        """
+        Elige la réplica para la siguiente solicitud.
+
+        Args:
+            exclude: Réplicas a evitar (ej: las que ya recibieron la solicitud);
+                se ignoran si no queda ninguna otra
+
+        Returns:
+            La réplica elegida
+        """
+        candidates = self.candidates()
+        if exclude:
+            candidates = [replica for replica in candidates if replica not in exclude] or candidates
+        if len(candidates) == 1:
+            return candidates[0]
+
+        if self.strategy == POWER_OF_TWO:
+            first, second = self._rng.sample(candidates, 2)
+            return first if first.in_flight <= second.in_flight else second
+
+        # Recorrer desde un desplazamiento rotativo para repartir los empates
+        self._offset = (self._offset + 1) % len(candidates)
+        best = candidates[self._offset]
+        for index in range(1, len(candidates)):
+            replica = candidates[(self._offset + index) % len(candidates)]
+            if replica.in_flight < best.in_flight:
+                best = replica
+        return best
+
+    @contextmanager
+    def track(self, replica: Replica) -> Iterator[Replica]:
+        """Cuenta la solicitud como en curso en la réplica mientras dura el bloque."""
+        replica.in_flight += 1
+        replica.requests += 1
+        try:
+            yield replica
+        finally:
+            replica.in_flight -= 1
+
+    def record_result(self, replica: Replica, ok: bool) -> None:
+        """
+        Registra el resultado de una solicitud enviada a la réplica. Tras
+        OUTLIER_CONSECUTIVE_ERRORS errores seguidos la réplica se expulsa durante
+        OUTLIER_EJECTION_SECONDS multiplicado por las expulsiones consecutivas,
+        sin superar OUTLIER_MAX_EJECTION_PERCENT de las réplicas del servicio.
+        """
+        if ok:
+            replica.consecutive_errors = 0
+            replica.ejections = 0
+            return
+
+        replica.consecutive_errors += 1
+        if replica.consecutive_errors < settings.OUTLIER_CONSECUTIVE_ERRORS or self.is_ejected(replica):
+            return
+
+        max_ejected = len(self.replicas) * settings.OUTLIER_MAX_EJECTION_PERCENT // 100
+        if sum(1 for other in self.replicas if self.is_ejected(other)) >= max_ejected:
+            return
+
+        replica.ejections += 1
+        replica.consecutive_errors = 0
+        replica.ejected_until = self._clock() + settings.OUTLIER_EJECTION_SECONDS * replica.ejections
+        logger.warning(
+            "Réplica %s expulsada durante %.0fs por errores consecutivos",
+            replica.url,
+            settings.OUTLIER_EJECTION_SECONDS * replica.ejections,
+        )
+
+    def record_health(self, replica: Replica, ok: bool) -> None:
+        """
+        Registra el resultado de un health check. El estado cambia después de
+        HEALTH_CHECK_UNHEALTHY_THRESHOLD fallos o HEALTH_CHECK_HEALTHY_THRESHOLD
+        éxitos consecutivos.
+        """
+        if ok:
+            replica._successes += 1
+            replica._failures = 0
+            if not replica.healthy and replica._successes >= settings.HEALTH_CHECK_HEALTHY_THRESHOLD:
+                replica.healthy = True
+                logger.info("Réplica %s vuelve a estar disponible", replica.url)
+        else:
+            replica._failures += 1
+            replica._successes = 0
+            if replica.healthy and replica._failures >= settings.HEALTH_CHECK_UNHEALTHY_THRESHOLD:
+                replica.healthy = False
+                logger.warning("Réplica %s marcada como no disponible", replica.url)
+
+
+async def check_replica(client: httpx.AsyncClient, balancer: LoadBalancer, replica: Replica, health_path: str) -> None:
+    """
+    Ejecuta el health check de una réplica y registra el resultado.
+    """
+    try:
+        response = await client.get(f"{replica.url}{health_path}", timeout=settings.HEALTH_CHECK_TIMEOUT)
+        ok = response.status_code == 200
+    except httpx.HTTPError:
+        ok = False
+    balancer.record_health(replica, ok)
+
+
+async def check_all_replicas(routes: Callable[[], Iterable[Any]]) -> None:
+    """
+    Ejecuta los health checks de todas las réplicas de todos los servicios.
+
+    Args:
+        routes: Función que devuelve las rutas de servicio activas
+    """
+    checks = [
+        check_replica(get_client(route.name), route.balancer, replica, route.health_path)
+        for route in routes()
+        for replica in route.balancer.replicas
+    ]
+    await asyncio.gather(*checks)
+
+
+async def health_check_loop(routes: Callable[[], Iterable[Any]]) -> None:
+    """
+    Tarea de fondo que revisa periódicamente la salud de las réplicas.
+
+    Args:
+        routes: Función que devuelve las rutas de servicio activas
+    """
+    while True:
+        try:
+            await check_all_replicas(routes)
+        except Exception as e:
+            logger.error("Error al ejecutar los health checks: %s", e)
+        await asyncio.sleep(settings.HEALTH_CHECK_INTERVAL)
+
+
+def replica_metrics(routes: Iterable[Any]) -> List[str]:
+    """
+    Genera las métricas por réplica (solicitudes en curso, totales y salud).
+
+    Args:
+        routes: Las rutas de servicio activas
+
+    Returns:
+        Las líneas en formato de texto de Prometheus
+    """
+    in_flight = [
+        "# HELP gateway_upstream_in_flight Solicitudes en curso por réplica",
+        "# TYPE gateway_upstream_in_flight gauge",
+    ]
+    requests = [
+        "# HELP gateway_upstream_requests_total Solicitudes enviadas por réplica",
+        "# TYPE gateway_upstream_requests_total counter",
+    ]
+    healthy = [
+        "# HELP gateway_upstream_healthy Estado del health check de la réplica (1 = saludable)",
+        "# TYPE gateway_upstream_healthy gauge",
+    ]
+    for route in routes:
+        for replica in route.balancer.replicas:
+            labels = format_labels(service=route.name, replica=replica.url)
+            in_flight.append(f"gateway_upstream_in_flight{labels} {replica.in_flight}")
+            requests.append(f"gateway_upstream_requests_total{labels} {replica.requests}")
+            healthy.append(f"gateway_upstream_healthy{labels} {int(replica.healthy)}")
+    return in_flight + requests + healthy
@@ -0,0 +1,233 @@
+import struct
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+from app.config.settings import settings
+from app.utils.metrics import format_labels
+from app.utils.shared_memory import SharedTable, shared_table
+import logging
+
+# Configurar logging
+logger = logging.getLogger("gateway-service")
+
+# Estados del circuito
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Valor numérico de cada estado para las métricas
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Momento de apertura publicado en la memoria compartida
+_OPENED_AT = struct.Struct("<d")
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de un servicio.
+
+    Mantiene una ventana con los resultados de las últimas solicitudes. El
+    circuito se abre si la tasa de errores o el percentil de latencia de la
+    ventana superan los umbrales; mientras está abierto las solicitudes se
+    rechazan de inmediato. Pasado `open_seconds` pasa a semiabierto y deja
+    pasar unas pocas solicitudes de prueba: si todas tienen éxito se cierra,
+    si alguna falla se vuelve a abrir.
+
+    Con `shared` (memoria compartida entre workers) la apertura del circuito
+    se publica y los demás workers la adoptan, en lugar de esperar a que cada
+    uno acumule sus propios errores. Las ventanas y las pruebas del estado
+    semiabierto siguen siendo de cada worker. El reloj monotónico es el mismo
+    para todos los procesos de la máquina.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window_size: int = 50,
+        min_requests: int = 20,
+        error_rate: float = 0.5,
+        latency_percentile: float = 0.95,
+        latency_threshold: float = 0.0,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 3,
+        clock: Callable[[], float] = time.monotonic,
+        shared: Optional[SharedTable] = None,
+    ):
+        self.name = name
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.latency_percentile = latency_percentile
+        self.latency_threshold = latency_threshold
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.rejected = 0
+        self.opened = 0
+        self._clock = clock
+        self._shared = shared
+        self._window: Deque[Tuple[bool, float]] = deque(maxlen=window_size)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+
+    @classmethod
+    def from_settings(cls, name: str) -> "CircuitBreaker":
+        """Crea un circuit breaker con los umbrales configurados."""
+        return cls(
+            name,
+            window_size=settings.BREAKER_WINDOW_SIZE,
+            min_requests=settings.BREAKER_MIN_REQUESTS,
+            error_rate=settings.BREAKER_ERROR_RATE,
+            latency_percentile=settings.BREAKER_LATENCY_PERCENTILE,
+            latency_threshold=settings.BREAKER_LATENCY_THRESHOLD,
+            open_seconds=settings.BREAKER_OPEN_SECONDS,
+            half_open_max_calls=settings.BREAKER_HALF_OPEN_MAX_CALLS,
+            shared=shared_table("breakers", 1024, _OPENED_AT.size),
+        )
+
+    @property
+    def state(self) -> str:
+        if self._shared is not None and self._state != OPEN:
+            self._adopt_shared_open()
+        if self._state == OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes = 0
+            self._probe_successes = 0
+        return self._state
+
+    def retry_after(self) -> float:
+        """Segundos que faltan para que el circuito deje pasar solicitudes de prueba."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.open_seconds - (self._clock() - self._opened_at))
+
+    def allow_request(self) -> bool:
+        """
+        Indica si la solicitud puede enviarse al servicio. En estado
+        semiabierto reserva uno de los cupos de prueba.
+        """
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and self._probes < self.half_open_max_calls:
+            self._probes += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def record(self, success: bool, latency: float) -> None:
+        """
+        Registra el resultado de una solicitud enviada al servicio.
+
+        Args:
+            success: False si hubo error de conexión o respuesta 5xx
+            latency: Duración de la solicitud en segundos
+        """
+        state = self.state
+        if state == HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+            if not success:
+                self._open()
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_max_calls:
+                self._close()
+            return
+
+        if state == OPEN:
+            return
+
+        self._window.append((success, latency))
+        if self._should_trip():
+            self._open()
+
+    def cancel(self) -> None:
+        """Libera el cupo de prueba de una solicitud cancelada (sin contar resultado)."""
+        if self._state == HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+
+    def _should_trip(self) -> bool:
+        if len(self._window) < self.min_requests:
+            return False
+        failures = sum(1 for success, _ in self._window if not success)
+        if failures / len(self._window) >= self.error_rate:
+            return True
+        if self.latency_threshold > 0:
+            latencies = sorted(latency for _, latency in self._window)
+            index = min(len(latencies) - 1, int(self.latency_percentile * len(latencies)))
+            return latencies[index] >= self.latency_threshold
+        return False
+
+    def _open(self) -> None:
+        if self._state != OPEN:
+            logger.warning("Circuito abierto para el servicio %s", self.name)
+            self.opened += 1
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self._window.clear()
+        if self._shared is not None:
+            self._shared.set(
+                f"breaker:{self.name}",
+                _OPENED_AT.pack(self._opened_at),
+                self._shared.clock() + self.open_seconds,
+            )
+
+    def _adopt_shared_open(self) -> None:
+        # Abrir el circuito si otro worker lo abrió después de la última apertura conocida
+        value = self._shared.get(f"breaker:{self.name}")
+        if value is None:
+            return
+        opened_at = _OPENED_AT.unpack(value)[0]
+        if opened_at > self._opened_at and self._clock() - opened_at < self.open_seconds:
+            logger.info("Circuito abierto para el servicio %s por otro worker", self.name)
+            self._state = OPEN
+            self._opened_at = opened_at
+            self._window.clear()
+
+    def _close(self) -> None:
+        logger.info("Circuito cerrado para el servicio %s", self.name)
+        self._state = CLOSED
+        self._window.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Devuelve el estado del circuito para los dashboards."""
+        return {
+            "state": self.state,
+            "window": len(self._window),
+            "rejected": self.rejected,
+            "opened": self.opened,
+            "retry_after": round(self.retry_after(), 3),
+        }
+
+
+def breaker_metrics(routes: Iterable[Any]) -> List[str]:
+    """
+    Genera las métricas del circuit breaker de cada servicio y de las
+    réplicas expulsadas por errores consecutivos.
+
+    Args:
+        routes: Las rutas de servicio activas
+
+    Returns:
+        Las líneas en formato de texto de Prometheus
+    """
+    state = [
+        "# HELP gateway_circuit_state Estado del circuito (0 = cerrado, 1 = semiabierto, 2 = abierto)",
+        "# TYPE gateway_circuit_state gauge",
+    ]
+    rejected = [
+        "# HELP gateway_circuit_rejected_total Solicitudes rechazadas con el circuito abierto",
+        "# TYPE gateway_circuit_rejected_total counter",
+    ]
+    ejected = [
+        "# HELP gateway_upstream_ejected Réplica expulsada por errores consecutivos (1 = expulsada)",
+        "# TYPE gateway_upstream_ejected gauge",
+    ]
+    for route in routes:
+        labels = format_labels(service=route.name)
+        state.append(f"gateway_circuit_state{labels} {STATE_VALUES[route.breaker.state]}")
+        rejected.append(f"gateway_circuit_rejected_total{labels} {route.breaker.rejected}")
+        for replica in route.balancer.replicas:
+            replica_labels = format_labels(service=route.name, replica=replica.url)
+            ejected.append(f"gateway_upstream_ejected{replica_labels} {int(route.balancer.is_ejected(replica))}")
+    return state + rejected + ejected
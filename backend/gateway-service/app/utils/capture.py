@@ -0,0 +1,322 @@
+"""
+Captura de tráfico del gateway para reproducirlo en pruebas de carga.
+
+Con CAPTURE_FILE configurado, una muestra de las solicitudes reenviadas a los
+servicios (CAPTURE_SAMPLE_RATE) se escribe en un archivo JSON Lines de solo
+agregado (comprimido con gzip si termina en ".gz"): instante de llegada,
+servicio, ruta y plantilla de ruta, tenant, usuario seudónimo, encabezados,
+cuerpo, estado y duración. La escritura ocurre en un hilo aparte, fuera del
+event loop.
+
+Los secretos no se guardan: los encabezados de CAPTURE_REDACT_HEADERS y los
+campos de CAPTURE_REDACT_FIELDS (en cuerpos JSON o de formulario y en la
+query) se reemplazan por REDACTED, y el usuario se guarda como un HMAC de su
+identificador. `benchmarks/replay.py` reproduce el archivo.
+"""
+import base64
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, IO, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+from fastapi import Request, Response
+from app.config.settings import settings
+from app.utils.identity import Identity
+from app.utils.metrics import Counter
+from app.utils.proxy import HOP_BY_HOP_HEADERS, should_stream_body
+import logging
+
+# Configurar logging
+logger = logging.getLogger("gateway-service")
+
+# Valor que reemplaza a los secretos
+REDACTED = "REDACTED"
+
+# Encabezados que no se guardan: los recalcula el cliente que reproduce o los
+# agrega el gateway
+_DROPPED_HEADERS = HOP_BY_HOP_HEADERS | {"host", "content-length", "x-gateway-identity", "x-request-deadline"}
+
+# Solicitudes capturadas y descartadas (cola llena o archivo completo)
+CAPTURE_RECORDS = Counter(
+    "gateway_capture_records_total",
+    "Solicitudes capturadas para reproducir (result=written|dropped)",
+    ("result",),
+)
+
+
+def redact_value(value: Any, fields: frozenset) -> Any:
+    """Reemplaza, en cualquier nivel de un valor JSON, los campos secretos."""
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if key.lower() in fields else redact_value(item, fields)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [redact_value(item, fields) for item in value]
+    return value
+
+
+def redact_query(query: str, fields: frozenset) -> str:
+    """Reemplaza los parámetros secretos de una query string."""
+    if not query:
+        return query
+    pairs = parse_qsl(query, keep_blank_values=True)
+    return urlencode([(key, REDACTED if key.lower() in fields else value) for key, value in pairs])
+
+
+def encode_body(body: bytes, content_type: str, fields: frozenset) -> Dict[str, Any]:
+    """
+    Prepara el cuerpo de la solicitud para el archivo, sin secretos.
+
+    Args:
+        body: El cuerpo recibido
+        content_type: El Content-Type de la solicitud
+        fields: Los campos secretos (en minúsculas)
+
+    Returns:
+        Los campos del registro: "b" (texto) o "b64" (binario en base64)
+    """
+    if not body:
+        return {}
+    media_type = content_type.partition(";")[0].strip().lower()
+    if media_type == "application/json" or media_type.endswith("+json"):
+        try:
+            return {"b": json.dumps(redact_value(json.loads(body), fields), separators=(",", ":"))}
+        except ValueError:
+            pass
+    if media_type == "application/x-www-form-urlencoded":
+        return {"b": redact_query(body.decode("latin-1"), fields)}
+    try:
+        return {"b": body.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"b64": base64.b64encode(body).decode("ascii")}
+
+
+def decode_body(record: Dict[str, Any]) -> bytes:
+    """Devuelve el cuerpo guardado en un registro."""
+    if "b64" in record:
+        return base64.b64decode(record["b64"])
+    return record.get("b", "").encode("utf-8")
+
+
+def pseudonymize(subject: str) -> str:
+    """Identificador estable del usuario que no revela el original."""
+    if not subject:
+        return ""
+    return hmac.new(settings.JWT_SECRET_KEY.encode(), subject.encode(), hashlib.sha256).hexdigest()[:16]
+
+
+def open_capture_file(path: str, mode: str) -> IO[bytes]:
+    """Abre el archivo de captura (gzip si termina en ".gz")."""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "b")
+    return open(path, mode + "b")
+
+
+def read_capture(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Lee los registros de un archivo de captura en orden. Una última línea
+    incompleta (ej: el gateway se detuvo mientras escribía) se ignora.
+    """
+    with open_capture_file(path, "r") as file:
+        try:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    logger.warning("Registro de captura incompleto en %s, se ignora", path)
+        except EOFError:
+            # Miembro gzip sin terminar al final del archivo
+            logger.warning("Archivo de captura %s truncado", path)
+
+
+class TrafficCapture:
+    """
+    Escribe una muestra de las solicitudes en el archivo de captura desde un
+    hilo aparte. Si la cola se llena o el archivo alcanza `max_bytes`, los
+    registros nuevos se descartan (la captura nunca frena al gateway).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        sample_rate: float = 1.0,
+        max_body_bytes: int = 65536,
+        max_bytes: int = 0,
+        redact_headers: Tuple[str, ...] = (),
+        redact_fields: Tuple[str, ...] = (),
+        queue_size: int = 10000,
+    ):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_body_bytes = max_body_bytes
+        self.max_bytes = max_bytes
+        self.redact_headers = frozenset(name.lower() for name in redact_headers)
+        self.redact_fields = frozenset(name.lower() for name in redact_fields)
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(queue_size)
+        self._written = CAPTURE_RECORDS.labels("written")
+        self._dropped = CAPTURE_RECORDS.labels("dropped")
+        self._file = open_capture_file(path, "a")
+        # Con gzip se suman los bytes comprimidos previos y los nuevos sin comprimir (cota superior)
+        self._size = os.path.getsize(path)
+        self._thread = threading.Thread(target=self._run, name="traffic-capture", daemon=True)
+        self._thread.start()
+
+    def sampled(self) -> bool:
+        """Indica si la solicitud actual entra en la muestra."""
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    async def record(
+        self,
+        request: Request,
+        service: str,
+        path: str,
+        identity: Identity,
+        forward: Callable[[], Awaitable[Response]],
+    ) -> Response:
+        """
+        Reenvía la solicitud y registra sus datos, su estado y su duración.
+
+        Args:
+            request: La solicitud entrante
+            service: El nombre del servicio
+            path: La ruta relativa al servicio
+            identity: La identidad verificada de la solicitud
+            forward: Función que reenvía la solicitud y devuelve la respuesta
+
+        Returns:
+            La respuesta de `forward`
+        """
+        # Importación diferida: app.middleware importa el router, que importa este módulo
+        from app.middleware import proxy_route_template
+
+        started = time.time()
+        entry: Dict[str, Any] = {
+            "t": round(started, 6),
+            "m": request.method,
+            "s": service,
+            "p": "/" + path,
+            "r": proxy_route_template(f"/{service}/{path}"),
+            "tn": identity.tenant,
+            "u": pseudonymize(identity.subject),
+            "h": self._headers(request),
+        }
+        query = request.url.query
+        if query:
+            entry["q"] = redact_query(query, self.redact_fields)
+
+        content_length = request.headers.get("content-length")
+        if content_length is not None and content_length.isdigit():
+            entry["bs"] = int(content_length)
+        # Los cuerpos transmitidos por partes o demasiado grandes solo se registran por tamaño
+        if not should_stream_body(request.headers) and (
+            content_length is None or (content_length.isdigit() and int(content_length) <= self.max_body_bytes)
+        ):
+            body = await request.body()
+            entry["bs"] = len(body)
+            if len(body) <= self.max_body_bytes:
+                entry.update(encode_body(body, request.headers.get("content-type", ""), self.redact_fields))
+
+        status_code = 500
+        try:
+            response = await forward()
+            status_code = response.status_code
+            return response
+        finally:
+            entry["st"] = status_code
+            entry["ms"] = round((time.time() - started) * 1000, 3)
+            self.write(entry)
+
+    def _headers(self, request: Request) -> Dict[str, str]:
+        headers = {}
+        for name, value in request.headers.items():
+            if name in _DROPPED_HEADERS:
+                continue
+            headers[name] = REDACTED if name in self.redact_headers else value
+        return headers
+
+    def write(self, entry: Dict[str, Any]) -> None:
+        """Encola un registro para el hilo de escritura."""
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self._dropped.inc()
+
+    def _run(self) -> None:
+        while True:
+            entry = self._queue.get()
+            batch = []
+            while entry is not None:
+                batch.append(entry)
+                try:
+                    entry = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+            if entry is None:
+                return
+
+    def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        lines = []
+        for entry in batch:
+            line = json.dumps(entry, separators=(",", ":"), ensure_ascii=False).encode("utf-8") + b"\n"
+            if self.max_bytes and self._size + len(line) > self.max_bytes:
+                self._dropped.inc()
+                continue
+            self._size += len(line)
+            lines.append(line)
+        if not lines:
+            return
+        try:
+            self._file.write(b"".join(lines))
+            self._file.flush()
+            self._written.inc(len(lines))
+        except OSError as e:
+            logger.error("Error al escribir la captura de tráfico en %s: %s", self.path, e)
+            self._dropped.inc(len(lines))
+
+    def close(self) -> None:
+        """Escribe los registros pendientes y cierra el archivo."""
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+
+
+# Captura activa (None si CAPTURE_FILE no está configurado)
+_traffic_capture: Optional[TrafficCapture] = None
+
+
+def get_traffic_capture() -> Optional[TrafficCapture]:
+    """Devuelve la captura de tráfico activa, o None si está desactivada."""
+    global _traffic_capture
+    if _traffic_capture is None and settings.CAPTURE_FILE:
+        _traffic_capture = TrafficCapture(
+            settings.CAPTURE_FILE,
+            sample_rate=settings.CAPTURE_SAMPLE_RATE,
+            max_body_bytes=settings.CAPTURE_MAX_BODY_BYTES,
+            max_bytes=settings.CAPTURE_MAX_FILE_BYTES,
+            redact_headers=tuple(settings.CAPTURE_REDACT_HEADERS),
+            redact_fields=tuple(settings.CAPTURE_REDACT_FIELDS),
+        )
+        logger.info("Captura de tráfico activa en %s (muestra %.2f)", settings.CAPTURE_FILE, settings.CAPTURE_SAMPLE_RATE)
+    return _traffic_capture
+
+
+def set_traffic_capture(capture: Optional[TrafficCapture]) -> None:
+    """Reemplaza la captura de tráfico activa."""
+    global _traffic_capture
+    _traffic_capture = capture
+
+
+def close_traffic_capture() -> None:
+    """Cierra la captura de tráfico activa, si existe."""
+    global _traffic_capture
+    if _traffic_capture is not None:
+        _traffic_capture.close()
+        _traffic_capture = None
@@ -0,0 +1,196 @@
+import asyncio
+import httpx
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import AsyncIterator, Callable, Dict, Iterable, Optional
+from app.config.settings import settings
+import logging
+
+# Configurar logging
+logger = logging.getLogger("gateway-service")
+
+# Un cliente HTTP por servicio, creado en el lifespan del gateway
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+# Clientes de los servicios eliminados al recargar; se cierran cuando
+# terminan sus solicitudes en curso y los cuerpos que siguen transmitiendo
+_retiring: Dict[httpx.AsyncClient, asyncio.Task] = {}
+
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """Cuerpo de una respuesta que avisa una sola vez al cerrarse."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close: Callable[[], None]):
+        self._stream = stream
+        self._on_close: Optional[Callable[[], None]] = on_close
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._on_close is not None:
+                on_close, self._on_close = self._on_close, None
+                on_close()
+
+
+class TrackingTransport(httpx.AsyncBaseTransport):
+    """
+    Transporte que cuenta las solicitudes en curso del cliente, desde que se
+    envían hasta que se cierra el cuerpo de la respuesta (las respuestas
+    transmitidas en streaming siguen abiertas después de los encabezados).
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+        self.open = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def _opened(self) -> None:
+        self.open += 1
+        self._idle.clear()
+
+    def _closed(self) -> None:
+        self.open -= 1
+        if self.open == 0:
+            self._idle.set()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self._opened()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self._closed()
+            raise
+        response.stream = _TrackedStream(response.stream, self._closed)
+        return response
+
+    async def wait_idle(self) -> None:
+        """Espera a que no queden solicitudes ni respuestas abiertas."""
+        await self._idle.wait()
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def http2_available() -> bool:
+    """
+    Indica si el paquete opcional `h2` está instalado (necesario para HTTP/2).
+    """
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def create_client() -> httpx.AsyncClient:
+    """
+    Crea un cliente HTTP con los límites de pool y keep-alive configurados.
+
+    Returns:
+        Un cliente httpx listo para reutilizarse entre solicitudes
+    """
+    http2 = settings.UPSTREAM_HTTP2
+    if http2 and not http2_available():
+        logger.warning("UPSTREAM_HTTP2 activado pero el paquete 'h2' no está instalado; se usará HTTP/1.1")
+        http2 = False
+
+    limits = httpx.Limits(
+        max_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.UPSTREAM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.UPSTREAM_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(settings.UPSTREAM_TIMEOUT, connect=settings.UPSTREAM_CONNECT_TIMEOUT)
+    # El cliente se comparte entre usuarios: no debe guardar las cookies de las
+    # respuestas, las cookies del cliente viajan en el encabezado Cookie reenviado
+    cookies = CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+
+    # El transporte cuenta las respuestas abiertas para cerrar el cliente
+    # retirado sin cortar los cuerpos que siguen transmitiéndose
+    transport = TrackingTransport(httpx.AsyncHTTPTransport(limits=limits, http2=http2))
+
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=timeout,
+        cookies=cookies,
+        follow_redirects=True,
+    )
+
+
+async def init_clients(service_names: Iterable[str]) -> None:
+    """
+    Crea un cliente por cada servicio configurado. Se llama al iniciar el gateway.
+
+    Args:
+        service_names: Nombres de los servicios configurados
+    """
+    for name in service_names:
+        if name not in _clients:
+            _clients[name] = create_client()
+    logger.info("Clientes HTTP inicializados para: %s", list(_clients))
+
+
+def get_client(service_name: str) -> httpx.AsyncClient:
+    """
+    Devuelve el cliente del servicio, creándolo si todavía no existe
+    (por ejemplo, cuando la aplicación se usa sin ejecutar el lifespan).
+
+    Args:
+        service_name: El nombre del servicio
+
+    Returns:
+        El cliente HTTP compartido del servicio
+    """
+    client: Optional[httpx.AsyncClient] = _clients.get(service_name)
+    if client is None or client.is_closed:
+        client = create_client()
+        _clients[service_name] = client
+    return client
+
+
+def retire_client(service_name: str, delay: Optional[float] = None) -> None:
+    """
+    Quita el cliente del servicio (ej: se eliminó) y lo cierra sin cortar las
+    solicitudes en curso: espera `delay` segundos (las solicitudes que ya
+    tomaron el cliente pero aún no lo usaron) y luego a que se cierren las
+    respuestas abiertas, incluidos los cuerpos transmitidos en streaming. La
+    siguiente solicitud al servicio crea un cliente nuevo.
+
+    Args:
+        service_name: El nombre del servicio
+        delay: Segundos antes de esperar las respuestas abiertas; por defecto
+            UPSTREAM_TIMEOUT
+    """
+    client = _clients.pop(service_name, None)
+    if client is None:
+        return
+
+    async def close_later() -> None:
+        try:
+            await asyncio.sleep(settings.UPSTREAM_TIMEOUT if delay is None else delay)
+            transport = client._transport
+            if isinstance(transport, TrackingTransport):
+                await transport.wait_idle()
+            await client.aclose()
+        finally:
+            _retiring.pop(client, None)
+
+    _retiring[client] = asyncio.get_running_loop().create_task(close_later())
+
+
+async def close_clients() -> None:
+    """
+    Cierra todos los clientes y sus conexiones. Se llama al detener el gateway.
+    """
+    for name, client in list(_clients.items()):
+        await client.aclose()
+        _clients.pop(name, None)
+    for client, task in list(_retiring.items()):
+        task.cancel()
+        await client.aclose()
+    _retiring.clear()
+    logger.info("Clientes HTTP cerrados")
@@ -0,0 +1,188 @@
+import asyncio
+import hashlib
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from fastapi import Request, Response
+from app.config.settings import settings
+from app.utils.identity import Identity
+from app.utils.metrics import format_labels, register_collector
+from app.utils.response_cache import VARY_HEADERS
+import logging
+
+# Configurar logging
+logger = logging.getLogger("gateway-service")
+
+
+@dataclass(frozen=True)
+class SharedResponse:
+    """Respuesta del servicio que puede entregarse a varias solicitudes."""
+
+    status_code: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+
+    def to_response(self) -> Response:
+        """Construye una copia de la respuesta para una solicitud agrupada."""
+        response = Response(content=self.body, status_code=self.status_code)
+        response.raw_headers = response.raw_headers + self.headers
+        return response
+
+
+def _consume_exception(future: asyncio.Future) -> None:
+    # Evitar el aviso "exception was never retrieved" si nadie esperaba el resultado
+    if not future.cancelled():
+        future.exception()
+
+
+class SingleFlight:
+    """
+    Agrupa las solicitudes GET idénticas que están en curso al mismo tiempo.
+
+    La primera solicitud (líder) se reenvía al servicio; las que llegan
+    mientras tanto con la misma clave (método, ruta reescrita, query e
+    identidad) esperan su resultado y reciben una copia de la respuesta. Las
+    respuestas que no pueden compartirse (transmitidas por partes, mayores que
+    `max_body_bytes` o con Set-Cookie) hacen que cada solicitud en espera se
+    reenvíe por su cuenta.
+    """
+
+    def __init__(self, max_body_bytes: int = 1024 * 1024):
+        self.max_body_bytes = max_body_bytes
+        self.leaders = 0
+        self.followers = 0
+        self.fallbacks = 0
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    @staticmethod
+    def build_key(request: Request, service: str, path: str, identity: Identity) -> str:
+        """
+        Construye la clave de agrupación de una solicitud.
+
+        Args:
+            request: La solicitud entrante
+            service: El nombre del servicio
+            path: La ruta relativa al servicio
+            identity: La identidad verificada de la solicitud
+
+        Returns:
+            La clave; solo coinciden solicitudes con la misma respuesta esperada
+        """
+        vary = "\x1f".join(request.headers.get(name, "") for name in VARY_HEADERS)
+        digest = hashlib.sha256(
+            f"{identity.key}\x1f{request.url.query}\x1f{vary}".encode()
+        ).hexdigest()
+        return f"{request.method} {service}:/{path}|{digest}"
+
+    def share(self, response: Response) -> Optional[SharedResponse]:
+        """
+        Convierte la respuesta del líder en una respuesta compartible, o
+        devuelve None si no puede entregarse a otras solicitudes.
+        """
+        body = getattr(response, "body", None)
+        if body is None or len(body) > self.max_body_bytes:
+            return None
+        headers = [(name, value) for name, value in response.raw_headers if name.lower() != b"content-length"]
+        if any(name.lower() == b"set-cookie" for name, _ in headers):
+            return None
+        return SharedResponse(status_code=response.status_code, headers=headers, body=body)
+
+    async def do(self, key: str, fetch: Callable[[], Awaitable[Response]]) -> Response:
+        """
+        Ejecuta `fetch` una sola vez por clave entre las solicitudes en curso.
+
+        Args:
+            key: La clave de agrupación
+            fetch: Función que reenvía la solicitud al servicio
+
+        Returns:
+            La respuesta del servicio (o una copia para las solicitudes agrupadas)
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            self.followers += 1
+            # shield: si esta solicitud se cancela, la del líder sigue en curso
+            shared = await asyncio.shield(future)
+            if shared is None:
+                self.fallbacks += 1
+                return await fetch()
+            return shared.to_response()
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_consume_exception)
+        self._calls[key] = future
+        self.leaders += 1
+        try:
+            response = await fetch()
+        except asyncio.CancelledError:
+            # El cliente del líder se desconectó: las demás solicitudes se
+            # reenvían por su cuenta
+            future.set_result(None)
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(self.share(response))
+            return response
+        finally:
+            del self._calls[key]
+
+    def coalescing_ratio(self) -> float:
+        """Fracción de solicitudes respondidas con el resultado de otra."""
+        total = self.leaders + self.followers
+        return (self.followers - self.fallbacks) / total if total else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        """Devuelve los contadores de agrupación."""
+        return {
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "fallbacks": self.fallbacks,
+            "in_flight": len(self._calls),
+            "ratio": round(self.coalescing_ratio(), 4),
+        }
+
+
+# Agrupador activo; None si COALESCING_ENABLED está desactivado
+_single_flight: Optional[SingleFlight] = None
+
+
+def get_single_flight() -> Optional[SingleFlight]:
+    """Devuelve el agrupador de solicitudes activo, o None si está desactivado."""
+    global _single_flight
+    if _single_flight is None and settings.COALESCING_ENABLED:
+        _single_flight = SingleFlight(settings.COALESCING_MAX_BODY_BYTES)
+    return _single_flight
+
+
+def set_single_flight(single_flight: Optional[SingleFlight]) -> None:
+    """Reemplaza el agrupador de solicitudes activo."""
+    global _single_flight
+    _single_flight = single_flight
+
+
+def _coalescing_metrics() -> List[str]:
+    """Genera las métricas de agrupación de solicitudes."""
+    single_flight = _single_flight or SingleFlight()
+    lines = [
+        "# HELP gateway_coalesced_requests_total Solicitudes GET por rol en la agrupación",
+        "# TYPE gateway_coalesced_requests_total counter",
+    ]
+    for role, value in (
+        ("leader", single_flight.leaders),
+        ("follower", single_flight.followers),
+        ("fallback", single_flight.fallbacks),
+    ):
+        lines.append(f"gateway_coalesced_requests_total{format_labels(role=role)} {value}")
+    lines.extend([
+        "# HELP gateway_coalescing_ratio Fracción de solicitudes GET respondidas con el resultado de otra",
+        "# TYPE gateway_coalescing_ratio gauge",
+        f"gateway_coalescing_ratio {single_flight.coalescing_ratio():.4f}",
+    ])
+    return lines
+
+
+register_collector(_coalescing_metrics)
@@ -0,0 +1,256 @@
+"""
+Compresión de las respuestas del gateway (gzip, brotli y zstd).
+
+La codificación se negocia con el Accept-Encoding del cliente entre las
+disponibles (brotli y zstd son opcionales: paquetes `brotli` y `zstandard`).
+Solo se comprimen las respuestas de los tipos de contenido permitidos y a
+partir de un tamaño mínimo; cada parte del cuerpo se comprime y se envía al
+llegar, sin acumular la respuesta en memoria. Las respuestas que ya traen
+Content-Encoding (ej: comprimidas por el servicio) se reenvían intactas.
+"""
+import fnmatch
+import zlib
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.config.settings import settings
+from app.utils.metrics import Counter
+
+# Bytes de las respuestas comprimidas, antes y después de comprimir
+COMPRESSION_BYTES = Counter(
+    "gateway_compression_bytes_total",
+    "Bytes de las respuestas comprimidas antes (stage=in) y después (stage=out) de comprimir",
+    ("encoding", "stage"),
+)
+
+
+class GzipCompressor:
+    """Compresor gzip por partes (zlib con flush de sincronización en cada parte)."""
+
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+    """Compresor brotli por partes (paquete opcional `brotli`)."""
+
+    def __init__(self, quality: int):
+        import brotli
+
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ZstdCompressor:
+    """Compresor zstd por partes (paquete opcional `zstandard`)."""
+
+    def __init__(self, level: int):
+        import zstandard
+
+        self._flush_block = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(self._flush_block)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+def _module_available(name: str) -> bool:
+    try:
+        __import__(name)
+    except ImportError:
+        return False
+    return True
+
+
+@lru_cache(maxsize=1)
+def available_encodings() -> Tuple[str, ...]:
+    """
+    Codificaciones configuradas en COMPRESSION_ENCODINGS (en orden de
+    preferencia) cuyo compresor está instalado.
+    """
+    modules = {"gzip": "zlib", "br": "brotli", "zstd": "zstandard"}
+    return tuple(
+        encoding
+        for encoding in settings.COMPRESSION_ENCODINGS
+        if encoding in modules and _module_available(modules[encoding])
+    )
+
+
+def create_compressor(encoding: str):
+    """Crea el compresor de la codificación con el nivel configurado."""
+    if encoding == "br":
+        return BrotliCompressor(settings.COMPRESSION_BROTLI_QUALITY)
+    if encoding == "zstd":
+        return ZstdCompressor(settings.COMPRESSION_ZSTD_LEVEL)
+    return GzipCompressor(settings.COMPRESSION_GZIP_LEVEL)
+
+
+@lru_cache(maxsize=256)
+def negotiate_encoding(accept_encoding: str, encodings: Tuple[str, ...]) -> Optional[str]:
+    """
+    Elige la codificación de la respuesta según el Accept-Encoding del cliente.
+
+    Args:
+        accept_encoding: El valor del encabezado (ej: "gzip, br;q=0.9")
+        encodings: Las codificaciones disponibles, en orden de preferencia
+
+    Returns:
+        La codificación con mayor q (a igual q, la preferida del gateway), o
+        None si el cliente no acepta ninguna
+    """
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.partition(";")
+        weight = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name.strip()] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in encodings:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+@lru_cache(maxsize=256)
+def is_compressible(content_type: str) -> bool:
+    """Indica si el tipo de contenido está en COMPRESSION_CONTENT_TYPES (admite comodines, ej: "text/*")."""
+    media_type = content_type.partition(";")[0].strip().lower()
+    return any(fnmatch.fnmatchcase(media_type, pattern) for pattern in settings.COMPRESSION_CONTENT_TYPES)
+
+
+class CompressionMiddleware:
+    """
+    Middleware ASGI que comprime las respuestas según el Accept-Encoding.
+
+    Las respuestas pequeñas (menos de COMPRESSION_MIN_SIZE bytes), de tipos no
+    permitidos, con Content-Encoding o con Cache-Control: no-transform se
+    envían sin cambios.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.COMPRESSION_ENABLED or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = negotiate_encoding(accept_encoding, available_encodings()) if accept_encoding else None
+        await self.app(scope, receive, CompressionResponder(send, encoding).send)
+
+
+class CompressionResponder:
+    """Estado de la compresión de una respuesta."""
+
+    __slots__ = ("_send", "encoding", "_start", "_compressor", "_passthrough", "_in", "_out")
+
+    def __init__(self, send: Send, encoding: Optional[str]):
+        self._send = send
+        self.encoding = encoding
+        self._start: Optional[Message] = None
+        self._compressor = None
+        self._passthrough = False
+        self._in = self._out = None
+
+    async def send(self, message: Message) -> None:
+        if self._passthrough:
+            await self._send(message)
+        elif message["type"] == "http.response.start":
+            self._on_start(message)
+            if self._passthrough:
+                await self._send(message)
+        elif message["type"] == "http.response.body":
+            if self._compressor is None:
+                await self._on_first_body(message)
+            else:
+                await self._send_compressed(message)
+        else:
+            await self._send(message)
+
+    def _on_start(self, message: Message) -> None:
+        headers = MutableHeaders(raw=list(message.get("headers", [])))
+        message["headers"] = headers.raw
+        eligible = (
+            message["status"] >= 200
+            and message["status"] not in (204, 304)
+            and "content-encoding" not in headers
+            and "no-transform" not in headers.get("cache-control", "").lower()
+            and is_compressible(headers.get("content-type", ""))
+        )
+        if not eligible:
+            self._passthrough = True
+            return
+
+        # La representación depende del Accept-Encoding aunque no se comprima
+        vary = headers.get("vary", "").lower()
+        if "accept-encoding" not in vary and "*" not in vary:
+            headers.add_vary_header("Accept-Encoding")
+        content_length = headers.get("content-length")
+        if self.encoding is None or (
+            content_length is not None and content_length.isdigit() and int(content_length) < settings.COMPRESSION_MIN_SIZE
+        ):
+            self._passthrough = True
+            return
+        self._start = message
+
+    async def _on_first_body(self, message: Message) -> None:
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if not more_body and len(body) < settings.COMPRESSION_MIN_SIZE:
+            self._passthrough = True
+            await self._send(self._start)
+            await self._send(message)
+            return
+
+        headers = MutableHeaders(raw=self._start["headers"])
+        del headers["content-length"]
+        headers["content-encoding"] = self.encoding
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            # El cuerpo comprimido no es idéntico byte a byte al original
+            headers["etag"] = "W/" + etag
+        self._start["headers"] = headers.raw
+        self._compressor = create_compressor(self.encoding)
+        self._in = COMPRESSION_BYTES.labels(self.encoding, "in")
+        self._out = COMPRESSION_BYTES.labels(self.encoding, "out")
+        await self._send(self._start)
+        await self._send_compressed(message)
+
+    async def _send_compressed(self, message: Message) -> None:
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        chunk = self._compressor.compress(body) if body else b""
+        if not more_body:
+            chunk += self._compressor.finish()
+        self._in.inc(len(body))
+        self._out.inc(len(chunk))
+        if chunk or not more_body:
+            await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
@@ -0,0 +1,150 @@
+import time
+from typing import Any, Callable, Iterable, List, Optional
+from app.config.settings import settings
+from app.utils.metrics import format_labels
+import logging
+
+# Configurar logging
+logger = logging.getLogger("gateway-service")
+
+# Respuestas que indican que el servicio está saturado (o no se pudo conectar)
+OVERLOAD_STATUS = frozenset({502, 503, 504})
+
+
+class AdaptiveConcurrencyLimit:
+    """
+    Límite adaptativo de solicitudes en curso hacia un servicio (AIMD).
+
+    Mientras las respuestas llegan a tiempo y el límite se está usando, el
+    límite crece en una solicitud por cada ida y vuelta (aumento aditivo).
+    Si una respuesta tarda más que `tolerance` veces la latencia de
+    referencia del servicio (una media móvil lenta) o indica saturación
+    (502, 503, 504), el límite se multiplica por `backoff_ratio` (reducción
+    multiplicativa), como mucho una vez por ida y vuelta. Las solicitudes que
+    superan el límite esperan en la cola del servicio (ver FairScheduler) o
+    se rechazan.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int = 50,
+        min_limit: int = 5,
+        max_limit: int = 500,
+        backoff_ratio: float = 0.9,
+        tolerance: float = 2.0,
+        smoothing: float = 0.05,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.in_flight = 0
+        self.shed = 0
+        # Latencia de referencia (media móvil de las respuestas correctas)
+        self.baseline: Optional[float] = None
+        self._clock = clock
+        self._last_decrease = 0.0
+
+    @classmethod
+    def from_settings(cls, name: str) -> "AdaptiveConcurrencyLimit":
+        """Crea un límite con los valores configurados."""
+        return cls(
+            name,
+            initial_limit=settings.CONCURRENCY_INITIAL_LIMIT,
+            min_limit=settings.CONCURRENCY_MIN_LIMIT,
+            max_limit=settings.CONCURRENCY_MAX_LIMIT,
+            backoff_ratio=settings.CONCURRENCY_BACKOFF_RATIO,
+            tolerance=settings.CONCURRENCY_LATENCY_TOLERANCE,
+        )
+
+    def try_acquire(self) -> bool:
+        """
+        Reserva un lugar para una solicitud.
+
+        Returns:
+            False si el servicio ya tiene `limit` solicitudes en curso
+        """
+        if self.in_flight >= int(self.limit):
+            self.shed += 1
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self, latency: Optional[float], ok: bool = True) -> None:
+        """
+        Libera el lugar de una solicitud y ajusta el límite.
+
+        Args:
+            latency: Duración de la solicitud en segundos (None si se canceló
+                o ya se informó con `observe`)
+            ok: False si la respuesta indica saturación del servicio
+        """
+        if latency is not None:
+            self.observe(latency, ok)
+        self.in_flight -= 1
+
+    def observe(self, latency: float, ok: bool = True) -> None:
+        """
+        Ajusta el límite con la latencia de una solicitud que sigue en curso
+        (ej: una respuesta cuyo cuerpo todavía se está transmitiendo).
+
+        Args:
+            latency: Tiempo hasta la respuesta del servicio en segundos
+            ok: False si la respuesta indica saturación del servicio
+        """
+        in_flight = self.in_flight
+        slow = self.baseline is not None and latency > self.baseline * self.tolerance
+        if ok:
+            if self.baseline is None:
+                self.baseline = latency
+            else:
+                self.baseline += self.smoothing * (latency - self.baseline)
+
+        if not ok or slow:
+            # Una sola reducción por ida y vuelta: las respuestas lentas de una
+            # misma ráfaga reflejan la misma saturación
+            now = self._clock()
+            if now - self._last_decrease >= (self.baseline or 0.0):
+                self._last_decrease = now
+                previous = self.limit
+                self.limit = max(float(self.min_limit), self.limit * self.backoff_ratio)
+                if int(previous) != int(self.limit):
+                    logger.debug("Límite de concurrencia de %s reducido a %d", self.name, int(self.limit))
+        elif in_flight * 2 >= self.limit:
+            # Solo crecer si el límite actual se está usando
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+
+def concurrency_metrics(routes: Iterable[Any]) -> List[str]:
+    """
+    Genera las métricas del límite de concurrencia de cada servicio.
+
+    Args:
+        routes: Las rutas de servicio activas
+
+    Returns:
+        Las líneas en formato de texto de Prometheus
+    """
+    limit = [
+        "# HELP gateway_concurrency_limit Límite adaptativo de solicitudes en curso por servicio",
+        "# TYPE gateway_concurrency_limit gauge",
+    ]
+    in_flight = [
+        "# HELP gateway_concurrency_in_flight Solicitudes en curso contadas por el límite de concurrencia",
+        "# TYPE gateway_concurrency_in_flight gauge",
+    ]
+    shed = [
+        "# HELP gateway_concurrency_shed_total Solicitudes rechazadas por superar el límite de concurrencia",
+        "# TYPE gateway_concurrency_shed_total counter",
+    ]
+    for route in routes:
+        labels = format_labels(service=route.name)
+        limit.append(f"gateway_concurrency_limit{labels} {int(route.limiter.limit)}")
+        in_flight.append(f"gateway_concurrency_in_flight{labels} {route.limiter.in_flight}")
+        shed.append(f"gateway_concurrency_shed_total{labels} {route.limiter.shed}")
+    return limit + in_flight + shed
@@ -0,0 +1,97 @@
+"""
+CORS del gateway.
+
+El gateway es el único punto de entrada de los navegadores: responde las
+solicitudes preflight (OPTIONS con Access-Control-Request-Method) a partir de
+CORS_ORIGINS sin reenviarlas a los servicios, y agrega los encabezados CORS a
+las respuestas. Los servicios no procesan CORS.
+
+Las respuestas preflight dependen solo del origen, el método y los
+encabezados pedidos, por lo que se guardan ya construidas en una caché LRU y
+se envían sin volver a evaluarlas. Con un Access-Control-Max-Age largo el
+navegador además las reutiliza durante ese tiempo.
+"""
+from collections import OrderedDict
+from typing import Optional, Tuple
+from starlette.middleware.cors import CORSMiddleware
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.config.settings import settings
+from app.utils.metrics import Counter
+
+# Preflights respondidos por el gateway, aceptados (200) o rechazados (400)
+CORS_PREFLIGHTS = Counter(
+    "gateway_cors_preflight_total",
+    "Solicitudes preflight de CORS respondidas por el gateway",
+    ("result",),
+)
+
+# (origen, método pedido, encabezados pedidos, red privada pedida)
+PreflightKey = Tuple[str, str, Optional[str], Optional[str]]
+
+
+class GatewayCORSMiddleware(CORSMiddleware):
+    """
+    CORSMiddleware de Starlette configurado desde los ajustes del gateway,
+    con caché de las respuestas preflight.
+    """
+
+    def __init__(self, app: ASGIApp, cache_size: Optional[int] = None):
+        super().__init__(
+            app,
+            allow_origins=settings.CORS_ORIGINS,
+            allow_methods=settings.CORS_ALLOW_METHODS,
+            allow_headers=settings.CORS_ALLOW_HEADERS,
+            allow_credentials=settings.CORS_ALLOW_CREDENTIALS,
+            expose_headers=settings.CORS_EXPOSE_HEADERS,
+            max_age=settings.CORS_MAX_AGE,
+        )
+        self.cache_size = settings.CORS_PREFLIGHT_CACHE_SIZE if cache_size is None else cache_size
+        self._preflights: "OrderedDict[PreflightKey, Tuple[Message, Message]]" = OrderedDict()
+        self._allowed = CORS_PREFLIGHTS.labels("allowed")
+        self._rejected = CORS_PREFLIGHTS.labels("rejected")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        origin = headers.get("origin")
+        if origin is not None and scope["method"] == "OPTIONS" and "access-control-request-method" in headers:
+            start, body = self.cached_preflight(headers)
+            (self._allowed if start["status"] == 200 else self._rejected).inc()
+            # Copia de los encabezados: los middlewares externos agregan los suyos (ej: X-Request-ID)
+            await send({**start, "headers": list(start["headers"])})
+            await send(dict(body))
+            return
+
+        await self.simple_response(scope, receive, send, request_headers=headers)
+
+    def cached_preflight(self, request_headers: Headers) -> Tuple[Message, Message]:
+        """
+        Devuelve los mensajes ASGI de la respuesta preflight, construyéndolos
+        solo la primera vez para cada combinación de origen, método y
+        encabezados pedidos.
+        """
+        key: PreflightKey = (
+            request_headers["origin"],
+            request_headers["access-control-request-method"],
+            request_headers.get("access-control-request-headers"),
+            request_headers.get("access-control-request-private-network"),
+        )
+        messages = self._preflights.get(key)
+        if messages is not None:
+            self._preflights.move_to_end(key)
+            return messages
+
+        response = self.preflight_response(request_headers=request_headers)
+        messages = (
+            {"type": "http.response.start", "status": response.status_code, "headers": response.raw_headers},
+            {"type": "http.response.body", "body": response.body},
+        )
+        if self.cache_size > 0:
+            self._preflights[key] = messages
+            if len(self._preflights) > self.cache_size:
+                self._preflights.popitem(last=False)
+        return messages
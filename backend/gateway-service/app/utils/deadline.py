@@ -0,0 +1,140 @@
+"""
+Plazo (deadline) de una solicitud, propagado entre el gateway y los servicios.
+
+El gateway fija el plazo de cada solicitud según el tiempo de espera de la
+ruta y lo envía a los servicios en el encabezado X-Request-Deadline (instante
+absoluto en milisegundos desde la época Unix). Los servicios lo leen en
+DeadlineMiddleware, comprueban el tiempo restante antes del trabajo costoso y
+dejan de trabajar en solicitudes que el gateway ya abandonó.
+"""
+import json
+import time
+from contextvars import ContextVar
+from typing import Optional
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Encabezado con el plazo de la solicitud
+DEADLINE_HEADER = "x-request-deadline"
+
+# Plazo de la solicitud en curso (segundos desde la época Unix), o None si no tiene
+deadline_var: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """El plazo de la solicitud venció (o no alcanza para el trabajo pendiente)."""
+
+
+def format_deadline(deadline: float) -> str:
+    """Valor del encabezado X-Request-Deadline para un plazo en segundos desde la época."""
+    return str(int(deadline * 1000))
+
+
+def parse_deadline(value: Optional[str]) -> Optional[float]:
+    """
+    Lee el encabezado X-Request-Deadline.
+
+    Args:
+        value: El valor del encabezado (milisegundos desde la época Unix)
+
+    Returns:
+        El plazo en segundos desde la época, o None si falta o no es válido
+    """
+    if not value:
+        return None
+    try:
+        milliseconds = int(value)
+    except ValueError:
+        return None
+    return milliseconds / 1000 if milliseconds > 0 else None
+
+
+def remaining(now: Optional[float] = None) -> Optional[float]:
+    """
+    Segundos que le quedan a la solicitud en curso.
+
+    Args:
+        now: Momento actual (para las pruebas)
+
+    Returns:
+        El tiempo restante (negativo si el plazo venció), o None si la
+        solicitud no tiene plazo
+    """
+    deadline = deadline_var.get()
+    if deadline is None:
+        return None
+    return deadline - (time.time() if now is None else now)
+
+
+def check_deadline(min_remaining: float = 0.0) -> None:
+    """
+    Verifica que quede tiempo para el trabajo siguiente.
+
+    Args:
+        min_remaining: Segundos que necesita el trabajo siguiente (ej: un bcrypt)
+
+    Raises:
+        DeadlineExceeded: Si el tiempo restante es menor que `min_remaining`
+    """
+    budget = remaining()
+    if budget is not None and budget <= min_remaining:
+        raise DeadlineExceeded(f"Quedan {budget * 1000:.0f}ms de plazo, se necesitan {min_remaining * 1000:.0f}ms")
+
+
+class DeadlineMiddleware:
+    """
+    Middleware ASGI que lee el plazo de la solicitud (X-Request-Deadline).
+
+    Las solicitudes que llegan con el plazo vencido se responden 504 sin
+    ejecutarse. Si la aplicación lanza DeadlineExceeded, o cualquier error
+    después de vencido el plazo (ej: la cancelación de una consulta por el
+    statement_timeout), se responde 504 en lugar de 500.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        deadline = None
+        for name, value in scope["headers"]:
+            if name == DEADLINE_HEADER.encode():
+                deadline = parse_deadline(value.decode("latin-1"))
+                break
+        if deadline is None:
+            await self.app(scope, receive, send)
+            return
+
+        if deadline <= time.time():
+            await self.send_timeout(send)
+            return
+
+        token = deadline_var.set(deadline)
+        response_started = False
+
+        async def send_tracking(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_tracking)
+        except Exception as e:
+            if response_started or not (isinstance(e, DeadlineExceeded) or deadline <= time.time()):
+                raise
+            await self.send_timeout(send)
+        finally:
+            deadline_var.reset(token)
+
+    @staticmethod
+    async def send_timeout(send: Send) -> None:
+        body = json.dumps({"detail": "Plazo de la solicitud vencido"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 504,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
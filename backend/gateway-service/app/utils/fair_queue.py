@@ -0,0 +1,276 @@
+"""
+Clases de prioridad y reparto justo entre tenants de la concurrencia hacia
+cada servicio.
+
+Cada solicitud tiene una clase de prioridad (ej: "interactive" o "bulk"),
+según las reglas "priorities" del servicio o el encabezado X-Request-Priority.
+Cuando el límite de concurrencia del servicio está lleno, en lugar de
+rechazarla de inmediato la solicitud espera en una cola acotada (como mucho
+FAIR_QUEUE_MAX_WAIT segundos). Al liberarse un lugar se elige la clase por
+encolamiento justo ponderado (con los pesos de PRIORITY_CLASSES, la clase
+interactiva pasa primero sin dejar sin servicio a la masiva) y, dentro de la
+clase, el tenant por turnos, de modo que un tenant con muchas solicitudes no
+retrasa a los demás. Además, ningún tenant puede tener en curso más de
+FAIR_QUEUE_TENANT_SHARE del límite del servicio.
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Iterable, List, Mapping, Optional, Tuple
+from app.config.settings import settings
+from app.utils.concurrency import AdaptiveConcurrencyLimit
+from app.utils.metrics import Counter, Histogram, format_labels
+import logging
+
+# Configurar logging
+logger = logging.getLogger("gateway-service")
+
+# Encabezado con el que el cliente indica la clase de prioridad de la solicitud
+PRIORITY_HEADER = "x-request-priority"
+
+QUEUE_WAIT = Histogram(
+    "gateway_fair_queue_wait_seconds",
+    "Tiempo de espera en la cola de las solicitudes admitidas por clase de prioridad",
+    ("service", "priority"),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+QUEUE_REJECTED = Counter(
+    "gateway_fair_queue_rejected_total",
+    "Solicitudes rechazadas por la cola (reason = full o timeout)",
+    ("service", "priority", "reason"),
+)
+
+
+class FairScheduler:
+    """
+    Cola de admisión de un servicio delante de su límite de concurrencia,
+    con una cola por clase de prioridad y, dentro de cada una, por tenant.
+
+    Las clases se eligen por tiempo virtual: cada admisión de una clase
+    avanza su tiempo en 1/peso, y pasa la clase que terminaría antes su
+    próxima admisión, por lo que con pesos 8 y 1 la clase interactiva pasa
+    primero y recibe 8 de cada 9 lugares mientras ambas tengan solicitudes
+    esperando. Las solicitudes sin tenant conocido (ej: login) se agrupan en
+    un mismo turno y no tienen tope propio.
+    """
+
+    def __init__(
+        self,
+        limiter: AdaptiveConcurrencyLimit,
+        weights: Optional[Mapping[str, float]] = None,
+        tenant_share: float = 1.0,
+        max_pending: int = 0,
+        max_wait: float = 0.0,
+    ):
+        self.limiter = limiter
+        self.weights = dict(weights or {})
+        self.tenant_share = tenant_share
+        self.max_pending = max_pending
+        self.max_wait = max_wait
+        self.pending = 0
+        # Clase -> tenant -> solicitudes en espera (en orden de llegada)
+        self._queues: Dict[str, "OrderedDict[str, Deque[asyncio.Future]]"] = {}
+        # Tiempo virtual de cada clase y de la última admisión
+        self._finish: Dict[str, float] = {}
+        self._virtual = 0.0
+        # Solicitudes en curso por tenant
+        self._tenants: Dict[str, int] = {}
+
+    @classmethod
+    def from_settings(cls, limiter: AdaptiveConcurrencyLimit) -> "FairScheduler":
+        """Crea la cola con los valores configurados (sin cola ni tope por tenant si está desactivada)."""
+        if not settings.FAIR_QUEUE_ENABLED:
+            return cls(limiter, settings.PRIORITY_CLASSES)
+        return cls(
+            limiter,
+            settings.PRIORITY_CLASSES,
+            tenant_share=settings.FAIR_QUEUE_TENANT_SHARE,
+            max_pending=settings.FAIR_QUEUE_MAX_PENDING,
+            max_wait=settings.FAIR_QUEUE_MAX_WAIT,
+        )
+
+    @property
+    def name(self) -> str:
+        return self.limiter.name
+
+    def tenant_limit(self) -> int:
+        """Máximo de solicitudes en curso de un mismo tenant."""
+        return max(1, int(self.limiter.limit * self.tenant_share))
+
+    def in_flight(self, tenant: str) -> int:
+        return self._tenants.get(tenant, 0)
+
+    def _eligible(self, tenant: str, tenant_limit: int) -> bool:
+        return not tenant or self._tenants.get(tenant, 0) < tenant_limit
+
+    def _admit(self, tenant: str) -> None:
+        self.limiter.in_flight += 1
+        if tenant:
+            self._tenants[tenant] = self._tenants.get(tenant, 0) + 1
+
+    async def acquire(self, tenant: str, priority: str) -> bool:
+        """
+        Reserva un lugar para una solicitud, esperando en la cola si el
+        servicio o el tenant están en su límite.
+
+        Args:
+            tenant: El tenant de la solicitud (cadena vacía si no se conoce)
+            priority: La clase de prioridad de la solicitud
+
+        Returns:
+            False si la cola está llena o la espera superó `max_wait`
+        """
+        limiter = self.limiter
+        if limiter.in_flight < int(limiter.limit) and self._eligible(tenant, self.tenant_limit()):
+            self._admit(tenant)
+            return True
+        if self.pending >= self.max_pending or self.max_wait <= 0:
+            return self._reject(priority, "full")
+
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(tenant, priority, future)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, self.max_wait)
+        except asyncio.TimeoutError:
+            self._remove(tenant, priority, future)
+            return self._reject(priority, "timeout")
+        except asyncio.CancelledError:
+            # Si el lugar ya se había asignado, se devuelve para el siguiente
+            if future.done() and not future.cancelled():
+                self.release(tenant, None)
+            else:
+                self._remove(tenant, priority, future)
+            raise
+        QUEUE_WAIT.labels(self.name, priority).observe(time.perf_counter() - start)
+        return True
+
+    def release(self, tenant: str, latency: Optional[float], ok: bool = True) -> None:
+        """
+        Libera el lugar de una solicitud (ajustando el límite de concurrencia)
+        y admite a las siguientes en espera.
+
+        Args:
+            tenant: El tenant de la solicitud
+            latency: Duración de la solicitud en segundos (None si se canceló
+                o ya se informó al límite al recibir la respuesta)
+            ok: False si la respuesta indica saturación del servicio
+        """
+        self.limiter.release(latency, ok)
+        if tenant:
+            count = self._tenants.get(tenant, 0) - 1
+            if count > 0:
+                self._tenants[tenant] = count
+            else:
+                self._tenants.pop(tenant, None)
+        self._dispatch()
+
+    def _reject(self, priority: str, reason: str) -> bool:
+        self.limiter.shed += 1
+        QUEUE_REJECTED.labels(self.name, priority, reason).inc()
+        return False
+
+    def _enqueue(self, tenant: str, priority: str, future: asyncio.Future) -> None:
+        tenants = self._queues.get(priority)
+        if tenants is None:
+            # Una clase que vuelve a tener solicitudes no acumula crédito del tiempo sin ellas
+            tenants = self._queues[priority] = OrderedDict()
+            self._finish[priority] = max(self._finish.get(priority, 0.0), self._virtual)
+        waiters = tenants.get(tenant)
+        if waiters is None:
+            waiters = tenants[tenant] = deque()
+        waiters.append(future)
+        self.pending += 1
+
+    def _remove(self, tenant: str, priority: str, future: asyncio.Future) -> None:
+        tenants = self._queues.get(priority)
+        waiters = tenants.get(tenant) if tenants is not None else None
+        if waiters is None:
+            return
+        try:
+            waiters.remove(future)
+        except ValueError:
+            # Ya se había sacado de la cola
+            return
+        self.pending -= 1
+        if not waiters:
+            del tenants[tenant]
+            if not tenants:
+                del self._queues[priority]
+
+    def _next(self) -> Optional[Tuple[str, asyncio.Future]]:
+        """Saca de la cola la siguiente solicitud a admitir, o None si ninguna puede pasar."""
+        tenant_limit = self.tenant_limit()
+        chosen: Optional[Tuple[str, str]] = None
+        chosen_finish = 0.0
+        for priority, tenants in self._queues.items():
+            # Tiempo virtual en que terminaría la próxima admisión de la clase
+            finish = self._finish[priority] + 1.0 / self.weights.get(priority, 1.0)
+            if chosen is not None and finish >= chosen_finish:
+                continue
+            for tenant in tenants:
+                if self._eligible(tenant, tenant_limit):
+                    chosen, chosen_finish = (priority, tenant), finish
+                    break
+        if chosen is None:
+            return None
+
+        priority, tenant = chosen
+        tenants = self._queues[priority]
+        waiters = tenants[tenant]
+        future = waiters.popleft()
+        self.pending -= 1
+        # El tenant pasa al final del turno de su clase
+        if waiters:
+            tenants.move_to_end(tenant)
+        else:
+            del tenants[tenant]
+            if not tenants:
+                del self._queues[priority]
+        self._virtual = self._finish[priority]
+        self._finish[priority] = chosen_finish
+        return tenant, future
+
+    def _dispatch(self) -> None:
+        limiter = self.limiter
+        while self.pending and limiter.in_flight < int(limiter.limit):
+            entry = self._next()
+            if entry is None:
+                break
+            tenant, future = entry
+            # La espera pudo haber vencido sin que la solicitud saliera aún de la cola
+            if future.done():
+                continue
+            self._admit(tenant)
+            future.set_result(True)
+
+    def pending_by_priority(self) -> Dict[str, int]:
+        """Solicitudes en espera por clase de prioridad."""
+        return {
+            priority: sum(len(waiters) for waiters in tenants.values())
+            for priority, tenants in self._queues.items()
+        }
+
+
+def fair_queue_metrics(routes: Iterable[Any]) -> List[str]:
+    """
+    Genera las métricas de la cola de cada servicio.
+
+    Args:
+        routes: Las rutas de servicio activas
+
+    Returns:
+        Las líneas en formato de texto de Prometheus
+    """
+    lines = [
+        "# HELP gateway_fair_queue_pending Solicitudes esperando un lugar hacia el servicio por clase de prioridad",
+        "# TYPE gateway_fair_queue_pending gauge",
+    ]
+    for route in routes:
+        pending = route.scheduler.pending_by_priority()
+        for priority in settings.PRIORITY_CLASSES:
+            lines.append(
+                f"gateway_fair_queue_pending{format_labels(service=route.name, priority=priority)} "
+                f"{pending.get(priority, 0)}"
+            )
+    return lines
@@ -0,0 +1,123 @@
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Tuple
+from uuid import UUID
+
+# Encabezado de identidad firmado de la solicitud en curso (ver signed_identity);
+# se reenvía al servicio en lugar de que este vuelva a validar el token
+identity_header_var: ContextVar[Optional[str]] = ContextVar("identity_header", default=None)
+
+# Tenant verificado de la solicitud en curso (del token o de la ruta, ver
+# resolve_identity); reparte entre tenants la concurrencia hacia los
+# servicios (ver FairScheduler)
+tenant_var: ContextVar[str] = ContextVar("tenant", default="")
+
+# Segmento que marca el tenant en las rutas de tenant de un servicio
+TENANT_SEGMENT = "{tenant}"
+
+
+@dataclass(frozen=True)
+class Identity:
+    """Identidad verificada de una solicitud (usuario y tenant)."""
+
+    subject: str = ""
+    tenant: str = ""
+
+    @property
+    def key(self) -> str:
+        return f"{self.tenant}:{self.subject}"
+
+
+def _is_uuid(value: str) -> bool:
+    try:
+        UUID(value)
+    except ValueError:
+        return False
+    return True
+
+
+@dataclass(frozen=True)
+class TenantPath:
+    """
+    Rutas de un servicio que llevan el tenant en un segmento, por ejemplo
+    "{tenant}/*" (ej: "{tenant_id}/patients") o "tenants/{tenant}". En el
+    patrón, "*" coincide con un segmento cualquiera y también coinciden las
+    rutas que están bajo él.
+    """
+
+    segments: Tuple[str, ...]
+    index: int
+
+    @classmethod
+    def parse(cls, pattern: str) -> "TenantPath":
+        """Crea el patrón a partir de la configuración de un servicio."""
+        segments = tuple(pattern.strip("/").split("/"))
+        if segments.count(TENANT_SEGMENT) != 1:
+            raise ValueError(f"La ruta de tenant {pattern} debe tener un único segmento {TENANT_SEGMENT}")
+        return cls(segments=segments, index=segments.index(TENANT_SEGMENT))
+
+    def extract(self, path: str) -> str:
+        """
+        Obtiene el tenant de una ruta relativa al servicio.
+
+        Returns:
+            El identificador del tenant (un UUID), o una cadena vacía si la
+            ruta no coincide con el patrón
+        """
+        parts = path.split("/")
+        if len(parts) < len(self.segments):
+            return ""
+        for expected, part in zip(self.segments, parts):
+            if expected not in ("*", TENANT_SEGMENT) and expected != part:
+                return ""
+        tenant = parts[self.index]
+        return tenant if len(tenant) == 36 and _is_uuid(tenant) else ""
+
+
+def extract_tenant(
+    path: str,
+    payload: Optional[Dict[str, Any]] = None,
+    tenant_paths: Iterable[TenantPath] = (),
+) -> str:
+    """
+    Obtiene el tenant de la solicitud: del token verificado o del segmento de
+    tenant de la ruta según los patrones del servicio. Los encabezados del
+    cliente (ej: X-Tenant-ID) no se usan, porque el cliente podría elegir
+    cualquier tenant y escapar de los límites por tenant.
+
+    Args:
+        path: La ruta relativa al servicio
+        payload: El payload del token verificado, si la ruta es protegida
+        tenant_paths: Las rutas del servicio que llevan el tenant
+
+    Returns:
+        El identificador del tenant, o una cadena vacía si no se conoce
+    """
+    if payload and payload.get("tenant_id"):
+        return str(payload["tenant_id"])
+
+    for tenant_path in tenant_paths:
+        tenant = tenant_path.extract(path)
+        if tenant:
+            return tenant
+    return ""
+
+
+def resolve_identity(
+    path: str,
+    payload: Optional[Dict[str, Any]] = None,
+    tenant_paths: Iterable[TenantPath] = (),
+) -> Identity:
+    """
+    Construye la identidad de la solicitud a partir del token verificado.
+
+    Args:
+        path: La ruta relativa al servicio
+        payload: El payload del token verificado, si la ruta es protegida
+        tenant_paths: Las rutas del servicio que llevan el tenant
+
+    Returns:
+        La identidad (usuario y tenant) de la solicitud
+    """
+    subject = str(payload.get("sub", "")) if payload else ""
+    return Identity(subject=subject, tenant=extract_tenant(path, payload, tenant_paths))
@@ -1,78 +1,676 @@
+import asyncio
 import httpx
+import json
+import math
+import time
 from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from app.config.settings import settings
+from app.utils.clients import get_client
+from app.utils.concurrency import OVERLOAD_STATUS
+from app.utils.balancer import Replica
+from app.utils.deadline import DEADLINE_HEADER, deadline_var, format_deadline, remaining
+from app.utils.fair_queue import PRIORITY_HEADER
+from app.utils.identity import identity_header_var, tenant_var
+from app.utils.logging_config import REQUEST_ID_HEADER, request_id_var
+from app.utils.metrics import Histogram
+from app.utils.retry import (
+    IDEMPOTENT_METHODS,
+    RETRY_BUDGET_EXHAUSTED,
+    UPSTREAM_HEDGE_WINS,
+    UPSTREAM_RETRIES,
+    backoff_delay,
+)
+from app.utils.routing import ServiceRoute, split_service_path
+from app.utils.shadow import ShadowComparison, get_shadow_mirror
+from app.utils.signed_identity import IDENTITY_HEADER
 import logging
 
 # Configurar logging
 logger = logging.getLogger("gateway-service")
 
+# Encabezados hop-by-hop (RFC 7230, sección 6.1): solo son válidos para una
+# conexión y no deben reenviarse en ninguna dirección
+HOP_BY_HOP_HEADERS = frozenset({
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "proxy-connection",
+    "te",
+    "trailer",
+    "trailers",
+    "transfer-encoding",
+    "upgrade",
+})
 
-async def forward_request_to_service(request: Request, service_url: str) -> Response:
+# Errores en los que la solicitud idempotente puede repetirse: no se pudo
+# conectar o la conexión reutilizada se cerró antes de recibir la respuesta
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError)
+
+# Tiempos de la conexión con los servicios, medidos con los eventos de trace de httpx
+UPSTREAM_CONNECT_SECONDS = Histogram(
+    "gateway_upstream_connect_seconds",
+    "Tiempo de establecer una conexión nueva (TCP y TLS) con el servicio",
+    ("service",),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+UPSTREAM_READ_SECONDS = Histogram(
+    "gateway_upstream_read_seconds",
+    "Tiempo desde el envío de la solicitud hasta recibir los encabezados de la respuesta del servicio",
+    ("service",),
+)
+
+
+class UpstreamTimer:
+    """
+    Callback de trace de httpx que registra el tiempo de conexión y el de
+    espera de la respuesta de cada solicitud al servicio.
+    """
+
+    __slots__ = ("connect", "read", "_started", "_connecting")
+
+    def __init__(self, service_name: str):
+        self.connect = UPSTREAM_CONNECT_SECONDS.labels(service_name)
+        self.read = UPSTREAM_READ_SECONDS.labels(service_name)
+        self._started = 0.0
+        self._connecting = 0.0
+
+    async def __call__(self, event_name: str, info: dict) -> None:
+        now = time.perf_counter()
+        if event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+            # TCP y TLS se suman en una sola observación por conexión
+            self._connecting += now - self._started
+        elif event_name.endswith(".receive_response_headers.complete"):
+            self.read.observe(now - self._started)
+        elif event_name.endswith(".started"):
+            if self._connecting and event_name.endswith(".send_request_headers.started"):
+                self.connect.observe(self._connecting)
+                self._connecting = 0.0
+            self._started = now
+
+
+def json_error(status_code: int, detail: str, headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Construye una respuesta de error en JSON generada por el gateway.
+
+    Args:
+        status_code: El código de estado HTTP
+        detail: El mensaje de error
+        headers: Encabezados adicionales (ej: Retry-After)
+
+    Returns:
+        La respuesta de error
+    """
+    return Response(
+        content=json.dumps({"detail": detail}).encode(),
+        status_code=status_code,
+        headers=headers,
+        media_type="application/json",
+    )
+
+
+def filter_headers(headers: Iterable[Tuple[str, str]], exclude: Iterable[str] = ()) -> List[Tuple[str, str]]:
+    """
+    Elimina los encabezados hop-by-hop, incluidos los que se declaran en el
+    encabezado Connection, conservando los encabezados repetidos (Set-Cookie).
+
+    Args:
+        headers: Pares (nombre, valor) de los encabezados
+        exclude: Nombres adicionales a eliminar (en minúsculas)
+
+    Returns:
+        La lista de encabezados que pueden reenviarse
+    """
+    headers = list(headers)
+    dropped = set(HOP_BY_HOP_HEADERS)
+    dropped.update(exclude)
+    for name, value in headers:
+        if name.lower() == "connection":
+            dropped.update(token.strip().lower() for token in value.split(","))
+
+    return [(name, value) for name, value in headers if name.lower() not in dropped]
+
+
+def should_stream_body(headers) -> bool:
+    """
+    Indica si el cuerpo de un mensaje debe transmitirse por partes en lugar de
+    leerse completo en memoria (cuerpos grandes o de longitud desconocida).
+
+    Args:
+        headers: Los encabezados del mensaje
+
+    Returns:
+        True si el cuerpo debe transmitirse en streaming
+    """
+    if not settings.PROXY_STREAMING:
+        return False
+    content_length = headers.get("content-length")
+    if content_length is None:
+        return "chunked" in headers.get("transfer-encoding", "").lower()
+    try:
+        return int(content_length) > settings.PROXY_STREAM_THRESHOLD
+    except ValueError:
+        return False
+
+
+async def iter_upstream_body(response: httpx.Response, service_name: str) -> AsyncIterator[bytes]:
+    """
+    Transmite el cuerpo de la respuesta del servicio sin decodificarlo
+    (los bytes comprimidos se reenvían tal cual).
+    """
+    try:
+        async for chunk in response.aiter_raw():
+            yield chunk
+    except httpx.RequestError as e:
+        logger.error("Error al transmitir la respuesta del servicio %s: %s", service_name, e)
+        raise
+    finally:
+        await response.aclose()
+
+
+async def build_response(upstream: httpx.Response, service_name: str) -> Response:
+    """
+    Construye la respuesta del gateway a partir de la respuesta del servicio.
+    Las respuestas pequeñas se leen completas; las grandes o de longitud
+    desconocida se devuelven como StreamingResponse.
+
+    Args:
+        upstream: La respuesta del servicio (abierta en modo stream)
+        service_name: El nombre del servicio
+
+    Returns:
+        La respuesta para el cliente
+    """
+    headers = filter_headers(upstream.headers.multi_items())
+
+    stream = settings.PROXY_STREAMING and (
+        "content-length" not in upstream.headers or should_stream_body(upstream.headers)
+    )
+    if stream:
+        response = StreamingResponse(
+            iter_upstream_body(upstream, service_name),
+            status_code=upstream.status_code,
+            background=BackgroundTask(upstream.aclose),
+        )
+    else:
+        try:
+            content = b"".join([chunk async for chunk in upstream.aiter_raw()])
+        finally:
+            await upstream.aclose()
+        response = Response(content=content, status_code=upstream.status_code)
+        # Starlette ya calculó Content-Length a partir de los bytes recibidos
+        headers = [(name, value) for name, value in headers if name.lower() != "content-length"]
+
+    response.raw_headers = response.raw_headers + [
+        (name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers
+    ]
+    return response
+
+
+def release_after_body(response: Response, release: Callable[[], None]) -> bool:
+    """
+    Llama a `release` (una sola vez) cuando termina de enviarse el cuerpo de
+    una respuesta transmitida en streaming: al completarse, al cancelarse
+    (ej: el cliente se desconectó) o al descartarse la respuesta sin enviarla.
+
+    Args:
+        response: La respuesta para el cliente
+        release: La función que libera los recursos de la solicitud
+
+    Returns:
+        False si la respuesta no se transmite en streaming (el llamador debe
+        liberar de inmediato)
+    """
+    if not isinstance(response, StreamingResponse):
+        return False
+    released = False
+
+    def release_once() -> None:
+        nonlocal released
+        if not released:
+            released = True
+            release()
+
+    body = response.body_iterator
+    background = response.background
+
+    async def iterate() -> AsyncIterator[bytes]:
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            release_once()
+
+    async def close() -> None:
+        try:
+            if background is not None:
+                await background()
+        finally:
+            release_once()
+
+    response.body_iterator = iterate()
+    response.background = BackgroundTask(close)
+    return True
+
+
+def upstream_headers(request: Request) -> List[Tuple[str, str]]:
+    """
+    Encabezados de la solicitud que se envían al servicio (sin el plazo, que
+    depende del destino).
+
+    Args:
+        request: La solicitud entrante
+
+    Returns:
+        Los encabezados del cliente sin los hop-by-hop, con el ID de la
+        solicitud y la identidad firmada por el gateway
+    """
+    # Eliminar encabezados hop-by-hop y el host, que corresponde al gateway
+    # El encabezado de identidad y el plazo solo puede generarlos el gateway:
+    # los que envíe el cliente se descartan
+    headers = filter_headers(request.headers.items(), exclude=("host", IDENTITY_HEADER, DEADLINE_HEADER))
+    # El cuerpo de la respuesta se reenvía sin decodificar: si el cliente no
+    # acepta compresión, el servicio tampoco debe comprimir
+    if not any(name.lower() == "accept-encoding" for name, _ in headers):
+        headers.append(("accept-encoding", "identity"))
+    # Propagar el ID de la solicitud para correlacionar los logs de los servicios
+    request_id = request_id_var.get()
+    if request_id and not any(name.lower() == REQUEST_ID_HEADER for name, _ in headers):
+        headers.append((REQUEST_ID_HEADER, request_id))
+    identity_header = identity_header_var.get()
+    if identity_header:
+        headers.append((IDENTITY_HEADER, identity_header))
+    return headers
+
+
+async def start_shadow(request: Request, route: ServiceRoute, path: str) -> Optional[ShadowComparison]:
+    """
+    Copia la solicitud a la versión candidata del servicio si entra en el
+    porcentaje configurado (sin esperar la respuesta).
+
+    Args:
+        request: La solicitud entrante
+        route: La ruta del servicio (con su destino en sombra)
+        path: La ruta relativa al servicio
+
+    Returns:
+        La comparación a la que se le informa el resultado de la solicitud
+        original, o None si no se copió
+    """
+    mirror = get_shadow_mirror()
+    # Los cuerpos transmitidos en streaming no pueden enviarse dos veces
+    if mirror is None or not route.shadow.sampled(request.method) or should_stream_body(request.headers):
+        return None
+    body = await request.body()
+    target = f"/{path}?{request.url.query}" if request.url.query else f"/{path}"
+    return mirror.mirror(route, request.method, target, upstream_headers(request), body)
+
+
+async def forward_request_to_service(
+    request: Request,
+    service_url: str,
+    service_name: Optional[str] = None,
+    path: Optional[str] = None,
+    raise_connect_errors: bool = False,
+) -> Response:
     """
     Reenvía una solicitud a un servicio específico y devuelve la respuesta.
-    
+
     Args:
         request: La solicitud entrante
         service_url: La URL base del servicio
-    
+        service_name: El nombre del servicio (si el router ya resolvió la ruta)
+        path: La ruta relativa al servicio (si el router ya resolvió la ruta)
+        raise_connect_errors: Propagar los errores de RETRYABLE_ERRORS en lugar
+            de responder 503 (para reintentar la solicitud)
+
     Returns:
         La respuesta del servicio
     """
-    # Extraer la ruta de la URL
-    path = request.url.path
-    
-    # Obtener el nombre del servicio de la ruta (primer segmento después de /)
-    service_name = path.split('/')[1] if len(path.split('/')) > 1 else ''
-    
-    # Eliminar el prefijo del servicio de la ruta (ej: /auth/users -> /users)
-    path_without_service = '/' + '/'.join(path.split('/')[2:]) if len(path.split('/')) > 2 else '/'
-    
+    # Separar el prefijo del servicio de la ruta (ej: /auth/users -> users)
+    # solo si el router no lo hizo ya
+    if service_name is None or path is None:
+        service_name, path = split_service_path(request.url.path)
+
     # Construir la URL de destino
-    target_path = f"{service_url}{path_without_service}"
+    target_path = f"{service_url}/{path}"
     if request.url.query:
         target_path = f"{target_path}?{request.url.query}"
-    
-    logger.debug(f"Reenviando solicitud a {service_name}: {path} -> {target_path}")
-    
-    # Obtener el cuerpo de la solicitud
-    body = await request.body()
-    
-    # Obtener los encabezados de la solicitud
-    headers = dict(request.headers)
-    # Eliminar encabezados que podrían causar problemas
-    headers.pop("host", None)
-    
+
+    logger.debug("Reenviando solicitud a %s: %s -> %s", service_name, request.url.path, target_path)
+
+    # Obtener el cuerpo de la solicitud: los cuerpos grandes se transmiten
+    # al servicio a medida que llegan, sin acumularlos en memoria
+    if should_stream_body(request.headers):
+        body = request.stream()
+    else:
+        body = await request.body()
+
+    headers = upstream_headers(request)
+    # Propagar el plazo de la solicitud; el tiempo de espera de la conexión
+    # con el servicio es el que le queda al plazo
+    timeout = httpx.USE_CLIENT_DEFAULT
+    deadline = deadline_var.get()
+    if deadline is not None:
+        headers.append((DEADLINE_HEADER, format_deadline(deadline)))
+        budget = max(remaining(), 0.001)
+        timeout = httpx.Timeout(budget, connect=min(settings.UPSTREAM_CONNECT_TIMEOUT, budget))
+
     try:
-        # Crear un cliente httpx para la solicitud
-        async with httpx.AsyncClient() as client:
-            # Reenviar la solicitud al servicio de destino
-            response = await client.request(
-                method=request.method,
-                url=target_path,
-                headers=headers,
-                content=body,
-                cookies=request.cookies,
-                follow_redirects=True,
-                timeout=30.0  # Tiempo de espera de 30 segundos
-            )
-            
-            # Crear una respuesta con el contenido del servicio de destino
-            return Response(
-                content=response.content,
-                status_code=response.status_code,
-                headers=dict(response.headers),
-                media_type=response.headers.get("content-type")
-            )
-    except httpx.RequestError as e:
-        logger.error(f"Error al conectar con el servicio {service_name}: {str(e)}")
-        return Response(
-            content=f"{{\"detail\": \"Error al conectar con el servicio {service_name}: {str(e)}\"}}".encode(),
-            status_code=503,  # Service Unavailable
-            media_type="application/json"
+        # Reutilizar el cliente del servicio (pool de conexiones con keep-alive)
+        client = get_client(service_name)
+
+        # Reenviar la solicitud al servicio de destino
+        # Las cookies viajan en el encabezado Cookie; las redirecciones se
+        # configuran en el cliente
+        upstream_request = client.build_request(
+            method=request.method,
+            url=target_path,
+            headers=headers,
+            content=body,
+            timeout=timeout,
+            extensions={"trace": UpstreamTimer(service_name)},
         )
+        response = await client.send(upstream_request, stream=True)
+
+        # Crear una respuesta con el contenido del servicio de destino
+        return await build_response(response, service_name)
+    except httpx.RequestError as e:
+        if raise_connect_errors and isinstance(e, RETRYABLE_ERRORS):
+            raise
+        if isinstance(e, httpx.TimeoutException) and not isinstance(e, httpx.ConnectTimeout):
+            logger.error("El servicio %s no respondió a tiempo: %s", service_name, e)
+            return upstream_timeout(service_name)
+        logger.error("Error al conectar con el servicio %s: %s", service_name, e)
+        return upstream_unavailable(service_name, e)
     except Exception as e:
-        logger.error(f"Error inesperado al procesar la solicitud: {str(e)}")
+        logger.error("Error inesperado al procesar la solicitud: %s", e)
         return Response(
             content="{\"detail\": \"Error interno del servidor\"}".encode(),
             status_code=500,  # Internal Server Error
             media_type="application/json"
         )
+
+
+def upstream_unavailable(service_name: str, error: Exception) -> Response:
+    """Respuesta 503 cuando no se pudo conectar con el servicio."""
+    return json_error(503, f"Error al conectar con el servicio {service_name}: {error}")
+
+
+def upstream_timeout(service_name: str) -> Response:
+    """Respuesta 504 cuando el servicio no respondió dentro del plazo de la solicitud."""
+    return json_error(504, f"El servicio {service_name} no respondió a tiempo")
+
+
+async def discard_response(response: Response) -> None:
+    """Libera la conexión de una respuesta que no se enviará al cliente."""
+    if response.background is not None:
+        await response.background()
+
+
+# Liberaciones de respuestas de solicitudes duplicadas que terminaron tras cancelarse
+_discarding: Set[asyncio.Task] = set()
+
+
+def _discard_later(task: asyncio.Task) -> None:
+    """Libera la respuesta de una solicitud cancelada que igual llegó a terminar."""
+    if task.cancelled() or task.exception() is not None:
+        return
+    discard = asyncio.ensure_future(discard_response(task.result()))
+    _discarding.add(discard)
+    discard.add_done_callback(_discarding.discard)
+
+
+async def discard_unused(tasks: Iterable[Optional[asyncio.Task]], returned: Optional[Response]) -> None:
+    """
+    Cancela las solicitudes que siguen en curso y libera las respuestas de
+    las que terminaron pero no se devuelven al cliente.
+
+    Args:
+        tasks: Las solicitudes enviadas (None si no se envió)
+        returned: La respuesta que se devuelve al cliente
+    """
+    for task in tasks:
+        if task is None:
+            continue
+        if not task.done():
+            task.cancel()
+            task.add_done_callback(_discard_later)
+        elif not task.cancelled() and task.exception() is None and task.result() is not returned:
+            await discard_response(task.result())
+
+
+async def send_to_replica(
+    request: Request,
+    route: ServiceRoute,
+    path: str,
+    replica: Replica,
+    raise_connect_errors: bool = False,
+) -> Response:
+    """
+    Envía la solicitud a una réplica y registra el resultado en el balanceador
+    (y la latencia de las respuestas correctas, usada por el hedging).
+
+    Args:
+        request: La solicitud entrante
+        route: La ruta del servicio
+        path: La ruta relativa al servicio
+        replica: La réplica elegida
+        raise_connect_errors: Propagar los errores que permiten reintentar
+
+    Returns:
+        La respuesta de la réplica
+    """
+    start = time.perf_counter()
+    try:
+        with route.balancer.track(replica):
+            response = await forward_request_to_service(
+                request, replica.url, route.name, path, raise_connect_errors=raise_connect_errors
+            )
+    except RETRYABLE_ERRORS:
+        route.balancer.record_result(replica, False)
+        raise
+
+    ok = response.status_code < 500
+    route.balancer.record_result(replica, ok)
+    if ok:
+        route.latency.observe(time.perf_counter() - start)
+    return response
+
+
+async def first_success(route: ServiceRoute, primary: asyncio.Task, hedge: asyncio.Task) -> Response:
+    """
+    Devuelve la primera respuesta correcta (no 5xx) entre la solicitud
+    original y la duplicada. Si ninguna es correcta devuelve la última
+    respuesta 5xx o propaga el último error. Las respuestas que no se
+    devuelven las libera `send_hedged`.
+    """
+    pending: Set[asyncio.Task] = {primary, hedge}
+    fallback: Optional[Response] = None
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is not None:
+                error = task.exception()
+                continue
+            response = task.result()
+            if response.status_code < 500:
+                if task is hedge:
+                    UPSTREAM_HEDGE_WINS.labels(route.name).inc()
+                return response
+            fallback = response
+    if fallback is not None:
+        return fallback
+    raise error
+
+
+async def send_hedged(
+    request: Request,
+    route: ServiceRoute,
+    path: str,
+    replica: Replica,
+    raise_connect_errors: bool = False,
+) -> Response:
+    """
+    Envía la solicitud a la réplica y, si la respuesta tarda más que el
+    percentil configurado de la latencia del servicio, envía un duplicado a
+    otra réplica y usa la primera respuesta correcta. La solicitud que pierde
+    se cancela o, si ya terminó, se libera su respuesta.
+    """
+    delay = route.latency.value if settings.HEDGE_ENABLED else None
+    if delay is None or len(route.balancer.replicas) < 2:
+        return await send_to_replica(request, route, path, replica, raise_connect_errors)
+
+    primary = asyncio.ensure_future(send_to_replica(request, route, path, replica, raise_connect_errors))
+    hedge: Optional[asyncio.Task] = None
+    response: Optional[Response] = None
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=max(delay, settings.HEDGE_MIN_DELAY))
+        if done:
+            response = primary.result()
+            return response
+
+        backup = route.balancer.choose(exclude=(replica,))
+        if backup is replica:
+            response = await primary
+            return response
+        if not route.retry_budget.withdraw():
+            RETRY_BUDGET_EXHAUSTED.labels(route.name).inc()
+            response = await primary
+            return response
+
+        UPSTREAM_RETRIES.labels(route.name, "hedge").inc()
+        logger.debug("Solicitud duplicada a %s tras %.1fms sin respuesta", backup.url, delay * 1000)
+        hedge = asyncio.ensure_future(send_to_replica(request, route, path, backup, raise_connect_errors))
+        response = await first_success(route, primary, hedge)
+        return response
+    finally:
+        await discard_unused((primary, hedge), response)
+
+
+async def send_idempotent(request: Request, route: ServiceRoute, path: str) -> Response:
+    """
+    Envía una solicitud idempotente (GET, HEAD, OPTIONS). Ante errores de
+    conexión se reintenta en otra réplica con backoff exponencial y jitter,
+    mientras lo permita el presupuesto de reintentos del servicio.
+
+    Args:
+        request: La solicitud entrante
+        route: La ruta del servicio
+        path: La ruta relativa al servicio
+
+    Returns:
+        La respuesta del servicio
+    """
+    # Leer el cuerpo una sola vez: los reintentos y duplicados lo reutilizan
+    await request.body()
+    route.retry_budget.deposit()
+    retries = settings.RETRY_MAX_RETRIES if settings.RETRY_ENABLED else 0
+    tried: List[Replica] = []
+    error: Optional[Exception] = None
+    for attempt in range(retries + 1):
+        if attempt:
+            if not route.retry_budget.withdraw():
+                RETRY_BUDGET_EXHAUSTED.labels(route.name).inc()
+                break
+            UPSTREAM_RETRIES.labels(route.name, "retry").inc()
+            await asyncio.sleep(backoff_delay(attempt))
+
+        replica = route.balancer.choose(exclude=tried)
+        tried.append(replica)
+        try:
+            # En el último intento el error de conexión se responde como 503
+            return await send_hedged(request, route, path, replica, raise_connect_errors=attempt < retries)
+        except RETRYABLE_ERRORS as e:
+            error = e
+            logger.warning("Error al conectar con %s (intento %d): %s", replica.url, attempt + 1, e)
+
+    logger.error("Error al conectar con el servicio %s: %s", route.name, error)
+    return upstream_unavailable(route.name, error)
+
+
+async def proxy_to_upstream(request: Request, route: ServiceRoute, path: str) -> Response:
+    """
+    Elige una réplica del servicio y le reenvía la solicitud, pasando por el
+    circuit breaker y el límite de concurrencia del servicio (con su cola por
+    prioridad y tenant). Las solicitudes idempotentes se reintentan ante
+    errores de conexión y pueden duplicarse (hedging). Si el servicio no
+    responde dentro del tiempo de espera de la ruta se responde 504.
+
+    Args:
+        request: La solicitud entrante
+        route: La ruta del servicio (con su balanceador y circuit breaker)
+        path: La ruta relativa al servicio
+
+    Returns:
+        La respuesta del servicio
+    """
+    # Con el circuito abierto se responde de inmediato sin contactar al servicio
+    breaker = route.breaker
+    if settings.BREAKER_ENABLED and not breaker.allow_request():
+        logger.warning("Circuito abierto para el servicio %s: solicitud rechazada", route.name)
+        return json_error(
+            503,
+            f"Servicio {route.name} no disponible temporalmente",
+            headers={"Retry-After": str(max(1, math.ceil(breaker.retry_after())))},
+        )
+
+    # Por encima del límite de concurrencia del servicio la solicitud espera
+    # su turno según su clase de prioridad y su tenant, o se rechaza
+    scheduler = route.scheduler if settings.CONCURRENCY_LIMIT_ENABLED else None
+    tenant = tenant_var.get()
+    if scheduler is not None and not await scheduler.acquire(
+        tenant, route.priority_for(request.method, path, request.headers.get(PRIORITY_HEADER))
+    ):
+        breaker.cancel()
+        logger.warning("Límite de concurrencia alcanzado para el servicio %s: solicitud rechazada", route.name)
+        return json_error(
+            503,
+            f"Servicio {route.name} saturado",
+            headers={"Retry-After": str(settings.CONCURRENCY_RETRY_AFTER)},
+        )
+
+    # Plazo de la solicitud según el tiempo de espera de la ruta; incluye los
+    # reintentos y se propaga a los servicios en X-Request-Deadline
+    timeout = route.timeout_for(request.method, path)
+    deadline_token = deadline_var.set(time.time() + timeout)
+    start = time.perf_counter()
+    try:
+        # Copia a la versión candidata del servicio, sin esperar su respuesta
+        shadow = await start_shadow(request, route, path) if route.shadow is not None else None
+        # Los cuerpos transmitidos en streaming no pueden reenviarse dos veces
+        if request.method in IDEMPOTENT_METHODS and not should_stream_body(request.headers):
+            dispatch = send_idempotent(request, route, path)
+        else:
+            dispatch = send_to_replica(request, route, path, route.balancer.choose())
+        try:
+            response = await asyncio.wait_for(dispatch, timeout)
+        except asyncio.TimeoutError:
+            logger.error("El servicio %s no respondió en %.1fs", route.name, timeout)
+            response = upstream_timeout(route.name)
+    except BaseException:
+        # Solicitud cancelada (ej: el cliente se desconectó): no cuenta como fallo
+        breaker.cancel()
+        if scheduler is not None:
+            scheduler.release(tenant, None)
+        raise
+    finally:
+        deadline_var.reset(deadline_token)
+
+    latency = time.perf_counter() - start
+    if shadow is not None:
+        shadow.set_primary(response.status_code, latency)
+    if scheduler is not None:
+        # El límite se ajusta con el tiempo hasta la respuesta, pero el lugar
+        # (del servicio y del tenant) se ocupa hasta que termina el cuerpo
+        scheduler.limiter.observe(latency, response.status_code not in OVERLOAD_STATUS)
+        if not release_after_body(response, lambda: scheduler.release(tenant, None)):
+            scheduler.release(tenant, None)
+    # Los errores de conexión y las respuestas 5xx cuentan como fallos
+    if settings.BREAKER_ENABLED:
+        breaker.record(response.status_code < 500, latency)
+    return response
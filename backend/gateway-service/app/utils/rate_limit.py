@@ -0,0 +1,432 @@
+import math
+import re
+import struct
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+from fastapi import Request
+from app.config.settings import settings
+from app.utils.identity import Identity
+from app.utils.metrics import register_collector
+from app.utils.shared_memory import SharedTable, shared_table
+import logging
+
+# Configurar logging
+logger = logging.getLogger("gateway-service")
+
+# Duración en segundos de cada unidad admitida en los límites ("100/minute")
+PERIODS = {"second": 1.0, "minute": 60.0, "hour": 3600.0, "day": 86400.0}
+
+# Claves de limitación admitidas en las reglas
+KEY_IP = "ip"
+KEY_USER = "user"
+KEY_TENANT = "tenant"
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Límite de solicitudes por periodo, con una ráfaga máxima."""
+
+    requests: int
+    period: float
+    burst: int
+
+    @property
+    def emission_interval(self) -> float:
+        return self.period / self.requests
+
+    @classmethod
+    def parse(cls, value: str) -> "RateLimit":
+        """
+        Convierte un límite en texto en un RateLimit.
+
+        Args:
+            value: El límite (ej: "100/minute" o "10/second;burst=20")
+
+        Returns:
+            El límite; la ráfaga por defecto es igual a la cantidad de solicitudes
+        """
+        rate, _, options = value.partition(";")
+        count, _, unit = rate.strip().partition("/")
+        if unit.strip() not in PERIODS:
+            raise ValueError(f"Periodo de límite desconocido: {value}")
+        requests = int(count)
+        burst = requests
+        if options.strip().startswith("burst="):
+            burst = int(options.strip()[len("burst="):])
+        period = PERIODS[unit.strip()]
+        # Un límite de 0 o negativo no tiene intervalo de emisión válido
+        if requests <= 0 or burst <= 0 or period <= 0:
+            raise ValueError(f"La cantidad, el periodo y la ráfaga deben ser positivos: {value}")
+        return cls(requests=requests, period=period, burst=burst)
+
+    @property
+    def policy(self) -> str:
+        return f"{self.requests};w={int(self.period)}"
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    """Resultado de comprobar un límite."""
+
+    allowed: bool
+    limit: RateLimit
+    remaining: int
+    reset_after: float
+    retry_after: float
+
+    def headers(self) -> Dict[str, str]:
+        """Encabezados RateLimit-* (y Retry-After si se rechazó la solicitud)."""
+        headers = {
+            "RateLimit-Limit": str(self.limit.requests),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(math.ceil(self.reset_after)),
+            "RateLimit-Policy": self.limit.policy,
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+def gcra_result(allowed: bool, tat: float, now: float, limit: RateLimit) -> RateLimitResult:
+    """
+    Calcula el resultado de GCRA a partir del "theoretical arrival time" (TAT)
+    guardado tras la comprobación.
+    """
+    interval = limit.emission_interval
+    allow_at = tat - limit.burst * interval
+    if allowed:
+        remaining = max(0, int((now - allow_at) / interval + 1e-9))
+        return RateLimitResult(True, limit, remaining, max(0.0, tat - now), 0.0)
+    retry_after = allow_at + interval - now
+    return RateLimitResult(False, limit, 0, max(0.0, tat - now), retry_after)
+
+
+class MemoryRateLimitStore:
+    """Estado de GCRA en memoria del proceso (un TAT por clave)."""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._tats: Dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._tats)
+
+    async def hit(self, key: str, limit: RateLimit, now: float) -> RateLimitResult:
+        interval = limit.emission_interval
+        tat = max(self._tats.get(key, now), now)
+        new_tat = tat + interval
+        if now < new_tat - limit.burst * interval:
+            return gcra_result(False, tat, now, limit)
+
+        self._tats[key] = new_tat
+        if len(self._tats) > self.max_keys:
+            self._purge(now)
+        return gcra_result(True, new_tat, now, limit)
+
+    async def refund(self, key: str, limit: RateLimit, now: float) -> None:
+        tat = self._tats.get(key)
+        if tat is not None:
+            self._tats[key] = max(now, tat - limit.emission_interval)
+
+    def _purge(self, now: float) -> None:
+        # Eliminar las claves cuya ráfaga ya se recuperó por completo y, si no
+        # alcanza, las más antiguas
+        for key in [key for key, tat in self._tats.items() if tat <= now]:
+            del self._tats[key]
+        while len(self._tats) > self.max_keys:
+            del self._tats[next(iter(self._tats))]
+
+
+class SharedMemoryRateLimitStore:
+    """
+    Estado de GCRA en memoria compartida entre los workers del gateway de una
+    misma máquina (ver shared_memory): el límite es el mismo con uno o con
+    varios workers, sin depender de Redis. Cada TAT vence cuando la ráfaga
+    de su clave se recuperó por completo.
+    """
+
+    _TAT = struct.Struct("<d")
+
+    def __init__(self, table: SharedTable):
+        self.table = table
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    async def hit(self, key: str, limit: RateLimit, now: float) -> RateLimitResult:
+        interval = limit.emission_interval
+
+        def gcra(value: Optional[bytes]):
+            tat = max(self._TAT.unpack(value)[0] if value is not None else now, now)
+            new_tat = tat + interval
+            if now < new_tat - limit.burst * interval:
+                return None, gcra_result(False, tat, now, limit)
+            return (self._TAT.pack(new_tat), new_tat), gcra_result(True, new_tat, now, limit)
+
+        return self.table.update(key, gcra)
+
+    async def refund(self, key: str, limit: RateLimit, now: float) -> None:
+        def give_back(value: Optional[bytes]):
+            if value is None:
+                return None, None
+            tat = max(now, self._TAT.unpack(value)[0] - limit.emission_interval)
+            return (self._TAT.pack(tat), tat), None
+
+        self.table.update(key, give_back)
+
+
+class RedisRateLimitStore:
+    """
+    Estado de GCRA compartido entre workers del gateway sobre Redis, para
+    aplicar un único límite global. Requiere el paquete opcional `redis`.
+    """
+
+    SCRIPT = """
+    local now = tonumber(ARGV[1])
+    local interval = tonumber(ARGV[2])
+    local burst = tonumber(ARGV[3])
+    local tat = tonumber(redis.call('GET', KEYS[1]) or ARGV[1])
+    if tat < now then tat = now end
+    local new_tat = tat + interval
+    if now < new_tat - burst * interval then
+        return {0, tostring(tat)}
+    end
+    redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+    return {1, tostring(new_tat)}
+    """
+
+    # Devuelve una solicitud al cupo (retrocede el TAT un intervalo)
+    REFUND_SCRIPT = """
+    local now = tonumber(ARGV[1])
+    local interval = tonumber(ARGV[2])
+    local tat = tonumber(redis.call('GET', KEYS[1]))
+    if not tat then return 0 end
+    local new_tat = tat - interval
+    if new_tat <= now then
+        redis.call('DEL', KEYS[1])
+    else
+        redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+    end
+    return 1
+    """
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_REDIS_URL requiere el paquete 'redis'") from e
+        self._redis = redis.from_url(url)
+        self._script = self._redis.register_script(self.SCRIPT)
+        self._refund_script = self._redis.register_script(self.REFUND_SCRIPT)
+
+    async def hit(self, key: str, limit: RateLimit, now: float) -> RateLimitResult:
+        allowed, tat = await self._script(keys=[key], args=[now, limit.emission_interval, limit.burst])
+        return gcra_result(bool(int(allowed)), float(tat), now, limit)
+
+    async def refund(self, key: str, limit: RateLimit, now: float) -> None:
+        await self._refund_script(keys=[key], args=[now, limit.emission_interval])
+
+
+def compile_path_pattern(path: str) -> "re.Pattern[str]":
+    """
+    Compila una ruta de la configuración de un servicio (ej: "*/patients").
+    En la ruta, "*" coincide con un segmento cualquiera; el patrón también
+    coincide con las rutas que están bajo ella.
+    """
+    segments = [r"[^/]+" if segment == "*" else re.escape(segment) for segment in path.split("/")]
+    return re.compile("/".join(segments) + r"(?:/.*)?")
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    """Límite configurado para las rutas de un servicio."""
+
+    name: str
+    pattern: "re.Pattern[str]"
+    limit: RateLimit
+    key: str = KEY_USER
+    methods: Optional[frozenset] = None
+
+    @classmethod
+    def from_config(cls, name: str, config: Mapping[str, Any]) -> "RateLimitRule":
+        """
+        Crea una regla a partir de la configuración de un servicio, por ejemplo
+        {"path": "*/patients", "methods": ["GET"], "limit": "120/minute", "key": "tenant"}.
+        En la ruta, "*" coincide con un segmento cualquiera.
+        """
+        key = config.get("key", KEY_USER)
+        if key not in (KEY_IP, KEY_USER, KEY_TENANT):
+            raise ValueError(f"Clave de límite desconocida: {key}")
+        methods = config.get("methods")
+        return cls(
+            name=name,
+            pattern=compile_path_pattern(config["path"]),
+            limit=RateLimit.parse(config["limit"]),
+            key=key,
+            methods=frozenset(method.upper() for method in methods) if methods else None,
+        )
+
+    def matches(self, method: str, path: str) -> bool:
+        if self.methods is not None and method not in self.methods:
+            return False
+        return self.pattern.fullmatch(path) is not None
+
+
+def build_rules(service: str, configs: Iterable[Mapping[str, Any]]) -> Tuple[RateLimitRule, ...]:
+    """Compila las reglas de límite configuradas para un servicio."""
+    return tuple(RateLimitRule.from_config(f"{service}:{index}", config) for index, config in enumerate(configs))
+
+
+def client_ip(request: Request) -> str:
+    """
+    Obtiene la IP del cliente. X-Forwarded-For solo se usa si el gateway está
+    detrás de un proxy de confianza (RATE_LIMIT_TRUST_FORWARDED), ya que el
+    cliente puede falsificarlo.
+    """
+    if settings.RATE_LIMIT_TRUST_FORWARDED:
+        forwarded_for = request.headers.get("x-forwarded-for")
+        if forwarded_for:
+            return forwarded_for.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+class RateLimiter:
+    """
+    Limitador de solicitudes del gateway (GCRA).
+
+    Las rutas públicas se limitan por IP del cliente y las protegidas por
+    usuario (`sub` del token) y por tenant, con los límites por defecto de la
+    configuración y las reglas específicas de cada servicio.
+    """
+
+    def __init__(self, store, fallback: Optional[MemoryRateLimitStore] = None, clock=time.time):
+        self.store = store
+        self.fallback = fallback
+        self.rejected = 0
+        self._clock = clock
+        self._defaults = {
+            KEY_IP: RateLimit.parse(settings.RATE_LIMIT_DEFAULT_IP) if settings.RATE_LIMIT_DEFAULT_IP else None,
+            KEY_USER: RateLimit.parse(settings.RATE_LIMIT_DEFAULT_USER) if settings.RATE_LIMIT_DEFAULT_USER else None,
+            KEY_TENANT: RateLimit.parse(settings.RATE_LIMIT_DEFAULT_TENANT) if settings.RATE_LIMIT_DEFAULT_TENANT else None,
+        }
+
+    def limits_for(
+        self, request: Request, route: Any, path: str, identity: Identity, is_public: bool
+    ) -> List[Tuple[str, RateLimit]]:
+        """
+        Devuelve las claves y límites que aplican a la solicitud. El tenant
+        es el del token verificado o el de la ruta (ver resolve_identity),
+        nunca uno elegido por el cliente en un encabezado.
+        """
+        values = {KEY_IP: None, KEY_USER: identity.subject, KEY_TENANT: identity.tenant}
+
+        def value_of(kind: str) -> Optional[str]:
+            if kind == KEY_IP and values[KEY_IP] is None:
+                values[KEY_IP] = client_ip(request)
+            return values[kind]
+
+        limits: List[Tuple[str, RateLimit]] = []
+        for rule in getattr(route, "rate_limits", ()):
+            if rule.matches(request.method, path):
+                value = value_of(rule.key)
+                if value:
+                    limits.append((f"rl:{rule.name}:{rule.key}:{value}", rule.limit))
+
+        for kind in ((KEY_IP,) if is_public else (KEY_USER, KEY_TENANT)):
+            limit = self._defaults[kind]
+            value = value_of(kind) if limit else None
+            if value:
+                limits.append((f"rl:{kind}:{value}", limit))
+        return limits
+
+    async def _hit(self, key: str, limit: RateLimit, now: float) -> RateLimitResult:
+        try:
+            return await self.store.hit(key, limit, now)
+        except Exception as e:
+            if self.fallback is None:
+                raise
+            # Si el almacén compartido falla se limita por proceso
+            logger.warning("Error en el almacén de rate limiting, se usa el estado local: %s", e)
+            return await self.fallback.hit(key, limit, now)
+
+    async def _refund(self, key: str, limit: RateLimit, now: float) -> None:
+        try:
+            await self.store.refund(key, limit, now)
+        except Exception as e:
+            # La solicitud ya se rechazó: sin devolución el cupo se recupera con el tiempo
+            logger.warning("Error al devolver el cupo de %s al almacén de rate limiting: %s", key, e)
+            if self.fallback is not None:
+                await self.fallback.refund(key, limit, now)
+
+    async def check(
+        self, request: Request, route: Any, path: str, identity: Identity, is_public: bool
+    ) -> Optional[RateLimitResult]:
+        """
+        Comprueba todos los límites que aplican a la solicitud. Si uno la
+        rechaza, se devuelve la solicitud al cupo de los que ya la habían
+        contado (ej: un tenant limitado no gasta el cupo de cada usuario).
+
+        Returns:
+            El resultado más restrictivo (el rechazado, o el de menor cupo
+            restante), o None si no aplica ningún límite
+        """
+        now = self._clock()
+        result: Optional[RateLimitResult] = None
+        counted: List[Tuple[str, RateLimit]] = []
+        for key, limit in self.limits_for(request, route, path, identity, is_public):
+            current = await self._hit(key, limit, now)
+            if not current.allowed:
+                self.rejected += 1
+                for counted_key, counted_limit in counted:
+                    await self._refund(counted_key, counted_limit, now)
+                return current
+            counted.append((key, limit))
+            if result is None or current.remaining < result.remaining:
+                result = current
+        return result
+
+
+# Limitador activo; None si RATE_LIMIT_ENABLED está desactivado
+_rate_limiter: Optional[RateLimiter] = None
+
+
+def create_rate_limiter() -> RateLimiter:
+    """
+    Crea el limitador con el almacén compartido entre instancias (Redis),
+    entre los workers de la máquina (memoria compartida) o local, según la
+    configuración.
+    """
+    if settings.RATE_LIMIT_REDIS_URL:
+        return RateLimiter(RedisRateLimitStore(settings.RATE_LIMIT_REDIS_URL), fallback=MemoryRateLimitStore())
+    table = shared_table("rate-limits", settings.RATE_LIMIT_MAX_KEYS, SharedMemoryRateLimitStore._TAT.size)
+    if table is not None:
+        return RateLimiter(SharedMemoryRateLimitStore(table))
+    return RateLimiter(MemoryRateLimitStore(settings.RATE_LIMIT_MAX_KEYS))
+
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """Devuelve el limitador activo, o None si está desactivado."""
+    global _rate_limiter
+    if _rate_limiter is None and settings.RATE_LIMIT_ENABLED:
+        _rate_limiter = create_rate_limiter()
+    return _rate_limiter
+
+
+def set_rate_limiter(limiter: Optional[RateLimiter]) -> None:
+    """Reemplaza el limitador activo."""
+    global _rate_limiter
+    _rate_limiter = limiter
+
+
+def _rate_limit_metrics() -> List[str]:
+    """Genera la métrica de solicitudes rechazadas por límite."""
+    rejected = _rate_limiter.rejected if _rate_limiter is not None else 0
+    return [
+        "# HELP gateway_rate_limited_total Solicitudes rechazadas por superar un límite",
+        "# TYPE gateway_rate_limited_total counter",
+        f"gateway_rate_limited_total {rejected}",
+    ]
+
+
+register_collector(_rate_limit_metrics)
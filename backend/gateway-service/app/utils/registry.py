@@ -0,0 +1,158 @@
+import asyncio
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional, Tuple
+from app.config.settings import settings
+from app.utils.clients import retire_client
+from app.utils.routing import RoutingTable, build_routing_table, get_routing_table, set_routing_table
+import logging
+
+# Configurar logging
+logger = logging.getLogger("gateway-service")
+
+# Nombres de servicio válidos (un solo segmento de la ruta del gateway)
+_SERVICE_NAME = re.compile(r"[A-Za-z0-9_-]+")
+
+
+def validate_services(services: Any) -> Dict[str, Dict[str, Any]]:
+    """
+    Verifica la estructura básica de la configuración de servicios.
+
+    Args:
+        services: La configuración leída (nombre del servicio -> configuración)
+
+    Returns:
+        La configuración de servicios
+
+    Raises:
+        ValueError: Si la configuración no es válida
+    """
+    if not isinstance(services, Mapping):
+        raise ValueError("La configuración de servicios debe ser un objeto (nombre -> configuración)")
+    for name, config in services.items():
+        if not isinstance(name, str) or not _SERVICE_NAME.fullmatch(name):
+            raise ValueError(f"Nombre de servicio inválido: {name!r}")
+        if not isinstance(config, Mapping) or not (config.get("url") or config.get("urls")):
+            raise ValueError(f"El servicio {name} debe tener 'url' o 'urls'")
+    return {name: dict(config) for name, config in services.items()}
+
+
+def parse_services(text: str, yaml_format: bool = False) -> Dict[str, Dict[str, Any]]:
+    """
+    Lee la configuración de servicios en JSON o YAML. Admite el objeto de
+    servicios directamente o dentro de una clave "services".
+
+    Args:
+        text: El contenido del archivo o de la variable de entorno
+        yaml_format: True para YAML, False para JSON
+
+    Returns:
+        La configuración de servicios validada
+    """
+    if yaml_format:
+        try:
+            import yaml
+        except ImportError:
+            raise RuntimeError("Para leer servicios en YAML se requiere el paquete 'PyYAML'")
+        data = yaml.safe_load(text)
+    else:
+        data = json.loads(text)
+    if isinstance(data, Mapping) and "services" in data:
+        data = data["services"]
+    return validate_services(data)
+
+
+def load_services_file(path: str) -> Dict[str, Dict[str, Any]]:
+    """Lee la configuración de servicios de un archivo JSON o YAML (según la extensión)."""
+    return parse_services(Path(path).read_text(encoding="utf-8"), path.endswith((".yaml", ".yml")))
+
+
+def load_service_definitions() -> Dict[str, Dict[str, Any]]:
+    """
+    Devuelve la configuración de servicios: del archivo SERVICES_FILE, de la
+    variable SERVICES_CONFIG (JSON) o, si no se configuró ninguna, de
+    `settings.SERVICES`.
+    """
+    if settings.SERVICES_FILE:
+        return load_services_file(settings.SERVICES_FILE)
+    if settings.SERVICES_CONFIG:
+        return parse_services(settings.SERVICES_CONFIG)
+    return settings.SERVICES
+
+
+def apply_services(services: Mapping[str, Mapping[str, Any]]) -> RoutingTable:
+    """
+    Construye la tabla de rutas nueva y la activa en una sola asignación. Los
+    servicios sin cambios de réplicas conservan su estado, y todos los que
+    siguen configurados conservan su cliente: el pool es por origen, así que
+    las conexiones a las réplicas que no cambiaron siguen abiertas y las de
+    las réplicas quitadas vencen solas (UPSTREAM_KEEPALIVE_EXPIRY). Los
+    clientes de los servicios eliminados se cierran cuando terminan sus
+    solicitudes en curso.
+
+    Args:
+        services: La configuración de servicios
+
+    Returns:
+        La tabla de rutas activa
+    """
+    current = get_routing_table()
+    # Si la configuración es inválida se lanza la excepción antes del reemplazo
+    table = build_routing_table(services, previous=current)
+    set_routing_table(table)
+
+    for name, route in current.services.items():
+        if table.get(name) is None:
+            # Esperar hasta los encabezados de las solicitudes en curso y luego sus cuerpos
+            retire_client(name, route.max_timeout)
+
+    added = sorted(set(table.services) - set(current.services))
+    removed = sorted(set(current.services) - set(table.services))
+    logger.info("Servicios recargados: %s (nuevos: %s, eliminados: %s)", list(table.services), added, removed)
+    return table
+
+
+class RegistryWatcher:
+    """
+    Revisa periódicamente el archivo de servicios y aplica los cambios sin
+    reiniciar el gateway. Una configuración inválida se registra y se ignora
+    (la tabla activa no cambia) hasta la siguiente modificación del archivo.
+    """
+
+    def __init__(self, path: str, interval: float = 5.0):
+        self.path = path
+        self.interval = interval
+        self._stamp = self._stat()
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def check(self) -> bool:
+        """
+        Aplica el archivo si cambió desde la última revisión.
+
+        Returns:
+            True si se aplicó una configuración nueva
+        """
+        stamp = self._stat()
+        if stamp is None or stamp == self._stamp:
+            return False
+        self._stamp = stamp
+        try:
+            apply_services(load_services_file(self.path))
+        except Exception as e:
+            logger.error("Configuración de servicios inválida en %s, se mantiene la actual: %s", self.path, e)
+            return False
+        return True
+
+    async def run(self) -> None:
+        """Tarea de fondo que revisa el archivo cada `interval` segundos."""
+        while True:
+            await asyncio.sleep(self.interval)
+            self.check()
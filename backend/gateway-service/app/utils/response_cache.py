@@ -0,0 +1,440 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from fastapi import Request, Response
+from app.config.settings import settings
+from app.utils.identity import Identity
+import logging
+
+# Configurar logging
+logger = logging.getLogger("gateway-service")
+
+# Encabezados de la solicitud que forman parte de la clave de caché
+# (la respuesta del servicio puede variar según ellos)
+VARY_HEADERS = ("accept", "accept-encoding", "origin")
+
+
+def parse_cache_control(value: str) -> Dict[str, Optional[str]]:
+    """
+    Convierte un encabezado Cache-Control en un diccionario de directivas.
+
+    Args:
+        value: El valor del encabezado (ej: "private, max-age=60")
+
+    Returns:
+        Las directivas en minúsculas con su argumento (o None)
+    """
+    directives: Dict[str, Optional[str]] = {}
+    for part in value.split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') or None
+    return directives
+
+
+def _seconds(value: Optional[str]) -> float:
+    try:
+        return max(0.0, float(value)) if value is not None else 0.0
+    except ValueError:
+        return 0.0
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Compara un encabezado If-None-Match con un ETag (comparación débil).
+    """
+    if not if_none_match:
+        return False
+    target = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == target:
+            return True
+    return False
+
+
+@dataclass
+class CachedResponse:
+    """Respuesta almacenada en la caché del gateway."""
+
+    status_code: int
+    headers: List[Tuple[str, str]]
+    body: bytes
+    etag: str
+    stored_at: float
+    max_age: float
+    stale_while_revalidate: float = 0.0
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(name) + len(value) for name, value in self.headers)
+
+    @property
+    def ttl(self) -> float:
+        return self.max_age + self.stale_while_revalidate
+
+    def age(self, now: float) -> float:
+        return max(0.0, now - self.stored_at)
+
+    def is_fresh(self, now: float) -> bool:
+        return self.age(now) < self.max_age
+
+    def is_usable(self, now: float) -> bool:
+        return self.age(now) < self.ttl
+
+    def to_bytes(self) -> bytes:
+        meta = {
+            "status_code": self.status_code,
+            "headers": self.headers,
+            "etag": self.etag,
+            "stored_at": self.stored_at,
+            "max_age": self.max_age,
+            "stale_while_revalidate": self.stale_while_revalidate,
+        }
+        return json.dumps(meta).encode() + b"\n" + self.body
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CachedResponse":
+        meta, _, body = data.partition(b"\n")
+        values = json.loads(meta)
+        values["headers"] = [tuple(header) for header in values["headers"]]
+        return cls(body=body, **values)
+
+
+class CacheBackend:
+    """Interfaz de los almacenes de la caché de respuestas."""
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        raise NotImplementedError
+
+    async def set(self, key: str, entry: CachedResponse) -> None:
+        raise NotImplementedError
+
+    async def delete_prefix(self, prefixes: Tuple[str, ...]) -> None:
+        """Elimina las entradas cuyas claves empiezan por alguno de los prefijos."""
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Almacén LRU en memoria limitado por la cantidad total de bytes."""
+
+    def __init__(self, max_bytes: int, clock: Callable[[], float] = time.time):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._clock = clock
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if not entry.is_usable(self._clock()):
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def set(self, key: str, entry: CachedResponse) -> None:
+        self._remove(key)
+        if entry.size > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self.size += entry.size
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.size
+
+    async def delete_prefix(self, prefixes: Tuple[str, ...]) -> None:
+        for key in [key for key in self._entries if key.startswith(prefixes)]:
+            self._remove(key)
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Almacén compartido entre instancias del gateway sobre Redis.
+    Requiere el paquete opcional `redis`.
+    """
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("RESPONSE_CACHE_REDIS_URL requiere el paquete 'redis'") from e
+        self._redis = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        data = await self._redis.get(key)
+        return CachedResponse.from_bytes(data) if data is not None else None
+
+    async def set(self, key: str, entry: CachedResponse) -> None:
+        await self._redis.set(key, entry.to_bytes(), px=max(1, int(entry.ttl * 1000)))
+
+    async def delete_prefix(self, prefixes: Tuple[str, ...]) -> None:
+        for prefix in prefixes:
+            async for key in self._redis.scan_iter(match=prefix + "*"):
+                await self._redis.delete(key)
+
+
+class ResponseCache:
+    """
+    Caché de respuestas GET del gateway.
+
+    La clave incluye el servicio, la ruta, la consulta, el usuario y el tenant
+    verificados, de modo que las respuestas nunca se comparten entre tenants
+    ni entre usuarios. Solo se guardan respuestas 200 que el servicio declara
+    cacheables con `Cache-Control: max-age` (o `s-maxage`); se respeta
+    `stale-while-revalidate` y se responde 304 a `If-None-Match` sin
+    contactar al servicio.
+    """
+
+    def __init__(
+        self,
+        local: CacheBackend,
+        shared: Optional[CacheBackend] = None,
+        max_entry_bytes: int = 1024 * 1024,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.local = local
+        self.shared = shared
+        self.max_entry_bytes = max_entry_bytes
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._clock = clock
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def build_key(request: Request, service: str, path: str, identity: Identity) -> str:
+        """
+        Construye la clave de caché de una solicitud. El prefijo legible
+        (servicio y ruta) permite invalidar por ruta.
+        """
+        vary = "\x1f".join(request.headers.get(name, "") for name in VARY_HEADERS)
+        digest = hashlib.sha256(
+            f"{identity.tenant}\x1f{identity.subject}\x1f{request.url.query}\x1f{vary}".encode()
+        ).hexdigest()
+        return f"{service}:/{path}|{digest}"
+
+    def entry_from_response(self, response: Response, now: float) -> Optional[CachedResponse]:
+        """
+        Convierte una respuesta del servicio en una entrada de caché, o
+        devuelve None si la respuesta no puede guardarse.
+        """
+        body = getattr(response, "body", None)
+        if response.status_code != 200 or body is None or len(body) > self.max_entry_bytes:
+            return None
+
+        headers = [(name.decode("latin-1"), value.decode("latin-1")) for name, value in response.raw_headers]
+        values = {name.lower(): value for name, value in headers}
+        directives = parse_cache_control(values.get("cache-control", ""))
+        if "no-store" in directives or "no-cache" in directives or "set-cookie" in values:
+            return None
+
+        max_age = _seconds(directives.get("s-maxage") or directives.get("max-age"))
+        if max_age <= 0:
+            return None
+
+        vary = {token.strip().lower() for token in values.get("vary", "").split(",") if token.strip()}
+        if not vary.issubset(VARY_HEADERS):
+            return None
+
+        etag = values.get("etag")
+        if etag is None:
+            etag = f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+            headers.append(("etag", etag))
+
+        return CachedResponse(
+            status_code=response.status_code,
+            headers=[(name, value) for name, value in headers if name.lower() != "content-length"],
+            body=body,
+            etag=etag,
+            stored_at=now,
+            max_age=max_age,
+            stale_while_revalidate=_seconds(directives.get("stale-while-revalidate")),
+        )
+
+    @staticmethod
+    def to_response(entry: CachedResponse, now: float, cache_status: str) -> Response:
+        """Construye la respuesta para el cliente a partir de una entrada."""
+        response = Response(content=entry.body, status_code=entry.status_code)
+        response.raw_headers = response.raw_headers + [
+            (name.lower().encode("latin-1"), value.encode("latin-1"))
+            for name, value in entry.headers + [("age", str(int(entry.age(now)))), ("x-cache", cache_status)]
+        ]
+        return response
+
+    @staticmethod
+    def not_modified_response(entry: CachedResponse, now: float) -> Response:
+        """Construye una respuesta 304 para una entrada cuyo ETag coincide."""
+        response = Response(status_code=304)
+        kept = {"etag", "cache-control", "vary", "expires", "last-modified"}
+        response.raw_headers = [
+            (name.lower().encode("latin-1"), value.encode("latin-1"))
+            for name, value in entry.headers + [("age", str(int(entry.age(now))))]
+            if name.lower() in kept or name == "age"
+        ]
+        return response
+
+    async def _guard(self, operation: Awaitable, description: str):
+        # Un fallo del almacén compartido no debe afectar a la solicitud
+        try:
+            return await operation
+        except Exception as e:
+            logger.warning("Error en la caché compartida (%s): %s", description, e)
+            return None
+
+    async def lookup(self, key: str, now: float) -> Optional[CachedResponse]:
+        """Busca una entrada utilizable en memoria y luego en el almacén compartido."""
+        entry = await self.local.get(key)
+        if entry is None and self.shared is not None:
+            entry = await self._guard(self.shared.get(key), "get")
+            if entry is not None:
+                await self.local.set(key, entry)
+        if entry is not None and not entry.is_usable(now):
+            return None
+        return entry
+
+    async def save(self, key: str, entry: CachedResponse) -> None:
+        """Guarda una entrada en memoria y en el almacén compartido."""
+        await self.local.set(key, entry)
+        if self.shared is not None:
+            await self._guard(self.shared.set(key, entry), "set")
+
+    async def invalidate(self, service: str, path: str) -> None:
+        """
+        Invalida las entradas bajo el primer segmento de la ruta (ej: todo el
+        tenant en "{tenant_id}/patients/..."). Se llama tras una escritura.
+        """
+        top = path.split("/", 1)[0]
+        prefixes = (f"{service}:/{top}/", f"{service}:/{top}|")
+        await self.local.delete_prefix(prefixes)
+        if self.shared is not None:
+            await self._guard(self.shared.delete_prefix(prefixes), "delete")
+
+    async def _refresh(self, key: str, fetch: Callable[[], Awaitable[Response]]) -> None:
+        try:
+            response = await fetch()
+            entry = self.entry_from_response(response, self._clock())
+            if entry is not None:
+                await self.save(key, entry)
+            elif response.background is not None:
+                # Liberar la conexión de una respuesta en streaming no consumida
+                await response.background()
+        except Exception as e:
+            logger.warning("Error al revalidar la entrada de caché %s: %s", key, e)
+
+    def _schedule_refresh(self, key: str, fetch: Callable[[], Awaitable[Response]]) -> None:
+        if key in self._refreshing:
+            return
+        task = asyncio.create_task(self._refresh(key, fetch))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def handle(
+        self,
+        request: Request,
+        service: str,
+        path: str,
+        identity: Identity,
+        fetch: Callable[[], Awaitable[Response]],
+    ) -> Response:
+        """
+        Responde una solicitud GET desde la caché o desde el servicio.
+
+        Args:
+            request: La solicitud entrante
+            service: El nombre del servicio
+            path: La ruta relativa al servicio
+            identity: La identidad verificada de la solicitud
+            fetch: Función que reenvía la solicitud al servicio
+
+        Returns:
+            La respuesta para el cliente
+        """
+        key = self.build_key(request, service, path, identity)
+        now = self._clock()
+        if_none_match = request.headers.get("if-none-match")
+
+        bypass = "no-cache" in parse_cache_control(request.headers.get("cache-control", ""))
+        entry = None if bypass else await self.lookup(key, now)
+        if entry is not None:
+            if entry.is_fresh(now):
+                self.hits += 1
+                cache_status = "HIT"
+            else:
+                self.stale_hits += 1
+                cache_status = "STALE"
+                self._schedule_refresh(key, fetch)
+
+            if etag_matches(if_none_match, entry.etag):
+                self.not_modified += 1
+                return self.not_modified_response(entry, now)
+            return self.to_response(entry, now, cache_status)
+
+        self.misses += 1
+        response = await fetch()
+        entry = self.entry_from_response(response, now)
+        if entry is None:
+            return response
+
+        await self.save(key, entry)
+        if etag_matches(if_none_match, entry.etag):
+            self.not_modified += 1
+            return self.not_modified_response(entry, now)
+        return self.to_response(entry, now, "MISS")
+
+    def stats(self) -> Dict[str, int]:
+        """Devuelve los contadores de la caché."""
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+        }
+
+
+# Caché activa; None si RESPONSE_CACHE_ENABLED está desactivado
+_response_cache: Optional[ResponseCache] = None
+
+
+def create_response_cache() -> ResponseCache:
+    """
+    Crea la caché de respuestas según la configuración.
+
+    Returns:
+        La caché con un almacén en memoria y, opcionalmente, uno compartido
+    """
+    shared = RedisCacheBackend(settings.RESPONSE_CACHE_REDIS_URL) if settings.RESPONSE_CACHE_REDIS_URL else None
+    return ResponseCache(
+        local=MemoryCacheBackend(settings.RESPONSE_CACHE_MAX_BYTES),
+        shared=shared,
+        max_entry_bytes=settings.RESPONSE_CACHE_MAX_ENTRY_BYTES,
+    )
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Devuelve la caché de respuestas activa, o None si está desactivada."""
+    global _response_cache
+    if _response_cache is None and settings.RESPONSE_CACHE_ENABLED:
+        _response_cache = create_response_cache()
+    return _response_cache
+
+
+def set_response_cache(cache: Optional[ResponseCache]) -> None:
+    """Reemplaza la caché de respuestas activa."""
+    global _response_cache
+    _response_cache = cache
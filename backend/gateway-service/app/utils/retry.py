@@ -0,0 +1,144 @@
+import random
+import time
+from collections import deque
+from typing import Callable, Deque, Optional
+from app.config.settings import settings
+from app.utils.metrics import Counter
+
+# Métodos que pueden repetirse o duplicarse sin efectos adicionales en el servicio
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+# Reintentos y solicitudes duplicadas (hedging) por servicio
+UPSTREAM_RETRIES = Counter(
+    "gateway_upstream_retries_total",
+    "Solicitudes adicionales enviadas al servicio (kind = retry o hedge)",
+    ("service", "kind"),
+)
+UPSTREAM_HEDGE_WINS = Counter(
+    "gateway_upstream_hedge_wins_total",
+    "Respuestas en las que la solicitud duplicada llegó antes que la original",
+    ("service",),
+)
+RETRY_BUDGET_EXHAUSTED = Counter(
+    "gateway_retry_budget_exhausted_total",
+    "Reintentos o solicitudes duplicadas descartados por agotar el presupuesto del servicio",
+    ("service",),
+)
+
+
+class RetryBudget:
+    """
+    Presupuesto de reintentos de un servicio.
+
+    Cada solicitud original deposita `ratio` fichas y cada reintento o
+    solicitud duplicada consume una, de modo que las solicitudes adicionales
+    no superan `ratio` de las originales aunque el servicio esté fallando.
+    Además se reponen `min_per_second` fichas por segundo para que los
+    servicios con poco tráfico también puedan reintentar. El saldo no supera
+    `max_balance`, para no acumular una ráfaga de reintentos en periodos
+    tranquilos.
+    """
+
+    def __init__(
+        self,
+        ratio: float = 0.1,
+        min_per_second: float = 5.0,
+        max_balance: float = 100.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_balance = max_balance
+        self._clock = clock
+        self._balance = max_balance
+        self._updated = clock()
+
+    @classmethod
+    def from_settings(cls) -> "RetryBudget":
+        """Crea un presupuesto con los valores configurados."""
+        return cls(
+            ratio=settings.RETRY_BUDGET_RATIO,
+            min_per_second=settings.RETRY_BUDGET_MIN_PER_SECOND,
+            max_balance=settings.RETRY_BUDGET_MAX_BALANCE,
+        )
+
+    @property
+    def balance(self) -> float:
+        now = self._clock()
+        self._balance = min(self.max_balance, self._balance + (now - self._updated) * self.min_per_second)
+        self._updated = now
+        return self._balance
+
+    def deposit(self) -> None:
+        """Registra una solicitud original."""
+        self._balance = min(self.max_balance, self._balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        """
+        Reserva una ficha para un reintento o una solicitud duplicada.
+
+        Returns:
+            True si el presupuesto lo permite
+        """
+        if self.balance < 1.0:
+            return False
+        self._balance -= 1.0
+        return True
+
+
+class LatencyPercentile:
+    """
+    Percentil de la latencia de las últimas respuestas correctas de un
+    servicio; indica cuánto esperar antes de enviar una solicitud duplicada.
+    El percentil se recalcula cada `refresh_every` observaciones para no
+    ordenar la ventana en cada solicitud.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 0.95,
+        window_size: int = 200,
+        min_samples: int = 20,
+        refresh_every: int = 16,
+    ):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.refresh_every = refresh_every
+        self._window: Deque[float] = deque(maxlen=window_size)
+        self._pending = 0
+        self._value: Optional[float] = None
+
+    def observe(self, latency: float) -> None:
+        self._window.append(latency)
+        self._pending += 1
+        if self._pending >= self.refresh_every or self._value is None:
+            self._refresh()
+
+    def _refresh(self) -> None:
+        self._pending = 0
+        if len(self._window) < self.min_samples:
+            self._value = None
+            return
+        latencies = sorted(self._window)
+        self._value = latencies[min(len(latencies) - 1, int(self.percentile * len(latencies)))]
+
+    @property
+    def value(self) -> Optional[float]:
+        """El percentil actual, o None si aún no hay suficientes muestras."""
+        return self._value
+
+
+def backoff_delay(attempt: int, rng: Optional[random.Random] = None) -> float:
+    """
+    Espera antes de un reintento con backoff exponencial y jitter completo
+    (un valor al azar entre 0 y el tope del intento).
+
+    Args:
+        attempt: El número de reintento (1 para el primero)
+        rng: Generador de números aleatorios (para las pruebas)
+
+    Returns:
+        Los segundos a esperar
+    """
+    cap = min(settings.RETRY_BACKOFF_MAX, settings.RETRY_BACKOFF_BASE * 2 ** (attempt - 1))
+    return (rng or random).uniform(0, cap)
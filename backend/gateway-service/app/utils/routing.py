@@ -0,0 +1,398 @@
+import random
+import re
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+from app.config.settings import settings
+from app.utils.balancer import LoadBalancer, replica_metrics
+from app.utils.breaker import CircuitBreaker, breaker_metrics
+from app.utils.concurrency import AdaptiveConcurrencyLimit, concurrency_metrics
+from app.utils.fair_queue import FairScheduler, fair_queue_metrics
+from app.utils.identity import TenantPath
+from app.utils.metrics import register_collector
+from app.utils.rate_limit import RateLimitRule, build_rules, compile_path_pattern
+from app.utils.retry import IDEMPOTENT_METHODS, LatencyPercentile, RetryBudget
+
+
+class PathMatcher:
+    """
+    Trie por segmentos de ruta para los prefijos públicos de un servicio.
+
+    Una ruta coincide si es igual a un prefijo o si empieza por el prefijo
+    seguido de '/', igual que `is_public_path`, pero el costo depende de la
+    profundidad de la ruta y no de la cantidad de prefijos configurados.
+    """
+
+    __slots__ = ("_root", "prefixes")
+
+    # Marca de nodo terminal dentro del trie
+    _END = ""
+
+    def __init__(self, prefixes: Iterable[str] = ()):
+        self.prefixes: Tuple[str, ...] = tuple(prefixes)
+        self._root: Dict[str, Any] = {}
+        for prefix in self.prefixes:
+            node = self._root
+            for segment in prefix.split("/"):
+                node = node.setdefault(segment, {})
+            node[self._END] = True
+
+    def matches(self, path: str) -> bool:
+        """
+        Verifica si la ruta es igual o está bajo alguno de los prefijos.
+
+        Args:
+            path: La ruta relativa al servicio (sin barra inicial)
+
+        Returns:
+            True si la ruta coincide con algún prefijo
+        """
+        node = self._root
+        for segment in path.split("/"):
+            node = node.get(segment)
+            if node is None:
+                return False
+            if self._END in node:
+                return True
+        return False
+
+
+@dataclass(frozen=True)
+class TimeoutRule:
+    """Tiempo de espera configurado para algunas rutas de un servicio."""
+
+    pattern: "re.Pattern[str]"
+    timeout: float
+    methods: Optional[frozenset] = None
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any]) -> "TimeoutRule":
+        """
+        Crea una regla a partir de la configuración de un servicio, por ejemplo
+        {"path": "*/patients", "methods": ["GET"], "timeout": 10}.
+        """
+        timeout = float(config["timeout"])
+        if timeout <= 0:
+            raise ValueError(f"Tiempo de espera inválido para {config['path']}: {timeout}")
+        methods = config.get("methods")
+        return cls(
+            pattern=compile_path_pattern(config["path"]),
+            timeout=timeout,
+            methods=frozenset(method.upper() for method in methods) if methods else None,
+        )
+
+    def matches(self, method: str, path: str) -> bool:
+        if self.methods is not None and method not in self.methods:
+            return False
+        return self.pattern.fullmatch(path) is not None
+
+
+@dataclass(frozen=True)
+class PriorityRule:
+    """Clase de prioridad configurada para algunas rutas de un servicio."""
+
+    pattern: "re.Pattern[str]"
+    priority: str
+    methods: Optional[frozenset] = None
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any]) -> "PriorityRule":
+        """
+        Crea una regla a partir de la configuración de un servicio, por ejemplo
+        {"path": "*/patients/export", "methods": ["GET"], "class": "bulk"}.
+        """
+        priority = config["class"]
+        if priority not in settings.PRIORITY_CLASSES:
+            raise ValueError(f"Clase de prioridad desconocida para {config['path']}: {priority}")
+        methods = config.get("methods")
+        return cls(
+            pattern=compile_path_pattern(config["path"]),
+            priority=priority,
+            methods=frozenset(method.upper() for method in methods) if methods else None,
+        )
+
+    def matches(self, method: str, path: str) -> bool:
+        if self.methods is not None and method not in self.methods:
+            return False
+        return self.pattern.fullmatch(path) is not None
+
+
+@dataclass(frozen=True)
+class ShadowTarget:
+    """
+    Versión candidata de un servicio que recibe una copia de una parte de
+    las solicitudes (tráfico en sombra); sus respuestas se descartan.
+    """
+
+    url: str
+    percent: float
+    methods: frozenset = IDEMPOTENT_METHODS
+    timeout: Optional[float] = None
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any]) -> "ShadowTarget":
+        """
+        Crea el destino a partir de la configuración de un servicio, por
+        ejemplo {"url": "http://dentist-canary:8002", "percent": 10}. Por
+        defecto solo se copian los métodos idempotentes (GET, HEAD, OPTIONS).
+        """
+        if not config.get("url"):
+            raise ValueError("La configuración de 'shadow' debe tener 'url'")
+        percent = float(config.get("percent", 100))
+        if not 0 <= percent <= 100:
+            raise ValueError(f"Porcentaje de tráfico en sombra inválido: {percent}")
+        timeout = float(config["timeout"]) if config.get("timeout") else None
+        if timeout is not None and timeout <= 0:
+            raise ValueError(f"Tiempo de espera inválido para el tráfico en sombra: {timeout}")
+        methods = config.get("methods")
+        return cls(
+            url=config["url"].rstrip("/"),
+            percent=percent,
+            methods=frozenset(method.upper() for method in methods) if methods else IDEMPOTENT_METHODS,
+            timeout=timeout,
+        )
+
+    def sampled(self, method: str) -> bool:
+        """Indica si se copia una solicitud con este método."""
+        return method in self.methods and (self.percent >= 100 or random.random() * 100 < self.percent)
+
+
+@dataclass(frozen=True)
+class ServiceRoute:
+    """Configuración inmutable de un servicio dentro de la tabla de rutas."""
+
+    name: str
+    urls: Tuple[str, ...]
+    public_paths: PathMatcher = field(default_factory=PathMatcher)
+    health_path: str = "/health"
+    rate_limits: Tuple[RateLimitRule, ...] = ()
+    # Rutas que llevan el tenant en un segmento (ej: "{tenant}/*")
+    tenant_paths: Tuple[TenantPath, ...] = ()
+    # Tiempo de espera del servicio (por defecto UPSTREAM_TIMEOUT) y de rutas específicas
+    timeout: Optional[float] = None
+    timeouts: Tuple[TimeoutRule, ...] = ()
+    # Clase de prioridad de rutas específicas (por defecto, la del encabezado o PRIORITY_DEFAULT_CLASS)
+    priorities: Tuple[PriorityRule, ...] = ()
+    # Copia de una parte del tráfico a una versión candidata del servicio
+    shadow: Optional[ShadowTarget] = None
+    # Estado de las réplicas (solicitudes en curso y salud); no forma parte
+    # de la identidad de la ruta
+    balancer: LoadBalancer = field(default=None, compare=False, repr=False)
+    breaker: CircuitBreaker = field(default=None, compare=False, repr=False)
+    limiter: AdaptiveConcurrencyLimit = field(default=None, compare=False, repr=False)
+    scheduler: FairScheduler = field(default=None, compare=False, repr=False)
+    retry_budget: RetryBudget = field(default=None, compare=False, repr=False)
+    latency: LatencyPercentile = field(default=None, compare=False, repr=False)
+
+    def __post_init__(self):
+        if self.timeout is None:
+            object.__setattr__(self, "timeout", settings.UPSTREAM_TIMEOUT)
+        if self.balancer is None:
+            object.__setattr__(self, "balancer", LoadBalancer(self.urls, settings.UPSTREAM_LB_STRATEGY))
+        if self.breaker is None:
+            object.__setattr__(self, "breaker", CircuitBreaker.from_settings(self.name))
+        if self.limiter is None:
+            object.__setattr__(self, "limiter", AdaptiveConcurrencyLimit.from_settings(self.name))
+        if self.scheduler is None:
+            object.__setattr__(self, "scheduler", FairScheduler.from_settings(self.limiter))
+        if self.retry_budget is None:
+            object.__setattr__(self, "retry_budget", RetryBudget.from_settings())
+        if self.latency is None:
+            object.__setattr__(
+                self,
+                "latency",
+                LatencyPercentile(settings.HEDGE_PERCENTILE, min_samples=settings.HEDGE_MIN_SAMPLES),
+            )
+
+    @property
+    def url(self) -> str:
+        """URL de la primera réplica (la URL del servicio si solo tiene una)."""
+        return self.urls[0]
+
+    def is_public(self, path: str) -> bool:
+        return self.public_paths.matches(path)
+
+    def timeout_for(self, method: str, path: str) -> float:
+        """
+        Tiempo de espera de una solicitud: el de la primera regla que
+        coincide con el método y la ruta, o el del servicio.
+
+        Args:
+            method: El método HTTP
+            path: La ruta relativa al servicio
+
+        Returns:
+            Los segundos que el gateway espera la respuesta del servicio
+        """
+        for rule in self.timeouts:
+            if rule.matches(method, path):
+                return rule.timeout
+        return self.timeout
+
+    def priority_for(self, method: str, path: str, requested: Optional[str] = None) -> str:
+        """
+        Clase de prioridad de una solicitud: la de la primera regla que
+        coincide con el método y la ruta, la pedida en X-Request-Priority si
+        es una clase conocida, o PRIORITY_DEFAULT_CLASS.
+
+        Args:
+            method: El método HTTP
+            path: La ruta relativa al servicio
+            requested: El valor del encabezado X-Request-Priority, si lo hay
+
+        Returns:
+            El nombre de la clase de prioridad
+        """
+        for rule in self.priorities:
+            if rule.matches(method, path):
+                return rule.priority
+        if requested:
+            requested = requested.strip().lower()
+            if requested in settings.PRIORITY_CLASSES:
+                return requested
+        return settings.PRIORITY_DEFAULT_CLASS
+
+    @property
+    def max_timeout(self) -> float:
+        """El mayor tiempo de espera configurado para el servicio."""
+        return max([self.timeout] + [rule.timeout for rule in self.timeouts])
+
+
+@dataclass(frozen=True)
+class RouteMatch:
+    """Resultado de resolver una ruta del gateway."""
+
+    service: ServiceRoute
+    # Ruta relativa al servicio sin barra inicial (ej: "users/me")
+    path: str
+
+    @property
+    def upstream_path(self) -> str:
+        return "/" + self.path
+
+    @property
+    def is_public(self) -> bool:
+        return self.service.is_public(self.path)
+
+
+def split_service_path(path: str) -> Tuple[str, str]:
+    """
+    Separa el prefijo del servicio del resto de la ruta en una sola pasada.
+
+    Args:
+        path: La ruta del gateway (ej: "/auth/users/me")
+
+    Returns:
+        Una tupla (servicio, ruta relativa) (ej: ("auth", "users/me"))
+    """
+    service, _, rest = path.lstrip("/").partition("/")
+    return service, rest
+
+
+# Estado de un servicio que se conserva al recargar la tabla de rutas si sus
+# réplicas no cambiaron
+_ROUTE_STATE = ("balancer", "breaker", "limiter", "scheduler", "retry_budget", "latency")
+
+
+class RoutingTable:
+    """
+    Tabla de rutas inmutable construida a partir de la configuración de
+    servicios. Al recargar la configuración se construye una tabla nueva; los
+    servicios cuyas réplicas no cambiaron conservan su estado (balanceador,
+    circuit breaker, límite de concurrencia con su cola y presupuesto de
+    reintentos).
+    """
+
+    def __init__(self, services: Mapping[str, Mapping[str, Any]], previous: Optional["RoutingTable"] = None):
+        routes = {}
+        for name, config in services.items():
+            urls = tuple(url.rstrip("/") for url in (config.get("urls") or [config["url"]]))
+            state = {}
+            old = previous.get(name) if previous is not None else None
+            if old is not None and old.urls == urls:
+                state = {attribute: getattr(old, attribute) for attribute in _ROUTE_STATE}
+            routes[name] = ServiceRoute(
+                name=name,
+                urls=urls,
+                public_paths=PathMatcher(config.get("public_paths", ())),
+                health_path=config.get("health_path", "/health"),
+                rate_limits=build_rules(name, config.get("rate_limits", ())),
+                tenant_paths=tuple(TenantPath.parse(pattern) for pattern in config.get("tenant_paths", ())),
+                timeout=float(config["timeout"]) if config.get("timeout") else None,
+                timeouts=tuple(TimeoutRule.from_config(rule) for rule in config.get("timeouts", ())),
+                priorities=tuple(PriorityRule.from_config(rule) for rule in config.get("priorities", ())),
+                shadow=ShadowTarget.from_config(config["shadow"]) if config.get("shadow") else None,
+                **state,
+            )
+        self.services: Mapping[str, ServiceRoute] = MappingProxyType(routes)
+
+    def get(self, service: str) -> Optional[ServiceRoute]:
+        """Devuelve la configuración del servicio o None si no existe."""
+        return self.services.get(service)
+
+    def resolve(self, path: str) -> Optional[RouteMatch]:
+        """
+        Resuelve una ruta del gateway a su servicio y ruta relativa.
+
+        Args:
+            path: La ruta del gateway (ej: "/dentist/123/patients")
+
+        Returns:
+            El resultado de la resolución, o None si el servicio no existe
+        """
+        service, rest = split_service_path(path)
+        route = self.services.get(service)
+        if route is None:
+            return None
+        return RouteMatch(service=route, path=rest)
+
+
+# Tabla de rutas activa; se construye en el lifespan del gateway
+_routing_table: Optional[RoutingTable] = None
+
+
+def build_routing_table(
+    services: Optional[Mapping[str, Mapping[str, Any]]] = None,
+    previous: Optional[RoutingTable] = None,
+) -> RoutingTable:
+    """
+    Construye la tabla de rutas a partir de la configuración de servicios.
+
+    Args:
+        services: Configuración de servicios; por defecto `settings.SERVICES`
+        previous: Tabla anterior, cuyo estado se conserva en los servicios sin cambios
+
+    Returns:
+        La tabla de rutas
+    """
+    return RoutingTable(settings.SERVICES if services is None else services, previous)
+
+
+def get_routing_table() -> RoutingTable:
+    """Devuelve la tabla de rutas activa, construyéndola si aún no existe."""
+    global _routing_table
+    if _routing_table is None:
+        _routing_table = build_routing_table()
+    return _routing_table
+
+
+def set_routing_table(table: RoutingTable) -> None:
+    """
+    Reemplaza la tabla de rutas activa. El reemplazo es una sola asignación:
+    las solicitudes en curso terminan con la tabla con la que empezaron.
+    """
+    global _routing_table
+    _routing_table = table
+
+
+def _routing_metrics():
+    routes = get_routing_table().services.values()
+    return (
+        replica_metrics(routes)
+        + breaker_metrics(routes)
+        + concurrency_metrics(routes)
+        + fair_queue_metrics(routes)
+    )
+
+
+register_collector(_routing_metrics)
@@ -0,0 +1,222 @@
+"""
+Tráfico en sombra (shadow traffic) hacia una versión candidata de un servicio.
+
+Una parte de las solicitudes de un servicio con "shadow" en el registro se
+copia a la URL candidata sin esperar su respuesta (fire-and-forget): la copia
+sale de un pool de conexiones propio y limitado, y si ya hay
+SHADOW_MAX_IN_FLIGHT copias en curso se descarta, de modo que la versión
+candidata nunca retrasa la respuesta al cliente. Las copias llevan el
+encabezado X-Shadow-Request para que el servicio evite efectos externos.
+
+Cuando terminan la solicitud original y su copia se registran las latencias
+de ambas (hasta recibir los encabezados) y la combinación de códigos de
+estado, para comparar la versión candidata con la actual.
+"""
+import asyncio
+import time
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Dict, List, Optional, Set, Tuple
+import httpx
+from app.config.settings import settings
+from app.utils.metrics import Counter, Histogram
+from app.utils.routing import ServiceRoute
+import logging
+
+# Configurar logging
+logger = logging.getLogger("gateway-service")
+
+# Encabezado que identifica las copias enviadas a la versión candidata
+SHADOW_HEADER = "x-shadow-request"
+
+SHADOW_REQUESTS = Counter(
+    "gateway_shadow_requests_total",
+    "Copias de solicitudes a la versión candidata (result = sent, dropped o error)",
+    ("service", "result"),
+)
+SHADOW_DURATION = Histogram(
+    "gateway_shadow_duration_seconds",
+    "Latencia hasta los encabezados de las solicitudes copiadas (target = primary o shadow)",
+    ("service", "target"),
+)
+SHADOW_STATUS = Counter(
+    "gateway_shadow_status_total",
+    "Clase del código de estado de la solicitud original y de su copia",
+    ("service", "primary", "shadow"),
+)
+SHADOW_MISMATCHES = Counter(
+    "gateway_shadow_mismatches_total",
+    "Solicitudes copiadas cuyo código de estado difiere del de la original",
+    ("service",),
+)
+
+
+def status_class(status_code: Optional[int]) -> str:
+    """Clase del código de estado (ej: "2xx"), o "error" si no hubo respuesta."""
+    return "error" if status_code is None else f"{status_code // 100}xx"
+
+
+class ShadowComparison:
+    """
+    Resultado de una solicitud copiada: se registra cuando terminan la
+    original y la copia, en cualquier orden.
+    """
+
+    __slots__ = ("service", "path", "primary", "shadow")
+
+    def __init__(self, service: str, path: str):
+        self.service = service
+        self.path = path
+        self.primary: Optional[Tuple[int, float]] = None
+        self.shadow: Optional[Tuple[Optional[int], float]] = None
+
+    def set_primary(self, status_code: int, latency: float) -> None:
+        self.primary = (status_code, latency)
+        self._record()
+
+    def set_shadow(self, status_code: Optional[int], latency: float) -> None:
+        self.shadow = (status_code, latency)
+        self._record()
+
+    def _record(self) -> None:
+        if self.primary is None or self.shadow is None:
+            return
+        (primary_status, primary_latency), (shadow_status, shadow_latency) = self.primary, self.shadow
+        SHADOW_DURATION.labels(self.service, "primary").observe(primary_latency)
+        if shadow_status is not None:
+            SHADOW_DURATION.labels(self.service, "shadow").observe(shadow_latency)
+        SHADOW_STATUS.labels(self.service, status_class(primary_status), status_class(shadow_status)).inc()
+        if shadow_status != primary_status:
+            SHADOW_MISMATCHES.labels(self.service).inc()
+            logger.info(
+                "Tráfico en sombra de %s: %s respondió %s (original %s)",
+                self.service, self.path, shadow_status, primary_status,
+            )
+
+
+class ShadowMirror:
+    """
+    Envía las copias de las solicitudes a las versiones candidatas, con un
+    cliente HTTP propio por URL y un máximo de copias en curso.
+    """
+
+    def __init__(self, max_in_flight: int = 100, max_connections: int = 20, timeout: float = 10.0):
+        self.max_in_flight = max_in_flight
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        # Referencias a las copias en curso (el event loop solo guarda referencias débiles)
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    def _client(self, url: str) -> httpx.AsyncClient:
+        client = self._clients.get(url)
+        if client is None or client.is_closed:
+            limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+            # Sin cookies compartidas entre usuarios, igual que los clientes de los servicios
+            cookies = CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+            client = httpx.AsyncClient(limits=limits, timeout=self.timeout, cookies=cookies)
+            self._clients[url] = client
+        return client
+
+    def mirror(
+        self,
+        route: ServiceRoute,
+        method: str,
+        target: str,
+        headers: List[Tuple[str, str]],
+        body: bytes,
+    ) -> Optional[ShadowComparison]:
+        """
+        Envía en segundo plano la copia de una solicitud a la versión candidata.
+
+        Args:
+            route: La ruta del servicio (con su destino en sombra)
+            method: El método HTTP
+            target: La ruta relativa al servicio con la query (ej: "/patients?page=2")
+            headers: Los encabezados que se envían al servicio
+            body: El cuerpo de la solicitud
+
+        Returns:
+            La comparación a la que se le informa el resultado de la solicitud
+            original, o None si la copia se descartó
+        """
+        if self.in_flight >= self.max_in_flight:
+            SHADOW_REQUESTS.labels(route.name, "dropped").inc()
+            return None
+        shadow = route.shadow
+        comparison = ShadowComparison(route.name, target)
+        request = self._client(shadow.url).build_request(
+            method,
+            shadow.url + target,
+            headers=headers + [(SHADOW_HEADER, "1")],
+            content=body,
+            timeout=shadow.timeout or self.timeout,
+        )
+        task = asyncio.get_running_loop().create_task(self._send(route.name, shadow.url, request, comparison))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        SHADOW_REQUESTS.labels(route.name, "sent").inc()
+        return comparison
+
+    async def _send(self, service: str, url: str, request: httpx.Request, comparison: ShadowComparison) -> None:
+        start = time.perf_counter()
+        try:
+            response = await self._client(url).send(request, stream=True)
+        except httpx.HTTPError as e:
+            SHADOW_REQUESTS.labels(service, "error").inc()
+            logger.debug("Error en el tráfico en sombra de %s: %s", service, e)
+            comparison.set_shadow(None, time.perf_counter() - start)
+            return
+        latency = time.perf_counter() - start
+        try:
+            # Leer y descartar el cuerpo para liberar la conexión
+            async for _ in response.aiter_raw():
+                pass
+        except httpx.HTTPError:
+            pass
+        finally:
+            await response.aclose()
+        comparison.set_shadow(response.status_code, latency)
+
+    async def close(self) -> None:
+        """Cancela las copias en curso y cierra los clientes."""
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+
+# Copias de solicitudes del gateway; se crea con la primera copia
+_shadow_mirror: Optional[ShadowMirror] = None
+
+
+def get_shadow_mirror() -> Optional[ShadowMirror]:
+    """Devuelve el emisor de tráfico en sombra, o None si está desactivado."""
+    global _shadow_mirror
+    if _shadow_mirror is None and settings.SHADOW_ENABLED:
+        _shadow_mirror = ShadowMirror(
+            max_in_flight=settings.SHADOW_MAX_IN_FLIGHT,
+            max_connections=settings.SHADOW_MAX_CONNECTIONS,
+            timeout=settings.SHADOW_TIMEOUT,
+        )
+    return _shadow_mirror
+
+
+def set_shadow_mirror(mirror: Optional[ShadowMirror]) -> None:
+    """Reemplaza el emisor de tráfico en sombra."""
+    global _shadow_mirror
+    _shadow_mirror = mirror
+
+
+async def close_shadow_mirror() -> None:
+    """Cierra el emisor de tráfico en sombra, si existe."""
+    global _shadow_mirror
+    if _shadow_mirror is not None:
+        await _shadow_mirror.close()
+        _shadow_mirror = None
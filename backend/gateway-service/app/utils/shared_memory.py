@@ -0,0 +1,307 @@
+"""
+Tablas hash en memoria compartida entre los workers del gateway.
+
+Con varios workers de uvicorn cada proceso tiene sus propias cachés y
+contadores: la caché de tokens acierta N veces menos y los límites de
+solicitudes se multiplican por N. Una SharedTable es una tabla hash de
+tamaño fijo en un archivo mapeado en memoria (normalmente en /dev/shm) que
+todos los workers abren con la misma configuración.
+
+La tabla es asociativa por grupos: cada clave (un digest BLAKE2b de 16 bytes)
+tiene un grupo fijo de BUCKET_SLOTS posiciones; si el grupo está lleno se
+reemplaza la entrada vencida o la que vence antes. Los grupos se protegen
+con locks repartidos (striped locks): un lock de rango de bytes (fcntl) por
+franja de grupos, de modo que los workers solo se bloquean entre sí cuando
+tocan la misma franja. Las operaciones no ceden el event loop dentro de la
+sección crítica.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple, Union
+from app.config.settings import settings
+import logging
+
+# Configurar logging
+logger = logging.getLogger("gateway-service")
+
+# Identificador del formato del archivo
+MAGIC = b"GWSHM001"
+
+# Encabezado: magic, cantidad de grupos, tamaño máximo del valor, franjas de locks
+_HEADER = struct.Struct("<8sIII")
+HEADER_SIZE = 64
+
+# Posiciones por grupo (una clave solo puede estar en su grupo)
+BUCKET_SLOTS = 8
+
+# Posición: digest de la clave, vencimiento (época Unix), largo del valor; luego el valor
+_SLOT = struct.Struct("<16sdI")
+_EMPTY_KEY = bytes(16)
+
+Key = Union[str, bytes]
+
+
+def _digest(key: Key) -> bytes:
+    digest = hashlib.blake2b(key.encode() if isinstance(key, str) else key, digest_size=16).digest()
+    # El digest vacío marca las posiciones libres
+    return digest if digest != _EMPTY_KEY else b"\x01" + digest[1:]
+
+
+class SharedTable:
+    """
+    Tabla hash de tamaño fijo en un archivo mapeado en memoria, compartida
+    entre procesos. Los valores son bytes de hasta `value_size` y cada entrada
+    tiene un vencimiento (segundos desde la época Unix).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        slots: int = 4096,
+        value_size: int = 64,
+        stripes: int = 64,
+        clock: Callable[[], float] = time.time,
+    ):
+        try:
+            import fcntl
+        except ImportError as e:
+            raise RuntimeError("La memoria compartida del gateway requiere fcntl (Linux o macOS)") from e
+        self._fcntl = fcntl
+        self.path = path
+        self.buckets = max(1, -(-slots // BUCKET_SLOTS))
+        self.value_size = value_size
+        self.stripes = max(1, min(stripes, self.buckets))
+        # Posiciones alineadas a 8 bytes
+        self.slot_size = (_SLOT.size + value_size + 7) & ~7
+        self.size = HEADER_SIZE + self.buckets * BUCKET_SLOTS * self.slot_size
+        self.clock = clock
+        # fcntl bloquea entre procesos, no entre hilos de un mismo proceso
+        self._thread_lock = threading.Lock()
+        self._fd: Optional[int] = None
+        self._map: Optional[mmap.mmap] = None
+        self._open()
+
+    def _open(self) -> None:
+        """Abre y mapea el archivo (también si la tabla se cerró y se vuelve a usar)."""
+        if self._map is not None:
+            return
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            self._initialize()
+            self._map = mmap.mmap(self._fd, self.size)
+        except BaseException:
+            os.close(self._fd)
+            self._fd = None
+            raise
+
+    def _initialize(self) -> None:
+        """
+        Crea el archivo si es nuevo (bajo el lock de inicialización). Un
+        archivo con otro formato no se trunca, porque otros workers podrían
+        tenerlo mapeado (al acceder fuera del archivo recibirían SIGBUS).
+        """
+        header = _HEADER.pack(MAGIC, self.buckets, self.value_size, self.stripes)
+        with self._locked(self.stripes):
+            size = os.fstat(self._fd).st_size
+            current = os.pread(self._fd, _HEADER.size, 0)
+            if size == self.size and current == header:
+                return
+            # Archivo nuevo, o creado por un proceso que terminó antes de escribir el encabezado
+            if size == 0 or (size == self.size and not any(current)):
+                os.ftruncate(self._fd, self.size)
+                os.pwrite(self._fd, header, 0)
+                return
+            raise RuntimeError(
+                f"La memoria compartida {self.path} tiene otro formato o tamaño; "
+                "elimine el archivo cuando ningún worker lo use o use otro SHARED_MEMORY_DIR"
+            )
+
+    @contextmanager
+    def _locked(self, stripe: int) -> Iterator[None]:
+        # Los locks son rangos de un byte después del final de los datos
+        with self._thread_lock:
+            self._fcntl.lockf(self._fd, self._fcntl.LOCK_EX, 1, self.size + stripe)
+            try:
+                yield
+            finally:
+                self._fcntl.lockf(self._fd, self._fcntl.LOCK_UN, 1, self.size + stripe)
+
+    def _bucket(self, digest: bytes) -> int:
+        return int.from_bytes(digest[:8], "little") % self.buckets
+
+    def _find(self, digest: bytes, bucket: int, now: float) -> Tuple[Optional[int], int]:
+        """
+        Busca la clave en su grupo.
+
+        Returns:
+            (posición de la clave o None, posición libre o a reemplazar)
+        """
+        start = HEADER_SIZE + bucket * BUCKET_SLOTS * self.slot_size
+        victim, victim_expiry = start, float("inf")
+        for offset in range(start, start + BUCKET_SLOTS * self.slot_size, self.slot_size):
+            key, expires_at, _ = _SLOT.unpack_from(self._map, offset)
+            if key == digest:
+                if expires_at > now:
+                    return offset, offset
+                return None, offset
+            if key == _EMPTY_KEY or expires_at <= now:
+                expires_at = float("-inf")
+            if expires_at < victim_expiry:
+                victim, victim_expiry = offset, expires_at
+        return None, victim
+
+    def _read(self, offset: int) -> bytes:
+        _, _, length = _SLOT.unpack_from(self._map, offset)
+        start = offset + _SLOT.size
+        return bytes(self._map[start:start + length])
+
+    def _write(self, offset: int, digest: bytes, value: bytes, expires_at: float) -> None:
+        _SLOT.pack_into(self._map, offset, digest, expires_at, len(value))
+        start = offset + _SLOT.size
+        self._map[start:start + len(value)] = value
+
+    def get(self, key: Key) -> Optional[bytes]:
+        """Devuelve el valor de la clave, o None si no existe o venció."""
+        self._open()
+        digest = _digest(key)
+        bucket = self._bucket(digest)
+        with self._locked(bucket % self.stripes):
+            offset, _ = self._find(digest, bucket, self.clock())
+            return None if offset is None else self._read(offset)
+
+    def set(self, key: Key, value: bytes, expires_at: float) -> bool:
+        """
+        Guarda el valor de la clave hasta `expires_at`.
+
+        Returns:
+            False si el valor no cabe en una posición (no se guarda)
+        """
+        if len(value) > self.value_size:
+            return False
+        self._open()
+        digest = _digest(key)
+        bucket = self._bucket(digest)
+        with self._locked(bucket % self.stripes):
+            _, offset = self._find(digest, bucket, self.clock())
+            self._write(offset, digest, value, expires_at)
+        return True
+
+    def update(self, key: Key, function: Callable[[Optional[bytes]], Tuple[Optional[Tuple[bytes, float]], Any]]) -> Any:
+        """
+        Lee y modifica la clave de forma atómica entre procesos.
+
+        Args:
+            key: La clave
+            function: Recibe el valor actual (o None) y devuelve
+                ((valor nuevo, vencimiento) o None para no modificarlo, resultado)
+
+        Returns:
+            El resultado devuelto por `function`
+        """
+        self._open()
+        digest = _digest(key)
+        bucket = self._bucket(digest)
+        with self._locked(bucket % self.stripes):
+            found, offset = self._find(digest, bucket, self.clock())
+            entry, result = function(None if found is None else self._read(found))
+            if entry is not None:
+                value, expires_at = entry
+                if len(value) > self.value_size:
+                    raise ValueError(f"El valor ocupa {len(value)} bytes, el máximo es {self.value_size}")
+                self._write(offset, digest, value, expires_at)
+            return result
+
+    def delete(self, key: Key) -> None:
+        """Elimina la clave si existe."""
+        self._open()
+        digest = _digest(key)
+        bucket = self._bucket(digest)
+        with self._locked(bucket % self.stripes):
+            offset, _ = self._find(digest, bucket, self.clock())
+            if offset is not None:
+                _SLOT.pack_into(self._map, offset, _EMPTY_KEY, 0.0, 0)
+
+    def clear(self) -> None:
+        """Elimina todas las entradas (de todos los workers)."""
+        self._open()
+        for stripe in range(self.stripes):
+            with self._locked(stripe):
+                for bucket in range(stripe, self.buckets, self.stripes):
+                    start = HEADER_SIZE + bucket * BUCKET_SLOTS * self.slot_size
+                    for offset in range(start, start + BUCKET_SLOTS * self.slot_size, self.slot_size):
+                        _SLOT.pack_into(self._map, offset, _EMPTY_KEY, 0.0, 0)
+
+    def __len__(self) -> int:
+        """Cantidad de entradas vigentes (recorre toda la tabla; para métricas y pruebas)."""
+        self._open()
+        now = self.clock()
+        count = 0
+        for offset in range(HEADER_SIZE, self.size, self.slot_size):
+            key, expires_at, _ = _SLOT.unpack_from(self._map, offset)
+            if key != _EMPTY_KEY and expires_at > now:
+                count += 1
+        return count
+
+    @property
+    def closed(self) -> bool:
+        return self._map is None
+
+    def close(self) -> None:
+        """
+        Cierra el mapeo del proceso (el archivo y sus datos se conservan). La
+        tabla se vuelve a abrir si se usa de nuevo.
+        """
+        if self._map is None:
+            return
+        self._map.close()
+        os.close(self._fd)
+        self._map = None
+        self._fd = None
+
+
+# Tablas abiertas por este proceso
+_tables: Dict[str, SharedTable] = {}
+
+
+def shared_table(name: str, slots: int, value_size: int) -> Optional[SharedTable]:
+    """
+    Abre (una sola vez por proceso) la tabla compartida `name` en
+    SHARED_MEMORY_DIR. El nombre del archivo incluye el formato de la tabla:
+    si cambia la configuración (ej: durante un despliegue gradual), los
+    workers nuevos usan otro archivo y los anteriores siguen con el suyo.
+
+    Args:
+        name: El nombre de la tabla (ej: "tokens")
+        slots: Cantidad de entradas
+        value_size: Tamaño máximo de cada valor en bytes
+
+    Returns:
+        La tabla, o None si SHARED_MEMORY_DIR no está configurado
+    """
+    if not settings.SHARED_MEMORY_DIR:
+        return None
+    table = _tables.get(name)
+    if table is None:
+        stripes = settings.SHARED_MEMORY_STRIPES
+        file_name = f"gateway-{name}-{MAGIC.decode()}-{slots}x{value_size}x{stripes}"
+        path = os.path.join(settings.SHARED_MEMORY_DIR, file_name)
+        table = SharedTable(path, slots, value_size, stripes)
+        _tables[name] = table
+        logger.info("Memoria compartida %s: %d entradas de hasta %d bytes", path, slots, value_size)
+    return table
+
+
+def close_shared_tables() -> None:
+    """
+    Cierra los mapeos de las tablas compartidas de este proceso. Las tablas
+    siguen registradas porque las usan instancias globales (caché de tokens,
+    circuit breakers, límites de solicitudes): si el lifespan vuelve a
+    empezar en el mismo proceso, se abren de nuevo al usarlas.
+    """
+    for table in _tables.values():
+        table.close()
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+from app.config.settings import settings
+from app.utils.shared_memory import BUCKET_SLOTS, SharedTable, shared_table
+
+
+class TokenCache:
+    """
+    Caché LRU con expiración de tokens JWT ya verificados.
+
+    Las entradas se indexan por un digest del token (el token no se guarda en
+    memoria) y expiran en el `exp` del token o al cumplirse el TTL máximo,
+    lo que ocurra primero. Un token expirado nunca se devuelve.
+    """
+
+    def __init__(self, max_size: int, max_ttl: float, clock: Callable[[], float] = time.time):
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._entries: "OrderedDict[bytes, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """
+        Devuelve el payload del token si está en caché y no ha expirado.
+
+        Args:
+            token: El token JWT
+
+        Returns:
+            Una copia del payload, o None si no está en caché
+        """
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, payload = entry
+        if self._clock() >= expires_at:
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return dict(payload)
+
+    def set(self, token: str, payload: Dict[str, Any]) -> None:
+        """
+        Guarda el payload de un token verificado.
+
+        Args:
+            token: El token JWT
+            payload: El payload decodificado del token
+        """
+        if self.max_size <= 0 or self.max_ttl <= 0:
+            return
+
+        expires_at = self._clock() + self.max_ttl
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)):
+            expires_at = min(expires_at, float(exp))
+
+        key = self._key(token)
+        self._entries[key] = (expires_at, dict(payload))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Elimina todas las entradas y reinicia los contadores."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        """Devuelve los contadores de aciertos, fallos y el tamaño actual."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self), "max_size": self.max_size}
+
+
+class SharedTokenCache(TokenCache):
+    """
+    Caché de tokens verificados en memoria compartida entre los workers del
+    gateway: un token verificado por un worker es un acierto en todos.
+
+    Las claves incluyen un digest de la clave y el algoritmo del JWT, de modo
+    que al rotar la clave no se aceptan tokens verificados con la anterior.
+    Los payloads que no caben en una entrada no se guardan.
+    """
+
+    def __init__(self, table: SharedTable, max_ttl: float, clock: Callable[[], float] = time.time):
+        super().__init__(max_size=table.buckets * BUCKET_SLOTS, max_ttl=max_ttl, clock=clock)
+        self.table = table
+        self._namespace = hashlib.sha256(f"{settings.JWT_ALGORITHM}:{settings.JWT_SECRET_KEY}".encode()).digest()[:16]
+
+    def _key(self, token: str) -> bytes:
+        return self._namespace + token.encode()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        value = self.table.get(self._key(token))
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    def set(self, token: str, payload: Dict[str, Any]) -> None:
+        if self.max_ttl <= 0:
+            return
+        expires_at = self._clock() + self.max_ttl
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)):
+            expires_at = min(expires_at, float(exp))
+        value = json.dumps(payload, separators=(",", ":"), default=str).encode()
+        self.table.set(self._key(token), value, expires_at)
+
+    def clear(self) -> None:
+        self.table.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+
+def create_token_cache() -> TokenCache:
+    """Crea la caché de tokens, en memoria compartida si SHARED_MEMORY_DIR está configurado."""
+    table = shared_table("tokens", settings.JWT_CACHE_MAX_SIZE, settings.JWT_CACHE_SHARED_ENTRY_BYTES)
+    if table is not None:
+        return SharedTokenCache(table, settings.JWT_CACHE_MAX_TTL)
+    return TokenCache(settings.JWT_CACHE_MAX_SIZE, settings.JWT_CACHE_MAX_TTL)
+
+
+# Instancia compartida por el gateway
+token_cache = create_token_cache()
@@ -0,0 +1,111 @@
+"""
+Benchmark: costo por solicitud del middleware y del enrutamiento del gateway.
+
+Compara la composición anterior (logging con `@app.middleware("http")`, es
+decir BaseHTTPMiddleware, y el proxy como ruta de FastAPI) con la actual
+(middlewares ASGI puros y proxy atendido fuera del enrutamiento de FastAPI).
+Ambas usan el mismo lifespan y reenvían al mismo upstream de prueba, que corre
+en otro proceso; la diferencia de CPU por solicitud es el costo eliminado.
+
+Uso (desde gateway-service/):
+    python -m benchmarks.bench_asgi --requests 3000 --concurrency 1,20
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from typing import Any, Dict
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+
+from app.config.settings import settings
+from benchmarks.bench_gateway import configure
+from benchmarks.harness import StubUpstreamProcess, metadata, parse_levels, run_load, write_report
+
+logger = logging.getLogger("gateway-service")
+
+
+def legacy_app() -> FastAPI:
+    """Reconstruye la composición anterior del gateway (BaseHTTPMiddleware y ruta de FastAPI)."""
+    from app.api.router import router
+    from app.main import lifespan
+
+    app = FastAPI(lifespan=lifespan)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=settings.CORS_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    @app.middleware("http")
+    async def log_requests(request: Request, call_next):
+        start_time = time.time()
+        logger.info(f"Request: {request.method} {request.url.path}")
+        response = await call_next(request)
+        logger.info(
+            f"Response: {request.method} {request.url.path} - "
+            f"Status: {response.status_code} - Time: {time.time() - start_time:.3f}s"
+        )
+        return response
+
+    app.include_router(router)
+    return app
+
+
+async def measure(app: Any, url: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """Mide la aplicación en cada nivel de concurrencia."""
+    results: Dict[str, Any] = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+
+            async def send(index: int) -> None:
+                (await client.get(url)).raise_for_status()
+
+            for level in parse_levels(args.concurrency):
+                results[str(level)] = await run_load(send, args.requests, level, warmup=args.warmup)
+    return results
+
+
+async def main(args: argparse.Namespace) -> Dict[str, Any]:
+    args.rate_limit = args.coalescing = args.no_jwt_cache = False
+    with StubUpstreamProcess() as upstream:
+        configure(upstream.url, args)
+        from app.main import app
+
+        url = f"/auth/health?size={args.size}"
+        results = {
+            "base_http_middleware": await measure(legacy_app(), url, args),
+            "pure_asgi": await measure(app, url, args),
+        }
+
+    for level in results["pure_asgi"]:
+        before, after = results["base_http_middleware"][level], results["pure_asgi"][level]
+        print(
+            f"c={level:<4} CPU/solicitud {before['cpu_us_per_request']}us -> {after['cpu_us_per_request']}us "
+            f"(ahorro {before['cpu_us_per_request'] - after['cpu_us_per_request']:.1f}us), "
+            f"p50 {before['p50_ms']}ms -> {after['p50_ms']}ms",
+            file=sys.stderr,
+        )
+    return {"benchmark": "asgi", "meta": metadata(vars(args)), "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", default="1,20", help="niveles de concurrencia separados por comas")
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--size", type=int, default=512, help="tamaño de la respuesta en bytes")
+    parser.add_argument("--log-level", default="WARNING", help="nivel de logging del gateway")
+    parser.add_argument("--output", help="archivo JSON de salida (por defecto, stdout)")
+    parser.add_argument("--baseline", help="resultado JSON anterior con el que comparar")
+    parser.add_argument("--threshold", type=float, default=0.10, help="variación que se considera regresión")
+    args = parser.parse_args()
+
+    report = asyncio.run(main(args))
+    sys.exit(write_report(report, args.output, args.baseline, args.threshold))
@@ -0,0 +1,115 @@
+"""
+Benchmark de la compresión de respuestas del gateway.
+
+Reenvía páginas de pacientes en JSON (como GET /dentist/{tenant_id}/patients)
+desde el upstream de prueba y compara, por codificación, los bytes enviados al
+cliente y la latencia (p50/p95/p99) frente a la respuesta sin comprimir.
+
+Uso (desde gateway-service/):
+    python -m benchmarks.bench_compression --rows 100 --concurrency 1,20
+    python -m benchmarks.bench_compression --encodings identity,gzip,br --output compresion.json
+
+Las codificaciones cuyo paquete no está instalado (brotli, zstandard) se omiten.
+"""
+import argparse
+import asyncio
+import sys
+from typing import Any, Dict, List
+
+import httpx
+
+from app.config.settings import settings
+from app.utils.compression import available_encodings
+from benchmarks.bench_gateway import TENANT_ID, configure, make_tokens
+from benchmarks.harness import StubUpstreamProcess, metadata, parse_levels, run_load, write_report
+
+
+def select_encodings(requested: str) -> List[str]:
+    """Codificaciones a medir: "identity" (sin comprimir) y las disponibles de las pedidas."""
+    available = set(available_encodings())
+    selected = []
+    for encoding in (item.strip() for item in requested.split(",") if item.strip()):
+        if encoding == "identity" or encoding in available:
+            selected.append(encoding)
+        else:
+            print(f"{encoding}: compresor no instalado, se omite", file=sys.stderr)
+    return selected
+
+
+async def main(args: argparse.Namespace) -> Dict[str, Any]:
+    with StubUpstreamProcess() as upstream:
+        configure(upstream.url, args)
+        settings.COMPRESSION_ENABLED = True
+        # Medir solo la compresión: sin rechazos por el límite adaptativo de concurrencia
+        settings.CONCURRENCY_LIMIT_ENABLED = False
+        # Importar después de configurar: la tabla de rutas se construye en el lifespan
+        from app.main import app
+
+        tokens = make_tokens(args.users)
+        url = f"/dentist/{TENANT_ID}/patients?rows={args.rows}"
+        results: Dict[str, Dict[str, Any]] = {}
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+                for encoding in select_encodings(args.encodings):
+                    errors = 0
+                    sizes = {"wire": 0}
+
+                    async def send(index: int) -> None:
+                        nonlocal errors
+                        headers = {
+                            "authorization": f"Bearer {tokens[index % len(tokens)]}",
+                            "accept-encoding": encoding,
+                        }
+                        # Leer el cuerpo tal como llega, sin descomprimir
+                        async with client.stream("GET", url, headers=headers) as response:
+                            wire = 0
+                            async for chunk in response.aiter_raw():
+                                wire += len(chunk)
+                        received = response.headers.get("content-encoding", "identity")
+                        if response.status_code != 200 or received != encoding:
+                            errors += 1
+                        sizes["wire"] = wire
+
+                    results[encoding] = {}
+                    for level in parse_levels(args.concurrency):
+                        errors = 0
+                        result = await run_load(send, args.requests, level, warmup=args.warmup)
+                        result["errors"] = errors
+                        result["bytes_per_response"] = sizes["wire"]
+                        results[encoding][str(level)] = result
+                        print(
+                            f"{encoding:<9} c={level:<4} bytes={sizes['wire']:<7} p50={result['p50_ms']}ms "
+                            f"p95={result['p95_ms']}ms rps={result['rps']} errors={errors}",
+                            file=sys.stderr,
+                        )
+
+        identity = results.get("identity")
+        if identity:
+            baseline_bytes = next(iter(identity.values()))["bytes_per_response"]
+            for encoding, levels in results.items():
+                for result in levels.values():
+                    result["ratio"] = round(result["bytes_per_response"] / baseline_bytes, 4) if baseline_bytes else None
+
+        return {"benchmark": "compression", "meta": metadata(vars(args)), "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000, help="solicitudes medidas por codificación y nivel")
+    parser.add_argument("--concurrency", default="1,20", help="niveles de concurrencia separados por comas")
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--rows", type=int, default=100, help="pacientes por página")
+    parser.add_argument("--encodings", default="identity,gzip,br,zstd", help="codificaciones a comparar")
+    parser.add_argument("--users", type=int, default=50, help="usuarios (tokens) distintos")
+    parser.add_argument("--no-jwt-cache", action="store_true", help="verificar la firma del token en cada solicitud")
+    parser.add_argument("--rate-limit", action="store_true", help="activar los límites de solicitudes")
+    parser.add_argument("--coalescing", action="store_true", help="activar la agrupación de GET idénticos")
+    parser.add_argument("--log-level", default="WARNING", help="nivel de logging del gateway")
+    parser.add_argument("--output", help="archivo JSON de salida (por defecto, stdout)")
+    parser.add_argument("--baseline", help="resultado JSON anterior con el que comparar")
+    parser.add_argument("--threshold", type=float, default=0.10, help="variación que se considera regresión")
+    args = parser.parse_args()
+
+    report = asyncio.run(main(args))
+    sys.exit(write_report(report, args.output, args.baseline, args.threshold))
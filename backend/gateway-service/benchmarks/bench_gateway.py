@@ -0,0 +1,145 @@
+"""
+Benchmark del gateway completo contra servicios de prueba locales.
+
+Ejecuta la aplicación del gateway en el mismo proceso (con su lifespan) y
+reenvía a un upstream de prueba que corre en otro proceso, de modo que el CPU
+y la memoria medidos corresponden al gateway (y al generador de carga). Mide
+rutas públicas frente a rutas autenticadas (verify_token) y cuerpos pequeños
+frente a grandes (transmitidos por partes), además de una mezcla de todas.
+
+Uso (desde gateway-service/):
+    python -m benchmarks.bench_gateway --requests 2000 --concurrency 1,10,50
+    python -m benchmarks.bench_gateway --output actual.json --baseline anterior.json
+
+El resultado se escribe en JSON; con --baseline se comparan p50/p95/p99, rps
+y CPU por solicitud escenario por escenario, y el comando termina con código 1
+si alguna métrica empeora más que --threshold.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import httpx
+from jose import jwt
+
+from app.config.settings import settings
+from benchmarks.harness import StubUpstreamProcess, metadata, parse_levels, run_load, write_report
+
+TENANT_ID = "9b2f6c1e-3d4a-4f5b-8c7d-0e1f2a3b4c5d"
+
+# Escenario -> (ruta autenticada, tamaño de la respuesta)
+SCENARIOS = {
+    "public_small": (False, "small"),
+    "public_large": (False, "large"),
+    "auth_small": (True, "small"),
+    "auth_large": (True, "large"),
+}
+
+
+def make_tokens(users: int) -> List[str]:
+    """Crea tokens firmados con la clave del gateway para `users` usuarios distintos."""
+    exp = int(time.time()) + 3600
+    return [
+        jwt.encode(
+            {"sub": f"bench-user-{index}", "tenant_id": TENANT_ID, "exp": exp},
+            settings.JWT_SECRET_KEY,
+            algorithm=settings.JWT_ALGORITHM,
+        )
+        for index in range(users)
+    ]
+
+
+def configure(upstream_url: str, args: argparse.Namespace) -> None:
+    """Apunta los servicios al upstream de prueba y ajusta las funciones del gateway."""
+    settings.AUTH_SERVICE_URL = upstream_url
+    settings.DENTIST_SERVICE_URL = upstream_url
+    settings.AUTH_SERVICE_URLS = []
+    settings.DENTIST_SERVICE_URLS = []
+    settings.HEALTH_CHECK_ENABLED = False
+    settings.RATE_LIMIT_ENABLED = args.rate_limit
+    settings.RESPONSE_CACHE_ENABLED = False
+    settings.COALESCING_ENABLED = args.coalescing
+    settings.JWT_CACHE_ENABLED = not args.no_jwt_cache
+    for name in ("gateway-service", "httpx"):
+        logging.getLogger(name).setLevel(args.log_level)
+
+
+def build_requests(args: argparse.Namespace) -> Dict[str, Callable[[int], Tuple[str, Dict[str, str]]]]:
+    """Devuelve, por escenario, la función que genera la URL y los encabezados de cada solicitud."""
+    tokens = make_tokens(args.users)
+    sizes = {"small": args.small, "large": args.large}
+
+    def scenario(authenticated: bool, size: str) -> Callable[[int], Tuple[str, Dict[str, str]]]:
+        def build(index: int) -> Tuple[str, Dict[str, str]]:
+            if not authenticated:
+                return f"/auth/health?size={sizes[size]}", {}
+            token = tokens[index % len(tokens)]
+            return (
+                f"/dentist/{TENANT_ID}/patients?size={sizes[size]}",
+                {"authorization": f"Bearer {token}"},
+            )
+        return build
+
+    requests = {name: scenario(*spec) for name, spec in SCENARIOS.items()}
+    builders = list(requests.values())
+    requests["mixed"] = lambda index: builders[index % len(builders)](index)
+    return requests
+
+
+async def main(args: argparse.Namespace) -> Dict[str, Any]:
+    with StubUpstreamProcess() as upstream:
+        configure(upstream.url, args)
+        # Importar después de configurar: la tabla de rutas se construye en el lifespan
+        from app.main import app
+
+        results: Dict[str, Dict[str, Any]] = {}
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+                for name, build in build_requests(args).items():
+                    errors = 0
+
+                    async def send(index: int) -> None:
+                        nonlocal errors
+                        url, headers = build(index)
+                        response = await client.get(url, headers=headers)
+                        if response.status_code != 200:
+                            errors += 1
+
+                    results[name] = {}
+                    for level in parse_levels(args.concurrency):
+                        errors = 0
+                        result = await run_load(send, args.requests, level, warmup=args.warmup)
+                        result["errors"] = errors
+                        results[name][str(level)] = result
+                        print(
+                            f"{name:<14} c={level:<4} p50={result['p50_ms']}ms p99={result['p99_ms']}ms "
+                            f"rps={result['rps']} errors={errors}",
+                            file=sys.stderr,
+                        )
+
+        return {"benchmark": "gateway", "meta": metadata(vars(args)), "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="solicitudes medidas por escenario y nivel")
+    parser.add_argument("--concurrency", default="1,10,50", help="niveles de concurrencia separados por comas")
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--small", type=int, default=512, help="tamaño del cuerpo pequeño en bytes")
+    parser.add_argument("--large", type=int, default=256 * 1024, help="tamaño del cuerpo grande en bytes")
+    parser.add_argument("--users", type=int, default=50, help="usuarios (tokens) distintos en rutas autenticadas")
+    parser.add_argument("--no-jwt-cache", action="store_true", help="verificar la firma del token en cada solicitud")
+    parser.add_argument("--rate-limit", action="store_true", help="activar los límites de solicitudes")
+    parser.add_argument("--coalescing", action="store_true", help="activar la agrupación de GET idénticos")
+    parser.add_argument("--log-level", default="WARNING", help="nivel de logging del gateway")
+    parser.add_argument("--output", help="archivo JSON de salida (por defecto, stdout)")
+    parser.add_argument("--baseline", help="resultado JSON anterior con el que comparar")
+    parser.add_argument("--threshold", type=float, default=0.10, help="variación que se considera regresión")
+    args = parser.parse_args()
+
+    report = asyncio.run(main(args))
+    sys.exit(write_report(report, args.output, args.baseline, args.threshold))
@@ -0,0 +1,70 @@
+"""
+Benchmark: cliente HTTP nuevo por solicitud vs. cliente compartido con pool.
+
+Compara la estrategia anterior de `forward_request_to_service` (un
+`httpx.AsyncClient` por solicitud) con los clientes compartidos creados en el
+lifespan del gateway, contra un upstream local.
+
+Uso (desde gateway-service/):
+    python -m benchmarks.bench_pool --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable, Dict, List
+
+import httpx
+
+from app.utils.clients import create_client
+from benchmarks.harness import summarize
+from benchmarks.stub_upstream import StubUpstream
+
+
+async def run_load(send: Callable[[], Awaitable[None]], total: int, concurrency: int) -> Dict[str, float]:
+    """Ejecuta `total` llamadas a `send` con `concurrency` trabajadores."""
+    latencies: List[float] = []
+    remaining = iter(range(total))
+
+    async def worker() -> None:
+        for _ in remaining:
+            start = time.perf_counter()
+            await send()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - start)
+
+
+async def main(total: int, concurrency: int, size: int) -> Dict[str, Dict[str, float]]:
+    async with StubUpstream() as upstream:
+        url = f"{upstream.url}/patients?size={size}"
+
+        async def per_request_client() -> None:
+            async with httpx.AsyncClient() as client:
+                (await client.get(url)).raise_for_status()
+
+        pooled = create_client()
+
+        async def pooled_client() -> None:
+            (await pooled.get(url)).raise_for_status()
+
+        results = {}
+        for name, send in (("per_request_client", per_request_client), ("pooled_client", pooled_client)):
+            connections_before = upstream.connections
+            results[name] = await run_load(send, total, concurrency)
+            results[name]["upstream_connections"] = upstream.connections - connections_before
+
+        await pooled.aclose()
+        return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--size", type=int, default=1024, help="tamaño de la respuesta en bytes")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(main(args.requests, args.concurrency, args.size)), indent=2))
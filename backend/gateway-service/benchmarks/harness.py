@@ -0,0 +1,207 @@
+"""
+Utilidades comunes de los benchmarks del gateway: generación de carga a
+concurrencia fija, percentiles de latencia, consumo de CPU y memoria, y
+resultados en JSON comparables entre commits.
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from benchmarks.stub_upstream import StubUpstream
+
+# Métricas comparadas y si un valor mayor es mejor
+COMPARED_METRICS = {"p50_ms": False, "p95_ms": False, "p99_ms": False, "rps": True, "cpu_us_per_request": False}
+
+
+def summarize(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    """Calcula percentiles (en ms) y throughput a partir de las latencias medidas."""
+    ordered = sorted(latencies)
+
+    def percentile(p: float) -> float:
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index] * 1000
+
+    return {
+        "requests": len(ordered),
+        "p50_ms": round(percentile(50), 3),
+        "p95_ms": round(percentile(95), 3),
+        "p99_ms": round(percentile(99), 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "rps": round(len(ordered) / elapsed, 1),
+    }
+
+
+def rss_kib() -> Optional[int]:
+    """Memoria residente actual del proceso en KiB (None si no está disponible)."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        return None
+
+
+async def run_load(
+    send: Callable[[int], Awaitable[None]], total: int, concurrency: int, warmup: int = 0
+) -> Dict[str, Any]:
+    """
+    Ejecuta `total` llamadas a `send` con `concurrency` trabajadores.
+
+    Args:
+        send: Función que ejecuta una solicitud (recibe el número de solicitud)
+        total: Cantidad de solicitudes medidas
+        concurrency: Cantidad de trabajadores concurrentes
+        warmup: Solicitudes previas que no se miden
+
+    Returns:
+        Latencias, throughput, CPU del proceso por solicitud y memoria residente
+    """
+    for index in range(warmup):
+        await send(index)
+
+    latencies: List[float] = []
+    remaining = iter(range(total))
+
+    async def worker() -> None:
+        for index in remaining:
+            start = time.perf_counter()
+            await send(index)
+            latencies.append(time.perf_counter() - start)
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    result: Dict[str, Any] = summarize(latencies, elapsed)
+    result["concurrency"] = concurrency
+    result["cpu_percent"] = round(cpu / elapsed * 100, 1)
+    result["cpu_us_per_request"] = round(cpu / total * 1e6, 1)
+    result["rss_kib"] = rss_kib()
+    result["max_rss_kib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return result
+
+
+def _serve_stub(host: str, ready: "multiprocessing.Queue") -> None:
+    async def serve() -> None:
+        async with StubUpstream(host) as upstream:
+            ready.put(upstream.port)
+            await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+class StubUpstreamProcess:
+    """
+    Ejecuta el upstream de prueba en otro proceso, para que el CPU y la
+    memoria medidos en el proceso del benchmark no incluyan al upstream.
+    """
+
+    def __init__(self, host: str = "127.0.0.1"):
+        self.host = host
+        self.port = 0
+        self._process: Optional[multiprocessing.Process] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def __enter__(self) -> "StubUpstreamProcess":
+        ready: multiprocessing.Queue = multiprocessing.Queue()
+        self._process = multiprocessing.Process(target=_serve_stub, args=(self.host, ready), daemon=True)
+        self._process.start()
+        self.port = ready.get(timeout=10)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+            self._process = None
+
+
+def metadata(args: Dict[str, Any]) -> Dict[str, Any]:
+    """Datos del entorno que permiten comparar resultados entre commits."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": args,
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Compara dos resultados del mismo benchmark escenario por escenario.
+
+    Args:
+        baseline: Resultado de referencia (ej: del commit anterior)
+        current: Resultado actual
+        threshold: Variación relativa a partir de la cual se marca una regresión
+
+    Returns:
+        Las líneas del informe; las regresiones se marcan con "REGRESIÓN"
+    """
+    lines = []
+    for scenario, levels in current["results"].items():
+        for level, result in levels.items():
+            previous = baseline.get("results", {}).get(scenario, {}).get(level)
+            if previous is None:
+                continue
+            for metric, higher_is_better in COMPARED_METRICS.items():
+                before, after = previous.get(metric), result.get(metric)
+                if not before or after is None:
+                    continue
+                change = (after - before) / before
+                worse = change < -threshold if higher_is_better else change > threshold
+                lines.append(
+                    f"{scenario:<16} c={level:<4} {metric:<20} {before:>10} -> {after:<10} "
+                    f"{change:+7.1%}{'  REGRESIÓN' if worse else ''}"
+                )
+    return lines
+
+
+def write_report(report: Dict[str, Any], output: Optional[str], baseline: Optional[str], threshold: float) -> int:
+    """
+    Escribe el resultado en JSON (stdout o archivo) y, si se indica, lo
+    compara con un resultado anterior.
+
+    Returns:
+        El código de salida: 1 si hay regresiones, 0 si no
+    """
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+    if not baseline:
+        return 0
+    with open(baseline) as file:
+        lines = compare(json.load(file), report, threshold)
+    for line in lines:
+        print(line, file=sys.stderr)
+    return int(any(line.endswith("REGRESIÓN") for line in lines))
+
+
+def parse_levels(value: str) -> Sequence[int]:
+    """Convierte "1,10,50" en los niveles de concurrencia."""
+    return [int(level) for level in value.split(",") if level.strip()]
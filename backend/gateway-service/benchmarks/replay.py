@@ -0,0 +1,190 @@
+"""
+Reproduce contra un entorno local el tráfico capturado por el gateway.
+
+Lee un archivo de captura (CAPTURE_FILE, ver app/utils/capture.py) y envía
+cada solicitud en el mismo instante relativo en que llegó al gateway,
+dividido por --speed: con 1 se reproduce a la velocidad original y con N,
+N veces más rápido. Las solicitudes no esperan a las anteriores (carga
+abierta), de modo que se conservan los tiempos entre llegadas y la
+concurrencia de producción.
+
+Los encabezados Authorization se capturaron sin el token: se firma uno nuevo
+con --jwt-secret para el usuario seudónimo y el tenant de cada registro, por
+lo que el entorno local debe usar esa misma clave.
+
+Uso (desde gateway-service/):
+    python -m benchmarks.replay captura.jsonl.gz --target http://localhost:8000 --speed 2
+    python -m benchmarks.replay captura.jsonl.gz --output actual.json --baseline anterior.json
+
+Informa por ruta (método y plantilla) los percentiles de latencia, los
+errores y las respuestas con un estado distinto del capturado; con
+--baseline se compara con una reproducción anterior.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from jose import jwt
+
+from app.config.settings import settings
+from app.utils.capture import REDACTED, decode_body, read_capture
+from benchmarks.harness import metadata, summarize, write_report
+
+
+def load_records(path: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Lee los registros del archivo ordenados por instante de llegada (se
+    escriben al terminar cada solicitud, no al llegar).
+    """
+    records = []
+    for record in read_capture(path):
+        records.append(record)
+        if limit and len(records) >= limit:
+            break
+    records.sort(key=lambda record: record["t"])
+    return records
+
+
+class TokenFactory:
+    """Firma un token por usuario seudónimo y tenant, reutilizándolo en toda la reproducción."""
+
+    def __init__(self, secret: str, algorithm: str, ttl: int = 3600):
+        self.secret = secret
+        self.algorithm = algorithm
+        self.ttl = ttl
+        self._tokens: Dict[Tuple[str, str], str] = {}
+
+    def token(self, subject: str, tenant: str) -> str:
+        key = (subject, tenant)
+        token = self._tokens.get(key)
+        if token is None:
+            claims = {"sub": subject, "exp": int(time.time()) + self.ttl}
+            if tenant:
+                claims["tenant_id"] = tenant
+            token = jwt.encode(claims, self.secret, algorithm=self.algorithm)
+            self._tokens[key] = token
+        return token
+
+
+def build_request(record: Dict[str, Any], tokens: TokenFactory) -> Tuple[str, str, Dict[str, str], bytes]:
+    """Devuelve el método, la URL relativa, los encabezados y el cuerpo de un registro."""
+    headers = {}
+    for name, value in record.get("h", {}).items():
+        if value != REDACTED:
+            headers[name] = value
+        elif name == "authorization" and record.get("u"):
+            headers[name] = f"Bearer {tokens.token(record['u'], record.get('tn', ''))}"
+    url = f"/{record['s']}{record['p']}"
+    if record.get("q"):
+        url += "?" + record["q"]
+    return record["m"], url, headers, decode_body(record)
+
+
+async def replay(args: argparse.Namespace) -> Dict[str, Any]:
+    records = load_records(args.capture, args.limit)
+    if not records:
+        raise SystemExit(f"{args.capture}: sin registros")
+    tokens = TokenFactory(args.jwt_secret, settings.JWT_ALGORITHM)
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    status_changed: Dict[str, int] = defaultdict(int)
+    lags: List[float] = []
+    in_flight = peak = 0
+
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    async with httpx.AsyncClient(base_url=args.target, limits=limits, timeout=args.timeout) as client:
+
+        async def send(record: Dict[str, Any]) -> None:
+            nonlocal in_flight, peak
+            route = f"{record['m']} {record.get('r') or record['s']}"
+            method, url, headers, body = build_request(record, tokens)
+            in_flight += 1
+            peak = max(peak, in_flight)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, headers=headers, content=body or None)
+                await response.aread()
+            except httpx.HTTPError:
+                errors[route] += 1
+                return
+            finally:
+                in_flight -= 1
+            latencies[route].append(time.perf_counter() - started)
+            if response.status_code >= 500:
+                errors[route] += 1
+            if response.status_code != record.get("st"):
+                status_changed[route] += 1
+
+        first = records[0]["t"]
+        start = time.perf_counter()
+        tasks = []
+        for record in records:
+            # Instante relativo de llegada, escalado por la velocidad
+            due = (record["t"] - first) / args.speed
+            delay = due - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lags.append(max(0.0, -delay))
+            tasks.append(asyncio.create_task(send(record)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    level = f"{args.speed:g}x"
+    results: Dict[str, Dict[str, Any]] = {}
+    for route in sorted(set(latencies) | set(errors)):
+        result: Dict[str, Any] = summarize(latencies[route], elapsed) if latencies[route] else {"requests": 0}
+        result["errors"] = errors[route]
+        result["status_changed"] = status_changed[route]
+        results[route] = {level: result}
+        print(
+            f"{route:<50} n={result['requests']:<6} p50={result.get('p50_ms')}ms p95={result.get('p95_ms')}ms "
+            f"p99={result.get('p99_ms')}ms errors={errors[route]} status_changed={status_changed[route]}",
+            file=sys.stderr,
+        )
+
+    all_latencies = [latency for values in latencies.values() for latency in values]
+    if all_latencies:
+        results["all"] = {level: summarize(all_latencies, elapsed)}
+    lags.sort()
+    print(
+        f"{len(records)} solicitudes en {elapsed:.1f}s (captura: {(records[-1]['t'] - first):.1f}s), "
+        f"concurrencia máxima {peak}, retraso máximo del envío {lags[-1] * 1000:.1f}ms",
+        file=sys.stderr,
+    )
+    return {
+        "benchmark": "replay",
+        "meta": metadata({name: value for name, value in vars(args).items() if name != "jwt_secret"}),
+        "summary": {
+            "requests": len(records),
+            "elapsed_s": round(elapsed, 3),
+            "captured_s": round(records[-1]["t"] - first, 3),
+            "peak_in_flight": peak,
+            "max_send_lag_ms": round(lags[-1] * 1000, 3),
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capture", help="archivo de captura (JSON Lines, gzip si termina en .gz)")
+    parser.add_argument("--target", default="http://localhost:8000", help="URL del gateway local")
+    parser.add_argument("--speed", type=float, default=1.0, help="factor de velocidad (1 = original)")
+    parser.add_argument("--limit", type=int, help="cantidad máxima de registros a reproducir")
+    parser.add_argument("--jwt-secret", default=settings.JWT_SECRET_KEY, help="clave para firmar los tokens")
+    parser.add_argument("--timeout", type=float, default=30.0, help="tiempo de espera por solicitud en segundos")
+    parser.add_argument("--max-connections", type=int, default=1000, help="conexiones máximas con el gateway")
+    parser.add_argument("--output", help="archivo JSON de salida (por defecto, stdout)")
+    parser.add_argument("--baseline", help="resultado JSON anterior con el que comparar")
+    parser.add_argument("--threshold", type=float, default=0.10, help="variación que se considera regresión")
+    args = parser.parse_args()
+    if args.speed <= 0:
+        parser.error("--speed debe ser mayor que 0")
+
+    report = asyncio.run(replay(args))
+    sys.exit(write_report(report, args.output, args.baseline, args.threshold))
@@ -0,0 +1,142 @@
+"""
+Servicio upstream de prueba para los benchmarks del gateway.
+
+Implementa un servidor HTTP/1.1 mínimo sobre asyncio (con keep-alive) para no
+depender de uvicorn ni de la base de datos de los servicios reales.
+
+Parámetros de consulta admitidos:
+    size:  tamaño en bytes del cuerpo de la respuesta (por defecto 64)
+    delay: retardo en milisegundos antes de responder (por defecto 0)
+    rows:  si se indica, responde un JSON con esa cantidad de pacientes (en
+           lugar de `size` bytes), como una página de /{tenant_id}/patients
+"""
+import asyncio
+import json
+import uuid
+from functools import lru_cache
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+
+@lru_cache(maxsize=32)
+def patient_page(rows: int) -> bytes:
+    """Página de pacientes en JSON con datos variados (nombres, fechas, contactos)."""
+    first_names = ["Ana", "Luis", "María", "Carlos", "Lucía", "Jorge", "Sofía", "Diego"]
+    last_names = ["García", "Pérez", "Rodríguez", "López", "Martínez", "Sánchez", "Ramírez", "Torres"]
+    tenant_id = str(uuid.UUID(int=1))
+    patients = []
+    for index in range(rows):
+        first_name = first_names[index % len(first_names)]
+        last_name = last_names[(index * 3) % len(last_names)]
+        patients.append({
+            "id": str(uuid.UUID(int=index * 7919 + 17)),
+            "tenant_id": tenant_id,
+            "first_name": first_name,
+            "last_name": last_name,
+            "email": f"{first_name.lower()}.{last_name.lower()}{index}@example.com",
+            "phone": f"+51 9{index * 7919 % 100000000:08d}",
+            "date_of_birth": f"{1950 + index % 60}-{1 + index % 12:02d}-{1 + index % 28:02d}",
+            "gender": "female" if index % 2 else "male",
+            "address": f"Av. Principal {100 + index * 13}, Lima",
+            "medical_history": {"allergies": ["penicilina"] if index % 5 == 0 else [], "notes": ""},
+            "is_active": True,
+            "created_at": f"2024-{1 + index % 12:02d}-{1 + index % 28:02d}T10:{index % 60:02d}:00",
+            "updated_at": None,
+        })
+    return json.dumps(patients).encode()
+
+
+class StubUpstream:
+    """Servidor upstream local que responde con cuerpos de tamaño configurable."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.connections = 0
+        self.requests = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> "StubUpstream":
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> "StubUpstream":
+        return await self.start()
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, dict]]:
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        # Descartar el cuerpo de la solicitud
+        if "content-length" in headers:
+            await reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        return method, target, headers
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                parsed = await self._read_request(reader)
+                if parsed is None:
+                    break
+                _, target, headers = parsed
+                self.requests += 1
+
+                query = parse_qs(urlsplit(target).query)
+                size = int(query.get("size", ["64"])[0])
+                delay = float(query.get("delay", ["0"])[0])
+                if delay:
+                    await asyncio.sleep(delay / 1000)
+
+                if "rows" in query:
+                    body = patient_page(int(query["rows"][0]))
+                    content_type = b"application/json"
+                else:
+                    body = b"x" * size
+                    content_type = b"application/octet-stream"
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    b"content-type: " + content_type + b"\r\n"
+                    + f"content-length: {len(body)}\r\n".encode()
+                    + (b"" if keep_alive else b"connection: close\r\n")
+                    + b"\r\n"
+                    + body
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionError):
+            pass
+        finally:
+            writer.close()
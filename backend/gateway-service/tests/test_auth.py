@@ -6,6 +6,7 @@ import time
 from unittest.mock import MagicMock, patch
 
 from app.utils.auth import verify_token
+from app.utils.token_cache import token_cache
 from app.config.settings import settings
 
 
@@ -46,6 +47,23 @@ class TestAuth:
         assert payload["tenant_id"] == "tenant1"
         assert payload["sub"] == "test@example.com"
 
+    @pytest.mark.asyncio
+    async def test_verify_token_uses_cache(self, mock_request, valid_token):
+        """Prueba que un token ya verificado no se vuelva a decodificar."""
+        # Configurar
+        token_cache.clear()
+        mock_request.headers = {"Authorization": f"Bearer {valid_token}"}
+        await verify_token(mock_request)
+        
+        # Ejecutar
+        with patch("app.utils.auth.jwt.decode") as mock_decode:
+            payload = await verify_token(mock_request)
+        
+        # Verificar
+        mock_decode.assert_not_called()
+        assert payload["user_id"] == "123"
+        assert token_cache.hits == 1
+
     @pytest.mark.asyncio
     async def test_verify_token_missing_header(self, mock_request):
         """Prueba que una solicitud sin token sea rechazada."""
@@ -0,0 +1,135 @@
+import random
+import pytest
+import httpx
+
+from app.config.settings import settings
+from app.utils.balancer import LoadBalancer, check_replica, replica_metrics
+from app.utils.routing import RoutingTable
+
+URLS = ["http://dentist-1:8002", "http://dentist-2:8002", "http://dentist-3:8002"]
+
+
+class TestLoadBalancer:
+    """Pruebas para el balanceador de réplicas."""
+
+    def test_least_outstanding(self):
+        """Prueba que se elija la réplica con menos solicitudes en curso."""
+        balancer = LoadBalancer(URLS)
+        balancer.replicas[0].in_flight = 5
+        balancer.replicas[1].in_flight = 1
+        balancer.replicas[2].in_flight = 3
+
+        assert balancer.choose().url == "http://dentist-2:8002"
+
+    def test_least_outstanding_spreads_ties(self):
+        """Prueba que los empates se repartan entre las réplicas."""
+        balancer = LoadBalancer(URLS)
+
+        chosen = {balancer.choose().url for _ in range(3)}
+
+        assert chosen == set(URLS)
+
+    def test_power_of_two_choices(self):
+        """Prueba que p2c elija la menos cargada de las dos réplicas muestreadas."""
+        balancer = LoadBalancer(URLS[:2], strategy="p2c", rng=random.Random(1))
+        balancer.replicas[0].in_flight = 4
+
+        assert all(balancer.choose().url == URLS[1] for _ in range(10))
+
+    def test_unhealthy_replicas_excluded(self):
+        """Prueba que las réplicas no saludables no reciban tráfico."""
+        balancer = LoadBalancer(URLS)
+        balancer.replicas[0].healthy = False
+        balancer.replicas[2].healthy = False
+
+        assert {balancer.choose().url for _ in range(5)} == {URLS[1]}
+
+    def test_all_unhealthy_falls_back_to_all(self):
+        """Prueba que si ninguna réplica está saludable se usen todas."""
+        balancer = LoadBalancer(URLS)
+        for replica in balancer.replicas:
+            replica.healthy = False
+
+        assert balancer.choose() in balancer.replicas
+
+    def test_track_in_flight(self):
+        """Prueba el conteo de solicitudes en curso."""
+        balancer = LoadBalancer(URLS)
+        replica = balancer.choose()
+
+        with balancer.track(replica):
+            assert replica.in_flight == 1
+        assert replica.in_flight == 0
+        assert replica.requests == 1
+
+    def test_record_health_thresholds(self, monkeypatch):
+        """Prueba que el estado cambie tras los fallos y éxitos consecutivos configurados."""
+        monkeypatch.setattr(settings, "HEALTH_CHECK_UNHEALTHY_THRESHOLD", 2)
+        monkeypatch.setattr(settings, "HEALTH_CHECK_HEALTHY_THRESHOLD", 1)
+        balancer = LoadBalancer(URLS)
+        replica = balancer.replicas[0]
+
+        balancer.record_health(replica, False)
+        assert replica.healthy is True
+        balancer.record_health(replica, False)
+        assert replica.healthy is False
+        balancer.record_health(replica, True)
+        assert replica.healthy is True
+
+    def test_outlier_ejection(self, monkeypatch):
+        """Prueba que una réplica con errores consecutivos se expulse temporalmente."""
+        monkeypatch.setattr(settings, "OUTLIER_CONSECUTIVE_ERRORS", 3)
+        monkeypatch.setattr(settings, "OUTLIER_EJECTION_SECONDS", 30)
+        monkeypatch.setattr(settings, "OUTLIER_MAX_EJECTION_PERCENT", 50)
+        now = [0.0]
+        balancer = LoadBalancer(URLS[:2], clock=lambda: now[0])
+        failing = balancer.replicas[0]
+
+        for _ in range(3):
+            balancer.record_result(failing, False)
+
+        assert balancer.is_ejected(failing)
+        assert {balancer.choose().url for _ in range(4)} == {URLS[1]}
+
+        # La segunda réplica no se expulsa: superaría el porcentaje máximo
+        for _ in range(3):
+            balancer.record_result(balancer.replicas[1], False)
+        assert not balancer.is_ejected(balancer.replicas[1])
+
+        now[0] = 31.0
+        assert not balancer.is_ejected(failing)
+        assert failing in balancer.candidates()
+
+    def test_invalid_strategy(self):
+        """Prueba que se rechace una estrategia desconocida."""
+        with pytest.raises(ValueError):
+            LoadBalancer(URLS, strategy="random")
+
+
+class TestHealthChecks:
+    """Pruebas para los health checks activos."""
+
+    @pytest.mark.asyncio
+    async def test_check_replica(self, monkeypatch):
+        """Prueba que una réplica que responde con error se marque como no saludable."""
+        monkeypatch.setattr(settings, "HEALTH_CHECK_UNHEALTHY_THRESHOLD", 1)
+        balancer = LoadBalancer(URLS[:2])
+        client = httpx.AsyncClient(transport=httpx.MockTransport(
+            lambda request: httpx.Response(200 if request.url.host == "dentist-1" else 503)
+        ))
+
+        for replica in balancer.replicas:
+            await check_replica(client, balancer, replica, "/health")
+
+        assert [replica.healthy for replica in balancer.replicas] == [True, False]
+        await client.aclose()
+
+    def test_replica_metrics(self):
+        """Prueba las métricas por réplica."""
+        table = RoutingTable({"dentist": {"url": URLS[0], "urls": URLS[:2]}})
+        table.get("dentist").balancer.replicas[1].in_flight = 3
+
+        lines = replica_metrics(table.services.values())
+
+        assert 'gateway_upstream_in_flight{service="dentist",replica="http://dentist-2:8002"} 3' in lines
+        assert 'gateway_upstream_healthy{service="dentist",replica="http://dentist-1:8002"} 1' in lines
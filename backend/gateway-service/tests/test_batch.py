@@ -0,0 +1,179 @@
+import asyncio
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException, Response
+from unittest.mock import AsyncMock, patch
+
+from app.api.batch import router
+from app.utils.rate_limit import set_rate_limiter
+from app.utils.routing import RoutingTable
+
+
+@pytest.fixture(autouse=True)
+def routing_table(monkeypatch):
+    """Fixture para usar una tabla de rutas conocida y sin límites de solicitudes."""
+    routing_table = RoutingTable({
+        "auth": {"url": "http://localhost:8001", "public_paths": ["login", "health"]},
+        "dentist": {"url": "http://localhost:8002", "public_paths": ["health"]},
+    })
+    monkeypatch.setattr("app.utils.routing._routing_table", routing_table)
+    monkeypatch.setattr("app.utils.rate_limit.settings.RATE_LIMIT_ENABLED", False)
+    set_rate_limiter(None)
+    return routing_table
+
+
+@pytest.fixture
+def client():
+    """Fixture para un cliente de una aplicación con el endpoint /batch."""
+    app = FastAPI()
+    app.include_router(router)
+    transport = httpx.ASGITransport(app=app)
+    return httpx.AsyncClient(transport=transport, base_url="http://gateway")
+
+
+def upstream(request, route, path):
+    """Respuesta simulada del servicio que describe la solicitud recibida."""
+    return Response(
+        content=f'{{"service": "{route.name}", "path": "{path}", "method": "{request.method}"}}'.encode(),
+        media_type="application/json",
+    )
+
+
+class TestBatch:
+    """Pruebas para el endpoint POST /batch."""
+
+    @pytest.mark.asyncio
+    @patch("app.api.batch.verify_token", new_callable=AsyncMock)
+    @patch("app.api.router.proxy_to_upstream", new_callable=AsyncMock)
+    async def test_ordered_responses_single_verification(self, mock_proxy, mock_verify, client):
+        """Prueba que el token se verifique una vez y las respuestas conserven el orden."""
+        mock_verify.return_value = {"sub": "user-1", "tenant_id": "tenant-1"}
+
+        async def proxy(request, route, path):
+            # La primera sub-solicitud tarda más para comprobar el orden
+            if path == "users/me":
+                await asyncio.sleep(0.01)
+            return upstream(request, route, path)
+
+        mock_proxy.side_effect = proxy
+
+        async with client:
+            response = await client.post("/batch", json={"requests": [
+                {"id": "me", "path": "/auth/users/me"},
+                {"id": "patients", "path": "/dentist/tenant-1/patients?limit=5"},
+                {"id": "login", "method": "POST", "path": "/auth/login", "body": {"email": "a@b.c"}},
+            ]}, headers={"Authorization": "Bearer token"})
+
+        assert response.status_code == 200
+        results = response.json()["responses"]
+        assert [result["id"] for result in results] == ["me", "patients", "login"]
+        assert results[0]["body"] == {"service": "auth", "path": "users/me", "method": "GET"}
+        assert results[1]["body"]["path"] == "tenant-1/patients"
+        assert results[2]["body"]["method"] == "POST"
+        mock_verify.assert_called_once()
+
+    @pytest.mark.asyncio
+    @patch("app.api.router.proxy_to_upstream", new_callable=AsyncMock)
+    async def test_sub_request_content(self, mock_proxy, client):
+        """Prueba que la sub-solicitud lleve la query, el cuerpo y los encabezados del elemento."""
+        received = {}
+
+        async def proxy(request, route, path):
+            received.update(
+                query=request.url.query,
+                body=await request.body(),
+                content_type=request.headers["content-type"],
+                custom=request.headers["x-custom"],
+                cookie=request.headers.get("cookie"),
+            )
+            return Response(status_code=204)
+
+        mock_proxy.side_effect = proxy
+
+        async with client:
+            response = await client.post("/batch", json={"requests": [{
+                "method": "post",
+                "path": "/auth/login?next=home",
+                "headers": {"X-Custom": "1"},
+                "body": {"email": "a@b.c"},
+            }]}, headers={"Cookie": "session=abc"})
+
+        assert response.json()["responses"][0] == {"id": None, "status": 204, "headers": {}, "body": None}
+        assert received == {
+            "query": "next=home",
+            "body": b'{"email": "a@b.c"}',
+            "content_type": "application/json",
+            "custom": "1",
+            "cookie": "session=abc",
+        }
+
+    @pytest.mark.asyncio
+    @patch("app.api.batch.verify_token", new_callable=AsyncMock)
+    @patch("app.api.router.proxy_to_upstream", new_callable=AsyncMock)
+    async def test_auth_error_only_for_protected_items(self, mock_proxy, mock_verify, client):
+        """Prueba que un token inválido solo afecte a los elementos protegidos."""
+        mock_verify.side_effect = HTTPException(
+            status_code=401, detail="Token inválido", headers={"WWW-Authenticate": "Bearer"}
+        )
+        mock_proxy.side_effect = upstream
+
+        async with client:
+            response = await client.post("/batch", json={"requests": [
+                {"path": "/auth/users/me"},
+                {"path": "/auth/health"},
+            ]})
+
+        protected, public = response.json()["responses"]
+        assert protected["status"] == 401
+        assert protected["body"] == {"detail": "Token inválido"}
+        assert protected["headers"]["www-authenticate"] == "Bearer"
+        assert public["status"] == 200
+        mock_proxy.assert_called_once()
+
+    @pytest.mark.asyncio
+    @patch("app.api.router.proxy_to_upstream", new_callable=AsyncMock)
+    async def test_invalid_items(self, mock_proxy, client):
+        """Prueba que los servicios desconocidos y los métodos no admitidos fallen por elemento."""
+        async with client:
+            response = await client.post("/batch", json={"requests": [
+                {"path": "/billing/invoices"},
+                {"path": "/batch"},
+                {"method": "TRACE", "path": "/auth/health"},
+            ]})
+
+        assert [result["status"] for result in response.json()["responses"]] == [404, 404, 405]
+        mock_proxy.assert_not_called()
+
+    @pytest.mark.asyncio
+    @patch("app.api.batch.verify_token", new_callable=AsyncMock)
+    @patch("app.api.router.proxy_to_upstream", new_callable=AsyncMock)
+    async def test_item_errors_isolated(self, mock_proxy, mock_verify, client):
+        """Prueba que un encabezado inválido o un error al reenviar fallen solo en su elemento."""
+        mock_verify.return_value = {"sub": "user-1"}
+
+        async def proxy(request, route, path):
+            if path == "broken":
+                raise RuntimeError("fallo inesperado")
+            return upstream(request, route, path)
+
+        mock_proxy.side_effect = proxy
+        async with client:
+            response = await client.post("/batch", json={"requests": [
+                {"path": "/dentist/patients", "headers": {"x-name": "Zoë ✓"}},
+                {"path": "/dentist/broken"},
+                {"path": "/dentist/patients"},
+            ]})
+
+        assert response.status_code == 200
+        assert [result["status"] for result in response.json()["responses"]] == [400, 502, 200]
+        assert mock_proxy.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_too_many_requests(self, client, monkeypatch):
+        """Prueba que se rechacen los lotes con más elementos que el máximo."""
+        monkeypatch.setattr("app.api.batch.settings.BATCH_MAX_REQUESTS", 2)
+
+        async with client:
+            response = await client.post("/batch", json={"requests": [{"path": "/auth/health"}] * 3})
+
+        assert response.status_code == 400
@@ -0,0 +1,135 @@
+import pytest
+
+from app.utils.breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+from app.utils.shared_memory import SharedTable
+
+
+class FakeClock:
+    """Reloj controlable para las pruebas de estados."""
+
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(
+        "dentist",
+        window_size=10,
+        min_requests=4,
+        error_rate=0.5,
+        latency_percentile=0.9,
+        latency_threshold=2.0,
+        open_seconds=30,
+        half_open_max_calls=2,
+        clock=clock,
+    )
+
+
+class TestCircuitBreaker:
+    """Pruebas para el circuit breaker de los servicios."""
+
+    def test_opens_on_error_rate(self, breaker):
+        """Prueba que el circuito se abra al superar la tasa de errores."""
+        for success in (True, False, True, False):
+            assert breaker.allow_request() is True
+            breaker.record(success, 0.01)
+
+        assert breaker.state == OPEN
+        assert breaker.allow_request() is False
+        assert breaker.rejected == 1
+
+    def test_needs_min_requests(self, breaker):
+        """Prueba que no se abra con menos solicitudes que el mínimo."""
+        for _ in range(3):
+            breaker.record(False, 0.01)
+
+        assert breaker.state == CLOSED
+
+    def test_opens_on_latency_percentile(self, breaker):
+        """Prueba que el circuito se abra si el percentil de latencia supera el umbral."""
+        for latency in (0.1, 0.1, 0.1, 2.5, 3.0):
+            breaker.record(True, latency)
+
+        assert breaker.state == OPEN
+
+    def test_half_open_after_timeout(self, breaker, clock):
+        """Prueba que tras el tiempo de apertura se permitan solicitudes de prueba limitadas."""
+        for _ in range(4):
+            breaker.record(False, 0.01)
+        assert breaker.retry_after() == 30
+
+        clock.now += 30
+
+        assert breaker.state == HALF_OPEN
+        assert breaker.allow_request() is True
+        assert breaker.allow_request() is True
+        assert breaker.allow_request() is False
+
+    def test_half_open_successes_close(self, breaker, clock):
+        """Prueba que las pruebas exitosas cierren el circuito."""
+        for _ in range(4):
+            breaker.record(False, 0.01)
+        clock.now += 30
+
+        for _ in range(2):
+            assert breaker.allow_request() is True
+            breaker.record(True, 0.01)
+
+        assert breaker.state == CLOSED
+
+    def test_half_open_failure_reopens(self, breaker, clock):
+        """Prueba que una prueba fallida vuelva a abrir el circuito."""
+        for _ in range(4):
+            breaker.record(False, 0.01)
+        clock.now += 30
+
+        breaker.allow_request()
+        breaker.record(False, 0.01)
+
+        assert breaker.state == OPEN
+        assert breaker.opened == 2
+
+    def test_cancel_releases_probe(self, breaker, clock):
+        """Prueba que una solicitud de prueba cancelada libere su cupo."""
+        for _ in range(4):
+            breaker.record(False, 0.01)
+        clock.now += 30
+        breaker.allow_request()
+        breaker.allow_request()
+
+        breaker.cancel()
+
+        assert breaker.allow_request() is True
+
+
+class TestSharedCircuitBreaker:
+    """Pruebas para la apertura del circuito compartida entre workers."""
+
+    def test_open_adopted_by_other_worker(self, clock, tmp_path):
+        """Prueba que la apertura del circuito en un worker se aplique en los demás."""
+        path = str(tmp_path / "gateway-breakers")
+        worker_1, worker_2 = (
+            CircuitBreaker("dentist", min_requests=2, open_seconds=30, clock=clock, shared=SharedTable(path, 64, 8))
+            for _ in range(2)
+        )
+
+        worker_1.record(False, 0.1)
+        worker_1.record(False, 0.1)
+
+        assert worker_1.state == OPEN
+        assert worker_2.state == OPEN
+        assert not worker_2.allow_request()
+        assert worker_2.retry_after() == pytest.approx(30)
+        assert worker_2.opened == 0
+
+        clock.now += 30
+        assert worker_2.state == HALF_OPEN
@@ -0,0 +1,163 @@
+import gzip
+import json
+import pytest
+from fastapi import Request, Response
+from unittest.mock import AsyncMock, patch
+
+from app.api.router import service_proxy
+from app.utils.capture import (
+    REDACTED,
+    TrafficCapture,
+    decode_body,
+    read_capture,
+    redact_query,
+    redact_value,
+    set_traffic_capture,
+)
+from app.utils.identity import Identity
+from app.utils.routing import RoutingTable
+
+TENANT_ID = "9b2f6c1e-3d4a-4f5b-8c7d-0e1f2a3b4c5d"
+FIELDS = frozenset({"password", "token"})
+
+
+def make_request(method="POST", path="/auth/login", query=b"", headers=(), body=b""):
+    """Solicitud de Starlette con el cuerpo indicado."""
+    raw_headers = [(name.encode(), value.encode()) for name, value in headers]
+    if body:
+        raw_headers.append((b"content-length", str(len(body)).encode()))
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query,
+        "headers": raw_headers,
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return Request(scope, receive)
+
+
+def make_capture(path, **kwargs):
+    kwargs.setdefault("redact_headers", ("authorization",))
+    kwargs.setdefault("redact_fields", tuple(FIELDS))
+    return TrafficCapture(str(path), **kwargs)
+
+
+class TestRedaction:
+    """Pruebas para la eliminación de secretos."""
+
+    def test_redact_nested_json(self):
+        """Prueba que los campos secretos se reemplacen en cualquier nivel."""
+        value = {"email": "ana@example.com", "Password": "x", "items": [{"token": "t", "id": 1}]}
+        assert redact_value(value, FIELDS) == {
+            "email": "ana@example.com",
+            "Password": REDACTED,
+            "items": [{"token": REDACTED, "id": 1}],
+        }
+
+    def test_redact_query(self):
+        """Prueba que los parámetros secretos de la query se reemplacen."""
+        assert redact_query("page=2&token=abc", FIELDS) == f"page=2&token={REDACTED}"
+
+
+class TestTrafficCapture:
+    """Pruebas para la captura de tráfico."""
+
+    @pytest.mark.asyncio
+    async def test_record_redacted(self, tmp_path):
+        """Prueba que se registren la ruta, el tenant, el estado y el cuerpo sin secretos."""
+        capture = make_capture(tmp_path / "capture.jsonl")
+        body = json.dumps({"email": "ana@example.com", "password": "secreto"}).encode()
+        request = make_request(
+            path="/auth/login",
+            query=b"next=%2Fhome&token=abc",
+            headers=[("authorization", "Bearer abc"), ("content-type", "application/json")],
+            body=body,
+        )
+        forward = AsyncMock(return_value=Response(status_code=201))
+
+        response = await capture.record(request, "auth", "login", Identity("user-1", TENANT_ID), forward)
+        capture.close()
+
+        assert response.status_code == 201
+        # El cuerpo sigue disponible para el reenvío
+        assert await request.body() == body
+        [record] = list(read_capture(str(tmp_path / "capture.jsonl")))
+        assert record["m"] == "POST"
+        assert record["s"] == "auth"
+        assert record["p"] == "/login"
+        assert record["r"] == "/auth/login"
+        assert record["tn"] == TENANT_ID
+        assert record["u"] and record["u"] != "user-1"
+        assert record["h"]["authorization"] == REDACTED
+        assert "content-length" not in record["h"]
+        assert record["q"] == f"next=%2Fhome&token={REDACTED}"
+        assert json.loads(decode_body(record)) == {"email": "ana@example.com", "password": REDACTED}
+        assert record["bs"] == len(body)
+        assert record["st"] == 201
+        assert record["ms"] >= 0
+
+    @pytest.mark.asyncio
+    async def test_large_body_recorded_by_size(self, tmp_path):
+        """Prueba que los cuerpos mayores que max_body_bytes solo se registren por tamaño."""
+        capture = make_capture(tmp_path / "capture.jsonl", max_body_bytes=8)
+        request = make_request(body=b"x" * 100, headers=[("content-type", "text/plain")])
+
+        await capture.record(request, "auth", "upload", Identity(), AsyncMock(return_value=Response()))
+        capture.close()
+
+        [record] = list(read_capture(str(tmp_path / "capture.jsonl")))
+        assert record["bs"] == 100
+        assert "b" not in record
+
+    @pytest.mark.asyncio
+    async def test_gzip_file_and_truncated_tail(self, tmp_path):
+        """Prueba la captura comprimida y que una última línea incompleta se ignore."""
+        path = tmp_path / "capture.jsonl.gz"
+        capture = make_capture(path)
+        for index in range(3):
+            request = make_request(method="GET", path=f"/dentist/{TENANT_ID}/patients/{index}")
+            await capture.record(
+                request, "dentist", f"{TENANT_ID}/patients/{index}", Identity(), AsyncMock(return_value=Response())
+            )
+        capture.close()
+        with gzip.open(path, "ab") as file:
+            file.write(b'{"t": 1')
+
+        records = list(read_capture(str(path)))
+        assert [record["r"] for record in records] == ["/dentist/{id}/patients/{id}"] * 3
+
+    @pytest.mark.asyncio
+    async def test_max_file_bytes(self, tmp_path):
+        """Prueba que al alcanzar el tamaño máximo los registros nuevos se descarten."""
+        capture = make_capture(tmp_path / "capture.jsonl", max_bytes=400)
+        for _ in range(10):
+            await capture.record(make_request(method="GET"), "auth", "me", Identity(), AsyncMock(return_value=Response()))
+        capture.close()
+
+        records = list(read_capture(str(tmp_path / "capture.jsonl")))
+        assert 0 < len(records) < 10
+        assert (tmp_path / "capture.jsonl").stat().st_size <= 400
+
+    @pytest.mark.asyncio
+    @patch("app.api.router.proxy_to_upstream", new_callable=AsyncMock)
+    async def test_proxy_captures_sampled_requests(self, mock_forward, tmp_path, monkeypatch):
+        """Prueba que las solicitudes reenviadas a los servicios se capturen."""
+        monkeypatch.setattr(
+            "app.utils.routing._routing_table",
+            RoutingTable({"auth": {"url": "http://localhost:8001", "public_paths": ["health"]}}),
+        )
+        mock_forward.return_value = Response(content=b"ok")
+        capture = make_capture(tmp_path / "capture.jsonl")
+        set_traffic_capture(capture)
+        try:
+            await service_proxy("auth", "health", make_request(method="GET", path="/auth/health"))
+        finally:
+            set_traffic_capture(None)
+            capture.close()
+
+        [record] = list(read_capture(str(tmp_path / "capture.jsonl")))
+        assert (record["m"], record["s"], record["p"], record["st"]) == ("GET", "auth", "/health", 200)
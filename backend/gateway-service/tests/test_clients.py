@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+import httpx
+
+from app.utils import clients
+from app.utils.clients import init_clients, get_client, close_clients, create_client
+
+
+@pytest.fixture(autouse=True)
+def reset_clients():
+    """Fixture para aislar el registro de clientes entre pruebas."""
+    clients._clients.clear()
+    yield
+    clients._clients.clear()
+
+
+class TestClients:
+    """Pruebas para los clientes HTTP compartidos."""
+
+    @pytest.mark.asyncio
+    async def test_one_client_per_service(self):
+        """Prueba que se cree un único cliente por servicio y se reutilice."""
+        await init_clients(["auth", "dentist"])
+
+        auth_client = get_client("auth")
+        assert get_client("auth") is auth_client
+        assert get_client("dentist") is not auth_client
+
+        await close_clients()
+        assert auth_client.is_closed
+
+    @pytest.mark.asyncio
+    async def test_get_client_without_init(self):
+        """Prueba que se cree el cliente bajo demanda si no se ejecutó el lifespan."""
+        client = get_client("auth")
+
+        assert isinstance(client, httpx.AsyncClient)
+        assert get_client("auth") is client
+        await close_clients()
+
+    @pytest.mark.asyncio
+    async def test_response_cookies_not_shared(self):
+        """Prueba que el cliente compartido no guarde cookies de las respuestas."""
+        client = create_client()
+        client._transport = httpx.MockTransport(
+            lambda request: httpx.Response(200, headers={"Set-Cookie": "session=abc; Path=/"})
+        )
+
+        response = await client.get("http://localhost:8001/login")
+
+        assert response.headers["set-cookie"] == "session=abc; Path=/"
+        assert len(client.cookies) == 0
+        await client.aclose()
+
+    @pytest.mark.asyncio
+    async def test_retired_client_waits_for_open_bodies(self, monkeypatch):
+        """Prueba que un cliente retirado no se cierre mientras transmite el cuerpo de una respuesta."""
+        monkeypatch.setattr(clients, "_retiring", {})
+        client = get_client("billing")
+        transport = client._transport
+        transport._transport = httpx.MockTransport(
+            lambda request: httpx.Response(200, stream=httpx.ByteStream(b"exportacion"))
+        )
+
+        response = await client.send(client.build_request("GET", "http://billing:8003/export"), stream=True)
+        assert transport.open == 1
+        clients.retire_client("billing", delay=0)
+        await asyncio.sleep(0.01)
+        assert not client.is_closed
+
+        assert [chunk async for chunk in response.aiter_raw()] == [b"exportacion"]
+        await response.aclose()
+        await asyncio.sleep(0.01)
+        assert transport.open == 0
+        assert client.is_closed
+        assert client not in clients._retiring
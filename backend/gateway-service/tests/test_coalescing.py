@@ -0,0 +1,159 @@
+import asyncio
+import pytest
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+from unittest.mock import MagicMock
+
+from app.utils.coalescing import SingleFlight
+from app.utils.identity import Identity
+
+
+def make_request(query="", headers=None):
+    request = MagicMock(spec=Request)
+    request.method = "GET"
+    request.url.query = query
+    request.headers = headers or {}
+    return request
+
+
+class TestBuildKey:
+    """Pruebas para la clave de agrupación."""
+
+    def test_same_request_same_key(self):
+        """Prueba que dos solicitudes idénticas del mismo tenant compartan clave."""
+        identity = Identity(subject="u1", tenant="t1")
+        first = SingleFlight.build_key(make_request("q=ana"), "dentist", "t1/patients", identity)
+        second = SingleFlight.build_key(make_request("q=ana"), "dentist", "t1/patients", identity)
+        assert first == second
+
+    def test_key_depends_on_identity_query_and_path(self):
+        """Prueba que la identidad, la query y la ruta formen parte de la clave."""
+        identity = Identity(subject="u1", tenant="t1")
+        base = SingleFlight.build_key(make_request("q=ana"), "dentist", "t1/patients", identity)
+
+        assert base != SingleFlight.build_key(make_request("q=ana"), "dentist", "t1/patients", Identity("u2", "t1"))
+        assert base != SingleFlight.build_key(make_request("q=luis"), "dentist", "t1/patients", identity)
+        assert base != SingleFlight.build_key(make_request("q=ana"), "dentist", "t1/appointments", identity)
+        assert base != SingleFlight.build_key(
+            make_request("q=ana", {"accept-encoding": "gzip"}), "dentist", "t1/patients", identity
+        )
+
+
+class TestSingleFlight:
+    """Pruebas para la agrupación de solicitudes en curso."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_share_one_call(self):
+        """Prueba que las solicitudes concurrentes reciban el resultado de una sola llamada."""
+        single_flight = SingleFlight()
+        release = asyncio.Event()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return Response(content=b'[{"id": 1}]', media_type="application/json")
+
+        tasks = [asyncio.create_task(single_flight.do("k", fetch)) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+        responses = await asyncio.gather(*tasks)
+
+        assert calls == 1
+        assert all(response.body == b'[{"id": 1}]' for response in responses)
+        assert all(response.headers["content-type"] == "application/json" for response in responses)
+        assert single_flight.stats()["leaders"] == 1
+        assert single_flight.stats()["followers"] == 4
+        assert single_flight.coalescing_ratio() == pytest.approx(0.8)
+        assert len(single_flight) == 0
+
+    @pytest.mark.asyncio
+    async def test_sequential_requests_not_coalesced(self):
+        """Prueba que las solicitudes que no se solapan se reenvíen cada una."""
+        single_flight = SingleFlight()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            return Response(content=b"ok")
+
+        await single_flight.do("k", fetch)
+        await single_flight.do("k", fetch)
+
+        assert calls == 2
+        assert single_flight.coalescing_ratio() == 0.0
+
+    @pytest.mark.asyncio
+    async def test_unshareable_response_falls_back(self):
+        """Prueba que con una respuesta transmitida por partes cada solicitud se reenvíe."""
+        single_flight = SingleFlight()
+        release = asyncio.Event()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return StreamingResponse(iter([b"a", b"b"]))
+
+        tasks = [asyncio.create_task(single_flight.do("k", fetch)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*tasks)
+
+        assert calls == 3
+        assert single_flight.stats()["fallbacks"] == 2
+        assert single_flight.coalescing_ratio() == 0.0
+
+    @pytest.mark.asyncio
+    async def test_set_cookie_not_shared(self):
+        """Prueba que una respuesta con Set-Cookie no se comparta."""
+        single_flight = SingleFlight()
+        response = Response(content=b"ok", headers={"set-cookie": "session=1"})
+        assert single_flight.share(response) is None
+
+    @pytest.mark.asyncio
+    async def test_error_propagates_to_waiters(self):
+        """Prueba que un error del líder se propague a las solicitudes en espera."""
+        single_flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            raise RuntimeError("fallo del servicio")
+
+        tasks = [asyncio.create_task(single_flight.do("k", fetch)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert len(single_flight) == 0
+
+    @pytest.mark.asyncio
+    async def test_leader_cancelled(self):
+        """Prueba que si el líder se cancela las solicitudes en espera se reenvíen solas."""
+        single_flight = SingleFlight()
+        release = asyncio.Event()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return Response(content=b"ok")
+
+        leader = asyncio.create_task(single_flight.do("k", fetch))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(single_flight.do("k", fetch))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        response = await follower
+        assert response.body == b"ok"
+        assert calls == 2
+        assert leader.cancelled()
@@ -0,0 +1,136 @@
+import gzip
+import json
+import zlib
+import pytest
+
+from app.utils.compression import CompressionMiddleware, negotiate_encoding
+
+
+def make_app(body_chunks, content_type="application/json", headers=()):
+    """Aplicación ASGI que responde con el cuerpo en las partes indicadas."""
+
+    async def app(scope, receive, send):
+        raw_headers = [(b"content-type", content_type.encode())] + [
+            (name.encode(), value.encode()) for name, value in headers
+        ]
+        await send({"type": "http.response.start", "status": 200, "headers": raw_headers})
+        for index, chunk in enumerate(body_chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": index < len(body_chunks) - 1})
+
+    return app
+
+
+async def call(app, accept_encoding="gzip"):
+    """Ejecuta la aplicación con CompressionMiddleware y devuelve los mensajes enviados."""
+    messages = []
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await CompressionMiddleware(app)(scope, receive, send)
+    return messages
+
+
+def response_headers(messages):
+    return {name.decode(): value.decode() for name, value in messages[0]["headers"]}
+
+
+def response_body(messages):
+    return b"".join(message.get("body", b"") for message in messages[1:])
+
+
+PATIENTS = json.dumps([{"id": index, "first_name": "Ana", "last_name": "Pérez"} for index in range(100)]).encode()
+
+
+class TestNegotiateEncoding:
+    """Pruebas para la negociación de la codificación."""
+
+    @pytest.mark.parametrize(
+        "accept_encoding, expected",
+        [
+            ("gzip", "gzip"),
+            ("gzip, br", "br"),
+            ("gzip;q=1.0, br;q=0.5", "gzip"),
+            ("br;q=0, gzip;q=0.1", "gzip"),
+            ("*", "br"),
+            ("identity", None),
+            ("gzip;q=0", None),
+        ],
+    )
+    def test_negotiation(self, accept_encoding, expected):
+        """Prueba que se elija la codificación con mayor q y, a igual q, la preferida."""
+        assert negotiate_encoding(accept_encoding, ("br", "gzip")) == expected
+
+
+class TestCompressionMiddleware:
+    """Pruebas para la compresión de las respuestas."""
+
+    @pytest.mark.asyncio
+    async def test_compresses_large_json(self):
+        """Prueba que una respuesta JSON grande se comprima con gzip."""
+        messages = await call(make_app([PATIENTS], headers=[("content-length", str(len(PATIENTS)))]))
+
+        headers = response_headers(messages)
+        assert headers["content-encoding"] == "gzip"
+        assert "content-length" not in headers
+        assert headers["vary"] == "Accept-Encoding"
+        assert gzip.decompress(response_body(messages)) == PATIENTS
+        assert len(response_body(messages)) < len(PATIENTS) / 4
+
+    @pytest.mark.asyncio
+    async def test_streams_chunk_by_chunk(self):
+        """Prueba que cada parte se comprima y se envíe al llegar, sin esperar el resto."""
+        chunks = [PATIENTS[:2000], PATIENTS[2000:4000], PATIENTS[4000:]]
+        messages = await call(make_app(chunks))
+
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        assert len(messages) == 1 + len(chunks)
+        assert decompressor.decompress(messages[1]["body"]) == chunks[0]
+        assert decompressor.decompress(messages[2]["body"]) == chunks[1]
+        assert messages[1]["more_body"] and not messages[-1]["more_body"]
+
+    @pytest.mark.asyncio
+    async def test_small_response_not_compressed(self):
+        """Prueba que las respuestas menores al mínimo se envíen sin comprimir."""
+        messages = await call(make_app([b'{"ok": true}']))
+
+        headers = response_headers(messages)
+        assert "content-encoding" not in headers
+        assert headers["vary"] == "Accept-Encoding"
+        assert response_body(messages) == b'{"ok": true}'
+
+    @pytest.mark.asyncio
+    async def test_already_compressed_passthrough(self):
+        """Prueba que un cuerpo ya comprimido por el servicio se reenvíe intacto."""
+        compressed = gzip.compress(PATIENTS)
+        messages = await call(make_app([compressed], headers=[("content-encoding", "gzip")]), "gzip, br")
+
+        assert response_headers(messages)["content-encoding"] == "gzip"
+        assert response_body(messages) == compressed
+
+    @pytest.mark.asyncio
+    async def test_content_type_not_allowed(self):
+        """Prueba que los tipos de contenido fuera de la lista no se compriman."""
+        messages = await call(make_app([b"\x89PNG" * 1000], content_type="image/png"))
+
+        assert "content-encoding" not in response_headers(messages)
+        assert "vary" not in response_headers(messages)
+
+    @pytest.mark.asyncio
+    async def test_client_without_compression(self):
+        """Prueba que no se comprima si el cliente no acepta ninguna codificación disponible."""
+        messages = await call(make_app([PATIENTS]), accept_encoding="identity")
+
+        assert "content-encoding" not in response_headers(messages)
+        assert response_body(messages) == PATIENTS
+
+    @pytest.mark.asyncio
+    async def test_etag_weakened(self):
+        """Prueba que el ETag fuerte se convierta en débil al comprimir."""
+        messages = await call(make_app([PATIENTS], headers=[("etag", '"abc"')]))
+
+        assert response_headers(messages)["etag"] == 'W/"abc"'
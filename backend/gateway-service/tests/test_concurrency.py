@@ -0,0 +1,215 @@
+import asyncio
+import time
+import pytest
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+from unittest.mock import MagicMock, patch
+
+from app.utils.concurrency import AdaptiveConcurrencyLimit, concurrency_metrics
+from app.utils.proxy import proxy_to_upstream
+from app.utils.routing import RoutingTable
+
+
+class FakeClock:
+    """Reloj controlable para las pruebas."""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestAdaptiveConcurrencyLimit:
+    """Pruebas para el límite adaptativo (AIMD)."""
+
+    def test_sheds_over_limit(self):
+        """Prueba que por encima del límite se rechace sin contar la solicitud."""
+        limiter = AdaptiveConcurrencyLimit("dentist", initial_limit=2, min_limit=1)
+        assert limiter.try_acquire()
+        assert limiter.try_acquire()
+        assert not limiter.try_acquire()
+        assert limiter.shed == 1
+        assert limiter.in_flight == 2
+
+    def test_additive_increase_when_used(self):
+        """Prueba que el límite crezca solo si se está usando."""
+        limiter = AdaptiveConcurrencyLimit("dentist", initial_limit=10, min_limit=1)
+        limiter.try_acquire()
+        limiter.release(0.01)
+        assert limiter.limit == 10
+
+        for _ in range(6):
+            limiter.try_acquire()
+        limiter.release(0.01)
+        assert limiter.limit == pytest.approx(10.1)
+
+    def test_multiplicative_decrease_once_per_round_trip(self):
+        """Prueba que las respuestas lentas de una misma ráfaga reduzcan el límite una sola vez."""
+        clock = FakeClock()
+        limiter = AdaptiveConcurrencyLimit("dentist", initial_limit=20, min_limit=5, clock=clock)
+        limiter.try_acquire()
+        limiter.release(0.01)
+
+        for _ in range(5):
+            limiter.try_acquire()
+        for _ in range(5):
+            limiter.release(0.5)
+        assert limiter.limit == pytest.approx(18)
+
+        clock.now += 1.0
+        limiter.try_acquire()
+        limiter.release(0.5)
+        assert limiter.limit == pytest.approx(16.2)
+
+    def test_overload_status_decreases_to_minimum(self):
+        """Prueba que las respuestas de saturación reduzcan el límite sin bajar del mínimo."""
+        clock = FakeClock()
+        limiter = AdaptiveConcurrencyLimit("dentist", initial_limit=10, min_limit=5, clock=clock)
+        for _ in range(20):
+            clock.now += 1.0
+            limiter.try_acquire()
+            limiter.release(0.01, ok=False)
+        assert limiter.limit == 5
+
+    def test_cancelled_request_does_not_adjust(self):
+        """Prueba que una solicitud cancelada libere el lugar sin cambiar el límite."""
+        limiter = AdaptiveConcurrencyLimit("dentist", initial_limit=1, min_limit=1)
+        limiter.try_acquire()
+        limiter.release(None)
+        assert limiter.in_flight == 0
+        assert limiter.limit == 1
+
+    def test_observe_keeps_request_in_flight(self):
+        """Prueba que la latencia informada antes de terminar ajuste el límite sin liberar el lugar."""
+        clock = FakeClock()
+        limiter = AdaptiveConcurrencyLimit("dentist", initial_limit=10, min_limit=5, clock=clock)
+        limiter.try_acquire()
+        limiter.observe(0.01, ok=False)
+        assert limiter.in_flight == 1
+        assert limiter.limit == 9
+
+        limiter.release(None)
+        assert limiter.in_flight == 0
+        assert limiter.limit == 9
+
+    def test_metrics(self):
+        """Prueba que se expongan el límite y las solicitudes rechazadas."""
+        route = RoutingTable({"dentist": {"url": "http://dentist:8002"}}).get("dentist")
+        route.limiter.shed = 3
+        lines = concurrency_metrics([route])
+        assert 'gateway_concurrency_limit{service="dentist"} 50' in lines
+        assert 'gateway_concurrency_shed_total{service="dentist"} 3' in lines
+
+
+class DegradingUpstream:
+    """
+    Servicio simulado cuya latencia crece con las solicitudes que atiende a
+    la vez (como un servicio saturado que encola internamente).
+    """
+
+    def __init__(self, per_request: float):
+        self.per_request = per_request
+        self.in_flight = 0
+
+    async def __call__(self, *args, **kwargs):
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(self.per_request * self.in_flight)
+        finally:
+            self.in_flight -= 1
+        return Response(status_code=200)
+
+
+async def run_wave(route, requests: int):
+    """Envía una ola de solicitudes concurrentes y devuelve (latencias aceptadas, rechazadas)."""
+    request = MagicMock(spec=Request)
+    request.method = "POST"
+    request.headers = {}
+
+    async def one():
+        start = time.perf_counter()
+        response = await proxy_to_upstream(request, route, "patients")
+        return response.status_code, time.perf_counter() - start
+
+    results = await asyncio.gather(*(one() for _ in range(requests)))
+    accepted = [latency for status, latency in results if status == 200]
+    shed = [status for status, _ in results if status == 503]
+    return accepted, shed
+
+
+class TestLoadShedding:
+    """Pruebas del límite de concurrencia frente a un servicio degradado."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("enabled", [True, False])
+    async def test_latency_bounded_when_upstream_degrades(self, enabled, monkeypatch):
+        """Prueba que con el límite la latencia quede acotada y el exceso se rechace con 503."""
+        monkeypatch.setattr("app.utils.proxy.settings.CONCURRENCY_LIMIT_ENABLED", enabled)
+        monkeypatch.setattr("app.utils.proxy.settings.BREAKER_ENABLED", False)
+        # Sin la cola de FAIR_QUEUE_*: el exceso se rechaza de inmediato
+        monkeypatch.setattr("app.utils.proxy.settings.FAIR_QUEUE_ENABLED", False)
+        route = RoutingTable({"dentist": {"url": "http://dentist:8002"}}).get("dentist")
+        route.limiter.limit = 20.0
+        upstream = DegradingUpstream(per_request=0.001)
+
+        with patch("app.utils.proxy.forward_request_to_service", new=upstream):
+            # Tráfico normal: fija la latencia de referencia
+            for _ in range(3):
+                await run_wave(route, 5)
+            # Sobrecarga: muchas más solicitudes concurrentes de las que el servicio soporta
+            for _ in range(3):
+                accepted, shed = await run_wave(route, 200)
+
+        if enabled:
+            assert shed
+            assert route.limiter.limit < 20
+            assert max(accepted) < 0.1
+        else:
+            assert not shed
+            assert max(accepted) > 0.15
+
+    @pytest.mark.asyncio
+    async def test_streamed_bodies_count_until_finished(self, monkeypatch):
+        """Prueba que las respuestas transmitidas en streaming ocupen su lugar hasta terminar o cancelarse."""
+        monkeypatch.setattr("app.utils.proxy.settings.BREAKER_ENABLED", False)
+        monkeypatch.setattr("app.utils.proxy.settings.FAIR_QUEUE_ENABLED", False)
+        route = RoutingTable({"dentist": {"url": "http://dentist:8002"}}).get("dentist")
+        route.limiter.limit = 2.0
+        route.limiter.min_limit = route.limiter.max_limit = 2
+        finish = asyncio.Event()
+
+        async def body():
+            yield b"inicio"
+            await finish.wait()
+            yield b"fin"
+
+        async def upstream(*args, **kwargs):
+            return StreamingResponse(body())
+
+        async def consume(response):
+            chunks = [chunk async for chunk in response.body_iterator]
+            await response.background()
+            return chunks
+
+        request = MagicMock(spec=Request)
+        request.method = "POST"
+        request.headers = {}
+        with patch("app.utils.proxy.forward_request_to_service", new=upstream):
+            first = await proxy_to_upstream(request, route, "exports")
+            second = await proxy_to_upstream(request, route, "exports")
+            streams = [asyncio.create_task(consume(first)), asyncio.create_task(consume(second))]
+            await asyncio.sleep(0)
+
+            # Los encabezados ya llegaron pero los cuerpos siguen abiertos
+            assert route.limiter.in_flight == 2
+            assert (await proxy_to_upstream(request, route, "exports")).status_code == 503
+
+            # El cliente se desconecta a mitad del cuerpo
+            streams[0].cancel()
+            await asyncio.gather(streams[0], return_exceptions=True)
+            assert route.limiter.in_flight == 1
+
+            finish.set()
+            assert await streams[1] == [b"inicio", b"fin"]
+            assert route.limiter.in_flight == 0
@@ -0,0 +1,121 @@
+import httpx
+import pytest
+
+from app.config.settings import settings
+from app.utils.cors import GatewayCORSMiddleware
+
+ORIGIN = "http://localhost:3000"
+
+
+def make_app(calls, cache_size=None):
+    """GatewayCORSMiddleware sobre una aplicación que registra las solicitudes que recibe."""
+
+    async def app(scope, receive, send):
+        calls.append(scope["method"])
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    return GatewayCORSMiddleware(app, cache_size=cache_size)
+
+
+def preflight_headers(origin=ORIGIN, method="POST", headers="authorization, content-type"):
+    return {
+        "origin": origin,
+        "access-control-request-method": method,
+        "access-control-request-headers": headers,
+    }
+
+
+@pytest.fixture(autouse=True)
+def cors_settings(monkeypatch):
+    monkeypatch.setattr(settings, "CORS_ORIGINS", [ORIGIN])
+    monkeypatch.setattr(settings, "CORS_MAX_AGE", 7200)
+
+
+class TestGatewayCORSMiddleware:
+    """Pruebas para el CORS del gateway."""
+
+    @pytest.mark.asyncio
+    async def test_preflight_answered_at_gateway(self):
+        """Prueba que el preflight se responda sin llegar a la aplicación (ni a los servicios)."""
+        calls = []
+        transport = httpx.ASGITransport(app=make_app(calls))
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+            response = await client.options("/dentist/patients", headers=preflight_headers())
+
+        assert response.status_code == 200
+        assert response.headers["access-control-allow-origin"] == ORIGIN
+        assert response.headers["access-control-allow-credentials"] == "true"
+        assert response.headers["access-control-allow-headers"] == "authorization, content-type"
+        assert response.headers["access-control-max-age"] == "7200"
+        assert calls == []
+
+    @pytest.mark.asyncio
+    async def test_preflight_from_unknown_origin_rejected(self):
+        """Prueba que el preflight de un origen no configurado se rechace en el gateway."""
+        calls = []
+        transport = httpx.ASGITransport(app=make_app(calls))
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+            response = await client.options("/auth/login", headers=preflight_headers(origin="https://evil.example"))
+
+        assert response.status_code == 400
+        assert "access-control-allow-origin" not in response.headers
+        assert calls == []
+
+    @pytest.mark.asyncio
+    async def test_preflight_cached(self):
+        """Prueba que las respuestas preflight se reutilicen por origen, método y encabezados."""
+        middleware = make_app([], cache_size=2)
+        transport = httpx.ASGITransport(app=middleware)
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+            first = await client.options("/dentist/patients", headers=preflight_headers())
+            second = await client.options("/dentist/patients/1", headers=preflight_headers())
+            await client.options("/dentist/patients", headers=preflight_headers(method="PUT"))
+            await client.options("/dentist/patients", headers=preflight_headers(method="DELETE"))
+
+        assert second.headers == first.headers
+        # Caché LRU de dos entradas: la primera combinación se descartó
+        assert [key[1] for key in middleware._preflights] == ["PUT", "DELETE"]
+
+    @pytest.mark.asyncio
+    async def test_cached_preflight_headers_not_shared(self):
+        """Prueba que los middlewares externos no modifiquen la respuesta guardada."""
+        middleware = make_app([])
+
+        async def outer(scope, receive, send):
+            async def send_with_id(message):
+                if message["type"] == "http.response.start":
+                    message["headers"].append((b"x-request-id", b"abc"))
+                await send(message)
+
+            await middleware(scope, receive, send_with_id)
+
+        transport = httpx.ASGITransport(app=outer)
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+            await client.options("/auth/me", headers=preflight_headers())
+            response = await client.options("/auth/me", headers=preflight_headers())
+
+        assert response.headers.get_list("x-request-id") == ["abc"]
+
+    @pytest.mark.asyncio
+    async def test_simple_request_forwarded_with_cors_headers(self):
+        """Prueba que las solicitudes normales lleguen a la aplicación con los encabezados CORS."""
+        calls = []
+        transport = httpx.ASGITransport(app=make_app(calls))
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+            response = await client.get("/dentist/patients", headers={"origin": ORIGIN})
+
+        assert calls == ["GET"]
+        assert response.headers["access-control-allow-origin"] == ORIGIN
+        assert "X-Request-ID" in response.headers["access-control-expose-headers"]
+
+    @pytest.mark.asyncio
+    async def test_options_without_preflight_forwarded(self):
+        """Prueba que un OPTIONS que no es preflight se reenvíe como cualquier solicitud."""
+        calls = []
+        transport = httpx.ASGITransport(app=make_app(calls))
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+            response = await client.options("/dentist/patients")
+
+        assert response.status_code == 200
+        assert calls == ["OPTIONS"]
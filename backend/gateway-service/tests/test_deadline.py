@@ -0,0 +1,88 @@
+import httpx
+import time
+import pytest
+from fastapi import FastAPI
+
+from app.utils.deadline import (
+    DeadlineExceeded,
+    DeadlineMiddleware,
+    check_deadline,
+    deadline_var,
+    format_deadline,
+    parse_deadline,
+    remaining,
+)
+
+
+@pytest.fixture
+def app():
+    """Fixture con una aplicación que usa DeadlineMiddleware."""
+    app = FastAPI()
+    app.add_middleware(DeadlineMiddleware)
+
+    @app.get("/remaining")
+    def get_remaining():
+        return {"remaining": remaining()}
+
+    @app.get("/expensive")
+    def expensive():
+        check_deadline(60.0)
+        return {"ok": True}
+
+    return app
+
+
+def make_client(app):
+    transport = httpx.ASGITransport(app=app)
+    return httpx.AsyncClient(transport=transport, base_url="http://service")
+
+
+class TestDeadline:
+    """Pruebas para el plazo de la solicitud."""
+
+    def test_format_and_parse(self):
+        """Prueba que el encabezado conserve el plazo en milisegundos."""
+        assert format_deadline(1700000000.1234) == "1700000000123"
+        assert parse_deadline("1700000000123") == 1700000000.123
+        assert parse_deadline("abc") is None
+        assert parse_deadline("0") is None
+        assert parse_deadline(None) is None
+
+    def test_check_deadline(self):
+        """Prueba que se lance DeadlineExceeded si no queda tiempo suficiente."""
+        check_deadline()
+        token = deadline_var.set(time.time() + 1.0)
+        try:
+            check_deadline(0.5)
+            with pytest.raises(DeadlineExceeded):
+                check_deadline(2.0)
+        finally:
+            deadline_var.reset(token)
+
+    @pytest.mark.asyncio
+    async def test_middleware_sets_deadline(self, app):
+        """Prueba que el middleware exponga el tiempo restante a la aplicación."""
+        deadline = format_deadline(time.time() + 5)
+
+        async with make_client(app) as client:
+            with_deadline = (await client.get("/remaining", headers={"X-Request-Deadline": deadline})).json()
+            without_deadline = (await client.get("/remaining")).json()
+
+        assert 0 < with_deadline["remaining"] <= 5
+        assert without_deadline["remaining"] is None
+
+    @pytest.mark.asyncio
+    async def test_expired_request_not_executed(self, app):
+        """Prueba que una solicitud con el plazo vencido se responda 504."""
+        async with make_client(app) as client:
+            response = await client.get("/remaining", headers={"X-Request-Deadline": format_deadline(time.time() - 1)})
+
+        assert response.status_code == 504
+
+    @pytest.mark.asyncio
+    async def test_insufficient_budget(self, app):
+        """Prueba que DeadlineExceeded en la aplicación se responda 504."""
+        async with make_client(app) as client:
+            response = await client.get("/expensive", headers={"X-Request-Deadline": format_deadline(time.time() + 5)})
+
+        assert response.status_code == 504
@@ -0,0 +1,332 @@
+import asyncio
+import pytest
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+from unittest.mock import MagicMock, patch
+
+from app.api.router import service_proxy
+from app.utils.concurrency import AdaptiveConcurrencyLimit
+from app.utils.fair_queue import QUEUE_REJECTED, FairScheduler, fair_queue_metrics
+from app.utils.identity import tenant_var
+from app.utils.proxy import proxy_to_upstream
+from app.utils.rate_limit import MemoryRateLimitStore, RateLimiter, set_rate_limiter
+from app.utils.routing import RoutingTable
+
+WEIGHTS = {"interactive": 8.0, "bulk": 1.0}
+TENANT_ID = "3f2504e0-4f89-11d3-9a0c-0305e82c3301"
+
+
+def make_scheduler(limit=1, **kwargs):
+    """Cola delante de un límite de concurrencia fijo."""
+    kwargs.setdefault("tenant_share", 1.0)
+    kwargs.setdefault("max_pending", 100)
+    kwargs.setdefault("max_wait", 5.0)
+    limiter = AdaptiveConcurrencyLimit("fair-test", initial_limit=limit, min_limit=limit, max_limit=limit)
+    return FairScheduler(limiter, WEIGHTS, **kwargs)
+
+
+async def settle():
+    """Deja correr a las solicitudes admitidas hasta que anoten su admisión."""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def queue(scheduler, tenant, priority, admitted):
+    """Encola una solicitud y anota su orden de admisión."""
+    task = asyncio.ensure_future(scheduler.acquire(tenant, priority))
+    task.add_done_callback(lambda _: admitted.append((tenant, priority)))
+    await settle()
+    return task
+
+
+async def drain(scheduler, tasks, admitted):
+    """Libera un lugar por cada solicitud admitida hasta vaciar la cola."""
+    while not all(task.done() for task in tasks):
+        scheduler.release(admitted[-1][0] if admitted else "", None)
+        await settle()
+
+
+class TestFairScheduler:
+    """Pruebas para la cola por clase de prioridad y tenant."""
+
+    @pytest.mark.asyncio
+    async def test_interactive_goes_first(self):
+        """Prueba que al liberarse un lugar pase primero la clase interactiva."""
+        scheduler = make_scheduler()
+        assert await scheduler.acquire("a", "bulk")
+        admitted = []
+        tasks = [
+            await queue(scheduler, "a", "bulk", admitted),
+            await queue(scheduler, "b", "interactive", admitted),
+        ]
+
+        scheduler.release("a", None)
+        await settle()
+
+        assert admitted == [("b", "interactive")]
+        assert scheduler.pending == 1
+        scheduler.release("b", None)
+        await asyncio.gather(*tasks)
+
+    @pytest.mark.asyncio
+    async def test_weighted_share_between_classes(self):
+        """Prueba que con ambas clases esperando la masiva reciba su parte según los pesos."""
+        scheduler = make_scheduler()
+        assert await scheduler.acquire("", "interactive")
+        admitted = []
+        tasks = []
+        for _ in range(18):
+            tasks.append(await queue(scheduler, "", "interactive", admitted))
+            tasks.append(await queue(scheduler, "", "bulk", admitted))
+
+        for _ in range(18):
+            scheduler.release("", None)
+            await settle()
+
+        assert [priority for _, priority in admitted].count("bulk") == 2
+        await drain(scheduler, tasks, admitted)
+
+    @pytest.mark.asyncio
+    async def test_round_robin_between_tenants(self):
+        """Prueba que un tenant con muchas solicitudes en espera no retrase a otro."""
+        scheduler = make_scheduler()
+        assert await scheduler.acquire("big", "bulk")
+        admitted = []
+        tasks = [await queue(scheduler, "big", "bulk", admitted) for _ in range(3)]
+        tasks.append(await queue(scheduler, "small", "bulk", admitted))
+
+        for _ in range(2):
+            scheduler.release(admitted[-1][0] if admitted else "big", None)
+            await settle()
+
+        assert admitted == [("big", "bulk"), ("small", "bulk")]
+        await drain(scheduler, tasks, admitted)
+
+    @pytest.mark.asyncio
+    async def test_tenant_share_bounded(self):
+        """Prueba que un tenant no supere su parte del límite aunque haya lugar."""
+        scheduler = make_scheduler(limit=4, tenant_share=0.5)
+        assert await scheduler.acquire("big", "interactive")
+        assert await scheduler.acquire("big", "interactive")
+        admitted = []
+        waiting = await queue(scheduler, "big", "interactive", admitted)
+
+        # Otro tenant pasa sin esperar
+        assert await scheduler.acquire("small", "interactive")
+        assert not waiting.done()
+        assert scheduler.in_flight("big") == 2
+
+        scheduler.release("big", None)
+        await waiting
+        assert scheduler.in_flight("big") == 2
+        assert scheduler.limiter.in_flight == 3
+
+    @pytest.mark.asyncio
+    async def test_rejected_when_wait_expires(self):
+        """Prueba que al vencer la espera la solicitud se rechace y salga de la cola."""
+        scheduler = make_scheduler(max_wait=0.01)
+        assert await scheduler.acquire("a", "bulk")
+
+        assert not await scheduler.acquire("a", "bulk")
+        assert scheduler.pending == 0
+        assert scheduler.limiter.shed == 1
+        assert QUEUE_REJECTED.labels("fair-test", "bulk", "timeout").value >= 1
+
+    @pytest.mark.asyncio
+    async def test_rejected_when_full(self):
+        """Prueba que con la cola llena la solicitud se rechace de inmediato."""
+        scheduler = make_scheduler(max_pending=1)
+        assert await scheduler.acquire("a", "interactive")
+        admitted = []
+        waiting = await queue(scheduler, "a", "interactive", admitted)
+
+        assert not await scheduler.acquire("b", "interactive")
+        scheduler.release("a", None)
+        assert await waiting
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_leaves_queue(self):
+        """Prueba que una solicitud cancelada mientras espera no ocupe un lugar."""
+        scheduler = make_scheduler()
+        assert await scheduler.acquire("a", "interactive")
+        admitted = []
+        waiting = await queue(scheduler, "b", "interactive", admitted)
+
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        scheduler.release("a", None)
+
+        assert scheduler.pending == 0
+        assert scheduler.limiter.in_flight == 0
+
+
+class TestPriorityRules:
+    """Pruebas para la clasificación de las solicitudes."""
+
+    def make_route(self):
+        config = {
+            "url": "http://dentist:8002",
+            "priorities": [{"path": "*/patients/export", "methods": ["get"], "class": "bulk"}],
+        }
+        return RoutingTable({"dentist": config}).get("dentist")
+
+    def test_rule_header_and_default(self):
+        """Prueba la clase por regla, por encabezado y por defecto."""
+        route = self.make_route()
+
+        assert route.priority_for("GET", "123/patients/export") == "bulk"
+        assert route.priority_for("GET", "123/patients/export", "interactive") == "bulk"
+        assert route.priority_for("GET", "123/patients", "Bulk") == "bulk"
+        assert route.priority_for("GET", "123/patients", "urgent") == "interactive"
+        assert route.priority_for("POST", "123/patients/export") == "interactive"
+
+    def test_unknown_class(self):
+        """Prueba que una regla con una clase desconocida se rechace."""
+        with pytest.raises(ValueError):
+            RoutingTable({"dentist": {"url": "http://dentist:8002", "priorities": [{"path": "*", "class": "urgent"}]}})
+
+    def test_state_kept_on_reload(self):
+        """Prueba que la cola se conserve al recargar la tabla de rutas."""
+        table = RoutingTable({"dentist": {"url": "http://dentist:8002"}})
+        reloaded = RoutingTable({"dentist": {"url": "http://dentist:8002", "timeout": 5}}, previous=table)
+
+        assert reloaded.get("dentist").scheduler is table.get("dentist").scheduler
+
+    def test_metrics(self):
+        """Prueba las métricas de solicitudes en espera por clase."""
+        route = self.make_route()
+        lines = fair_queue_metrics([route])
+
+        assert 'gateway_fair_queue_pending{service="dentist",priority="bulk"} 0' in lines
+
+
+class TestProxyFairQueue:
+    """Pruebas del reparto de la concurrencia entre tenants al reenviar."""
+
+    @pytest.mark.asyncio
+    async def test_bulk_tenant_does_not_starve_others(self, monkeypatch):
+        """Prueba que un tenant con exportaciones masivas no deje sin lugar a otro tenant."""
+        monkeypatch.setattr("app.utils.proxy.settings.BREAKER_ENABLED", False)
+        monkeypatch.setattr("app.utils.proxy.settings.FAIR_QUEUE_MAX_WAIT", 5.0)
+        config = {
+            "url": "http://dentist:8002",
+            "priorities": [{"path": "*/patients/export", "class": "bulk"}],
+        }
+        route = RoutingTable({"dentist": config}).get("dentist")
+        route.limiter.limit = 4.0
+        route.limiter.min_limit = route.limiter.max_limit = 4
+        active = {"big": 0, "small": 0}
+        peak = {"big": 0, "small": 0}
+        order = []
+
+        async def upstream(request, *args, **kwargs):
+            tenant = tenant_var.get()
+            active[tenant] += 1
+            peak[tenant] = max(peak[tenant], active[tenant])
+            order.append(tenant)
+            await asyncio.sleep(0.01)
+            active[tenant] -= 1
+            return Response(status_code=200)
+
+        async def send(tenant, path):
+            request = MagicMock(spec=Request)
+            request.method = "GET"
+            request.headers = {}
+            tenant_var.set(tenant)
+            return await proxy_to_upstream(request, route, path)
+
+        with patch("app.utils.proxy.send_idempotent", new=upstream):
+            bulk = [asyncio.create_task(send("big", "big/patients/export")) for _ in range(12)]
+            await asyncio.sleep(0)
+            small = await send("small", "small/patients")
+            responses = await asyncio.gather(*bulk)
+
+        assert small.status_code == 200
+        assert all(response.status_code == 200 for response in responses)
+        # El tenant masivo no supera la mitad del límite y el otro pasa antes que su cola
+        assert peak["big"] == 2
+        assert order.index("small") < 4
+
+    @pytest.mark.asyncio
+    async def test_tenant_header_does_not_escape_share(self, monkeypatch):
+        """Prueba que cambiar X-Tenant-ID en cada solicitud no evite la parte del tenant de la ruta."""
+        monkeypatch.setattr("app.utils.proxy.settings.BREAKER_ENABLED", False)
+        monkeypatch.setattr("app.utils.proxy.settings.FAIR_QUEUE_MAX_WAIT", 5.0)
+        table = RoutingTable({"dentist": {"url": "http://dentist:8002", "tenant_paths": ["{tenant}/*"]}})
+        monkeypatch.setattr("app.utils.routing._routing_table", table)
+        route = table.get("dentist")
+        route.limiter.limit = 4.0
+        route.limiter.min_limit = route.limiter.max_limit = 4
+        set_rate_limiter(RateLimiter(MemoryRateLimitStore()))
+        tenants = set()
+        active = peak = 0
+
+        async def upstream(*args, **kwargs):
+            nonlocal active, peak
+            tenants.add(tenant_var.get())
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return Response(status_code=201)
+
+        async def send(index):
+            request = MagicMock(spec=Request)
+            request.method = "POST"
+            request.headers = {"x-tenant-id": f"spoofed-{index}"}
+            request.client.host = "203.0.113.7"
+            return await service_proxy("dentist", f"{TENANT_ID}/patients", request)
+
+        try:
+            with patch("app.api.router.verify_token", return_value={"sub": "user-1"}), \
+                    patch("app.utils.proxy.forward_request_to_service", new=upstream):
+                responses = await asyncio.gather(*(send(index) for index in range(8)))
+        finally:
+            set_rate_limiter(None)
+
+        assert all(response.status_code == 201 for response in responses)
+        assert tenants == {TENANT_ID}
+        assert peak == 2
+
+    @pytest.mark.asyncio
+    async def test_streamed_bodies_hold_tenant_share(self, monkeypatch):
+        """Prueba que un tenant con exportaciones lentas en streaming no supere su parte mientras se transmiten."""
+        monkeypatch.setattr("app.utils.proxy.settings.BREAKER_ENABLED", False)
+        monkeypatch.setattr("app.utils.proxy.settings.FAIR_QUEUE_MAX_WAIT", 5.0)
+        route = RoutingTable({"dentist": {"url": "http://dentist:8002"}}).get("dentist")
+        route.limiter.limit = 4.0
+        route.limiter.min_limit = route.limiter.max_limit = 4
+        streaming = peak = 0
+
+        async def export():
+            nonlocal streaming, peak
+            streaming += 1
+            peak = max(peak, streaming)
+            try:
+                for _ in range(3):
+                    await asyncio.sleep(0.01)
+                    yield b"fila\n"
+            finally:
+                streaming -= 1
+
+        async def upstream(*args, **kwargs):
+            # Los encabezados llegan de inmediato y el cuerpo tarda
+            return StreamingResponse(export())
+
+        async def send():
+            request = MagicMock(spec=Request)
+            request.method = "GET"
+            request.headers = {}
+            tenant_var.set("big")
+            response = await proxy_to_upstream(request, route, "big/patients/export")
+            body = b"".join([chunk async for chunk in response.body_iterator])
+            await response.background()
+            return body
+
+        with patch("app.utils.proxy.send_idempotent", new=upstream):
+            bodies = await asyncio.gather(*(send() for _ in range(6)))
+
+        assert bodies == [b"fila\n" * 3] * 6
+        assert peak == 2
+        assert route.limiter.in_flight == 0
+        assert route.scheduler.in_flight("big") == 0
@@ -0,0 +1,44 @@
+import pytest
+
+from app.utils.identity import TenantPath, resolve_identity
+
+TENANT_ID = "3f2504e0-4f89-11d3-9a0c-0305e82c3301"
+USER_ID = "6fa459ea-ee8a-3ca4-894e-db77e160355e"
+
+# Rutas de tenant de los servicios por defecto
+DENTIST_TENANT_PATHS = (TenantPath.parse("{tenant}/*"),)
+AUTH_TENANT_PATHS = (TenantPath.parse("tenants/{tenant}"),)
+
+
+class TestResolveIdentity:
+    """Pruebas para la identidad de las solicitudes."""
+
+    def test_subject_and_tenant_from_token(self):
+        """Prueba que el tenant del token tenga prioridad."""
+        identity = resolve_identity(f"{TENANT_ID}/patients", {"sub": "u1", "tenant_id": "t9"}, DENTIST_TENANT_PATHS)
+
+        assert identity.subject == "u1"
+        assert identity.tenant == "t9"
+
+    def test_tenant_from_path(self):
+        """Prueba que se use el segmento de tenant de la ruta del servicio."""
+        assert resolve_identity(f"{TENANT_ID}/patients", {"sub": "u1"}, DENTIST_TENANT_PATHS).tenant == TENANT_ID
+        assert resolve_identity(f"tenants/{TENANT_ID}", {"sub": "u1"}, AUTH_TENANT_PATHS).tenant == TENANT_ID
+
+    def test_non_tenant_uuid_ignored(self):
+        """Prueba que un UUID fuera del segmento de tenant (ej: un usuario) no se tome como tenant."""
+        assert resolve_identity(f"users/{USER_ID}", {"sub": "u1"}, AUTH_TENANT_PATHS).tenant == ""
+        assert resolve_identity(f"{TENANT_ID}", {"sub": "u1"}, DENTIST_TENANT_PATHS).tenant == ""
+        assert resolve_identity("tenants/exists", {"sub": "u1"}, AUTH_TENANT_PATHS).tenant == ""
+
+    def test_anonymous(self):
+        """Prueba la identidad de una ruta pública sin token."""
+        identity = resolve_identity("login")
+
+        assert identity.subject == ""
+        assert identity.tenant == ""
+
+    def test_invalid_tenant_path(self):
+        """Prueba que un patrón sin segmento de tenant se rechace."""
+        with pytest.raises(ValueError):
+            TenantPath.parse("tenants/*")
@@ -0,0 +1,133 @@
+import io
+import json
+import logging
+import queue
+import sys
+import threading
+import pytest
+from logging.handlers import QueueListener
+
+from app.utils.logging_config import (
+    DeferredQueueHandler,
+    JsonFormatter,
+    RequestIdFilter,
+    client_address,
+    new_request_id,
+    request_id_var,
+    should_log_success,
+)
+
+
+class ThreadRecorder:
+    """Argumento de log que registra en qué hilo se convirtió a texto."""
+
+    def __init__(self):
+        self.thread = None
+
+    def __str__(self):
+        self.thread = threading.current_thread().name
+        return "valor"
+
+
+def make_record(msg="mensaje %s", args=("uno",), **extra):
+    record = logging.LogRecord("gateway-service", logging.INFO, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+class TestJsonFormatter:
+    """Pruebas para el formato JSON de los registros."""
+
+    def test_fields(self):
+        """Prueba que se incluyan el mensaje formateado, el servicio y los campos extra."""
+        record = make_record(request_id="req-1", status=200, duration_ms=1.5)
+        data = json.loads(JsonFormatter("gateway-service").format(record))
+
+        assert data["message"] == "mensaje uno"
+        assert data["service"] == "gateway-service"
+        assert data["level"] == "INFO"
+        assert data["request_id"] == "req-1"
+        assert data["status"] == 200
+        assert data["duration_ms"] == 1.5
+        assert data["ts"].endswith("Z")
+
+    def test_exception(self):
+        """Prueba que se incluya el traceback de las excepciones."""
+        try:
+            raise ValueError("fallo")
+        except ValueError:
+            record = logging.LogRecord(
+                "gateway-service", logging.ERROR, __file__, 1, "error", (), sys.exc_info()
+            )
+        data = json.loads(JsonFormatter("gateway-service").format(record))
+        assert "ValueError: fallo" in data["exc_info"]
+
+
+class TestQueuePipeline:
+    """Pruebas para el pipeline con QueueHandler y QueueListener."""
+
+    def test_formats_in_listener_thread(self):
+        """Prueba que el mensaje se formatee en el hilo del listener y no en el que registra."""
+        log_queue = queue.SimpleQueue()
+        stream = io.StringIO()
+        output = logging.StreamHandler(stream)
+        output.setFormatter(JsonFormatter("gateway-service"))
+        listener = QueueListener(log_queue, output)
+        handler = DeferredQueueHandler(log_queue)
+        handler.addFilter(RequestIdFilter())
+
+        logger = logging.getLogger("test-logging-pipeline")
+        logger.propagate = False
+        logger.addHandler(handler)
+        argument = ThreadRecorder()
+        token = request_id_var.set("req-42")
+        try:
+            listener.start()
+            logger.warning("valor: %s", argument)
+            listener.stop()
+        finally:
+            request_id_var.reset(token)
+            logger.removeHandler(handler)
+
+        data = json.loads(stream.getvalue())
+        assert data["message"] == "valor: valor"
+        assert data["request_id"] == "req-42"
+        assert argument.thread is not None
+        assert argument.thread != threading.current_thread().name
+
+
+class TestRequestId:
+    """Pruebas para el ID de la solicitud."""
+
+    def test_keeps_valid_header(self):
+        """Prueba que se conserve el ID recibido si es válido."""
+        assert new_request_id("abc-123") == "abc-123"
+
+    def test_replaces_invalid_header(self):
+        """Prueba que se genere un ID nuevo si el recibido es inválido o demasiado largo."""
+        assert new_request_id("a" * 200) != "a" * 200
+        assert new_request_id("bad\nvalue") != "bad\nvalue"
+        assert len(new_request_id(None)) == 32
+
+
+class TestClientAddress:
+    """Pruebas para la IP del cliente usada en los logs."""
+
+    def test_forwarded_for(self):
+        """Prueba que se use la primera IP de X-Forwarded-For."""
+        scope = {"headers": [(b"x-forwarded-for", b"192.0.2.1, 10.0.0.1")], "client": ("10.0.0.2", 1234)}
+        assert client_address(scope) == "192.0.2.1"
+
+    def test_connection_address(self):
+        """Prueba que sin X-Forwarded-For se use la dirección de la conexión."""
+        assert client_address({"headers": [], "client": ("10.0.0.2", 1234)}) == "10.0.0.2"
+        assert client_address({"headers": []}) == "unknown"
+
+
+class TestSampling:
+    """Pruebas para el muestreo de solicitudes exitosas."""
+
+    @pytest.mark.parametrize("rate, expected", [(1.0, True), (0.0, False)])
+    def test_limits(self, rate, expected):
+        """Prueba los extremos de la tasa de muestreo."""
+        assert all(should_log_success(rate) is expected for _ in range(50))
@@ -0,0 +1,150 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.middleware import proxy_route_template
+from app.utils import metrics
+from app.utils.metrics import Counter, Gauge, Histogram, MetricsMiddleware
+from app.utils.proxy import UpstreamTimer
+
+
+class TestHistogram:
+    """Pruebas para los histogramas con buckets fijos."""
+
+    def test_buckets_are_cumulative(self):
+        """Prueba que cada observación caiga en su bucket y la salida sea acumulada."""
+        histogram = Histogram("test_latency_seconds", "Latencia", ("route",), buckets=(0.1, 1.0), register=False)
+        child = histogram.labels("/a")
+        for value in (0.05, 0.1, 0.5, 3.0):
+            child.observe(value)
+
+        lines = histogram.collect()
+        assert "# TYPE test_latency_seconds histogram" in lines
+        assert 'test_latency_seconds_bucket{route="/a",le="0.1"} 2' in lines
+        assert 'test_latency_seconds_bucket{route="/a",le="1"} 3' in lines
+        assert 'test_latency_seconds_bucket{route="/a",le="+Inf"} 4' in lines
+        assert 'test_latency_seconds_count{route="/a"} 4' in lines
+        assert 'test_latency_seconds_sum{route="/a"} 3.650000' in lines
+
+    def test_labels_reuse_child(self):
+        """Prueba que las mismas etiquetas devuelvan el mismo hijo."""
+        histogram = Histogram("test_reuse_seconds", "Latencia", ("route",), register=False)
+        assert histogram.labels("/a") is histogram.labels("/a")
+
+    def test_wrong_label_count(self):
+        """Prueba que se rechace una cantidad incorrecta de etiquetas."""
+        histogram = Histogram("test_wrong_seconds", "Latencia", ("route",), register=False)
+        with pytest.raises(ValueError):
+            histogram.labels("/a", "GET")
+
+
+class TestCounterAndGauge:
+    """Pruebas para los contadores y gauges."""
+
+    def test_counter(self):
+        """Prueba que el contador acumule por combinación de etiquetas."""
+        counter = Counter("test_total", "Total", ("status",), register=False)
+        counter.labels("200").inc()
+        counter.labels("200").inc(2)
+        counter.labels("500").inc()
+
+        lines = counter.collect()
+        assert 'test_total{status="200"} 3' in lines
+        assert 'test_total{status="500"} 1' in lines
+
+    def test_gauge(self):
+        """Prueba que el gauge suba, baje y se pueda fijar."""
+        gauge = Gauge("test_in_flight", "En curso", register=False)
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+        assert "test_in_flight 1" in gauge.collect()
+        gauge.set(7)
+        assert "test_in_flight 7" in gauge.collect()
+
+    def test_series_limit(self, monkeypatch):
+        """Prueba que las series que superan el límite se acumulen en "other"."""
+        monkeypatch.setattr(metrics, "MAX_SERIES", 2)
+        counter = Counter("test_limited_total", "Total", ("route",), register=False)
+        for route in ("/a", "/b", "/c", "/d"):
+            counter.labels(route).inc()
+
+        lines = counter.collect()
+        assert 'test_limited_total{route="other"} 2' in lines
+        assert len(lines) == 2 + 3
+
+    def test_registered_in_render(self):
+        """Prueba que las métricas registradas aparezcan en /metrics."""
+        counter = Counter("test_rendered_total", "Total")
+        counter.inc()
+        assert "test_rendered_total 1" in metrics.render_metrics()
+
+
+class TestMetricsMiddleware:
+    """Pruebas para el middleware de métricas HTTP."""
+
+    @pytest.mark.asyncio
+    async def test_records_route_template_and_status(self):
+        """Prueba que se registre la plantilla de ruta y no la URL concreta."""
+        app = FastAPI()
+
+        @app.get("/items/{item_id}")
+        def get_item(item_id: int):
+            return {"id": item_id}
+
+        app.add_middleware(MetricsMiddleware, namespace="test_mw")
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await client.get("/items/1")
+            await client.get("/items/2")
+            await client.get("/missing")
+
+        duration, responses, in_flight = metrics.http_metrics("test_mw")
+        assert duration.labels("GET", "/items/{item_id}").count == 2
+        assert responses.labels("GET", "/items/{item_id}", "200").value == 2
+        assert responses.labels("GET", "unmatched", "404").value == 1
+        assert in_flight.labels().value == 0
+
+
+class TestRouteTemplate:
+    """Pruebas para la normalización de las rutas reenviadas."""
+
+    @pytest.mark.parametrize("path, expected", [
+        ("/dentist/42/patients/7", "/dentist/{id}/patients/{id}"),
+        ("/dentist/3fa85f64-5717-4562-b3fc-2c963f66afa6/patients", "/dentist/{id}/patients"),
+        ("/auth/login", "/auth/login"),
+        ("/auth/users/me", "/auth/users/me"),
+    ])
+    def test_ids_replaced(self, path, expected):
+        """Prueba que los identificadores numéricos y UUID se reemplacen por {id}."""
+        assert proxy_route_template(path) == expected
+
+
+class TestUpstreamTimer:
+    """Pruebas para la medición de conexión y espera del servicio."""
+
+    @pytest.mark.asyncio
+    async def test_connect_and_read(self):
+        """Prueba que TCP y TLS se sumen en una observación y la espera se mida aparte."""
+        timer = UpstreamTimer("test-timer")
+        for event in (
+            "connection.connect_tcp.started",
+            "connection.connect_tcp.complete",
+            "connection.start_tls.started",
+            "connection.start_tls.complete",
+            "http11.send_request_headers.started",
+            "http11.send_request_headers.complete",
+            "http11.receive_response_headers.started",
+            "http11.receive_response_headers.complete",
+        ):
+            await timer(event, {})
+        # Solicitud siguiente por la misma conexión: sin tiempo de conexión
+        for event in (
+            "http11.send_request_headers.started",
+            "http11.receive_response_headers.started",
+            "http11.receive_response_headers.complete",
+        ):
+            await timer(event, {})
+
+        assert timer.connect.count == 1
+        assert timer.read.count == 2
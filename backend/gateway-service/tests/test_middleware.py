@@ -0,0 +1,151 @@
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException, Response
+from unittest.mock import AsyncMock, patch
+
+from app.api.router import router
+from app.middleware import ProxyMiddleware, RequestLoggingMiddleware
+from app.utils.routing import RoutingTable
+
+
+@pytest.fixture
+def routing_table(monkeypatch):
+    """Fixture para usar una tabla de rutas conocida."""
+    routing_table = RoutingTable({
+        "auth": {"url": "http://localhost:8001", "public_paths": ["login", "health"]},
+        "dentist": {"url": "http://localhost:8002", "public_paths": ["health"]},
+    })
+    monkeypatch.setattr("app.utils.routing._routing_table", routing_table)
+    return routing_table
+
+
+@pytest.fixture
+def gateway(routing_table):
+    """Fixture para una aplicación con la misma composición que app.main."""
+    app = FastAPI()
+    app.add_middleware(ProxyMiddleware)
+    app.add_middleware(RequestLoggingMiddleware)
+    app.include_router(router)
+
+    @app.get("/health")
+    def health_check():
+        return {"status": "healthy"}
+
+    @app.get("/boom")
+    def boom():
+        raise RuntimeError("fallo inesperado")
+
+    return app
+
+
+def make_client(app):
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    return httpx.AsyncClient(transport=transport, base_url="http://gateway")
+
+
+class TestProxyMiddleware:
+    """Pruebas para el middleware que atiende las rutas de los servicios."""
+
+    @pytest.mark.asyncio
+    @patch("app.middleware.service_proxy", new_callable=AsyncMock)
+    async def test_service_path_handled_directly(self, mock_proxy, gateway):
+        """Prueba que las rutas de un servicio se atiendan sin el enrutamiento de FastAPI."""
+        mock_proxy.return_value = Response(content=b"ok", status_code=201)
+
+        async with make_client(gateway) as client:
+            response = await client.post("/auth/login", content=b"{}")
+
+        assert response.status_code == 201
+        assert response.content == b"ok"
+        service, path, request = mock_proxy.call_args.args
+        assert (service, path) == ("auth", "login")
+        assert request.method == "POST"
+
+    @pytest.mark.asyncio
+    @patch("app.middleware.service_proxy", new_callable=AsyncMock)
+    async def test_http_exception_as_json(self, mock_proxy, gateway):
+        """Prueba que un HTTPException se convierta en una respuesta JSON."""
+        mock_proxy.side_effect = HTTPException(
+            status_code=401, detail="Token inválido", headers={"WWW-Authenticate": "Bearer"}
+        )
+
+        async with make_client(gateway) as client:
+            response = await client.get("/dentist/appointments")
+
+        assert response.status_code == 401
+        assert response.json() == {"detail": "Token inválido"}
+        assert response.headers["www-authenticate"] == "Bearer"
+
+    @pytest.mark.asyncio
+    @patch("app.middleware.service_proxy", new_callable=AsyncMock)
+    async def test_other_paths_go_to_fastapi(self, mock_proxy, gateway):
+        """Prueba que /health y los servicios desconocidos sigan a FastAPI."""
+        async with make_client(gateway) as client:
+            health = await client.get("/health")
+            unknown = await client.get("/billing/invoices")
+
+        assert health.json() == {"status": "healthy"}
+        assert unknown.status_code == 404
+        assert "no encontrado" in unknown.json()["detail"]
+        mock_proxy.assert_not_called()
+
+    @pytest.mark.asyncio
+    @patch("app.middleware.service_proxy", new_callable=AsyncMock)
+    async def test_unsupported_method_goes_to_fastapi(self, mock_proxy, gateway):
+        """Prueba que los métodos que no se reenvían sigan a FastAPI (405)."""
+        async with make_client(gateway) as client:
+            response = await client.request("TRACE", "/auth/login")
+
+        assert response.status_code == 405
+        mock_proxy.assert_not_called()
+
+
+class TestRequestLoggingMiddleware:
+    """Pruebas para el middleware de logging."""
+
+    @pytest.mark.asyncio
+    async def test_logs_request_and_response(self, gateway, caplog):
+        """Prueba que se registre una línea con el código, el ID de la solicitud y la duración."""
+        with caplog.at_level("INFO", logger="gateway-service"):
+            async with make_client(gateway) as client:
+                response = await client.get("/health", headers={"X-Request-ID": "req-123"})
+
+        assert response.headers["x-request-id"] == "req-123"
+        records = [record for record in caplog.records if getattr(record, "status", None) == 200]
+        assert len(records) == 1
+        assert records[0].getMessage().startswith("GET /health - Status: 200")
+        assert records[0].request_id == "req-123"
+        assert records[0].path == "/health"
+
+    @pytest.mark.asyncio
+    async def test_generates_request_id(self, gateway):
+        """Prueba que se genere un ID de solicitud si el cliente no lo envía."""
+        async with make_client(gateway) as client:
+            first = await client.get("/health")
+            second = await client.get("/health")
+
+        assert len(first.headers["x-request-id"]) == 32
+        assert first.headers["x-request-id"] != second.headers["x-request-id"]
+
+    @pytest.mark.asyncio
+    async def test_successful_requests_sampled(self, gateway, caplog, monkeypatch):
+        """Prueba que con muestreo 0 no se registren las solicitudes exitosas pero sí los errores."""
+        monkeypatch.setattr("app.middleware.settings.LOG_SAMPLE_RATE", 0.0)
+        app = RequestLoggingMiddleware(gateway)
+        with caplog.at_level("INFO", logger="gateway-service"):
+            async with make_client(app) as client:
+                await client.get("/health")
+                await client.get("/billing/invoices")
+
+        statuses = [getattr(record, "status", None) for record in caplog.records]
+        assert 200 not in statuses
+        assert 404 in statuses
+
+    @pytest.mark.asyncio
+    async def test_unhandled_error_returns_500(self, gateway):
+        """Prueba que un error no controlado devuelva 500 en JSON."""
+        async with make_client(gateway) as client:
+            response = await client.get("/boom")
+
+        assert response.status_code == 500
+        assert response.json() == {"detail": "Internal server error"}
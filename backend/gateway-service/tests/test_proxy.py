@@ -1,9 +1,18 @@
+import asyncio
+import gzip
 import pytest
-from fastapi import Request
+import time
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from unittest.mock import MagicMock, patch, AsyncMock
 import httpx
 
-from app.utils.proxy import forward_request_to_service
+from app.utils.deadline import deadline_var
+from app.utils.identity import identity_header_var
+from app.utils.logging_config import request_id_var
+from app.utils.proxy import forward_request_to_service, filter_headers, proxy_to_upstream
+from app.utils.routing import RoutingTable
 
 
 @pytest.fixture
@@ -12,6 +21,7 @@ def mock_request():
     request = MagicMock(spec=Request)
     request.method = "GET"
     request.url.path = "/dentist/appointments"
+    request.url.query = ""
     request.query_params = {}
     request.headers = {"Content-Type": "application/json", "Authorization": "Bearer token123"}
     request.cookies = {}
@@ -19,19 +29,23 @@ def mock_request():
     return request
 
 
+def upstream_response(status_code, headers, body):
+    """Crea una respuesta de servicio sin leer, como la devuelve send(stream=True)."""
+    headers = list(headers) + [("Content-Length", str(len(body)))]
+    return httpx.Response(status_code, headers=headers, stream=httpx.ByteStream(body))
+
+
 class TestProxy:
     """Pruebas para las funciones de proxy."""
 
     @pytest.mark.asyncio
-    @patch("httpx.AsyncClient.request", new_callable=AsyncMock)
-    async def test_forward_request_url_construction(self, mock_request_method, mock_request):
+    @patch("httpx.AsyncClient.send", new_callable=AsyncMock)
+    async def test_forward_request_url_construction(self, mock_send, mock_request):
         """Prueba que la URL se construya correctamente."""
         # Configurar
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.headers = {"Content-Type": "application/json"}
-        mock_response.content = b'{"result": "success"}'
-        mock_request_method.return_value = mock_response
+        mock_send.return_value = upstream_response(
+            200, [("Content-Type", "application/json")], b'{"result": "success"}'
+        )
         
         # Configurar la URL correctamente
         mock_request.url.query = ""
@@ -40,55 +54,123 @@ class TestProxy:
         await forward_request_to_service(mock_request, "http://localhost:8002")
         
         # Verificar
-        mock_request_method.assert_called_once()
-        call_args = mock_request_method.call_args[1]
+        mock_send.assert_called_once()
+        upstream_request = mock_send.call_args[0][0]
         # Verificar que la URL contenga la parte correcta, sin verificar la query
-        assert "http://localhost:8002/appointments" in call_args["url"]
-        assert call_args["method"] == "GET"
+        assert "http://localhost:8002/appointments" in str(upstream_request.url)
+        assert upstream_request.method == "GET"
 
     @pytest.mark.asyncio
-    @patch("httpx.AsyncClient.request", new_callable=AsyncMock)
-    async def test_forward_request_headers(self, mock_request_method, mock_request):
+    @patch("httpx.AsyncClient.send", new_callable=AsyncMock)
+    async def test_forward_request_headers(self, mock_send, mock_request):
         """Prueba que los headers se reenvíen correctamente."""
         # Configurar
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.headers = {"Content-Type": "application/json"}
-        mock_response.content = b'{"result": "success"}'
-        mock_request_method.return_value = mock_response
+        mock_send.return_value = upstream_response(
+            200, [("Content-Type", "application/json")], b'{"result": "success"}'
+        )
         
         # Ejecutar
         await forward_request_to_service(mock_request, "http://localhost:8002")
         
         # Verificar
-        mock_request_method.assert_called_once()
-        call_args = mock_request_method.call_args[1]
-        assert "headers" in call_args
-        assert call_args["headers"]["Content-Type"] == "application/json"
-        assert call_args["headers"]["Authorization"] == "Bearer token123"
+        mock_send.assert_called_once()
+        upstream_request = mock_send.call_args[0][0]
+        assert upstream_request.headers["Content-Type"] == "application/json"
+        assert upstream_request.headers["Authorization"] == "Bearer token123"
+
+    @pytest.mark.asyncio
+    @patch("httpx.AsyncClient.send", new_callable=AsyncMock)
+    async def test_forward_request_propagates_request_id(self, mock_send, mock_request):
+        """Prueba que el ID de la solicitud en curso se propague al servicio."""
+        # Configurar
+        mock_send.return_value = upstream_response(200, [], b"ok")
+        token = request_id_var.set("req-77")
+        
+        # Ejecutar
+        try:
+            await forward_request_to_service(mock_request, "http://localhost:8002")
+        finally:
+            request_id_var.reset(token)
+        
+        # Verificar
+        upstream_request = mock_send.call_args[0][0]
+        assert upstream_request.headers["x-request-id"] == "req-77"
 
     @pytest.mark.asyncio
-    @patch("httpx.AsyncClient.request", new_callable=AsyncMock)
-    async def test_forward_request_body(self, mock_request_method, mock_request):
+    @patch("httpx.AsyncClient.send", new_callable=AsyncMock)
+    async def test_forward_request_identity_header(self, mock_send, mock_request):
+        """Prueba que se descarte la identidad enviada por el cliente y se envíe la del gateway."""
+        # Configurar
+        mock_send.return_value = upstream_response(200, [], b"ok")
+        mock_request.headers = {"X-Gateway-Identity": "falsa.firma"}
+
+        # Ejecutar
+        await forward_request_to_service(mock_request, "http://localhost:8002")
+        token = identity_header_var.set("claims.firma")
+        try:
+            await forward_request_to_service(mock_request, "http://localhost:8002")
+        finally:
+            identity_header_var.reset(token)
+
+        # Verificar
+        without_identity, with_identity = [call.args[0] for call in mock_send.call_args_list]
+        assert "x-gateway-identity" not in without_identity.headers
+        assert with_identity.headers.get_list("x-gateway-identity") == ["claims.firma"]
+
+    @pytest.mark.asyncio
+    @patch("httpx.AsyncClient.send", new_callable=AsyncMock)
+    async def test_forward_request_deadline(self, mock_send, mock_request):
+        """Prueba que se propague el plazo del gateway (no el del cliente) y limite la espera."""
+        # Configurar
+        mock_send.return_value = upstream_response(200, [], b"ok")
+        mock_request.headers = {"X-Request-Deadline": "1"}
+
+        # Ejecutar
+        token = deadline_var.set(time.time() + 2.0)
+        try:
+            await forward_request_to_service(mock_request, "http://localhost:8002")
+        finally:
+            deadline_var.reset(token)
+
+        # Verificar
+        upstream_request = mock_send.call_args[0][0]
+        deadline = int(upstream_request.headers["x-request-deadline"])
+        assert deadline > time.time() * 1000
+        assert upstream_request.extensions["timeout"]["read"] <= 2.0
+
+    @pytest.mark.asyncio
+    @patch("httpx.AsyncClient.send", new_callable=AsyncMock)
+    async def test_forward_request_read_timeout(self, mock_send, mock_request):
+        """Prueba que un servicio que no responde a tiempo se responda 504."""
+        # Configurar
+        mock_send.side_effect = httpx.ReadTimeout("timeout")
+
+        # Ejecutar
+        response = await forward_request_to_service(mock_request, "http://localhost:8002")
+
+        # Verificar
+        assert response.status_code == 504
+
+    @pytest.mark.asyncio
+    @patch("httpx.AsyncClient.send", new_callable=AsyncMock)
+    async def test_forward_request_body(self, mock_send, mock_request):
         """Prueba que el cuerpo de la solicitud se reenvíe correctamente."""
         # Configurar
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.headers = {"Content-Type": "application/json"}
-        mock_response.content = b'{"result": "success"}'
-        mock_request_method.return_value = mock_response
+        mock_send.return_value = upstream_response(
+            200, [("Content-Type", "application/json")], b'{"result": "success"}'
+        )
         
         # Ejecutar
         await forward_request_to_service(mock_request, "http://localhost:8002")
         
         # Verificar
-        mock_request_method.assert_called_once()
-        call_args = mock_request_method.call_args[1]
-        assert call_args["content"] == b'{"data": "test"}'
+        mock_send.assert_called_once()
+        upstream_request = mock_send.call_args[0][0]
+        assert upstream_request.content == b'{"data": "test"}'
 
     @pytest.mark.asyncio
-    @patch("httpx.AsyncClient.request", side_effect=httpx.RequestError("Connection error"))
-    async def test_forward_request_connection_error(self, mock_request_method, mock_request):
+    @patch("httpx.AsyncClient.send", side_effect=httpx.RequestError("Connection error"))
+    async def test_forward_request_connection_error(self, mock_send, mock_request):
         """Prueba el manejo de errores de conexión."""
         # Ejecutar y verificar
         response = await forward_request_to_service(mock_request, "http://localhost:8002")
@@ -99,4 +181,283 @@ class TestProxy:
         # En FastAPI, el contenido se pasa como parámetro al constructor de Response
         # pero no se puede acceder directamente como atributo
         # Verificamos solo el código de estado que es suficiente para esta prueba
-        mock_request_method.assert_called_once()
+        mock_send.assert_called_once()
+
+    @pytest.mark.asyncio
+    @patch("httpx.AsyncClient.send", new_callable=AsyncMock)
+    async def test_forward_request_streams_large_body(self, mock_send, mock_request):
+        """Prueba que un cuerpo grande se transmita al servicio sin leerlo completo."""
+        # Configurar
+        async def chunks():
+            yield b"a" * 10
+            yield b"b" * 10
+
+        mock_request.method = "POST"
+        mock_request.headers = {"content-length": str(10 * 1024 * 1024), "content-type": "image/png"}
+        mock_request.stream = MagicMock(return_value=chunks())
+        mock_send.return_value = upstream_response(201, [], b"")
+
+        # Ejecutar
+        await forward_request_to_service(mock_request, "http://localhost:8002")
+
+        # Verificar
+        mock_request.body.assert_not_called()
+        upstream_request = mock_send.call_args[0][0]
+        assert b"".join([chunk async for chunk in upstream_request.stream]) == b"a" * 10 + b"b" * 10
+
+    @pytest.mark.asyncio
+    @patch("httpx.AsyncClient.send", new_callable=AsyncMock)
+    async def test_forward_response_streaming_passthrough(self, mock_send, mock_request):
+        """Prueba que una respuesta comprimida sin longitud se transmita sin decodificar."""
+        # Configurar
+        compressed = gzip.compress(b'[{"id": 1}]' * 1000)
+
+        async def chunks():
+            yield compressed[:100]
+            yield compressed[100:]
+
+        mock_send.return_value = httpx.Response(
+            200,
+            headers={"Content-Encoding": "gzip", "Content-Type": "application/json", "Transfer-Encoding": "chunked"},
+            content=chunks(),
+        )
+
+        # Ejecutar
+        response = await forward_request_to_service(mock_request, "http://localhost:8002")
+
+        # Verificar
+        assert isinstance(response, StreamingResponse)
+        assert response.headers["content-encoding"] == "gzip"
+        assert "transfer-encoding" not in response.headers
+        assert b"".join([chunk async for chunk in response.body_iterator]) == compressed
+
+    @pytest.mark.asyncio
+    @patch("httpx.AsyncClient.send", new_callable=AsyncMock)
+    async def test_forward_response_keeps_repeated_headers(self, mock_send, mock_request):
+        """Prueba que los encabezados repetidos (Set-Cookie) se conserven."""
+        # Configurar
+        mock_send.return_value = upstream_response(
+            200, [("Set-Cookie", "a=1"), ("Set-Cookie", "b=2"), ("Connection", "keep-alive")], b"ok"
+        )
+
+        # Ejecutar
+        response = await forward_request_to_service(mock_request, "http://localhost:8002")
+
+        # Verificar
+        assert response.body == b"ok"
+        assert response.headers.getlist("set-cookie") == ["a=1", "b=2"]
+        assert "connection" not in response.headers
+        assert response.headers["content-length"] == "2"
+
+
+class TestFilterHeaders:
+    """Pruebas para la función filter_headers."""
+
+    def test_removes_hop_by_hop_headers(self):
+        """Prueba que se eliminen los encabezados hop-by-hop y los listados en Connection."""
+        headers = [
+            ("Connection", "keep-alive, X-Internal"),
+            ("Keep-Alive", "timeout=5"),
+            ("X-Internal", "1"),
+            ("Transfer-Encoding", "chunked"),
+            ("Content-Type", "application/json"),
+            ("Host", "gateway"),
+        ]
+
+        assert filter_headers(headers, exclude=("host",)) == [("Content-Type", "application/json")]
+
+
+class TestProxyToUpstream:
+    """Pruebas para la selección de réplica antes de reenviar."""
+
+    @pytest.mark.asyncio
+    @patch("app.utils.proxy.forward_request_to_service", new_callable=AsyncMock)
+    async def test_forwards_to_least_loaded_replica(self, mock_forward, mock_request):
+        """Prueba que la solicitud se envíe a la réplica menos cargada y se cuente como en curso."""
+        # Configurar
+        route = RoutingTable({
+            "dentist": {"url": "http://dentist-1:8002", "urls": ["http://dentist-1:8002", "http://dentist-2:8002"]}
+        }).get("dentist")
+        route.balancer.replicas[0].in_flight = 2
+        in_flight_during_call = []
+
+        async def forward(request, url, service_name, path, **kwargs):
+            in_flight_during_call.append(route.balancer.replicas[1].in_flight)
+            return Response(status_code=200)
+
+        mock_forward.side_effect = forward
+
+        # Ejecutar
+        await proxy_to_upstream(mock_request, route, "appointments")
+
+        # Verificar
+        mock_forward.assert_called_once_with(
+            mock_request, "http://dentist-2:8002", "dentist", "appointments", raise_connect_errors=True
+        )
+        assert in_flight_during_call == [1]
+        assert route.balancer.replicas[1].in_flight == 0
+
+    @pytest.mark.asyncio
+    @patch("app.utils.proxy.forward_request_to_service", new_callable=AsyncMock)
+    async def test_open_circuit_fails_fast(self, mock_forward, mock_request):
+        """Prueba que con el circuito abierto se responda 503 sin contactar al servicio."""
+        # Configurar
+        route = RoutingTable({"dentist": {"url": "http://dentist-1:8002"}}).get("dentist")
+        mock_forward.return_value = Response(status_code=502)
+        for _ in range(route.breaker.min_requests):
+            await proxy_to_upstream(mock_request, route, "appointments")
+        mock_forward.reset_mock()
+
+        # Ejecutar
+        response = await proxy_to_upstream(mock_request, route, "appointments")
+
+        # Verificar
+        mock_forward.assert_not_called()
+        assert response.status_code == 503
+        assert int(response.headers["retry-after"]) > 0
+
+
+    @pytest.mark.asyncio
+    async def test_route_timeout(self, mock_request):
+        """Prueba que se responda 504 al vencer el tiempo de espera de la ruta."""
+        # Configurar
+        route = RoutingTable({
+            "dentist": {"url": "http://dentist-1:8002", "timeouts": [{"path": "slow", "timeout": 0.05}]}
+        }).get("dentist")
+        deadlines = []
+
+        async def forward(request, url, service_name, path, **kwargs):
+            deadlines.append(deadline_var.get())
+            await asyncio.sleep(1)
+            return Response(status_code=200)
+
+        # Ejecutar
+        with patch("app.utils.proxy.forward_request_to_service", new=forward):
+            start = time.time()
+            response = await proxy_to_upstream(mock_request, route, "slow")
+
+        # Verificar
+        assert response.status_code == 504
+        assert time.time() - start < 0.5
+        assert deadlines[0] == pytest.approx(start + 0.05, abs=0.05)
+        assert deadline_var.get() is None
+        assert route.balancer.replicas[0].in_flight == 0
+
+
+def two_replicas():
+    """Ruta de servicio con dos réplicas."""
+    return RoutingTable({
+        "dentist": {"url": "http://dentist-1:8002", "urls": ["http://dentist-1:8002", "http://dentist-2:8002"]}
+    }).get("dentist")
+
+
+class TestRetries:
+    """Pruebas para los reintentos y el hedging de solicitudes idempotentes."""
+
+    @pytest.fixture(autouse=True)
+    def no_backoff(self, monkeypatch):
+        """Fixture para reintentar sin esperar."""
+        monkeypatch.setattr("app.utils.proxy.backoff_delay", lambda attempt: 0)
+
+    @pytest.mark.asyncio
+    @patch("app.utils.proxy.forward_request_to_service", new_callable=AsyncMock)
+    async def test_retries_connection_error_on_other_replica(self, mock_forward, mock_request):
+        """Prueba que un error de conexión en un GET se reintente en otra réplica."""
+        route = two_replicas()
+        mock_forward.side_effect = [httpx.ConnectError("refused"), Response(status_code=200)]
+
+        response = await proxy_to_upstream(mock_request, route, "appointments")
+
+        assert response.status_code == 200
+        first, second = [call.args[1] for call in mock_forward.call_args_list]
+        assert first != second
+        assert mock_forward.call_args_list[-1].kwargs["raise_connect_errors"] is True
+
+    @pytest.mark.asyncio
+    @patch("app.utils.proxy.forward_request_to_service", new_callable=AsyncMock)
+    async def test_post_not_retried(self, mock_forward, mock_request):
+        """Prueba que las solicitudes no idempotentes se envíen una sola vez."""
+        mock_request.method = "POST"
+        mock_forward.return_value = Response(status_code=503)
+
+        response = await proxy_to_upstream(mock_request, two_replicas(), "appointments")
+
+        assert response.status_code == 503
+        mock_forward.assert_called_once()
+        assert mock_forward.call_args.kwargs["raise_connect_errors"] is False
+
+    @pytest.mark.asyncio
+    @patch("app.utils.proxy.forward_request_to_service", new_callable=AsyncMock)
+    async def test_budget_stops_retries(self, mock_forward, mock_request):
+        """Prueba que sin presupuesto no se reintente y se responda 503."""
+        route = two_replicas()
+        route.retry_budget.min_per_second = 0.0
+        route.retry_budget._balance = 0.0
+        mock_forward.side_effect = httpx.ConnectError("refused")
+
+        response = await proxy_to_upstream(mock_request, route, "appointments")
+
+        assert response.status_code == 503
+        mock_forward.assert_called_once()
+
+    @pytest.mark.asyncio
+    @patch("app.utils.proxy.forward_request_to_service", new_callable=AsyncMock)
+    async def test_hedge_uses_first_response(self, mock_forward, mock_request, monkeypatch):
+        """Prueba que una réplica lenta se duplique y se use la primera respuesta."""
+        monkeypatch.setattr("app.utils.proxy.settings.HEDGE_ENABLED", True)
+        monkeypatch.setattr("app.utils.proxy.settings.HEDGE_MIN_DELAY", 0.01)
+        route = two_replicas()
+        for _ in range(route.latency.min_samples):
+            route.latency.observe(0.01)
+        slow_cancelled = []
+
+        async def forward(request, url, service_name, path, **kwargs):
+            if url == "http://dentist-2:8002":
+                return Response(content=b"fast", status_code=200)
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                slow_cancelled.append(url)
+                raise
+
+        mock_forward.side_effect = forward
+        route.balancer.replicas[1].in_flight = 1  # la réplica lenta se elige primero
+
+        response = await proxy_to_upstream(mock_request, route, "appointments")
+        await asyncio.sleep(0)
+
+        assert response.body == b"fast"
+        assert slow_cancelled == ["http://dentist-1:8002"]
+        assert mock_forward.call_count == 2
+
+    @pytest.mark.asyncio
+    @patch("app.utils.proxy.forward_request_to_service", new_callable=AsyncMock)
+    async def test_hedge_releases_losing_response(self, mock_forward, mock_request, monkeypatch):
+        """Prueba que si ambas solicitudes responden a la vez se libere la respuesta que no se usa."""
+        monkeypatch.setattr("app.utils.proxy.settings.HEDGE_ENABLED", True)
+        monkeypatch.setattr("app.utils.proxy.settings.HEDGE_MIN_DELAY", 0.01)
+        route = two_replicas()
+        for _ in range(route.latency.min_samples):
+            route.latency.observe(0.01)
+        hedged = asyncio.Event()
+        closed = []
+
+        async def forward(request, url, service_name, path, **kwargs):
+            if url == "http://dentist-2:8002":
+                hedged.set()
+            else:
+                # La solicitud original termina en la misma vuelta que la duplicada
+                await hedged.wait()
+            return StreamingResponse(iter([url.encode()]), background=BackgroundTask(closed.append, url))
+
+        mock_forward.side_effect = forward
+        route.balancer.replicas[1].in_flight = 1  # la réplica lenta se elige primero
+
+        response = await proxy_to_upstream(mock_request, route, "appointments")
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+        assert mock_forward.call_count == 2
+        assert len(closed) == 1
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        assert body.decode() not in closed
@@ -0,0 +1,289 @@
+import pytest
+from fastapi import Request
+from unittest.mock import MagicMock
+
+from app.utils.identity import Identity
+from app.utils.rate_limit import (
+    MemoryRateLimitStore,
+    RateLimit,
+    RateLimiter,
+    RateLimitRule,
+    SharedMemoryRateLimitStore,
+    client_ip,
+)
+from app.utils.shared_memory import SharedTable
+
+
+class FakeClock:
+    """Reloj controlable para las pruebas de límites."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FailingStore:
+    """Almacén compartido que siempre falla (ej: Redis caído)."""
+
+    async def hit(self, key, limit, now):
+        raise ConnectionError("redis no disponible")
+
+
+def make_request(method="GET", host="198.51.100.1", headers=None):
+    request = MagicMock(spec=Request)
+    request.method = method
+    request.headers = headers or {}
+    request.client.host = host
+    return request
+
+
+class TestRateLimit:
+    """Pruebas para el formato de los límites."""
+
+    def test_parse(self):
+        """Prueba que se interprete la cantidad, el periodo y la ráfaga."""
+        limit = RateLimit.parse("120/minute;burst=30")
+        assert limit.requests == 120
+        assert limit.period == 60.0
+        assert limit.burst == 30
+        assert limit.emission_interval == 0.5
+        assert limit.policy == "120;w=60"
+
+    def test_parse_default_burst(self):
+        """Prueba que la ráfaga por defecto sea la cantidad de solicitudes."""
+        assert RateLimit.parse("10/second").burst == 10
+
+    def test_parse_unknown_period(self):
+        """Prueba que un periodo desconocido se rechace."""
+        with pytest.raises(ValueError):
+            RateLimit.parse("10/fortnight")
+
+    @pytest.mark.parametrize("value", ["0/minute", "-5/minute", "10/minute;burst=0", "10/second;burst=-1"])
+    def test_parse_not_positive(self, value):
+        """Prueba que una cantidad o una ráfaga que no sean positivas se rechacen al cargar la configuración."""
+        with pytest.raises(ValueError):
+            RateLimit.parse(value)
+
+    def test_rule_not_positive(self):
+        """Prueba que una regla de servicio con límite 0 se rechace al construirla."""
+        with pytest.raises(ValueError):
+            RateLimitRule.from_config("dentist:0", {"path": "*/patients", "limit": "0/minute", "key": "tenant"})
+
+
+class TestMemoryRateLimitStore:
+    """Pruebas para GCRA en memoria."""
+
+    @pytest.mark.asyncio
+    async def test_allows_burst_then_denies(self):
+        """Prueba que se admita la ráfaga completa y luego se rechace."""
+        store = MemoryRateLimitStore()
+        limit = RateLimit.parse("3/minute")
+
+        results = [await store.hit("k", limit, 0.0) for _ in range(4)]
+
+        assert [result.allowed for result in results] == [True, True, True, False]
+        assert [result.remaining for result in results[:3]] == [2, 1, 0]
+        assert results[3].retry_after == pytest.approx(20.0)
+
+    @pytest.mark.asyncio
+    async def test_recovers_over_time(self):
+        """Prueba que el cupo se recupere a razón de una solicitud por intervalo."""
+        store = MemoryRateLimitStore()
+        limit = RateLimit.parse("3/minute")
+        for _ in range(3):
+            await store.hit("k", limit, 0.0)
+
+        assert (await store.hit("k", limit, 19.0)).allowed is False
+        assert (await store.hit("k", limit, 20.0)).allowed is True
+
+    @pytest.mark.asyncio
+    async def test_purges_keys(self):
+        """Prueba que la cantidad de claves no supere el máximo."""
+        store = MemoryRateLimitStore(max_keys=2)
+        limit = RateLimit.parse("1/second")
+        for index in range(5):
+            await store.hit(f"k{index}", limit, 0.0)
+
+        assert len(store) <= 2
+
+
+class TestSharedMemoryRateLimitStore:
+    """Pruebas para GCRA en memoria compartida entre workers."""
+
+    @pytest.mark.asyncio
+    async def test_limit_shared_between_workers(self, tmp_path):
+        """Prueba que dos workers (dos mapeos del mismo archivo) compartan el cupo."""
+        path = str(tmp_path / "gateway-rate-limits")
+        clock = FakeClock(0.0)
+        worker_1 = SharedMemoryRateLimitStore(SharedTable(path, slots=64, value_size=8, clock=clock))
+        worker_2 = SharedMemoryRateLimitStore(SharedTable(path, slots=64, value_size=8, clock=clock))
+        limit = RateLimit.parse("3/minute")
+
+        results = [await store.hit("k", limit, 0.0) for store in (worker_1, worker_2, worker_1, worker_2)]
+
+        assert [result.allowed for result in results] == [True, True, True, False]
+        assert [result.remaining for result in results[:3]] == [2, 1, 0]
+        assert results[3].retry_after == pytest.approx(20.0)
+        assert (await worker_1.hit("k", limit, 20.0)).allowed is True
+
+    @pytest.mark.asyncio
+    async def test_keys_expire_after_recovery(self, tmp_path):
+        """Prueba que la clave venza cuando su ráfaga se recuperó por completo."""
+        clock = FakeClock(0.0)
+        store = SharedMemoryRateLimitStore(SharedTable(str(tmp_path / "rl"), slots=64, value_size=8, clock=clock))
+        await store.hit("k", RateLimit.parse("1/second"), 0.0)
+
+        assert len(store) == 1
+        clock.now = 1.0
+        assert len(store) == 0
+
+
+class TestRateLimitRule:
+    """Pruebas para las reglas de límite por ruta."""
+
+    def test_wildcard_segment(self):
+        """Prueba que "*" coincida con un segmento y con las subrutas."""
+        rule = RateLimitRule.from_config(
+            "dentist:0", {"path": "*/patients", "methods": ["get"], "limit": "120/minute", "key": "tenant"}
+        )
+
+        assert rule.matches("GET", "b3c1/patients") is True
+        assert rule.matches("GET", "b3c1/patients/42") is True
+        assert rule.matches("POST", "b3c1/patients") is False
+        assert rule.matches("GET", "b3c1/appointments") is False
+        assert rule.matches("GET", "a/b/patients") is False
+
+    def test_unknown_key(self):
+        """Prueba que una clave de límite desconocida se rechace."""
+        with pytest.raises(ValueError):
+            RateLimitRule.from_config("auth:0", {"path": "login", "limit": "5/minute", "key": "session"})
+
+
+class TestClientIp:
+    """Pruebas para la IP usada en los límites por cliente."""
+
+    def test_ignores_forwarded_by_default(self, monkeypatch):
+        """Prueba que X-Forwarded-For se ignore si no se confía en el proxy."""
+        monkeypatch.setattr("app.utils.rate_limit.settings.RATE_LIMIT_TRUST_FORWARDED", False)
+        request = make_request(headers={"x-forwarded-for": "192.0.2.9"})
+        assert client_ip(request) == "198.51.100.1"
+
+    def test_trusted_forwarded(self, monkeypatch):
+        """Prueba que se use la primera IP de X-Forwarded-For detrás de un proxy de confianza."""
+        monkeypatch.setattr("app.utils.rate_limit.settings.RATE_LIMIT_TRUST_FORWARDED", True)
+        request = make_request(headers={"x-forwarded-for": "192.0.2.9, 10.0.0.1"})
+        assert client_ip(request) == "192.0.2.9"
+
+
+class TestRateLimiter:
+    """Pruebas para el limitador del gateway."""
+
+    @pytest.fixture
+    def limiter(self, monkeypatch):
+        monkeypatch.setattr("app.utils.rate_limit.settings.RATE_LIMIT_DEFAULT_IP", "5/minute")
+        monkeypatch.setattr("app.utils.rate_limit.settings.RATE_LIMIT_DEFAULT_USER", "3/minute")
+        monkeypatch.setattr("app.utils.rate_limit.settings.RATE_LIMIT_DEFAULT_TENANT", "10/minute")
+        return RateLimiter(MemoryRateLimitStore(), clock=FakeClock())
+
+    @pytest.mark.asyncio
+    async def test_public_path_limited_by_ip(self, limiter):
+        """Prueba que las rutas públicas se limiten por IP."""
+        route = MagicMock(rate_limits=())
+        identity = Identity(subject=None, tenant=None)
+
+        results = [await limiter.check(make_request(), route, "login", identity, True) for _ in range(6)]
+
+        assert results[4].allowed is True
+        assert results[5].allowed is False
+        assert results[5].headers()["Retry-After"] == "12"
+        assert limiter.rejected == 1
+
+        # Otra IP tiene su propio cupo
+        other = await limiter.check(make_request(host="198.51.100.2"), route, "login", identity, True)
+        assert other.allowed is True
+
+    @pytest.mark.asyncio
+    async def test_most_restrictive_result(self, limiter):
+        """Prueba que se devuelva el límite con menor cupo restante (usuario frente a tenant)."""
+        route = MagicMock(rate_limits=())
+        identity = Identity(subject="user-1", tenant="tenant-1")
+
+        result = await limiter.check(make_request(), route, "appointments", identity, False)
+
+        assert result.allowed is True
+        assert result.limit.requests == 3
+        assert result.remaining == 2
+
+    @pytest.mark.asyncio
+    async def test_route_rule_by_tenant(self, limiter):
+        """Prueba que una regla de ruta limite a todos los usuarios del mismo tenant."""
+        rule = RateLimitRule.from_config(
+            "dentist:0", {"path": "*/patients", "methods": ["GET"], "limit": "2/minute", "key": "tenant"}
+        )
+        route = MagicMock(rate_limits=(rule,))
+
+        first = await limiter.check(make_request(), route, "t1/patients", Identity("a", "t1"), False)
+        second = await limiter.check(make_request(), route, "t1/patients", Identity("b", "t1"), False)
+        third = await limiter.check(make_request(), route, "t1/patients", Identity("c", "t1"), False)
+
+        assert first.allowed and second.allowed
+        assert third.allowed is False
+        assert third.limit.requests == 2
+
+    @pytest.mark.asyncio
+    async def test_tenant_rejection_keeps_user_quota(self, limiter):
+        """Prueba que si el tenant rechaza la solicitud no se gaste el cupo del usuario."""
+        route = MagicMock(rate_limits=())
+        # Otros usuarios agotan el cupo del tenant (10/minute)
+        for index in range(10):
+            await limiter.check(make_request(), route, "appointments", Identity(f"user-{index}", "t1"), False)
+
+        for _ in range(3):
+            rejected = await limiter.check(make_request(), route, "appointments", Identity("b", "t1"), False)
+            assert rejected.allowed is False
+            assert rejected.limit.requests == 10
+
+        # El usuario conserva su cupo completo (3/minute)
+        result = await limiter.check(make_request(), route, "appointments", Identity("b", "t2"), False)
+        assert result.allowed is True
+        assert result.remaining == 2
+
+    @pytest.mark.asyncio
+    async def test_refund(self, tmp_path):
+        """Prueba que la devolución al cupo deje el estado como antes de contar la solicitud."""
+        limit = RateLimit.parse("2/minute")
+        clock = FakeClock(0.0)
+        stores = [
+            MemoryRateLimitStore(),
+            SharedMemoryRateLimitStore(SharedTable(str(tmp_path / "rl"), slots=64, value_size=8, clock=clock)),
+        ]
+        for store in stores:
+            await store.hit("k", limit, 0.0)
+            await store.hit("k", limit, 0.0)
+            await store.refund("k", limit, 0.0)
+
+            assert (await store.hit("k", limit, 0.0)).allowed is True
+            assert (await store.hit("k", limit, 0.0)).allowed is False
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_local_store(self, limiter):
+        """Prueba que si el almacén compartido falla se use el estado local."""
+        limiter.store = FailingStore()
+        limiter.fallback = MemoryRateLimitStore()
+        route = MagicMock(rate_limits=())
+
+        result = await limiter.check(make_request(), route, "login", Identity(None, None), True)
+
+        assert result.allowed is True
+        assert len(limiter.fallback) == 1
+
+    @pytest.mark.asyncio
+    async def test_shared_store_error_without_fallback(self, limiter):
+        """Prueba que sin almacén local de respaldo el error se propague."""
+        limiter.store = FailingStore()
+        route = MagicMock(rate_limits=())
+
+        with pytest.raises(ConnectionError):
+            await limiter.check(make_request(), route, "login", Identity(None, None), True)
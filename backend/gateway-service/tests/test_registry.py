@@ -0,0 +1,120 @@
+import json
+import os
+import pytest
+
+from app.utils import clients
+from app.utils.registry import RegistryWatcher, apply_services, load_services_file, parse_services
+from app.utils.routing import RoutingTable, get_routing_table
+
+SERVICES = {
+    "auth": {"url": "http://auth:8001", "public_paths": ["login"]},
+    "dentist": {"urls": ["http://dentist-1:8002", "http://dentist-2:8002"]},
+}
+
+
+@pytest.fixture(autouse=True)
+def routing_table(monkeypatch):
+    """Fixture para partir de una tabla de rutas conocida y sin clientes creados."""
+    monkeypatch.setattr("app.utils.routing._routing_table", RoutingTable(SERVICES))
+    monkeypatch.setattr(clients, "_clients", {})
+    monkeypatch.setattr(clients, "_retiring", {})
+
+
+def write_services(path, services):
+    path.write_text(json.dumps({"services": services}), encoding="utf-8")
+    # Forzar un mtime distinto aunque la escritura ocurra en el mismo instante
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+class TestParseServices:
+    """Pruebas para la lectura de la configuración de servicios."""
+
+    def test_json_and_yaml(self, tmp_path):
+        """Prueba que se lean archivos JSON y YAML, con o sin la clave "services"."""
+        json_file = tmp_path / "services.json"
+        json_file.write_text(json.dumps(SERVICES), encoding="utf-8")
+        yaml_file = tmp_path / "services.yaml"
+        yaml_file.write_text(
+            "services:\n  auth:\n    url: http://auth:8001\n    public_paths: [login]\n", encoding="utf-8"
+        )
+
+        assert load_services_file(str(json_file)) == SERVICES
+        assert load_services_file(str(yaml_file)) == {"auth": SERVICES["auth"]}
+
+    @pytest.mark.parametrize("text", [
+        "[]",
+        '{"auth": {"public_paths": []}}',
+        '{"auth/v2": {"url": "http://auth:8001"}}',
+    ])
+    def test_invalid(self, text):
+        """Prueba que se rechacen las configuraciones sin URL o con nombres inválidos."""
+        with pytest.raises(ValueError):
+            parse_services(text)
+
+
+class TestApplyServices:
+    """Pruebas para el reemplazo de la tabla de rutas en caliente."""
+
+    @pytest.mark.asyncio
+    async def test_keeps_state_and_client_of_unchanged_services(self):
+        """Prueba que los servicios sin cambios de réplicas conserven su estado y solo se retiren los eliminados."""
+        apply_services(dict(SERVICES, billing={"url": "http://billing:8003"}))
+        old = get_routing_table()
+        auth_client = clients.get_client("auth")
+        dentist_client = clients.get_client("dentist")
+        billing_client = clients.get_client("billing")
+
+        updated = dict(SERVICES, auth={"url": "http://auth:8001", "public_paths": ["login", "register"]})
+        updated["dentist"] = {"urls": SERVICES["dentist"]["urls"] + ["http://dentist-3:8002"]}
+        table = apply_services(updated)
+
+        assert get_routing_table() is table
+        assert table.get("auth").is_public("register")
+        assert table.get("auth").balancer is old.get("auth").balancer
+        assert table.get("auth").breaker is old.get("auth").breaker
+        assert table.get("dentist").balancer is not old.get("dentist").balancer
+        assert table.get("billing") is None
+        assert clients.get_client("auth") is auth_client
+        # Agregar una réplica no cierra las conexiones a las que no cambiaron
+        assert clients.get_client("dentist") is dentist_client
+        assert billing_client in clients._retiring
+        await clients.close_clients()
+        assert billing_client.is_closed
+
+    def test_invalid_config_keeps_table(self):
+        """Prueba que una configuración inválida no reemplace la tabla activa."""
+        old = get_routing_table()
+        with pytest.raises(ValueError):
+            apply_services({"auth": {"url": "http://auth:8001", "rate_limits": [{"path": "x", "limit": "mal"}]}})
+        assert get_routing_table() is old
+
+
+class TestRegistryWatcher:
+    """Pruebas para la recarga del archivo de servicios."""
+
+    def test_applies_changes_once(self, tmp_path):
+        """Prueba que el archivo se aplique solo cuando cambia."""
+        path = tmp_path / "services.json"
+        write_services(path, SERVICES)
+        watcher = RegistryWatcher(str(path))
+
+        assert watcher.check() is False
+        write_services(path, dict(SERVICES, billing={"url": "http://billing:8003"}))
+        assert watcher.check() is True
+        assert get_routing_table().get("billing") is not None
+        assert watcher.check() is False
+
+    def test_invalid_file_ignored(self, tmp_path, caplog):
+        """Prueba que un archivo inválido se registre como error y no cambie la tabla."""
+        path = tmp_path / "services.json"
+        write_services(path, SERVICES)
+        watcher = RegistryWatcher(str(path))
+        old = get_routing_table()
+
+        path.write_text("{no es json", encoding="utf-8")
+        os.utime(path, ns=(0, 1))
+        with caplog.at_level("ERROR", logger="gateway-service"):
+            assert watcher.check() is False
+        assert get_routing_table() is old
+        assert "se mantiene la actual" in caplog.text
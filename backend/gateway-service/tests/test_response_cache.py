@@ -0,0 +1,218 @@
+import asyncio
+import pytest
+from fastapi import Request, Response
+from unittest.mock import AsyncMock
+
+from app.utils.identity import Identity
+from app.utils.response_cache import (
+    CacheBackend,
+    CachedResponse,
+    MemoryCacheBackend,
+    ResponseCache,
+    parse_cache_control,
+)
+
+
+class FakeClock:
+    """Reloj controlable para las pruebas de expiración."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeSharedBackend(CacheBackend):
+    """Sustituto local del almacén compartido (serializa como lo haría Redis)."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        data = self.data.get(key)
+        return CachedResponse.from_bytes(data) if data is not None else None
+
+    async def set(self, key, entry):
+        self.data[key] = entry.to_bytes()
+
+
+def make_request(headers=None, query=""):
+    """Crea una solicitud GET real de Starlette."""
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/dentist/t1/patients",
+        "query_string": query.encode(),
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+    })
+
+
+def upstream(body=b'[{"id": 1}]', cache_control="private, max-age=60", **headers):
+    """Crea una respuesta del servicio con el Cache-Control indicado."""
+    response = Response(content=body, status_code=200, media_type="application/json")
+    if cache_control:
+        response.headers["cache-control"] = cache_control
+    for name, value in headers.items():
+        response.headers[name.replace("_", "-")] = value
+    return response
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def cache(clock):
+    return ResponseCache(local=MemoryCacheBackend(1024 * 1024, clock=clock), clock=clock)
+
+
+USER_A = Identity(subject="user-a", tenant="t1")
+
+
+class TestResponseCache:
+    """Pruebas para la caché de respuestas GET del gateway."""
+
+    @pytest.mark.asyncio
+    async def test_hit_without_upstream_call(self, cache):
+        """Prueba que una respuesta cacheable se sirva desde la caché."""
+        fetch = AsyncMock(return_value=upstream())
+
+        first = await cache.handle(make_request(), "dentist", "t1/patients", USER_A, fetch)
+        second = await cache.handle(make_request(), "dentist", "t1/patients", USER_A, fetch)
+
+        fetch.assert_called_once()
+        assert first.headers["x-cache"] == "MISS"
+        assert second.headers["x-cache"] == "HIT"
+        assert second.body == b'[{"id": 1}]'
+        assert second.headers["etag"] == first.headers["etag"]
+
+    @pytest.mark.asyncio
+    async def test_isolated_by_tenant_and_user(self, cache):
+        """Prueba que las entradas no se compartan entre tenants ni usuarios."""
+        fetch = AsyncMock(side_effect=lambda: upstream())
+
+        await cache.handle(make_request(), "dentist", "t1/patients", USER_A, fetch)
+        await cache.handle(make_request(), "dentist", "t1/patients", Identity("user-a", "t2"), fetch)
+        await cache.handle(make_request(), "dentist", "t1/patients", Identity("user-b", "t1"), fetch)
+
+        assert fetch.call_count == 3
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("cache_control", [None, "no-store, max-age=60", "no-cache", "max-age=0"])
+    async def test_not_cacheable(self, cache, cache_control):
+        """Prueba que se respete el Cache-Control del servicio."""
+        fetch = AsyncMock(side_effect=lambda: upstream(cache_control=cache_control))
+
+        await cache.handle(make_request(), "dentist", "t1/patients", USER_A, fetch)
+        await cache.handle(make_request(), "dentist", "t1/patients", USER_A, fetch)
+
+        assert fetch.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_if_none_match_returns_304(self, cache):
+        """Prueba que un ETag coincidente se responda con 304 sin contactar al servicio."""
+        fetch = AsyncMock(return_value=upstream(etag='"v1"'))
+        await cache.handle(make_request(), "dentist", "t1/patients", USER_A, fetch)
+
+        response = await cache.handle(
+            make_request({"If-None-Match": '"v1"'}), "dentist", "t1/patients", USER_A, fetch
+        )
+
+        fetch.assert_called_once()
+        assert response.status_code == 304
+        assert response.body == b""
+        assert response.headers["etag"] == '"v1"'
+        assert cache.not_modified == 1
+
+    @pytest.mark.asyncio
+    async def test_stale_while_revalidate(self, cache, clock):
+        """Prueba que una entrada vencida se sirva mientras se revalida en segundo plano."""
+        fetch = AsyncMock(side_effect=[
+            upstream(b"v1", "max-age=10, stale-while-revalidate=30"),
+            upstream(b"v2", "max-age=10, stale-while-revalidate=30"),
+        ])
+        await cache.handle(make_request(), "dentist", "t1/patients", USER_A, fetch)
+
+        clock.now += 15
+        stale = await cache.handle(make_request(), "dentist", "t1/patients", USER_A, fetch)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        fresh = await cache.handle(make_request(), "dentist", "t1/patients", USER_A, fetch)
+
+        assert stale.headers["x-cache"] == "STALE"
+        assert stale.body == b"v1"
+        assert fresh.headers["x-cache"] == "HIT"
+        assert fresh.body == b"v2"
+        assert fetch.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_expired_entry_refetched(self, cache, clock):
+        """Prueba que una entrada vencida y fuera de la ventana de revalidación no se use."""
+        fetch = AsyncMock(side_effect=lambda: upstream(cache_control="max-age=10"))
+        await cache.handle(make_request(), "dentist", "t1/patients", USER_A, fetch)
+
+        clock.now += 11
+        response = await cache.handle(make_request(), "dentist", "t1/patients", USER_A, fetch)
+
+        assert response.headers["x-cache"] == "MISS"
+        assert fetch.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_shared_backend(self, clock):
+        """Prueba que una instancia use las entradas guardadas por otra en el almacén compartido."""
+        shared = FakeSharedBackend()
+        worker_1 = ResponseCache(MemoryCacheBackend(1024, clock=clock), shared, clock=clock)
+        worker_2 = ResponseCache(MemoryCacheBackend(1024, clock=clock), shared, clock=clock)
+        fetch = AsyncMock(return_value=upstream())
+
+        await worker_1.handle(make_request(), "dentist", "t1/patients", USER_A, fetch)
+        response = await worker_2.handle(make_request(), "dentist", "t1/patients", USER_A, fetch)
+
+        fetch.assert_called_once()
+        assert response.headers["x-cache"] == "HIT"
+        assert response.body == b'[{"id": 1}]'
+
+    @pytest.mark.asyncio
+    async def test_invalidate(self, cache):
+        """Prueba que una escritura invalide las entradas del mismo tenant."""
+        fetch = AsyncMock(side_effect=lambda: upstream())
+        await cache.handle(make_request(), "dentist", "t1/patients", USER_A, fetch)
+
+        await cache.invalidate("dentist", "t1/patients/42")
+        await cache.handle(make_request(), "dentist", "t1/patients", USER_A, fetch)
+
+        assert fetch.call_count == 2
+
+
+class TestMemoryCacheBackend:
+    """Pruebas para el almacén en memoria."""
+
+    @pytest.mark.asyncio
+    async def test_byte_budget(self, clock):
+        """Prueba que se descarten las entradas menos usadas al superar el presupuesto."""
+        backend = MemoryCacheBackend(max_bytes=250, clock=clock)
+
+        def entry(size):
+            return CachedResponse(200, [], b"x" * size, '"e"', clock(), 60)
+
+        await backend.set("a", entry(100))
+        await backend.set("b", entry(100))
+        await backend.get("a")
+        await backend.set("c", entry(100))
+
+        assert await backend.get("b") is None
+        assert await backend.get("a") is not None
+        assert backend.size == 200
+
+        await backend.set("big", entry(1000))
+        assert await backend.get("big") is None
+
+    def test_parse_cache_control(self):
+        """Prueba el análisis de directivas Cache-Control."""
+        assert parse_cache_control('private, max-age=60, stale-while-revalidate="30"') == {
+            "private": None,
+            "max-age": "60",
+            "stale-while-revalidate": "30",
+        }
@@ -0,0 +1,76 @@
+import random
+
+from app.utils.retry import LatencyPercentile, RetryBudget, backoff_delay
+
+
+class FakeClock:
+    """Reloj controlable para las pruebas."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRetryBudget:
+    """Pruebas para el presupuesto de reintentos."""
+
+    def test_limits_retries_to_ratio(self):
+        """Prueba que sin reposición por tiempo los reintentos no superen la proporción."""
+        budget = RetryBudget(ratio=0.25, min_per_second=0.0, max_balance=1.0, clock=FakeClock())
+        assert budget.withdraw()
+        assert not budget.withdraw()
+
+        for _ in range(4):
+            budget.deposit()
+        assert budget.withdraw()
+        assert not budget.withdraw()
+
+    def test_refills_over_time(self):
+        """Prueba que se repongan min_per_second fichas por segundo sin superar el máximo."""
+        clock = FakeClock()
+        budget = RetryBudget(ratio=0.0, min_per_second=2.0, max_balance=3.0, clock=clock)
+        while budget.withdraw():
+            pass
+
+        clock.now = 1.0
+        assert budget.withdraw()
+        assert budget.withdraw()
+        assert not budget.withdraw()
+
+        clock.now = 100.0
+        assert budget.balance == 3.0
+
+
+class TestLatencyPercentile:
+    """Pruebas para el percentil de latencia usado por el hedging."""
+
+    def test_requires_min_samples(self):
+        """Prueba que no haya valor hasta reunir las muestras mínimas."""
+        latency = LatencyPercentile(percentile=0.9, min_samples=5, refresh_every=1)
+        for _ in range(4):
+            latency.observe(0.1)
+        assert latency.value is None
+        latency.observe(0.1)
+        assert latency.value == 0.1
+
+    def test_percentile(self):
+        """Prueba que el valor sea el percentil de la ventana."""
+        latency = LatencyPercentile(percentile=0.9, min_samples=10, refresh_every=1)
+        for value in range(1, 101):
+            latency.observe(value / 1000)
+        assert latency.value == 0.091
+
+
+class TestBackoff:
+    """Pruebas para la espera entre reintentos."""
+
+    def test_jitter_within_cap(self, monkeypatch):
+        """Prueba que la espera esté entre 0 y el tope exponencial del intento."""
+        monkeypatch.setattr("app.utils.retry.settings.RETRY_BACKOFF_BASE", 0.1)
+        monkeypatch.setattr("app.utils.retry.settings.RETRY_BACKOFF_MAX", 0.3)
+        rng = random.Random(1)
+        assert all(0 <= backoff_delay(1, rng) <= 0.1 for _ in range(50))
+        assert all(0 <= backoff_delay(2, rng) <= 0.2 for _ in range(50))
+        assert all(0 <= backoff_delay(5, rng) <= 0.3 for _ in range(50))
@@ -1,9 +1,15 @@
 import pytest
-from fastapi import Request, HTTPException
+from fastapi import Request, Response, HTTPException
 from unittest.mock import MagicMock, patch, AsyncMock
 
 from app.api.router import is_public_path, service_proxy
 from app.config.settings import settings
+from app.utils.identity import identity_header_var
+from app.utils.rate_limit import MemoryRateLimitStore, RateLimiter, set_rate_limiter
+from app.utils.routing import RoutingTable
+from app.utils.signed_identity import decode_identity
+
+TENANT_ID = "3f2504e0-4f89-11d3-9a0c-0305e82c3301"
 
 
 class TestIsPublicPath:
@@ -34,31 +40,45 @@ def mock_request():
     """Fixture para crear una solicitud simulada."""
     request = MagicMock(spec=Request)
     request.headers = {}
+    request.method = "POST"
+    request.client.host = "203.0.113.7"
     return request
 
 
+@pytest.fixture(autouse=True)
+def rate_limiter():
+    """Fixture para usar un limitador de solicitudes nuevo en cada prueba."""
+    limiter = RateLimiter(MemoryRateLimitStore())
+    set_rate_limiter(limiter)
+    yield limiter
+    set_rate_limiter(None)
+
+
 @pytest.fixture
 def mock_settings(monkeypatch):
     """Fixture para simular la configuración de servicios."""
-    # Crear una clase MockSettings que simule el comportamiento de Settings
-    class MockSettings:
-        @property
-        def SERVICES(self):
-            return {
-                "auth": {
-                    "url": "http://localhost:8001",
-                    "public_paths": ["login", "register", "health"]
-                },
-                "dentist": {
-                    "url": "http://localhost:8002",
-                    "public_paths": ["health"]
-                }
-            }
+    # Construir una tabla de rutas con una configuración de servicios conocida
+    routing_table = RoutingTable({
+        "auth": {
+            "url": "http://localhost:8001",
+            "public_paths": ["login", "register", "health"],
+            "rate_limits": [
+                {"path": "login", "methods": ["POST"], "limit": "2/minute", "key": "ip"}
+            ]
+        },
+        "dentist": {
+            "url": "http://localhost:8002",
+            "public_paths": ["health"],
+            "tenant_paths": ["{tenant}/*"],
+            "rate_limits": [
+                {"path": "*/patients", "methods": ["GET"], "limit": "2/minute", "key": "tenant"}
+            ]
+        }
+    })
     
-    # Reemplazar el objeto settings con nuestra versión simulada
-    mock_settings_obj = MockSettings()
-    monkeypatch.setattr("app.api.router.settings", mock_settings_obj)
-    return mock_settings_obj
+    # Reemplazar la tabla de rutas activa con nuestra versión simulada
+    monkeypatch.setattr("app.utils.routing._routing_table", routing_table)
+    return routing_table
 
 
 class TestServiceProxy:
@@ -75,35 +95,36 @@ class TestServiceProxy:
         assert "no encontrado" in excinfo.value.detail
 
     @pytest.mark.asyncio
-    @patch("app.api.router.forward_request_to_service", new_callable=AsyncMock)
+    @patch("app.api.router.proxy_to_upstream", new_callable=AsyncMock)
     async def test_public_path_no_auth(self, mock_forward, mock_request, mock_settings):
         """Prueba que una solicitud a una ruta pública se reenvíe sin verificar token."""
         # Configurar
-        mock_forward.return_value = {"status": "ok"}
+        mock_forward.return_value = Response(content=b"ok")
         
         # Ejecutar
         result = await service_proxy("auth", "login", mock_request)
         
         # Verificar
-        assert result == {"status": "ok"}
-        mock_forward.assert_called_once_with(mock_request, "http://localhost:8001")
+        assert result.body == b"ok"
+        assert result.headers["RateLimit-Limit"] == "2"
+        mock_forward.assert_called_once_with(mock_request, mock_settings.get("auth"), "login")
 
     @pytest.mark.asyncio
     @patch("app.api.router.verify_token", new_callable=AsyncMock)
-    @patch("app.api.router.forward_request_to_service", new_callable=AsyncMock)
+    @patch("app.api.router.proxy_to_upstream", new_callable=AsyncMock)
     async def test_private_path_with_auth(self, mock_forward, mock_verify, mock_request, mock_settings):
         """Prueba que una solicitud a una ruta privada con token válido se reenvíe."""
         # Configurar
         mock_verify.return_value = {"user_id": "123"}
-        mock_forward.return_value = {"status": "ok"}
+        mock_forward.return_value = Response(content=b"ok")
         
         # Ejecutar
         result = await service_proxy("dentist", "appointments", mock_request)
         
         # Verificar
         mock_verify.assert_called_once_with(mock_request)
-        mock_forward.assert_called_once_with(mock_request, "http://localhost:8002")
-        assert result == {"status": "ok"}
+        mock_forward.assert_called_once_with(mock_request, mock_settings.get("dentist"), "appointments")
+        assert result.body == b"ok"
 
     @pytest.mark.asyncio
     @patch("app.api.router.verify_token", side_effect=HTTPException(status_code=401, detail="Token inválido"))
@@ -115,3 +136,67 @@ class TestServiceProxy:
         
         assert excinfo.value.status_code == 401
         assert "Token inválido" in excinfo.value.detail
+
+    @pytest.mark.asyncio
+    @patch("app.api.router.verify_token", new_callable=AsyncMock)
+    @patch("app.api.router.proxy_to_upstream", new_callable=AsyncMock)
+    async def test_private_path_signed_identity(self, mock_forward, mock_verify, mock_request, mock_settings):
+        """Prueba que los claims verificados se firmen para el servicio solo durante el reenvío."""
+        # Configurar
+        mock_verify.return_value = {"sub": "user-1", "tenant_id": "tenant-1", "exp": 1}
+        headers = []
+
+        async def forward(request, route, path):
+            headers.append(identity_header_var.get())
+            return Response(content=b"ok")
+
+        mock_forward.side_effect = forward
+
+        # Ejecutar
+        await service_proxy("dentist", "appointments", mock_request)
+        await service_proxy("dentist", "health", mock_request)
+
+        # Verificar
+        claims = decode_identity(headers[0], settings.IDENTITY_HEADER_SECRET)
+        assert (claims["sub"], claims["tenant_id"]) == ("user-1", "tenant-1")
+        assert claims["exp"] > 1
+        assert headers[1] is None
+        assert identity_header_var.get() is None
+
+    @pytest.mark.asyncio
+    @patch("app.api.router.verify_token", new_callable=AsyncMock)
+    @patch("app.api.router.proxy_to_upstream", new_callable=AsyncMock)
+    async def test_tenant_limit_ignores_tenant_header(self, mock_forward, mock_verify, mock_request, mock_settings):
+        """Prueba que cambiar X-Tenant-ID en cada solicitud no evite el límite del tenant de la ruta."""
+        # Configurar
+        mock_forward.return_value = Response(content=b"ok")
+        mock_request.method = "GET"
+        results = []
+
+        # Ejecutar: usuarios distintos del mismo tenant, cada uno con otro X-Tenant-ID
+        for index in range(3):
+            mock_verify.return_value = {"sub": f"user-{index}"}
+            mock_request.headers = {"x-tenant-id": f"spoofed-{index}"}
+            results.append(await service_proxy("dentist", f"{TENANT_ID}/patients", mock_request))
+
+        # Verificar
+        assert [result.status_code for result in results] == [200, 200, 429]
+        assert mock_forward.call_count == 2
+
+    @pytest.mark.asyncio
+    @patch("app.api.router.proxy_to_upstream", new_callable=AsyncMock)
+    async def test_rate_limited_path(self, mock_forward, mock_request, mock_settings):
+        """Prueba que al superar el límite de una ruta se responda 429 sin reenviar."""
+        # Configurar
+        mock_forward.return_value = Response(content=b"ok")
+        
+        # Ejecutar: el límite de login es de 2 solicitudes por minuto por IP
+        await service_proxy("auth", "login", mock_request)
+        await service_proxy("auth", "login", mock_request)
+        result = await service_proxy("auth", "login", mock_request)
+        
+        # Verificar
+        assert result.status_code == 429
+        assert result.headers["RateLimit-Remaining"] == "0"
+        assert int(result.headers["Retry-After"]) >= 1
+        assert mock_forward.call_count == 2
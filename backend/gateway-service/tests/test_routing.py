@@ -0,0 +1,100 @@
+import pytest
+
+from app.api.router import is_public_path
+from app.config.settings import settings
+from app.utils.routing import PathMatcher, RoutingTable, split_service_path
+
+
+@pytest.fixture
+def routing_table():
+    """Fixture con una tabla de rutas de ejemplo."""
+    return RoutingTable({
+        "auth": {
+            "url": "http://localhost:8001/",
+            "public_paths": ["login", "register", "reset-password", "health"]
+        },
+        "dentist": {
+            "url": "http://localhost:8002",
+            "public_paths": ["health"]
+        }
+    })
+
+
+class TestPathMatcher:
+    """Pruebas para el trie de rutas públicas."""
+
+    @pytest.mark.parametrize("path", [
+        "login", "login/refresh", "login/", "health", "health/status",
+        "loginx", "users", "users/login", "", "reset", "reset-password/confirm",
+    ])
+    def test_same_result_as_is_public_path(self, path):
+        """Prueba que el trie coincida con la comparación lineal de prefijos."""
+        public_paths = ["login", "health", "reset-password"]
+
+        assert PathMatcher(public_paths).matches(path) is is_public_path(path, public_paths)
+
+    def test_nested_prefix(self):
+        """Prueba prefijos de varios segmentos."""
+        matcher = PathMatcher(["users/verify-email"])
+
+        assert matcher.matches("users/verify-email") is True
+        assert matcher.matches("users/verify-email/abc") is True
+        assert matcher.matches("users") is False
+        assert matcher.matches("users/me") is False
+
+
+class TestRoutingTable:
+    """Pruebas para la tabla de rutas precompilada."""
+
+    def test_split_service_path(self):
+        """Prueba la separación del prefijo del servicio."""
+        assert split_service_path("/auth/users/me") == ("auth", "users/me")
+        assert split_service_path("/auth") == ("auth", "")
+        assert split_service_path("/auth/") == ("auth", "")
+
+    def test_resolve(self, routing_table):
+        """Prueba que una ruta se resuelva a su servicio y ruta relativa."""
+        match = routing_table.resolve("/dentist/123/patients")
+
+        assert match.service.name == "dentist"
+        assert match.service.url == "http://localhost:8002"
+        assert match.upstream_path == "/123/patients"
+        assert match.is_public is False
+
+    def test_resolve_public_path(self, routing_table):
+        """Prueba que se detecten las rutas públicas al resolver."""
+        match = routing_table.resolve("/auth/login")
+
+        assert match.service.url == "http://localhost:8001"
+        assert match.is_public is True
+
+    def test_resolve_unknown_service(self, routing_table):
+        """Prueba que un servicio inexistente no se resuelva."""
+        assert routing_table.resolve("/billing/invoices") is None
+        assert routing_table.get("billing") is None
+
+    def test_table_is_immutable(self, routing_table):
+        """Prueba que la tabla de rutas no pueda modificarse."""
+        with pytest.raises(TypeError):
+            routing_table.services["billing"] = routing_table.services["auth"]
+
+    def test_route_timeouts(self):
+        """Prueba el tiempo de espera por servicio y por ruta."""
+        table = RoutingTable({
+            "auth": {"url": "http://localhost:8001", "timeout": 10},
+            "dentist": {
+                "url": "http://localhost:8002",
+                "timeouts": [{"path": "*/patients", "methods": ["get"], "timeout": 15}],
+            },
+        })
+        dentist = table.get("dentist")
+
+        assert table.get("auth").timeout_for("POST", "login") == 10
+        assert dentist.timeout_for("GET", "t1/patients/42") == 15
+        assert dentist.timeout_for("POST", "t1/patients") == settings.UPSTREAM_TIMEOUT
+        assert dentist.max_timeout == max(15, settings.UPSTREAM_TIMEOUT)
+
+    def test_invalid_timeout(self):
+        """Prueba que se rechace un tiempo de espera no positivo."""
+        with pytest.raises(ValueError):
+            RoutingTable({"auth": {"url": "http://localhost:8001", "timeouts": [{"path": "login", "timeout": 0}]}})
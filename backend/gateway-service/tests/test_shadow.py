@@ -0,0 +1,179 @@
+import asyncio
+import pytest
+from fastapi import Request, Response
+from unittest.mock import AsyncMock, MagicMock, patch
+import httpx
+
+from app.utils.proxy import proxy_to_upstream
+from app.utils.routing import RoutingTable, ShadowTarget
+from app.utils.shadow import (
+    SHADOW_DURATION,
+    SHADOW_MISMATCHES,
+    SHADOW_REQUESTS,
+    SHADOW_STATUS,
+    ShadowMirror,
+    set_shadow_mirror,
+)
+
+SHADOW_URL = "http://dentist-canary:8002"
+
+
+def make_request(method="GET"):
+    """Solicitud simulada al servicio dentist."""
+    request = MagicMock(spec=Request)
+    request.method = method
+    request.url.path = "/dentist/patients"
+    request.url.query = "page=2"
+    request.headers = {"content-type": "application/json", "authorization": "Bearer token123"}
+    request.body = AsyncMock(return_value=b"")
+    return request
+
+
+def shadow_response(status_code):
+    """Respuesta sin leer de la versión candidata, como la devuelve send(stream=True)."""
+    return httpx.Response(status_code, stream=httpx.ByteStream(b"ok"))
+
+
+def make_route(service, **shadow):
+    shadow = {"url": SHADOW_URL, "percent": 100, **shadow}
+    return RoutingTable({service: {"url": "http://dentist:8002", "shadow": shadow}}).get(service)
+
+
+@pytest.fixture
+def mirror():
+    """Emisor de tráfico en sombra cuyo cliente responde con `mirror.respond`."""
+    mirror = ShadowMirror(max_in_flight=2)
+    mirror.received = []
+
+    async def handler(request):
+        mirror.received.append(request)
+        return await mirror.respond(request)
+
+    mirror.respond = AsyncMock(side_effect=lambda request: shadow_response(200))
+    mirror._clients[SHADOW_URL] = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    set_shadow_mirror(mirror)
+    yield mirror
+    set_shadow_mirror(None)
+
+
+async def drain(mirror):
+    """Espera a que terminen las copias en curso."""
+    while mirror._tasks:
+        await asyncio.gather(*mirror._tasks)
+
+
+class TestShadowTarget:
+    """Pruebas para la configuración del tráfico en sombra."""
+
+    def test_defaults_to_idempotent_methods(self):
+        """Prueba que por defecto solo se copien GET, HEAD y OPTIONS."""
+        target = ShadowTarget.from_config({"url": SHADOW_URL + "/", "percent": 100})
+
+        assert target.url == SHADOW_URL
+        assert target.sampled("GET")
+        assert not target.sampled("POST")
+
+    def test_percent(self):
+        """Prueba que con 0 % no se copie ninguna solicitud."""
+        assert not ShadowTarget.from_config({"url": SHADOW_URL, "percent": 0}).sampled("GET")
+
+    @pytest.mark.parametrize("config", [{"percent": 10}, {"url": SHADOW_URL, "percent": 150}])
+    def test_invalid_config(self, config):
+        """Prueba que se rechacen una configuración sin URL o un porcentaje inválido."""
+        with pytest.raises(ValueError):
+            ShadowTarget.from_config(config)
+
+
+class TestShadowMirror:
+    """Pruebas para la copia de solicitudes a la versión candidata."""
+
+    @pytest.mark.asyncio
+    @patch("app.utils.proxy.forward_request_to_service", new_callable=AsyncMock)
+    async def test_mirrors_and_compares(self, mock_forward, mirror):
+        """Prueba que la copia vaya a la versión candidata y se compare con la original."""
+        mock_forward.return_value = Response(status_code=200)
+        mirror.respond.side_effect = lambda request: shadow_response(500)
+        route = make_route("shadow-compare")
+
+        response = await proxy_to_upstream(make_request(), route, "patients")
+        await drain(mirror)
+
+        assert response.status_code == 200
+        [shadow_request] = mirror.received
+        assert str(shadow_request.url) == SHADOW_URL + "/patients?page=2"
+        assert shadow_request.headers["x-shadow-request"] == "1"
+        assert shadow_request.headers["authorization"] == "Bearer token123"
+        assert SHADOW_STATUS.labels("shadow-compare", "2xx", "5xx").value == 1
+        assert SHADOW_MISMATCHES.labels("shadow-compare").value == 1
+        assert SHADOW_DURATION.labels("shadow-compare", "primary").count == 1
+        assert SHADOW_DURATION.labels("shadow-compare", "shadow").count == 1
+
+    @pytest.mark.asyncio
+    @patch("app.utils.proxy.forward_request_to_service", new_callable=AsyncMock)
+    async def test_primary_does_not_wait_for_shadow(self, mock_forward, mirror):
+        """Prueba que la respuesta original no espere a la copia."""
+        mock_forward.return_value = Response(status_code=200)
+        release = asyncio.Event()
+
+        async def slow(request):
+            await release.wait()
+            return shadow_response(200)
+
+        mirror.respond.side_effect = slow
+        route = make_route("shadow-slow")
+
+        response = await asyncio.wait_for(proxy_to_upstream(make_request(), route, "patients"), 1)
+        assert response.status_code == 200
+        assert mirror.in_flight == 1
+
+        release.set()
+        await drain(mirror)
+        assert SHADOW_STATUS.labels("shadow-slow", "2xx", "2xx").value == 1
+        assert SHADOW_MISMATCHES.labels("shadow-slow").value == 0
+
+    @pytest.mark.asyncio
+    @patch("app.utils.proxy.forward_request_to_service", new_callable=AsyncMock)
+    async def test_drops_when_full(self, mock_forward, mirror):
+        """Prueba que las copias se descarten al alcanzar el máximo en curso."""
+        mock_forward.return_value = Response(status_code=200)
+        release = asyncio.Event()
+
+        async def slow(request):
+            await release.wait()
+            return shadow_response(200)
+
+        mirror.respond.side_effect = slow
+        route = make_route("shadow-full")
+
+        for _ in range(3):
+            await proxy_to_upstream(make_request(), route, "patients")
+        release.set()
+        await drain(mirror)
+
+        assert SHADOW_REQUESTS.labels("shadow-full", "sent").value == 2
+        assert SHADOW_REQUESTS.labels("shadow-full", "dropped").value == 1
+
+    @pytest.mark.asyncio
+    @patch("app.utils.proxy.forward_request_to_service", new_callable=AsyncMock)
+    async def test_non_idempotent_not_mirrored(self, mock_forward, mirror):
+        """Prueba que un POST no se copie si no está en los métodos configurados."""
+        mock_forward.return_value = Response(status_code=201)
+
+        await proxy_to_upstream(make_request("POST"), make_route("shadow-post"), "patients")
+
+        assert mirror.received == []
+
+    @pytest.mark.asyncio
+    @patch("app.utils.proxy.forward_request_to_service", new_callable=AsyncMock)
+    async def test_shadow_error_recorded(self, mock_forward, mirror):
+        """Prueba que un error de conexión de la versión candidata se registre sin afectar la respuesta."""
+        mock_forward.return_value = Response(status_code=200)
+        mirror.respond.side_effect = httpx.ConnectError("sin conexión")
+        route = make_route("shadow-error")
+
+        response = await proxy_to_upstream(make_request(), route, "patients")
+        await drain(mirror)
+
+        assert response.status_code == 200
+        assert SHADOW_REQUESTS.labels("shadow-error", "error").value == 1
+        assert SHADOW_STATUS.labels("shadow-error", "2xx", "error").value == 1
@@ -0,0 +1,138 @@
+import multiprocessing
+import struct
+import pytest
+
+from app.utils.shared_memory import BUCKET_SLOTS, SharedTable, close_shared_tables, shared_table
+
+COUNTER = struct.Struct("<q")
+
+
+class FakeClock:
+    """Reloj controlable para las pruebas de vencimiento."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def increment(value):
+    count = COUNTER.unpack(value)[0] if value is not None else 0
+    return (COUNTER.pack(count + 1), 1e12), count + 1
+
+
+def increment_many(path, times):
+    table = SharedTable(path, slots=64, value_size=COUNTER.size, stripes=4)
+    for _ in range(times):
+        table.update("contador", increment)
+    table.close()
+
+
+@pytest.fixture
+def path(tmp_path):
+    """Fixture con la ruta del archivo de la tabla."""
+    return str(tmp_path / "gateway-test")
+
+
+class TestSharedTable:
+    """Pruebas para la tabla hash en memoria compartida."""
+
+    def test_set_get_and_expiry(self, path):
+        """Prueba que las entradas se lean hasta su vencimiento."""
+        clock = FakeClock()
+        table = SharedTable(path, slots=64, value_size=16, clock=clock)
+
+        assert table.set("clave", b"valor", expires_at=1010)
+        assert table.get("clave") == b"valor"
+        assert table.get("otra") is None
+        assert len(table) == 1
+
+        clock.now = 1010
+        assert table.get("clave") is None
+        assert len(table) == 0
+
+    def test_value_too_large(self, path):
+        """Prueba que no se guarden valores más grandes que una posición."""
+        table = SharedTable(path, slots=64, value_size=4)
+
+        assert not table.set("clave", b"12345", expires_at=1e12)
+        assert table.get("clave") is None
+
+    def test_visible_from_other_mapping(self, path):
+        """Prueba que otro proceso (otro mapeo del archivo) vea las escrituras."""
+        writer = SharedTable(path, slots=64, value_size=16)
+        reader = SharedTable(path, slots=64, value_size=16)
+
+        writer.set("clave", b"valor", expires_at=1e12)
+        assert reader.get("clave") == b"valor"
+        reader.delete("clave")
+        assert writer.get("clave") is None
+
+    def test_full_bucket_replaces_earliest_expiry(self, path):
+        """Prueba que con el grupo lleno se reemplace la entrada que vence antes."""
+        table = SharedTable(path, slots=BUCKET_SLOTS, value_size=8, clock=FakeClock())
+        for index in range(BUCKET_SLOTS):
+            table.set(f"k{index}", b"v", expires_at=2000 + index)
+
+        table.set("nueva", b"v", expires_at=3000)
+
+        assert table.get("k0") is None
+        assert table.get("k1") == b"v"
+        assert table.get("nueva") == b"v"
+
+    def test_layout_change_refused(self, path):
+        """Prueba que un archivo con otro formato no se trunque (otros workers podrían tenerlo mapeado)."""
+        table = SharedTable(path, slots=64, value_size=16)
+        table.set("clave", b"valor", expires_at=1e12)
+
+        with pytest.raises(RuntimeError):
+            SharedTable(path, slots=128, value_size=16)
+        assert table.get("clave") == b"valor"
+
+    def test_file_name_includes_layout(self, tmp_path, monkeypatch):
+        """Prueba que tablas con otro formato usen otro archivo."""
+        monkeypatch.setattr("app.utils.shared_memory.settings.SHARED_MEMORY_DIR", str(tmp_path))
+        monkeypatch.setattr("app.utils.shared_memory._tables", {})
+        first = shared_table("test", 64, 16)
+        first.set("clave", b"valor", expires_at=1e12)
+
+        # Un worker nuevo con otra configuración
+        monkeypatch.setattr("app.utils.shared_memory._tables", {})
+        second = shared_table("test", 128, 16)
+
+        assert first.path != second.path
+        assert second.get("clave") is None
+        assert first.get("clave") == b"valor"
+        first.close()
+        close_shared_tables()
+
+    def test_reopened_after_close(self, tmp_path, monkeypatch):
+        """Prueba que una tabla cerrada al terminar el lifespan se vuelva a abrir al usarla."""
+        monkeypatch.setattr("app.utils.shared_memory.settings.SHARED_MEMORY_DIR", str(tmp_path))
+        monkeypatch.setattr("app.utils.shared_memory._tables", {})
+        table = shared_table("test", 64, 16)
+        table.set("clave", b"valor", expires_at=1e12)
+
+        close_shared_tables()
+        assert table.closed
+
+        assert table.get("clave") == b"valor"
+        table.set("otra", b"valor", expires_at=1e12)
+        assert len(table) == 2
+        assert shared_table("test", 64, 16) is table
+        close_shared_tables()
+
+    def test_update_is_atomic_across_processes(self, path):
+        """Prueba que las lecturas y modificaciones concurrentes de varios procesos no se pierdan."""
+        SharedTable(path, slots=64, value_size=COUNTER.size, stripes=4)
+        context = multiprocessing.get_context("fork")
+        workers = [context.Process(target=increment_many, args=(path, 200)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=30)
+
+        table = SharedTable(path, slots=64, value_size=COUNTER.size, stripes=4)
+        assert all(worker.exitcode == 0 for worker in workers)
+        assert COUNTER.unpack(table.get("contador"))[0] == 800
@@ -0,0 +1,45 @@
+import pytest
+
+from app.utils.signed_identity import InvalidIdentity, decode_identity, encode_identity
+
+SECRET = "secreto-de-prueba"
+
+
+class TestSignedIdentity:
+    """Pruebas para el encabezado de identidad firmado por el gateway."""
+
+    def test_roundtrip(self):
+        """Prueba que los claims firmados se recuperen con su propia expiración."""
+        claims = {"sub": "user-1", "tenant_id": "tenant-1", "roles": ["admin"], "exp": 5, "iat": 1}
+        value = encode_identity(claims, SECRET, ttl=30, now=1000)
+
+        decoded = decode_identity(value, SECRET, now=1010)
+        assert decoded["sub"] == "user-1"
+        assert decoded["roles"] == ["admin"]
+        assert (decoded["iat"], decoded["exp"]) == (1000, 1030)
+
+    def test_expired(self):
+        """Prueba que se rechace un encabezado expirado (con la tolerancia de reloj)."""
+        value = encode_identity({"sub": "user-1"}, SECRET, ttl=30, now=1000)
+        assert decode_identity(value, SECRET, leeway=5, now=1034)["sub"] == "user-1"
+        with pytest.raises(InvalidIdentity):
+            decode_identity(value, SECRET, leeway=5, now=1036)
+
+    @pytest.mark.parametrize("mutate", [
+        lambda value: value.replace(value.split(".")[0], encode_identity({"sub": "admin"}, SECRET, 30).split(".")[0]),
+        lambda value: value[:-2] + "xx",
+        lambda value: value.split(".")[0],
+        lambda value: "ñ" + value,
+        lambda value: "",
+    ])
+    def test_tampered(self, mutate):
+        """Prueba que se rechacen los encabezados modificados o mal formados."""
+        value = encode_identity({"sub": "user-1"}, SECRET, ttl=30)
+        with pytest.raises(InvalidIdentity):
+            decode_identity(mutate(value), SECRET)
+
+    def test_wrong_secret(self):
+        """Prueba que se rechace un encabezado firmado con otra clave."""
+        value = encode_identity({"sub": "user-1"}, "otra-clave", ttl=30)
+        with pytest.raises(InvalidIdentity):
+            decode_identity(value, SECRET)
@@ -0,0 +1,97 @@
+import pytest
+
+from app.utils.shared_memory import SharedTable
+from app.utils.token_cache import SharedTokenCache, TokenCache
+
+
+class FakeClock:
+    """Reloj controlable para las pruebas de expiración."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenCache:
+    """Pruebas para la caché de tokens verificados."""
+
+    def test_hit_and_miss_counters(self):
+        """Prueba que se cuenten aciertos y fallos."""
+        cache = TokenCache(max_size=10, max_ttl=60, clock=FakeClock())
+
+        assert cache.get("token") is None
+        cache.set("token", {"sub": "user1", "exp": 2000})
+
+        assert cache.get("token") == {"sub": "user1", "exp": 2000}
+        assert cache.stats() == {"hits": 1, "misses": 1, "size": 1, "max_size": 10}
+
+    def test_expires_at_token_exp(self):
+        """Prueba que la entrada expire en el `exp` del token si es anterior al TTL."""
+        clock = FakeClock()
+        cache = TokenCache(max_size=10, max_ttl=300, clock=clock)
+        cache.set("token", {"sub": "user1", "exp": 1010})
+
+        clock.now = 1009.9
+        assert cache.get("token") is not None
+        clock.now = 1010
+        assert cache.get("token") is None
+        assert len(cache) == 0
+
+    def test_expires_at_max_ttl(self):
+        """Prueba que la entrada expire al cumplirse el TTL máximo."""
+        clock = FakeClock()
+        cache = TokenCache(max_size=10, max_ttl=60, clock=clock)
+        cache.set("token", {"sub": "user1", "exp": 5000})
+
+        clock.now = 1061
+        assert cache.get("token") is None
+
+    def test_lru_eviction(self):
+        """Prueba que se descarte la entrada menos usada al superar el tamaño máximo."""
+        cache = TokenCache(max_size=2, max_ttl=60, clock=FakeClock())
+        cache.set("a", {"sub": "a"})
+        cache.set("b", {"sub": "b"})
+        cache.get("a")
+        cache.set("c", {"sub": "c"})
+
+        assert cache.get("b") is None
+        assert cache.get("a") == {"sub": "a"}
+        assert cache.get("c") == {"sub": "c"}
+
+    def test_returns_copy(self):
+        """Prueba que modificar el payload devuelto no altere la caché."""
+        cache = TokenCache(max_size=10, max_ttl=60, clock=FakeClock())
+        cache.set("token", {"sub": "user1"})
+
+        cache.get("token")["sub"] = "otro"
+
+        assert cache.get("token") == {"sub": "user1"}
+
+
+class TestSharedTokenCache:
+    """Pruebas para la caché de tokens en memoria compartida."""
+
+    def test_shared_between_workers(self, tmp_path):
+        """Prueba que un token verificado por un worker sea un acierto en otro."""
+        path = str(tmp_path / "gateway-tokens")
+        clock = FakeClock()
+        worker_1 = SharedTokenCache(SharedTable(path, slots=64, value_size=256, clock=clock), max_ttl=60, clock=clock)
+        worker_2 = SharedTokenCache(SharedTable(path, slots=64, value_size=256, clock=clock), max_ttl=60, clock=clock)
+
+        worker_1.set("token", {"sub": "user1", "exp": 1030})
+
+        assert worker_2.get("token") == {"sub": "user1", "exp": 1030}
+        assert worker_2.stats()["hits"] == 1
+        clock.now = 1030
+        assert worker_2.get("token") is None
+
+    def test_payload_too_large_not_cached(self, tmp_path):
+        """Prueba que los payloads que no caben en una entrada no se guarden."""
+        clock = FakeClock()
+        cache = SharedTokenCache(SharedTable(str(tmp_path / "t"), slots=64, value_size=32, clock=clock), 60, clock)
+
+        cache.set("token", {"sub": "user1", "roles": ["admin"] * 10})
+
+        assert cache.get("token") is None